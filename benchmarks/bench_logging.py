@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+效能測試 - 資料層日誌成本
+
+比較大量新增交易記錄時三種輸出方式的耗時：
+1. quiet   : 預設設定 (NullHandler，DEBUG 訊息在層級檢查即被略過)
+2. console : 每筆都輸出到主控台 (等同改用 logging 之前每次呼叫 print 的行為)
+3. limited : 輸出到主控台但啟用頻率限制 (configure_logging 的預設)
+
+使用方法：
+python benchmarks/bench_logging.py [筆數]
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import time
+
+# 確保可以找到專案模組
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.log import LOGGER_NAME, configure_logging
+from database.models import DatabaseManager, CategoryManager, TransactionManager
+
+
+def run_inserts(count: int, db_path: str) -> float:
+    """在新資料庫新增 count 筆交易 (群組提交，排除 fsync 的影響)，回傳秒數"""
+    db_manager = DatabaseManager(db_path, group_commit_ms=1000)
+    category_id = CategoryManager(db_manager).get_categories_by_type('expense')[0]['id']
+    transaction_manager = TransactionManager(db_manager)
+    
+    start = time.perf_counter()
+    for i in range(count):
+        transaction_manager.add_transaction('2024-01-01', 'expense', category_id, 100 + i % 50, f"item {i}")
+    db_manager.flush()
+    elapsed = time.perf_counter() - start
+    
+    db_manager.close()
+    return elapsed
+
+
+def reset_logging():
+    """回到預設的安靜設定"""
+    logger = logging.getLogger(LOGGER_NAME)
+    for handler in list(logger.handlers):
+        if not isinstance(handler, logging.NullHandler):
+            logger.removeHandler(handler)
+    logger.setLevel(logging.NOTSET)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    # 主控台輸出寫到 stderr，最後的結果表格寫到 stdout，可用 2>/dev/null 只看結果
+    scenarios = {
+        'quiet': lambda: None,
+        'console': lambda: configure_logging(logging.DEBUG, sys.stderr, max_per_window=count * 2),
+        'limited': lambda: configure_logging(logging.DEBUG, sys.stderr),
+    }
+    
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, setup in scenarios.items():
+            reset_logging()
+            setup()
+            results[name] = run_inserts(count, os.path.join(temp_dir, f"{name}.db"))
+    reset_logging()
+    
+    baseline = results['quiet']
+    print(f"新增 {count} 筆交易記錄")
+    print(f"{'模式':<10} {'秒數':>8} {'每筆 µs':>10} {'相對 quiet':>12}")
+    for name, elapsed in results.items():
+        print(f"{name:<10} {elapsed:>8.3f} {elapsed / count * 1e6:>10.1f} {elapsed / baseline:>11.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+記帳應用程式 - 帳戶與轉帳
+帳戶餘額存放在 account_balances，由交易與轉帳的寫入路徑增減，讀取餘額不需加總歷史
+"""
+
+import sqlite3
+from typing import Dict, List, Optional
+
+from .log import get_logger
+from .models import BASE_CURRENCY, DatabaseManager, TransactionManager, converted_amount_sql
+
+logger = get_logger('accounts')
+
+
+class AccountManager:
+    """
+    帳戶管理類別
+    
+    每筆轉帳是一筆紀錄、兩個分錄：轉出帳戶減少 amount，轉入帳戶增加 to_amount
+    (同幣別時兩者相同)。轉帳存放在 transfers，不是收入或支出，因此不會
+    出現在月度統計、分類合計等收支報表中。
+    """
+    
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+    
+    # 帳戶
+    def add_account(self, name: str, currency: str = BASE_CURRENCY,
+                    opening_balance: float = 0.0) -> Optional[int]:
+        """
+        新增帳戶
+        
+        Args:
+            name: 帳戶名稱 (不可重複)
+            currency: 帳戶幣別 (記入此帳戶的交易必須使用相同幣別)
+            opening_balance: 期初餘額
+        
+        Returns:
+            新帳戶的 ID，名稱重複或失敗時回傳 None
+        """
+        name = name.strip()
+        if not name:
+            raise ValueError("帳戶名稱不可為空白")
+        currency = TransactionManager._normalize_currency(currency)
+        opening_balance = round(opening_balance, 2)
+        
+        def insert(conn):
+            account_id = conn.execute(
+                'INSERT INTO accounts (name, currency, opening_balance) VALUES (?, ?, ?)',
+                (name, currency, opening_balance)).lastrowid
+            conn.execute(
+                'INSERT INTO account_balances (account_id, balance) VALUES (?, ?)',
+                (account_id, opening_balance))
+            return account_id
+        
+        try:
+            account_id = self.db_manager.run_write(insert)
+            logger.debug("成功新增帳戶：%s", name, extra={'event': 'account_added', 'account_id': account_id})
+            return account_id
+        except sqlite3.IntegrityError:
+            logger.warning("帳戶 '%s' 已存在", name, extra={'event': 'account_exists'})
+            return None
+        except sqlite3.Error as e:
+            logger.error("新增帳戶錯誤：%s", e, extra={'event': 'account_add_failed'})
+            return None
+    
+    def rename_account(self, account_id: int, name: str) -> bool:
+        """重新命名帳戶"""
+        name = name.strip()
+        if not name:
+            raise ValueError("帳戶名稱不可為空白")
+        try:
+            cursor = self.db_manager.run_write(lambda conn: conn.execute(
+                'UPDATE accounts SET name = ? WHERE id = ?', (name, account_id)))
+            if cursor.rowcount == 0:
+                logger.warning("帳戶 ID %s 不存在", account_id, extra={'event': 'account_not_found'})
+                return False
+            return True
+        except sqlite3.IntegrityError:
+            logger.warning("帳戶 '%s' 已存在", name, extra={'event': 'account_exists'})
+            return False
+        except sqlite3.Error as e:
+            logger.error("重新命名帳戶錯誤：%s", e, extra={'event': 'account_update_failed'})
+            return False
+    
+    def delete_account(self, account_id: int) -> bool:
+        """刪除帳戶 (已有交易或轉帳記入的帳戶無法刪除)"""
+        def delete(conn):
+            row = conn.execute(
+                'SELECT entry_count FROM account_balances WHERE account_id = ?', (account_id,)).fetchone()
+            if row is None:
+                return 0
+            if row['entry_count'] > 0:
+                raise ValueError(f"帳戶仍有 {row['entry_count']} 筆交易或轉帳，無法刪除")
+            conn.execute('DELETE FROM account_balances WHERE account_id = ?', (account_id,))
+            TransactionManager._invalidate_checkpoints(conn, account_id)
+            conn.execute('DELETE FROM accounts WHERE id = ?', (account_id,))
+            return 1
+        
+        try:
+            if self.db_manager.run_write(delete) == 0:
+                logger.warning("帳戶 ID %s 不存在", account_id, extra={'event': 'account_not_found'})
+                return False
+            logger.debug("成功刪除帳戶 ID %s", account_id, extra={'event': 'account_deleted'})
+            return True
+        except sqlite3.Error as e:
+            logger.error("刪除帳戶錯誤：%s", e, extra={'event': 'account_delete_failed'})
+            return False
+    
+    def get_accounts(self) -> List[Dict]:
+        """
+        取得所有帳戶及目前餘額
+        
+        Returns:
+            帳戶列表，每個項目包含 id, name, currency, opening_balance, balance, entry_count
+        """
+        try:
+            return self.db_manager.query('''
+                SELECT a.id, a.name, a.currency, a.opening_balance,
+                       COALESCE(b.balance, 0) as balance, COALESCE(b.entry_count, 0) as entry_count
+                FROM accounts a
+                LEFT JOIN account_balances b ON b.account_id = a.id
+                ORDER BY a.id
+            ''')
+        except sqlite3.Error as e:
+            logger.error("查詢帳戶錯誤：%s", e, extra={'event': 'query_failed'})
+            return []
+    
+    def get_balance(self, account_id: int) -> Optional[float]:
+        """取得帳戶目前餘額 (單筆主鍵查詢)，帳戶不存在時回傳 None"""
+        try:
+            row = self.db_manager.query_one(
+                'SELECT balance FROM account_balances WHERE account_id = ?', (account_id,))
+            return float(row['balance']) if row else None
+        except sqlite3.Error as e:
+            logger.error("查詢帳戶餘額錯誤：%s", e, extra={'event': 'query_failed'})
+            return None
+    
+    def get_net_worth(self) -> float:
+        """取得所有帳戶餘額合計 (外幣帳戶以今天適用的匯率換算為基準幣別)"""
+        try:
+            row = self.db_manager.query_one(f'''
+                SELECT COALESCE(SUM({converted_amount_sql('b')}), 0) as total
+                FROM (
+                    SELECT ab.balance as amount, a.currency, date('now', 'localtime') as date
+                    FROM accounts a
+                    JOIN account_balances ab ON ab.account_id = a.id
+                ) b
+            ''')
+            return float(row['total'])
+        except sqlite3.Error as e:
+            logger.error("查詢資產合計錯誤：%s", e, extra={'event': 'query_failed'})
+            return 0.0
+    
+    # 轉帳
+    def add_transfer(self, date: str, from_account_id: int, to_account_id: int, amount: float,
+                     description: str = '', to_amount: Optional[float] = None) -> Optional[int]:
+        """
+        新增轉帳
+        
+        Args:
+            date: 轉帳日期 (YYYY-MM-DD)
+            from_account_id: 轉出帳戶
+            to_account_id: 轉入帳戶
+            amount: 轉出金額 (轉出帳戶幣別)
+            description: 備註
+            to_amount: 轉入金額 (轉入帳戶幣別；同幣別時可省略)
+        
+        Returns:
+            新轉帳的 ID，失敗時回傳 None
+        """
+        if from_account_id == to_account_id:
+            raise ValueError("轉出與轉入帳戶不可相同")
+        if amount <= 0 or (to_amount is not None and to_amount <= 0):
+            raise ValueError("金額必須大於 0")
+        
+        def insert(conn):
+            rows = {row['id']: row['currency'] for row in conn.execute(
+                'SELECT id, currency FROM accounts WHERE id IN (?, ?)', (from_account_id, to_account_id))}
+            for account_id in (from_account_id, to_account_id):
+                if account_id not in rows:
+                    raise ValueError(f"帳戶 ID {account_id} 不存在")
+            
+            received = to_amount
+            if received is None:
+                if rows[from_account_id] != rows[to_account_id]:
+                    raise ValueError("不同幣別的帳戶轉帳需指定轉入金額")
+                received = amount
+            
+            transfer_id = conn.execute('''
+                INSERT INTO transfers (date, from_account_id, to_account_id, amount, to_amount, description)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (date, from_account_id, to_account_id, round(amount, 2), round(received, 2),
+                  description)).lastrowid
+            TransactionManager._adjust_balance(conn, from_account_id, -round(amount, 2), 1, date)
+            TransactionManager._adjust_balance(conn, to_account_id, round(received, 2), 1, date)
+            return transfer_id
+        
+        try:
+            transfer_id = self.db_manager.run_write(insert)
+            logger.debug("成功新增轉帳：%s → %s %.2f", from_account_id, to_account_id, amount,
+                         extra={'event': 'transfer_added', 'transfer_id': transfer_id})
+            return transfer_id
+        except sqlite3.Error as e:
+            logger.error("新增轉帳錯誤：%s", e, extra={'event': 'transfer_add_failed'})
+            return None
+    
+    def delete_transfer(self, transfer_id: int) -> bool:
+        """刪除轉帳 (兩個帳戶的餘額同時沖回)"""
+        def delete(conn):
+            row = conn.execute(
+                'SELECT date, from_account_id, to_account_id, amount, to_amount FROM transfers WHERE id = ?',
+                (transfer_id,)).fetchone()
+            if row is None:
+                return 0
+            conn.execute('DELETE FROM transfers WHERE id = ?', (transfer_id,))
+            date = row['date']
+            TransactionManager._adjust_balance(conn, row['from_account_id'], float(row['amount']), -1, date)
+            TransactionManager._adjust_balance(conn, row['to_account_id'], -float(row['to_amount']), -1, date)
+            return 1
+        
+        try:
+            if self.db_manager.run_write(delete) == 0:
+                logger.warning("轉帳 ID %s 不存在", transfer_id, extra={'event': 'transfer_not_found'})
+                return False
+            logger.debug("成功刪除轉帳 ID %s", transfer_id, extra={'event': 'transfer_deleted'})
+            return True
+        except sqlite3.Error as e:
+            logger.error("刪除轉帳錯誤：%s", e, extra={'event': 'transfer_delete_failed'})
+            return False
+    
+    def get_transfers(self, account_id: Optional[int] = None, start_date: Optional[str] = None,
+                      end_date: Optional[str] = None) -> List[Dict]:
+        """
+        取得轉帳記錄 (由新到舊)
+        
+        Args:
+            account_id: 只取得轉出或轉入此帳戶的轉帳
+            start_date: 開始日期 (包含)
+            end_date: 結束日期 (包含)
+        """
+        conditions, params = [], []
+        if account_id is not None:
+            conditions.append('(t.from_account_id = ? OR t.to_account_id = ?)')
+            params.extend([account_id, account_id])
+        if start_date:
+            conditions.append('t.date >= ?')
+            params.append(start_date)
+        if end_date:
+            conditions.append('t.date <= ?')
+            params.append(end_date)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        
+        try:
+            return self.db_manager.query(f'''
+                SELECT t.id, t.date, t.from_account_id, t.to_account_id, t.amount, t.to_amount,
+                       t.description, f.name as from_account_name, r.name as to_account_name
+                FROM transfers t
+                LEFT JOIN accounts f ON t.from_account_id = f.id
+                LEFT JOIN accounts r ON t.to_account_id = r.id
+                {where}
+                ORDER BY t.date DESC, t.id DESC
+            ''', params)
+        except sqlite3.Error as e:
+            logger.error("查詢轉帳記錄錯誤：%s", e, extra={'event': 'query_failed'})
+            return []
@@ -0,0 +1,177 @@
+"""
+記帳應用程式 - 歷史資料封存
+將舊交易明細移到冷封存檔，主資料庫只保留每月各分類的彙總
+"""
+
+import os
+import sqlite3
+from datetime import date
+from typing import Dict, List, Optional
+
+from .log import get_logger
+from .models import TRANSACTION_ADDED_COLUMNS, DatabaseManager, add_missing_columns, converted_amount_sql
+
+logger = get_logger('archive')
+
+
+ARCHIVE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS archive.transactions (
+        id INTEGER PRIMARY KEY,
+        date DATE NOT NULL,
+        type TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        amount DECIMAL(10,2) NOT NULL,
+        description TEXT,
+        created_at DATETIME,
+        archived_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        currency TEXT NOT NULL DEFAULT 'TWD',
+        account_id INTEGER,
+        recurring_rule_id INTEGER,
+        external_id TEXT,
+        fingerprint TEXT,
+        reconciled INTEGER NOT NULL DEFAULT 0
+    )
+'''
+
+ARCHIVE_COLUMNS = ('id, date, type, category_id, amount, description, created_at, currency, account_id, '
+                   'recurring_rule_id, external_id, fingerprint, reconciled')
+
+
+class ArchiveManager:
+    """
+    歷史資料封存管理類別
+    
+    封存以整月為單位：截止日之前的明細在同一個寫入交易中累加到
+    transaction_summaries (期間 YYYY-MM × 類型 × 分類)，複製到封存檔後
+    從主資料庫刪除。TransactionManager 的月度統計與分類合計會自動納入彙總，
+    因此年度/月度報表結果不受影響。帳戶餘額在寫入時已累計，封存不會改變餘額。
+    """
+    
+    def __init__(self, db_manager: DatabaseManager, archive_path: Optional[str] = None):
+        """
+        初始化封存管理器
+        
+        Args:
+            db_manager: DatabaseManager 實例 (不支援群組提交模式)
+            archive_path: 封存檔路徑 (預設為 {資料庫名稱}_archive.db)
+        """
+        if db_manager.group_commit:
+            raise ValueError("封存不支援群組提交模式 (交易進行中無法 ATTACH 資料庫)")
+        
+        self.db_manager = db_manager
+        if archive_path is None:
+            base, ext = os.path.splitext(db_manager.db_path)
+            archive_path = f"{base}_archive{ext or '.db'}"
+        self.archive_path = archive_path
+    
+    @staticmethod
+    def get_cutoff_date(years: int, today: Optional[date] = None) -> str:
+        """
+        計算「N 年前」的封存截止日 (對齊到月初，確保彙總涵蓋完整月份)
+        
+        Returns:
+            截止日 (YYYY-MM-DD)，此日期之前的明細會被封存
+        """
+        if years < 1:
+            raise ValueError("封存年數必須至少為 1")
+        today = today or date.today()
+        return f"{today.year - years:04d}-{today.month:02d}-01"
+    
+    def archive_before(self, cutoff_date: str) -> int:
+        """
+        封存截止日之前的交易明細
+        
+        Args:
+            cutoff_date: 截止日 (YYYY-MM-DD，必須是月初)
+        
+        Returns:
+            封存的筆數
+        """
+        if not cutoff_date.endswith('-01'):
+            raise ValueError("封存截止日必須是月初 (YYYY-MM-01)")
+        
+        if self.db_manager.query_one(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'partitions'"):
+            raise ValueError("年度分區模式下請改用結帳 (close_year) 管理舊年度")
+        
+        def archive(conn):
+            # ATTACH 必須在交易開始前執行
+            conn.execute('ATTACH DATABASE ? AS archive', (self.archive_path,))
+            conn.execute(ARCHIVE_SCHEMA)
+            add_missing_columns(conn, 'transactions', TRANSACTION_ADDED_COLUMNS, 'archive')
+            conn.execute('CREATE INDEX IF NOT EXISTS archive.idx_transactions_date ON transactions(date)')
+            
+            # 累加到月度彙總 (外幣以交易日匯率換算為基準幣別；同一月份之後補登的明細再次封存時會合併)
+            conn.execute(f'''
+                INSERT INTO main.transaction_summaries (period, type, category_id, total, count)
+                SELECT substr(t.date, 1, 7), t.type, t.category_id, SUM({converted_amount_sql('t')}), COUNT(*)
+                FROM main.transactions t
+                WHERE t.date < ?
+                GROUP BY substr(t.date, 1, 7), t.type, t.category_id
+                ON CONFLICT (period, type, category_id) DO UPDATE SET
+                    total = total + excluded.total,
+                    count = count + excluded.count
+            ''', (cutoff_date,))
+            
+            conn.execute(f'''
+                INSERT OR REPLACE INTO archive.transactions ({ARCHIVE_COLUMNS})
+                SELECT {ARCHIVE_COLUMNS} FROM main.transactions WHERE date < ?
+            ''', (cutoff_date,))
+            return conn.execute('DELETE FROM main.transactions WHERE date < ?', (cutoff_date,)).rowcount
+        
+        try:
+            count = self.db_manager.run_write(archive)
+            logger.info("已封存 %d 筆 %s 之前的交易記錄", count, cutoff_date,
+                        extra={'event': 'transactions_archived', 'archive_path': self.archive_path})
+            return count
+        except sqlite3.Error as e:
+            logger.error("封存交易記錄錯誤：%s", e, extra={'event': 'archive_failed'})
+            return 0
+    
+    def archive_older_than(self, years: int) -> int:
+        """封存 N 年前 (對齊月初) 的交易明細，回傳封存筆數"""
+        return self.archive_before(self.get_cutoff_date(years))
+    
+    def get_archived_periods(self) -> List[Dict]:
+        """
+        取得已封存的月份
+        
+        Returns:
+            月份列表 (由新到舊)，每個項目包含 period, total_income, total_expense, count
+        """
+        try:
+            return self.db_manager.query('''
+                SELECT period,
+                       SUM(CASE WHEN type = 'income' THEN total ELSE 0 END) as total_income,
+                       SUM(CASE WHEN type = 'expense' THEN total ELSE 0 END) as total_expense,
+                       SUM(count) as count
+                FROM transaction_summaries
+                GROUP BY period
+                ORDER BY period DESC
+            ''')
+        except sqlite3.Error as e:
+            logger.error("查詢封存月份錯誤：%s", e, extra={'event': 'query_failed'})
+            return []
+    
+    def get_archived_transactions(self, start_date: str, end_date: str) -> List[Dict]:
+        """從封存檔讀取日期範圍內的交易明細 (僅供偶爾查閱)"""
+        if not os.path.exists(self.archive_path):
+            return []
+        
+        def fetch(conn):
+            conn.execute('ATTACH DATABASE ? AS archive', (self.archive_path,))
+            cursor = conn.execute('''
+                SELECT t.id, t.date, t.type, t.category_id, t.amount, t.currency, t.description,
+                       c.name as category_name
+                FROM archive.transactions t
+                LEFT JOIN main.categories c ON t.category_id = c.id
+                WHERE t.date >= ? AND t.date <= ?
+                ORDER BY t.date DESC, t.id DESC
+            ''', (start_date, end_date))
+            return [dict(row) for row in cursor.fetchall()]
+        
+        try:
+            return self.db_manager.run_read(fetch)
+        except sqlite3.Error as e:
+            logger.error("查詢封存交易記錄錯誤：%s", e, extra={'event': 'query_failed'})
+            return []
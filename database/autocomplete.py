@@ -0,0 +1,236 @@
+"""
+記帳應用程式 - 備註自動完成
+歷史備註依正規化後的文字排序成陣列，前綴查詢以二分搜尋找出範圍；各前綴的前幾名
+依「隨時間衰減的使用次數」排序後快取，每次按鍵只需一次字典查詢。
+索引在背景由交易建立一次，之後由寫入路徑逐筆更新
+"""
+
+import sqlite3
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from datetime import date
+from heapq import nlargest
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .log import get_logger
+from .models import TransactionManager
+
+logger = get_logger('autocomplete')
+
+# 分數的半衰期 (天)：半年前的一次使用只算半次
+HALF_LIFE_DAYS = 180
+
+# 每個前綴快取的候選數 (也是一次最多回傳的筆數)
+TOP_K = 10
+
+# 建立索引時預先排序的前綴長度 (較長的前綴範圍小，第一次查詢時才排序)
+PRECOMPUTED_PREFIX_LENGTH = 2
+
+_EPOCH = date(2000, 1, 1).toordinal()
+
+
+def completion_key(text: str) -> str:
+    """比對用的文字 (全形轉半形、忽略大小寫與前後空白)"""
+    return unicodedata.normalize('NFKC', text).casefold().strip()
+
+
+def usage_weight(day: str) -> float:
+    """一次使用的分數 (以 2000-01-01 為基準的指數成長，比較大小時等同依現在衰減)"""
+    try:
+        ordinal = date.fromisoformat(day[:10]).toordinal()
+    except ValueError:
+        ordinal = _EPOCH
+    return 2.0 ** ((ordinal - _EPOCH) / HALF_LIFE_DAYS)
+
+
+class DescriptionIndex:
+    """
+    備註的前綴索引
+    
+    _entries 為依 (比對文字, 備註) 排序的陣列，前綴相同的備註相鄰；_top 快取前綴的前 TOP_K 名。
+    使用次數增加時只需在快取中調整該備註的位置；減少或移除時捨棄受影響的快取，下次查詢再排序。
+    """
+    
+    def __init__(self, usage: Sequence[Tuple[str, str, int]] = ()):
+        """
+        Args:
+            usage: [(備註, 日期或 YYYY-MM, 次數)]，YYYY-MM 以當月 15 日計算分數
+        """
+        self._scores: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        for description, period, count in usage:
+            description = description.strip()
+            if not completion_key(description):
+                continue
+            day = f"{period}-15" if len(period) == 7 else period
+            self._scores[description] = self._scores.get(description, 0.0) + count * usage_weight(day)
+            self._counts[description] = self._counts.get(description, 0) + count
+        self._entries: List[Tuple[str, str]] = sorted(
+            (completion_key(description), description) for description in self._scores)
+        
+        # 預先排序短前綴 (範圍最大，第一次按鍵就需要)
+        groups: Dict[str, List[str]] = {}
+        for key, description in self._entries:
+            for length in range(1, min(len(key), PRECOMPUTED_PREFIX_LENGTH) + 1):
+                groups.setdefault(key[:length], []).append(description)
+        self._top: Dict[str, List[str]] = {prefix: self._rank(descriptions)
+                                           for prefix, descriptions in groups.items()}
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def _rank(self, descriptions) -> List[str]:
+        """依分數取前 TOP_K 名 (分數相同時保留傳入的順序)"""
+        return nlargest(TOP_K, descriptions, key=self._scores.__getitem__)
+    
+    def _range(self, key: str):
+        """前綴為 key 的備註"""
+        index = bisect_left(self._entries, (key,))
+        while index < len(self._entries) and self._entries[index][0].startswith(key):
+            yield self._entries[index][1]
+            index += 1
+    
+    def complete(self, prefix: str, limit: int = 5) -> List[str]:
+        """
+        取得以 prefix 開頭的備註
+        
+        Args:
+            prefix: 目前輸入的文字
+            limit: 最多回傳幾筆 (不超過 TOP_K)
+        
+        Returns:
+            依分數由高到低排序的備註 (不含與輸入完全相同者)
+        """
+        key = completion_key(prefix)
+        if not key:
+            return []
+        top = self._top.get(key)
+        if top is None:
+            top = self._top[key] = self._rank(self._range(key))
+        return [description for description in top if description != prefix.strip()][:limit]
+    
+    def add(self, description: Optional[str], day: str, count: int = 1):
+        """記入 (count > 0) 或移除 (count < 0) 備註的使用"""
+        description = (description or '').strip()
+        key = completion_key(description)
+        if not key:
+            return
+        remaining = self._counts.get(description, 0) + count
+        prefixes = [key[:length] for length in range(1, len(key) + 1)]
+        if remaining <= 0:
+            if description in self._counts:
+                del self._counts[description], self._scores[description]
+                self._entries.pop(bisect_left(self._entries, (key, description)))
+            for prefix in prefixes:
+                self._top.pop(prefix, None)
+            return
+        
+        if description not in self._counts:
+            insort(self._entries, (key, description))
+            self._scores[description] = 0.0
+        self._counts[description] = remaining
+        self._scores[description] = max(self._scores[description] + count * usage_weight(day), 0.0)
+        for prefix in prefixes:
+            top = self._top.get(prefix)
+            if top is None:
+                continue
+            if count < 0:
+                del self._top[prefix]
+            else:
+                if description in top:
+                    top.remove(description)
+                top[:] = self._rank(top + [description])
+
+
+class DescriptionCompleter:
+    """
+    備註自動完成
+    
+    第一次需要時在背景執行緒建立索引 (建立期間查詢回傳空列表)；之後由呼叫端在寫入交易後
+    呼叫 record 逐筆更新，批次匯入或外部程式修改後呼叫 invalidate 重建 (重建期間沿用舊索引)。
+    建立期間有 record 時建立結果可能已過期，會再重建一次。
+    """
+    
+    def __init__(self, transaction_manager: TransactionManager):
+        self.transaction_manager = transaction_manager
+        self._index: Optional[DescriptionIndex] = None
+        self._lock = threading.Lock()
+        self._building = False
+        self._stale = False
+    
+    @property
+    def ready(self) -> bool:
+        """索引是否已建立"""
+        return self._index is not None
+    
+    def complete(self, prefix: str, limit: int = 5) -> List[str]:
+        """取得以 prefix 開頭的常用備註 (索引尚未建立時開始建立並回傳空列表)"""
+        if self._index is None:
+            self.prepare()
+            return []
+        with self._lock:
+            return self._index.complete(prefix, limit)
+    
+    def record(self, old: Optional[Dict] = None, new: Optional[Dict] = None):
+        """
+        套用單筆交易異動
+        
+        Args:
+            old: 異動前的交易 (新增時為 None)
+            new: 異動後的交易 (刪除時為 None)
+        """
+        with self._lock:
+            if self._building:
+                self._stale = True
+            if self._index is None:
+                return
+            if old is not None:
+                self._index.add(old.get('description'), old['date'], -1)
+            if new is not None:
+                self._index.add(new.get('description'), new['date'], 1)
+    
+    def prepare(self, background: bool = True):
+        """尚未建立 (也不在建立中) 時建立索引"""
+        self._start(False, background)
+    
+    def invalidate(self, background: bool = True):
+        """
+        由交易重新建立索引 (建立中時建立完成後再重建一次)
+        
+        Args:
+            background: 是否在背景執行緒建立 (False 時建立完成才返回)
+        """
+        self._start(True, background)
+    
+    def _start(self, rebuild: bool, background: bool):
+        with self._lock:
+            if self._building:
+                self._stale = self._stale or rebuild
+                return
+            if self._index is not None and not rebuild:
+                return
+            self._building = True
+        if background:
+            threading.Thread(target=self._build, daemon=True).start()
+        else:
+            self._build()
+    
+    def _build(self):
+        """建立索引，期間有異動時重建"""
+        while True:
+            try:
+                index = DescriptionIndex(self.transaction_manager._description_usage())
+            except sqlite3.Error as e:
+                logger.error("建立備註索引錯誤：%s", e, extra={'event': 'autocomplete_build_failed'})
+                with self._lock:
+                    self._building = self._stale = False
+                return
+            with self._lock:
+                if self._stale:
+                    self._stale = False
+                    continue
+                self._index = index
+                self._building = False
+            logger.debug("已建立 %d 個備註的自動完成索引", len(index), extra={'event': 'autocomplete_built'})
+            return
@@ -0,0 +1,233 @@
+"""
+記帳應用程式 - 歷史餘額
+以月底餘額檢查點 (balance_checkpoints) 回答「某一天的餘額是多少」，
+查詢成本為一次檢查點查找加上當月的少量明細，不隨歷史筆數增加
+"""
+
+import calendar
+import sqlite3
+from typing import Dict, List, Optional
+
+from .log import get_logger
+from .models import LEDGER_SCOPE, TransactionManager
+
+logger = get_logger('balances')
+
+# 沒有上限的查詢範圍結束日期
+_END_OF_TIME = '9999-12-31'
+
+
+def _shift_period(period: str, months: int) -> str:
+    """將 YYYY-MM 前後移動指定月數"""
+    index = int(period[:4]) * 12 + int(period[5:7]) - 1 + months
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def _period_end(period: str) -> str:
+    """取得月份最後一天 (YYYY-MM-DD)"""
+    return f"{period}-{calendar.monthrange(int(period[:4]), int(period[5:7]))[1]:02d}"
+
+
+def _periods(start_period: str, end_period: str) -> List[str]:
+    """列出兩個月份之間 (包含) 的所有月份"""
+    periods = []
+    period = start_period
+    while period <= end_period:
+        periods.append(period)
+        period = _shift_period(period, 1)
+    return periods
+
+
+class BalanceHistory:
+    """
+    歷史餘額查詢類別
+    
+    檢查點是每個月月底的累計餘額：帳本範圍 (LEDGER_SCOPE) 為歷來收入減支出，
+    換算為基準幣別並包含已封存的月度彙總；帳戶範圍為帳戶幣別的餘額，包含期初
+    餘額與轉帳。交易、轉帳與匯率的寫入路徑在同一個交易中刪除編輯日期所在月份
+    之後的檢查點，查詢時再由最近的有效檢查點補算並存回：
+    
+    - 帳本由較早的檢查點 (或第一筆交易) 往後累加
+    - 帳戶由較晚的檢查點 (或 account_balances 的目前餘額) 往回扣減，
+      因此封存後帳戶明細不完整也不影響封存期間之後的餘額
+    
+    補算期間若有其他寫入 (資料表版本改變)，結果照常回傳但不存回，避免快取過期的值。
+    """
+    
+    def __init__(self, transaction_manager: TransactionManager):
+        self.transaction_manager = transaction_manager
+        self.db_manager = transaction_manager.db_manager
+    
+    def balance_at(self, date: str, account_id: Optional[int] = None) -> Optional[float]:
+        """
+        取得某一天結束時的餘額
+        
+        Args:
+            date: 日期 (YYYY-MM-DD，包含當天的交易)
+            account_id: 帳戶 ID (None 時為整個帳本的累計結餘，以基準幣別計算；
+                        已封存的月份以整月彙總計入)
+        
+        Returns:
+            餘額，帳戶不存在或查詢失敗時回傳 None
+        """
+        period = date[:7]
+        try:
+            previous = _shift_period(period, -1)
+            checkpoints = self._get_checkpoints(previous, previous, account_id)
+            if checkpoints is None:
+                return None
+            tail = self._net(f"{period}-01", date, account_id)
+            return round(checkpoints[previous] + sum(tail.values()), 2)
+        except sqlite3.Error as e:
+            logger.error("查詢歷史餘額錯誤：%s", e, extra={'event': 'query_failed'})
+            return None
+    
+    def get_month_end_balances(self, start_period: str, end_period: str,
+                               account_id: Optional[int] = None) -> Dict[str, float]:
+        """
+        取得每個月月底的餘額
+        
+        Args:
+            start_period: 開始月份 (YYYY-MM)
+            end_period: 結束月份 (YYYY-MM，包含)
+            account_id: 帳戶 ID (None 時為整個帳本)
+        
+        Returns:
+            {YYYY-MM: 月底餘額}，帳戶不存在或查詢失敗時回傳空字典
+        """
+        try:
+            return self._get_checkpoints(start_period, end_period, account_id) or {}
+        except sqlite3.Error as e:
+            logger.error("查詢月底餘額錯誤：%s", e, extra={'event': 'query_failed'})
+            return {}
+    
+    def _get_checkpoints(self, start_period: str, end_period: str,
+                         account_id: Optional[int]) -> Optional[Dict[str, float]]:
+        """讀取範圍內的檢查點，缺少的月份補算後存回 (帳戶不存在時回傳 None)"""
+        scope = LEDGER_SCOPE if account_id is None else account_id
+        # 先取得版本，補算期間若有寫入就不存回
+        generations = self.db_manager.get_table_generations()
+        stored = {row['period']: float(row['balance']) for row in self.db_manager.query('''
+            SELECT period, balance FROM balance_checkpoints
+            WHERE account_id = ? AND period >= ? AND period <= ?
+        ''', (scope, start_period, end_period))}
+        
+        periods = _periods(start_period, end_period)
+        missing = [period for period in periods if period not in stored]
+        if not missing:
+            return {period: stored[period] for period in periods}
+        
+        if account_id is None:
+            computed = self._compute_forward(missing[0], missing[-1])
+        else:
+            computed = self._compute_backward(account_id, missing[0], missing[-1])
+            if computed is None:
+                return None
+        
+        self._store(scope, computed, generations)
+        logger.debug("已補算 %d 個餘額檢查點", len(computed),
+                     extra={'event': 'balance_checkpoints_computed', 'account_id': scope})
+        stored.update(computed)
+        return {period: stored[period] for period in periods}
+    
+    def _compute_forward(self, first: str, last: str) -> Dict[str, float]:
+        """帳本：由 first 之前最近的檢查點往後累加到 last"""
+        row = self.db_manager.query_one('''
+            SELECT period, balance FROM balance_checkpoints
+            WHERE account_id = ? AND period < ?
+            ORDER BY period DESC LIMIT 1
+        ''', (LEDGER_SCOPE, first))
+        if row:
+            balance, start = float(row['balance']), _shift_period(row['period'], 1)
+        else:
+            # 沒有更早的檢查點時從第一筆交易 (或封存彙總) 的月份開始
+            balance, start = 0.0, first
+            origin = self._first_period()
+            if origin is not None:
+                start = min(origin, first)
+        
+        net = self._net(f"{start}-01", _period_end(last))
+        computed = {}
+        for period in _periods(start, last):
+            balance += net.get(period, 0.0)
+            computed[period] = round(balance, 2)
+        return computed
+    
+    def _compute_backward(self, account_id: int, first: str, last: str) -> Optional[Dict[str, float]]:
+        """帳戶：由 last 之後最近的檢查點 (或目前餘額) 往回扣減到 first"""
+        row = self.db_manager.query_one('''
+            SELECT period, balance FROM balance_checkpoints
+            WHERE account_id = ? AND period > ?
+            ORDER BY period LIMIT 1
+        ''', (account_id, last))
+        if row:
+            balance, end_date = float(row['balance']), _period_end(row['period'])
+        else:
+            current = self.db_manager.query_one(
+                'SELECT balance FROM account_balances WHERE account_id = ?', (account_id,))
+            if current is None:
+                logger.warning("帳戶 ID %s 不存在", account_id, extra={'event': 'account_not_found'})
+                return None
+            balance, end_date = float(current['balance']), _END_OF_TIME
+        
+        net = self._net(f"{_shift_period(first, 1)}-01", end_date, account_id)
+        balance -= sum(amount for period, amount in net.items() if period > last)
+        computed = {}
+        for period in reversed(_periods(first, last)):
+            computed[period] = round(balance, 2)
+            balance -= net.get(period, 0.0)
+        return computed
+    
+    def _net(self, start_date: str, end_date: str, account_id: Optional[int] = None) -> Dict[str, float]:
+        """
+        日期範圍內每月的餘額變動 {YYYY-MM: 淨額}
+        
+        帳本包含封存彙總 (月份與範圍重疊即計入整月)，帳戶包含轉入與轉出。
+        """
+        net = self.transaction_manager._monthly_net(start_date, end_date, account_id)
+        if account_id is None:
+            rows = self.db_manager.query('''
+                SELECT period, SUM(CASE WHEN type = 'income' THEN total ELSE -total END) as net
+                FROM transaction_summaries
+                WHERE period >= ? AND period <= ?
+                GROUP BY period
+            ''', (start_date[:7], end_date[:7]))
+        else:
+            rows = self.db_manager.query('''
+                SELECT substr(date, 1, 7) as period,
+                       SUM(CASE WHEN to_account_id = ? THEN to_amount ELSE -amount END) as net
+                FROM transfers
+                WHERE (from_account_id = ? OR to_account_id = ?) AND date >= ? AND date <= ?
+                GROUP BY period
+            ''', (account_id, account_id, account_id, start_date, end_date))
+        for row in rows:
+            net[row['period']] = net.get(row['period'], 0.0) + float(row['net'])
+        return net
+    
+    def _first_period(self) -> Optional[str]:
+        """帳本最早有資料的月份 (第一筆交易或最早的封存彙總)"""
+        candidates = []
+        first_date = self.transaction_manager._first_date()
+        if first_date:
+            candidates.append(first_date[:7])
+        row = self.db_manager.query_one('SELECT MIN(period) as period FROM transaction_summaries')
+        if row and row['period']:
+            candidates.append(row['period'])
+        return min(candidates) if candidates else None
+    
+    def _store(self, scope: int, checkpoints: Dict[str, float], generations: Dict[str, int]):
+        """存回補算的檢查點 (資料表版本與補算前相同時才寫入)"""
+        def store(conn):
+            if self.db_manager.get_table_generations(conn) != generations:
+                return False
+            conn.executemany(
+                'INSERT OR REPLACE INTO balance_checkpoints (account_id, period, balance) VALUES (?, ?, ?)',
+                [(scope, period, balance) for period, balance in checkpoints.items()])
+            return True
+        
+        try:
+            if not self.db_manager.run_write(store):
+                logger.debug("補算期間資料已變更，略過存回檢查點",
+                             extra={'event': 'balance_checkpoints_stale', 'account_id': scope})
+        except sqlite3.Error as e:
+            logger.warning("存回餘額檢查點錯誤：%s", e, extra={'event': 'balance_checkpoints_store_failed'})
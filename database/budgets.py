@@ -0,0 +1,209 @@
+"""
+記帳應用程式 - 預算
+分類的每月預算與已支出計數器 (budget_spend)，計數器在交易寫入時同步增減，
+評估所有預算只需讀取每個預算一列，不需掃描當月交易
+"""
+
+import sqlite3
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from .log import get_logger
+from .models import TransactionManager
+
+logger = get_logger('budgets')
+
+# 預算狀態：未達提醒門檻 / 超過提醒門檻 / 超支
+BUDGET_OK = 'ok'
+BUDGET_WARNING = 'warning'
+BUDGET_OVER = 'over'
+
+
+def budget_status(spent: float, amount: float, alert_threshold: float) -> str:
+    """依已支出與預算金額判斷預算狀態"""
+    ratio = spent / amount
+    if ratio > 1:
+        return BUDGET_OVER
+    if ratio >= alert_threshold:
+        return BUDGET_WARNING
+    return BUDGET_OK
+
+
+class BudgetManager:
+    """
+    預算管理類別
+    
+    每個支出分類最多一筆每月預算。有預算的分類在新增、修改、刪除交易時，
+    寫入路徑在同一個交易中把交易日匯率換算後的金額加減到 (分類, 月份) 的計數器。
+    新設定的預算與匯率異動後的預算 (spend_valid = 0) 在下次查詢時由交易與
+    封存彙總重建一次計數器；重建期間若有其他寫入就不存回，下次查詢再重建。
+    """
+    
+    def __init__(self, transaction_manager: TransactionManager):
+        self.transaction_manager = transaction_manager
+        self.db_manager = transaction_manager.db_manager
+    
+    def set_budget(self, category_id: int, amount: float, alert_threshold: float = 0.8) -> bool:
+        """
+        設定分類的每月預算 (已有預算時更新金額與門檻)
+        
+        Args:
+            category_id: 支出分類ID
+            amount: 每月預算金額 (基準幣別)
+            alert_threshold: 已支出達預算的此比例時提醒 (0 < 門檻 <= 1)
+        
+        Returns:
+            是否成功
+        """
+        if amount <= 0:
+            raise ValueError("預算金額必須大於 0")
+        if not 0 < alert_threshold <= 1:
+            raise ValueError("提醒門檻必須介於 0 與 1 之間")
+        
+        def upsert(conn):
+            TransactionManager._check_category(conn, category_id, 'expense')
+            conn.execute('''
+                INSERT INTO budgets (category_id, amount, alert_threshold) VALUES (?, ?, ?)
+                ON CONFLICT (category_id) DO UPDATE SET
+                    amount = excluded.amount, alert_threshold = excluded.alert_threshold
+            ''', (category_id, round(amount, 2), alert_threshold))
+        
+        try:
+            self.db_manager.run_write(upsert)
+            logger.debug("成功設定分類 ID %s 的預算", category_id,
+                         extra={'event': 'budget_set', 'category_id': category_id})
+            return True
+        except sqlite3.Error as e:
+            logger.error("設定預算錯誤：%s", e, extra={'event': 'budget_set_failed'})
+            return False
+    
+    def delete_budget(self, category_id: int) -> bool:
+        """刪除分類的預算與支出計數器"""
+        def delete(conn):
+            count = conn.execute('DELETE FROM budgets WHERE category_id = ?', (category_id,)).rowcount
+            conn.execute('DELETE FROM budget_spend WHERE category_id = ?', (category_id,))
+            return count
+        
+        try:
+            if self.db_manager.run_write(delete) == 0:
+                logger.warning("分類 ID %s 沒有預算", category_id, extra={'event': 'budget_not_found'})
+                return False
+            logger.debug("成功刪除分類 ID %s 的預算", category_id, extra={'event': 'budget_deleted'})
+            return True
+        except sqlite3.Error as e:
+            logger.error("刪除預算錯誤：%s", e, extra={'event': 'budget_delete_failed'})
+            return False
+    
+    def get_budgets(self) -> List[Dict]:
+        """
+        取得所有預算
+        
+        Returns:
+            預算列表，每個項目包含 category_id, category_name, amount, alert_threshold
+        """
+        try:
+            return self.db_manager.query('''
+                SELECT b.category_id, c.name as category_name, b.amount, b.alert_threshold
+                FROM budgets b
+                JOIN categories c ON b.category_id = c.id
+                ORDER BY c.name
+            ''')
+        except sqlite3.Error as e:
+            logger.error("查詢預算錯誤：%s", e, extra={'event': 'query_failed'})
+            return []
+    
+    def get_budget_status(self, year: int, month: int) -> List[Dict]:
+        """
+        取得某月所有預算的執行狀況 (每個預算一次主鍵查找)
+        
+        Args:
+            year: 年份
+            month: 月份
+        
+        Returns:
+            預算列表 (依使用比例由高到低)，每個項目包含 category_id, category_name,
+            amount, alert_threshold, spent, remaining, ratio 與 status
+            ('ok', 'warning' 或 'over')
+        """
+        period = f"{year:04d}-{month:02d}"
+        try:
+            unsaved = self._rebuild_invalid()
+            rows = self.db_manager.query('''
+                SELECT b.category_id, c.name as category_name, b.amount, b.alert_threshold,
+                       COALESCE(s.spent, 0) as spent
+                FROM budgets b
+                JOIN categories c ON b.category_id = c.id
+                LEFT JOIN budget_spend s ON s.category_id = b.category_id AND s.period = ?
+            ''', (period,))
+        except sqlite3.Error as e:
+            logger.error("查詢預算狀況錯誤：%s", e, extra={'event': 'query_failed'})
+            return []
+        
+        statuses = []
+        for row in rows:
+            amount, spent = float(row['amount']), float(row['spent'])
+            if row['category_id'] in unsaved:
+                spent = round(unsaved[row['category_id']].get(period, 0.0), 2)
+            statuses.append({**row, 'amount': amount, 'spent': spent, 'remaining': round(amount - spent, 2),
+                             'ratio': spent / amount,
+                             'status': budget_status(spent, amount, row['alert_threshold'])})
+        statuses.sort(key=lambda item: item['ratio'], reverse=True)
+        return statuses
+    
+    def _rebuild_invalid(self) -> Dict[int, Dict[str, float]]:
+        """
+        重建需要重建 (spend_valid = 0) 的預算計數器
+        
+        Returns:
+            未能存回的分類的重建結果 {分類ID: {YYYY-MM: 已支出}}，供本次查詢使用
+        """
+        category_ids = [row['category_id'] for row in self.db_manager.query(
+            'SELECT category_id FROM budgets WHERE spend_valid = 0')]
+        if not category_ids:
+            return {}
+        
+        # 先取得版本，重建期間若有寫入就不存回
+        generations = self.db_manager.get_table_generations()
+        spent: Dict[Tuple[int, str], float] = defaultdict(float)
+        for category_id, period, total in self.transaction_manager._category_spend(category_ids):
+            spent[(category_id, period)] += total
+        placeholders = ','.join('?' * len(category_ids))
+        for row in self.db_manager.query(f'''
+            SELECT category_id, period, total FROM transaction_summaries
+            WHERE type = 'expense' AND category_id IN ({placeholders})
+        ''', category_ids):
+            spent[(row['category_id'], row['period'])] += float(row['total'])
+        
+        def store(conn):
+            if self.db_manager.get_table_generations(conn) != generations:
+                return []
+            # 重建期間被刪除或已由其他程式重建的預算不處理
+            valid = [row['category_id'] for row in conn.execute(f'''
+                SELECT category_id FROM budgets WHERE spend_valid = 0 AND category_id IN ({placeholders})
+            ''', category_ids).fetchall()]
+            for category_id in valid:
+                conn.execute('DELETE FROM budget_spend WHERE category_id = ?', (category_id,))
+            conn.executemany(
+                'INSERT INTO budget_spend (category_id, period, spent) VALUES (?, ?, ?)',
+                [(category_id, period, round(total, 2)) for (category_id, period), total in spent.items()
+                 if category_id in valid])
+            conn.executemany('UPDATE budgets SET spend_valid = 1 WHERE category_id = ?',
+                             [(category_id,) for category_id in valid])
+            return valid
+        
+        try:
+            rebuilt = self.db_manager.run_write(store)
+        except sqlite3.Error as e:
+            logger.warning("存回預算計數器錯誤：%s", e, extra={'event': 'budget_spend_store_failed'})
+            rebuilt = []
+        if rebuilt:
+            logger.debug("已重建 %d 個預算計數器", len(rebuilt), extra={'event': 'budget_spend_rebuilt'})
+        if len(rebuilt) < len(category_ids):
+            logger.debug("重建期間資料已變更，略過存回預算計數器", extra={'event': 'budget_spend_stale'})
+        
+        unsaved: Dict[int, Dict[str, float]] = {
+            category_id: {} for category_id in category_ids if category_id not in rebuilt}
+        for (category_id, period), total in spent.items():
+            if category_id in unsaved:
+                unsaved[category_id][period] = total
+        return unsaved
@@ -0,0 +1,319 @@
+"""
+記帳應用程式 - 自動分類規則
+關鍵字、正規表示式與金額範圍 → 分類的規則，編譯成單一比對器：關鍵字以 Aho-Corasick
+自動機一次掃描備註，正規表示式先以合併的單一表示式過濾，金額範圍以二分搜尋查表，
+比對一筆交易的成本與規則數量無關
+"""
+
+import re
+import sqlite3
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from .log import get_logger
+from .models import TransactionManager, normalize_description
+
+logger = get_logger('category_rules')
+
+# 規則類型：備註包含關鍵字 / 備註符合正規表示式 / 只依金額範圍
+RULE_KEYWORD = 'keyword'
+RULE_REGEX = 'regex'
+RULE_AMOUNT = 'amount'
+RULE_TYPES = (RULE_KEYWORD, RULE_REGEX, RULE_AMOUNT)
+
+# 視為「未分類」的分類 (匯入時沒有分類欄位且沒有規則符合時使用)
+UNCATEGORIZED_CATEGORIES = {'income': '其他收入', 'expense': '其他支出'}
+
+
+class _KeywordAutomaton:
+    """
+    Aho-Corasick 自動機
+    
+    所有關鍵字建成一棵字典樹並加上失敗連結，掃描一次文字即可找出出現的所有關鍵字，
+    時間與文字長度加上命中數成正比，與關鍵字數量無關。
+    """
+    
+    def __init__(self, keywords: Sequence[Tuple[str, int]]):
+        """
+        Args:
+            keywords: [(關鍵字, 值)]，同一個關鍵字可對應多個值
+        """
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[Tuple[int, ...]] = [()]
+        for keyword, value in keywords:
+            state = 0
+            for char in keyword:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state] += (value,)
+        
+        # 以廣度優先順序設定失敗連結 (第一層指向根)，並合併失敗狀態的輸出 (較短的關鍵字)
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] += self.output[self.fail[child]]
+    
+    def search(self, text: str) -> Set[int]:
+        """回傳文字中出現的關鍵字對應的值"""
+        found: Set[int] = set()
+        state = 0
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            if self.output[state]:
+                found.update(self.output[state])
+        return found
+
+
+class _AmountIndex:
+    """
+    金額範圍查表
+    
+    所有範圍的端點排序後把數線切成「端點本身」與「端點之間」的區段，
+    預先算好每個區段優先順序最高的規則，查詢時二分搜尋區段即可。
+    """
+    
+    def __init__(self, ranges: Sequence[Tuple[Optional[float], Optional[float], int]]):
+        """
+        Args:
+            ranges: [(下限, 上限, 規則順位)]，上下限可為 None (不限)，順位越小越優先
+        """
+        self.points = sorted({bound for low, high, _ in ranges for bound in (low, high) if bound is not None})
+        self.best: List[Optional[int]] = []
+        for slot in range(len(self.points) * 2 + 1):
+            index, is_point = divmod(slot, 2)
+            covering = [rank for low, high, rank in ranges if self._covers(low, high, index, is_point)]
+            self.best.append(min(covering) if covering else None)
+    
+    def _covers(self, low: Optional[float], high: Optional[float], index: int, is_point: int) -> bool:
+        """範圍是否涵蓋第 slot 個區段 (端點都在 points 中，只需比較區段的邊界)"""
+        if is_point:
+            value = self.points[index]
+            return (low is None or low <= value) and (high is None or value <= high)
+        # 區段 (points[index - 1], points[index])
+        lower_ok = low is None or (index > 0 and low <= self.points[index - 1])
+        upper_ok = high is None or (index < len(self.points) and high >= self.points[index])
+        return lower_ok and upper_ok
+    
+    def lookup(self, amount: float) -> Optional[int]:
+        """金額所在區段優先順序最高的規則順位"""
+        index = bisect_left(self.points, amount)
+        is_point = int(index < len(self.points) and self.points[index] == amount)
+        return self.best[index * 2 + is_point]
+
+
+class CategoryMatcher:
+    """
+    編譯後的分類規則比對器 (可序列化，匯入時傳給解析的工作行程)
+    
+    規則依 priority 由高到低、同優先時依建立順序排定順位，多條規則符合時取順位最前者。
+    關鍵字不分大小寫與全形半形 (與重複偵測相同的備註正規化)；正規表示式不分大小寫，
+    比對原始備註。規則設定的金額範圍與分類的收支類型也必須符合。
+    """
+    
+    def __init__(self, rules: Sequence[Dict]):
+        """
+        Args:
+            rules: 規則列表，每個項目包含 id, match_type, pattern, min_amount, max_amount,
+                   category_id, category_type, priority
+        """
+        self.rules = sorted(rules, key=lambda rule: (-rule['priority'], rule['id']))
+        self.keywords = _KeywordAutomaton([
+            (normalize_description(rule['pattern']), rank)
+            for rank, rule in enumerate(self.rules) if rule['match_type'] == RULE_KEYWORD])
+        
+        self.regexes = [(rank, re.compile(rule['pattern'], re.IGNORECASE))
+                        for rank, rule in enumerate(self.rules) if rule['match_type'] == RULE_REGEX]
+        # 合併的表示式只用來判斷是否有任何一條可能符合 (群組名稱重複等無法合併時逐條比對)
+        try:
+            self.regex_filter = re.compile(
+                '|'.join(f'(?:{pattern.pattern})' for _, pattern in self.regexes), re.IGNORECASE
+            ) if self.regexes else None
+        except re.error:
+            self.regex_filter = re.compile('')
+        
+        self.amounts = {
+            transaction_type: _AmountIndex([
+                (rule['min_amount'], rule['max_amount'], rank) for rank, rule in enumerate(self.rules)
+                if rule['match_type'] == RULE_AMOUNT and rule['category_type'] == transaction_type])
+            for transaction_type in ('income', 'expense')
+        }
+    
+    def __len__(self) -> int:
+        return len(self.rules)
+    
+    def match(self, description: Optional[str], transaction_type: str, amount: float) -> Optional[int]:
+        """
+        找出交易適用的分類
+        
+        Returns:
+            符合的規則中順位最前者的分類ID，沒有規則符合時回傳 None
+        """
+        candidates = self.keywords.search(normalize_description(description))
+        if self.regex_filter is not None and self.regex_filter.search(description or ''):
+            candidates.update(rank for rank, pattern in self.regexes if pattern.search(description or ''))
+        
+        best = self.amounts[transaction_type].lookup(amount)
+        for rank in candidates:
+            if best is not None and rank > best:
+                continue
+            rule = self.rules[rank]
+            if (rule['category_type'] == transaction_type
+                    and (rule['min_amount'] is None or amount >= rule['min_amount'])
+                    and (rule['max_amount'] is None or amount <= rule['max_amount'])):
+                best = rank
+        return None if best is None else self.rules[best]['category_id']
+
+
+class CategoryRuleManager:
+    """
+    自動分類規則管理類別
+    
+    規則存放在資料庫，匯入時編譯一次後套用到沒有分類的列；也可回頭套用到
+    既有的未分類交易 (UNCATEGORIZED_CATEGORIES)，以 ID 游標分批讀取並批次更新。
+    """
+    
+    def __init__(self, transaction_manager: TransactionManager):
+        self.transaction_manager = transaction_manager
+        self.db_manager = transaction_manager.db_manager
+    
+    def add_rule(self, match_type: str, pattern: str, category_id: int,
+                 min_amount: Optional[float] = None, max_amount: Optional[float] = None,
+                 priority: int = 0) -> Optional[int]:
+        """
+        新增分類規則
+        
+        Args:
+            match_type: 'keyword' (備註包含關鍵字)、'regex' (備註符合正規表示式) 或 'amount' (只依金額)
+            pattern: 關鍵字或正規表示式 (amount 規則不使用)
+            category_id: 符合時套用的分類ID (規則只適用於與分類相同收支類型的交易)
+            min_amount: 金額下限 (含，None 為不限)
+            max_amount: 金額上限 (含，None 為不限)
+            priority: 優先順序 (越大越優先)
+        
+        Returns:
+            新規則的 ID，失敗時回傳 None
+        """
+        if match_type not in RULE_TYPES:
+            raise ValueError(f"規則類型必須是 {', '.join(RULE_TYPES)} 之一")
+        pattern = (pattern or '').strip()
+        if match_type == RULE_KEYWORD and not normalize_description(pattern):
+            raise ValueError("請輸入關鍵字")
+        if match_type == RULE_REGEX:
+            if not pattern:
+                raise ValueError("請輸入正規表示式")
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"無效的正規表示式：{e}") from None
+        if match_type == RULE_AMOUNT:
+            if min_amount is None and max_amount is None:
+                raise ValueError("金額規則必須指定金額下限或上限")
+            pattern = ''
+        if min_amount is not None and max_amount is not None and min_amount > max_amount:
+            raise ValueError("金額下限不可大於上限")
+        
+        def insert(conn):
+            if conn.execute('SELECT 1 FROM categories WHERE id = ?', (category_id,)).fetchone() is None:
+                raise ValueError(f"分類 ID {category_id} 不存在")
+            return conn.execute('''
+                INSERT INTO category_rules (match_type, pattern, min_amount, max_amount, category_id, priority)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (match_type, pattern, min_amount, max_amount, category_id, priority)).lastrowid
+        
+        try:
+            rule_id = self.db_manager.run_write(insert)
+            logger.debug("成功新增分類規則：%s %s", match_type, pattern,
+                         extra={'event': 'category_rule_added', 'rule_id': rule_id})
+            return rule_id
+        except sqlite3.Error as e:
+            logger.error("新增分類規則錯誤：%s", e, extra={'event': 'category_rule_add_failed'})
+            return None
+    
+    def delete_rule(self, rule_id: int) -> bool:
+        """刪除分類規則 (已分類的交易不變)"""
+        try:
+            count = self.db_manager.run_write(
+                lambda conn: conn.execute('DELETE FROM category_rules WHERE id = ?', (rule_id,)).rowcount)
+        except sqlite3.Error as e:
+            logger.error("刪除分類規則錯誤：%s", e, extra={'event': 'category_rule_delete_failed'})
+            return False
+        if count == 0:
+            logger.warning("分類規則 ID %s 不存在", rule_id, extra={'event': 'category_rule_not_found'})
+            return False
+        logger.debug("成功刪除分類規則 ID %s", rule_id, extra={'event': 'category_rule_deleted'})
+        return True
+    
+    def get_rules(self) -> List[Dict]:
+        """
+        取得所有分類規則 (依優先順序)
+        
+        Returns:
+            規則列表，每個項目包含 id, match_type, pattern, min_amount, max_amount,
+            category_id, category_name, category_type, priority
+        """
+        try:
+            return self.db_manager.query('''
+                SELECT r.id, r.match_type, r.pattern, r.min_amount, r.max_amount, r.category_id,
+                       c.name as category_name, c.type as category_type, r.priority
+                FROM category_rules r
+                JOIN categories c ON r.category_id = c.id
+                ORDER BY r.priority DESC, r.id
+            ''')
+        except sqlite3.Error as e:
+            logger.error("查詢分類規則錯誤：%s", e, extra={'event': 'query_failed'})
+            return []
+    
+    def get_matcher(self) -> CategoryMatcher:
+        """將目前的規則編譯成比對器 (沒有規則時比對結果一律為 None)"""
+        return CategoryMatcher(self.get_rules())
+    
+    def get_uncategorized_ids(self) -> List[int]:
+        """未分類 (UNCATEGORIZED_CATEGORIES) 的分類ID"""
+        try:
+            rows = self.db_manager.query('SELECT id, type, name FROM categories')
+        except sqlite3.Error as e:
+            logger.error("查詢分類錯誤：%s", e, extra={'event': 'query_failed'})
+            return []
+        return [row['id'] for row in rows if UNCATEGORIZED_CATEGORIES.get(row['type']) == row['name']]
+    
+    def apply_to_existing(self, category_ids: Optional[Sequence[int]] = None, batch_size: int = 5000) -> int:
+        """
+        將規則套用到既有交易 (每批一個寫入交易，沒有規則符合的交易不變)
+        
+        Args:
+            category_ids: 要重新分類的分類 (預設為未分類的分類)
+            batch_size: 每批讀取與更新的筆數
+        
+        Returns:
+            重新分類的筆數
+        """
+        matcher = self.get_matcher()
+        category_ids = list(category_ids) if category_ids is not None else self.get_uncategorized_ids()
+        if len(matcher) == 0 or not category_ids:
+            return 0
+        
+        count = 0
+        try:
+            for rows in self.transaction_manager._iter_category_rows(category_ids, batch_size):
+                changes = {}
+                for row in rows:
+                    category_id = matcher.match(row['description'], row['type'], float(row['amount']))
+                    if category_id is not None and category_id != row['category_id']:
+                        changes[row['id']] = category_id
+                count += self.transaction_manager.set_categories(changes)
+        except sqlite3.Error as e:
+            logger.error("套用分類規則錯誤：%s", e, extra={'event': 'category_rules_apply_failed'})
+        logger.info("已依規則重新分類 %d 筆交易", count, extra={'event': 'category_rules_applied'})
+        return count
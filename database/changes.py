@@ -0,0 +1,136 @@
+"""
+記帳應用程式 - 資料變更偵測
+透過 PRAGMA data_version 與各資料表的版本計數器，低成本判斷畫面資料是否過期
+"""
+
+import sqlite3
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .log import get_logger
+
+logger = get_logger('changes')
+
+
+class ChangeMonitor:
+    """
+    資料變更監視器
+    
+    使用一條常駐連線輪詢 PRAGMA data_version：只要沒有其他連線 (包含其他
+    程式、其他電腦經同步軟體寫入的檔案) 提交變更，數值就不會改變，因此閒置時
+    每次輪詢只需一個 PRAGMA。數值改變時才讀取 table_generations 資料表，
+    找出實際變動的資料表並通知有訂閱的視圖或快取。
+    
+    DatabaseManager 記錄本程式自己提交的版本遞增，mark_seen 只略過這些遞增，
+    在上次輪詢之後、自身寫入之前落地的外部寫入仍會通知。
+    """
+    
+    def __init__(self, db_manager):
+        """
+        初始化變更監視器
+        
+        Args:
+            db_manager: DatabaseManager 實例
+        """
+        self.db_manager = db_manager
+        self._conn: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        self._generations: Dict[str, int] = {}
+        self._own_generations: Dict[str, int] = {}
+        self._subscribers: List[Tuple[Optional[Set[str]], Callable[[Set[str]], None]]] = []
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """取得 (必要時建立) 常駐輪詢連線"""
+        if self._conn is None:
+            self._conn = self.db_manager.get_connection()
+            self._data_version = self._read_data_version()
+            self._generations, self._own_generations = self.db_manager.get_generation_snapshot(self._conn)
+        return self._conn
+    
+    def _read_data_version(self) -> int:
+        return self._conn.execute('PRAGMA data_version').fetchone()[0]
+    
+    def subscribe(self, callback: Callable[[Set[str]], None],
+                  tables: Optional[Iterable[str]] = None) -> None:
+        """
+        訂閱資料變更通知
+        
+        Args:
+            callback: 變更時呼叫，參數為變動的資料表名稱集合
+            tables: 只關心的資料表 (None 表示全部)
+        """
+        self._subscribers.append((set(tables) if tables else None, callback))
+    
+    def unsubscribe(self, callback: Callable[[Set[str]], None]) -> None:
+        """取消訂閱"""
+        self._subscribers = [(t, cb) for t, cb in self._subscribers if cb != callback]
+    
+    def poll(self) -> Set[str]:
+        """
+        檢查是否有新變更並通知訂閱者
+        
+        Returns:
+            自上次檢查以來變動的資料表名稱集合 (沒有變更時為空集合)
+        """
+        changed = self._detect_changes()
+        self._notify(changed)
+        return changed
+    
+    def mark_seen(self) -> Set[str]:
+        """
+        將本程式自己的寫入設為已知，只通知外部寫入的變更
+        
+        用於程式自己寫入並已局部更新畫面之後，避免下一次輪詢再整批重新載入。
+        群組提交模式下會先提交待提交的寫入，否則它們稍後提交時會被誤判為外部變更。
+        
+        Returns:
+            有外部寫入的資料表名稱集合 (已通知訂閱者)
+        """
+        try:
+            self.db_manager.flush()
+        except sqlite3.Error:
+            pass
+        changed = self._detect_changes(exclude_own=True)
+        self._notify(changed)
+        return changed
+    
+    def _notify(self, changed: Set[str]) -> None:
+        if changed:
+            for tables, callback in list(self._subscribers):
+                relevant = changed if tables is None else changed & tables
+                if relevant:
+                    callback(relevant)
+    
+    def _detect_changes(self, exclude_own: bool = False) -> Set[str]:
+        """
+        找出版本變動的資料表
+        
+        Args:
+            exclude_own: 只回報版本增加超過本程式自身提交遞增的資料表 (即有外部寫入)
+        """
+        try:
+            conn = self._get_connection()
+            version = self._read_data_version()
+            if version == self._data_version:
+                return set()
+            self._data_version = version
+            
+            generations, own = self.db_manager.get_generation_snapshot(conn)
+        except sqlite3.Error as e:
+            logger.error("檢查資料變更錯誤：%s", e, extra={'event': 'change_check_failed'})
+            return set()
+        
+        changed = set()
+        for name, gen in generations.items():
+            expected = self._generations.get(name)
+            if exclude_own and expected is not None:
+                expected += own.get(name, 0) - self._own_generations.get(name, 0)
+            if expected != gen:
+                changed.add(name)
+        self._generations, self._own_generations = generations, own
+        return changed
+    
+    def close(self) -> None:
+        """關閉常駐連線"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
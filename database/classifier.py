@@ -0,0 +1,153 @@
+"""
+記帳應用程式 - 分類建議
+以單純貝氏 (naive Bayes) 依備註的詞與金額級距建議分類。計數 (classifier_tokens、
+classifier_categories) 在交易寫入時同步增減，建議時只需查詢輸入中出現的詞，
+不需重新訓練或掃描交易
+"""
+
+import math
+import sqlite3
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from .log import get_logger
+from .models import TransactionManager, amount_bucket, classifier_features, description_tokens
+
+logger = get_logger('classifier')
+
+# classifier_categories 中標記「已由歷史交易建立計數」的列 (documents 為 0，不參與建議)
+TRAINED_MARKER = 0
+
+
+class CategoryClassifier:
+    """
+    分類建議類別
+    
+    分數為 log P(分類) + Σ log P(特徵 | 分類)，兩者皆以加一平滑；只計入曾出現過的特徵，
+    備註中沒有任何已知的詞時不建議。各分類的交易數與詞彙量在交易或分類異動前快取。
+    既有的帳本在第一次 ensure_trained 時由歷史交易重建一次計數，之後只靠寫入路徑增減。
+    """
+    
+    def __init__(self, transaction_manager: TransactionManager):
+        self.transaction_manager = transaction_manager
+        self.db_manager = transaction_manager.db_manager
+        self._stats: Optional[Tuple[Dict[str, int], Dict[int, Dict], int]] = None
+    
+    def _get_stats(self) -> Tuple[Dict[int, Dict], int]:
+        """各分類的 (名稱、類型、交易數、特徵數) 與詞彙量 (依資料表版本快取)"""
+        generations = self.db_manager.get_table_generations()
+        if self._stats is None or self._stats[0] != generations:
+            categories = {row['category_id']: row for row in self.db_manager.query('''
+                SELECT s.category_id, c.name as category_name, c.type, s.documents, s.tokens
+                FROM classifier_categories s
+                JOIN categories c ON s.category_id = c.id
+                WHERE s.documents > 0
+            ''')}
+            vocabulary = self.db_manager.query_one(
+                'SELECT COUNT(DISTINCT token) as count FROM classifier_tokens WHERE count > 0')['count']
+            self._stats = (generations, categories, vocabulary)
+        return self._stats[1], self._stats[2]
+    
+    def suggest(self, description: str, transaction_type: str, amount: Optional[float] = None,
+                limit: int = 3) -> List[Dict]:
+        """
+        依備註 (與金額) 建議分類
+        
+        Args:
+            description: 目前輸入的備註
+            transaction_type: 'income' 或 'expense'，只建議同類型的分類
+            amount: 金額 (None 或非正數時不使用金額級距)
+            limit: 最多回傳幾個建議
+        
+        Returns:
+            依可能性排序的建議列表，每個項目包含 category_id, category_name, probability；
+            無法建議或查詢失敗時回傳空列表
+        """
+        tokens = description_tokens(description)
+        if not tokens:
+            return []
+        features = tokens + [amount_bucket(amount)] if amount and amount > 0 else tokens
+        try:
+            categories, vocabulary = self._get_stats()
+            candidates = {category_id: row for category_id, row in categories.items()
+                          if row['type'] == transaction_type}
+            if not candidates:
+                return []
+            placeholders = ','.join('?' * len(features))
+            counts: Dict[str, Dict[int, int]] = {}
+            for row in self.db_manager.query(f'''
+                SELECT token, category_id, count FROM classifier_tokens
+                WHERE token IN ({placeholders}) AND count > 0
+            ''', features):
+                counts.setdefault(row['token'], {})[row['category_id']] = row['count']
+        except sqlite3.Error as e:
+            logger.error("查詢分類建議錯誤：%s", e, extra={'event': 'query_failed'})
+            return []
+        if not any(token in counts for token in tokens):
+            return []
+        
+        total = sum(row['documents'] for row in candidates.values())
+        scores = {}
+        for category_id, row in candidates.items():
+            score = math.log((row['documents'] + 1) / (total + len(candidates)))
+            denominator = row['tokens'] + vocabulary
+            for feature in features:
+                if feature in counts:
+                    score += math.log((counts[feature].get(category_id, 0) + 1) / denominator)
+            scores[category_id] = score
+        
+        # 以 softmax 將分數換算為機率
+        best = max(scores.values())
+        weights = {category_id: math.exp(score - best) for category_id, score in scores.items()}
+        normalizer = sum(weights.values())
+        ranked = sorted(weights, key=lambda category_id: (-weights[category_id], category_id))[:limit]
+        return [{'category_id': category_id, 'category_name': candidates[category_id]['category_name'],
+                 'probability': weights[category_id] / normalizer} for category_id in ranked]
+    
+    def ensure_trained(self, batch_size: int = 5000) -> int:
+        """
+        尚未建立過計數時由現有交易重建一次 (之後由交易寫入路徑增減)
+        
+        重建會取代寫入路徑已累積的計數；期間若有其他寫入就不存回，下次呼叫再重建。
+        
+        Returns:
+            計入的交易筆數 (已建立過或沒有交易時為 0)
+        """
+        try:
+            if self.db_manager.query_one('SELECT 1 FROM classifier_categories WHERE category_id = ?',
+                                         (TRAINED_MARKER,)):
+                return 0
+            category_ids = [row['id'] for row in self.db_manager.query('SELECT id FROM categories')]
+            generations = self.db_manager.get_table_generations()
+            tokens: Counter = Counter()
+            documents: Counter = Counter()
+            features_per_category: Counter = Counter()
+            for rows in self.transaction_manager._iter_category_rows(category_ids, batch_size):
+                for row in rows:
+                    features = classifier_features(row['description'], row['amount'])
+                    tokens.update((feature, row['category_id']) for feature in features)
+                    documents[row['category_id']] += 1
+                    features_per_category[row['category_id']] += len(features)
+            
+            def store(conn):
+                if self.db_manager.get_table_generations(conn) != generations:
+                    return 0
+                conn.execute('DELETE FROM classifier_tokens')
+                conn.execute('DELETE FROM classifier_categories')
+                conn.execute('INSERT INTO classifier_categories (category_id) VALUES (?)', (TRAINED_MARKER,))
+                conn.executemany(TransactionManager._CLASSIFIER_TOKEN_SQL,
+                                 [(token, category_id, count) for (token, category_id), count in tokens.items()])
+                conn.executemany(TransactionManager._CLASSIFIER_CATEGORY_SQL,
+                                 [(category_id, count, features_per_category[category_id])
+                                  for category_id, count in documents.items()])
+                return sum(documents.values())
+            
+            count = self.db_manager.run_write(store)
+        except sqlite3.Error as e:
+            logger.error("建立分類建議錯誤：%s", e, extra={'event': 'classifier_train_failed'})
+            return 0
+        if count:
+            # 重建不會改變資料表版本，需自行清除快取
+            self._stats = None
+            logger.info("已由 %d 筆交易建立分類建議", count, extra={'event': 'classifier_trained'})
+        return count
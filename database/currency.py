@@ -0,0 +1,143 @@
+"""
+記帳應用程式 - 外幣匯率
+維護依日期記錄的匯率表 (fx_rates)，報表查詢在 SQL 中依交易日換算為基準幣別
+"""
+
+import csv
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from .log import get_logger
+from .models import BASE_CURRENCY, LEDGER_SCOPE, DatabaseManager, TransactionManager
+
+logger = get_logger('currency')
+
+
+class FxRateManager:
+    """
+    匯率管理類別
+    
+    rate 為 1 單位外幣等於多少基準幣別 (例如 USD 2024-01-02 31.2 表示 1 美元 = 31.2 元)。
+    查詢某日匯率時取當天或之前最近的一筆，與報表 SQL 的換算方式相同。
+    新的最早匯率也會改變更早交易的換算，因此匯率異動時帳本的餘額檢查點全部失效，
+    預算的支出計數器也標記為需要重建。
+    """
+    
+    # CSV 匯入每批寫入的筆數
+    IMPORT_BATCH_SIZE = 1000
+    
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+    
+    @staticmethod
+    def _validate(currency: str, rate_date: str, rate) -> Tuple[str, str, float]:
+        """驗證並正規化一筆匯率 (格式錯誤時拋出 ValueError)"""
+        currency = TransactionManager._normalize_currency(currency)
+        if currency == BASE_CURRENCY:
+            raise ValueError(f"{BASE_CURRENCY} 是基準幣別，不需要匯率")
+        rate_date = (rate_date or '').strip()
+        if len(rate_date) != 10 or rate_date[4] != '-' or rate_date[7] != '-':
+            raise ValueError(f"日期格式必須是 YYYY-MM-DD：{rate_date}")
+        rate = float(rate)
+        if rate <= 0:
+            raise ValueError("匯率必須大於 0")
+        return currency, rate_date, rate
+    
+    @staticmethod
+    def _upsert(conn: sqlite3.Connection, rows: List[Tuple[str, str, float]]):
+        """寫入匯率並使帳本的餘額檢查點與預算計數器失效"""
+        conn.executemany('''
+            INSERT INTO fx_rates (currency, rate_date, rate) VALUES (?, ?, ?)
+            ON CONFLICT (currency, rate_date) DO UPDATE SET rate = excluded.rate
+        ''', rows)
+        TransactionManager._invalidate_checkpoints(conn, LEDGER_SCOPE)
+        conn.execute('UPDATE budgets SET spend_valid = 0')
+    
+    def set_rate(self, currency: str, rate_date: str, rate: float) -> bool:
+        """新增或更新某日的匯率"""
+        values = self._validate(currency, rate_date, rate)
+        try:
+            self.db_manager.run_write(lambda conn: self._upsert(conn, [values]))
+            logger.debug("成功設定匯率：%s %s %.6f", *values, extra={'event': 'fx_rate_set'})
+            return True
+        except sqlite3.Error as e:
+            logger.error("設定匯率錯誤：%s", e, extra={'event': 'fx_rate_set_failed'})
+            return False
+    
+    def get_rate(self, currency: str, rate_date: str) -> Optional[float]:
+        """取得某日適用的匯率 (當天或之前最近的一筆)，基準幣別回傳 1，查無匯率時回傳 None"""
+        currency = TransactionManager._normalize_currency(currency)
+        if currency == BASE_CURRENCY:
+            return 1.0
+        try:
+            row = self.db_manager.query_one('''
+                SELECT rate FROM fx_rates
+                WHERE currency = ? AND rate_date <= ?
+                ORDER BY rate_date DESC LIMIT 1
+            ''', (currency, rate_date))
+            return row['rate'] if row else None
+        except sqlite3.Error as e:
+            logger.error("查詢匯率錯誤：%s", e, extra={'event': 'query_failed'})
+            return None
+    
+    def get_currencies(self) -> List[str]:
+        """取得可選用的幣別 (基準幣別在最前面，其餘為已有匯率的幣別)"""
+        try:
+            rows = self.db_manager.query('SELECT DISTINCT currency FROM fx_rates ORDER BY currency')
+        except sqlite3.Error as e:
+            logger.error("查詢幣別錯誤：%s", e, extra={'event': 'query_failed'})
+            rows = []
+        return [BASE_CURRENCY] + [row['currency'] for row in rows]
+    
+    def get_missing_currencies(self) -> List[str]:
+        """取得交易中使用但沒有任何匯率的幣別 (這些交易在報表中以 1:1 計算)"""
+        try:
+            rows = self.db_manager.query('''
+                SELECT DISTINCT t.currency FROM transactions t
+                WHERE t.currency != ?
+                  AND NOT EXISTS (SELECT 1 FROM fx_rates r WHERE r.currency = t.currency)
+                ORDER BY t.currency
+            ''', (BASE_CURRENCY,))
+            return [row['currency'] for row in rows]
+        except sqlite3.Error as e:
+            logger.error("查詢缺少匯率的幣別錯誤：%s", e, extra={'event': 'query_failed'})
+            return []
+    
+    def import_csv(self, file_path: str) -> Dict:
+        """
+        從 CSV 批次匯入匯率 (欄位：currency, date, rate；第一列為標題)
+        
+        逐列讀取並分批以 executemany 寫入，同一幣別同一天的匯率會被覆蓋。
+        
+        Returns:
+            包含 imported (匯入筆數) 與 errors ([(列號, 錯誤訊息)]) 的字典
+        """
+        imported = 0
+        errors: List[Tuple[int, str]] = []
+        batch: List[Tuple[str, str, float]] = []
+        
+        def write(rows):
+            self.db_manager.run_write(lambda conn: self._upsert(conn, rows))
+        
+        try:
+            with open(file_path, newline='', encoding='utf-8-sig') as f:
+                for line_number, row in enumerate(csv.DictReader(f), start=2):
+                    try:
+                        batch.append(self._validate(row.get('currency'), row.get('date'), row.get('rate')))
+                    except (TypeError, ValueError) as e:
+                        errors.append((line_number, str(e)))
+                        continue
+                    if len(batch) >= self.IMPORT_BATCH_SIZE:
+                        write(batch)
+                        imported += len(batch)
+                        batch = []
+            if batch:
+                write(batch)
+                imported += len(batch)
+        except sqlite3.Error as e:
+            logger.error("匯入匯率錯誤：%s", e, extra={'event': 'fx_import_failed', 'file_path': file_path})
+            errors.append((0, str(e)))
+        
+        logger.info("已匯入 %d 筆匯率 (%d 筆錯誤)", imported, len(errors),
+                    extra={'event': 'fx_rates_imported', 'file_path': file_path})
+        return {'imported': imported, 'errors': errors}
@@ -0,0 +1,377 @@
+"""
+記帳應用程式 - 多帳本管理
+每個帳本是獨立的 SQLite 檔案，擁有自己的管理器、快取與連線；帳本清單存放在 JSON 登錄檔
+"""
+
+import glob
+import json
+import os
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .accounts import AccountManager
+from .autocomplete import DescriptionCompleter
+from .budgets import BudgetManager
+from .category_rules import CategoryRuleManager
+from .classifier import CategoryClassifier
+from .currency import FxRateManager
+from .log import get_logger
+from .maintenance import MaintenanceManager
+from .models import DatabaseManager, CategoryManager
+from .partitions import create_transaction_manager, list_partitions
+from .reconciliation import ReconciliationManager
+from .recurring import RecurringManager
+
+logger = get_logger('ledgers')
+
+
+class Ledger:
+    """
+    單一帳本：一個資料庫檔案及其專屬的管理器 (開啟後保留，切換回來不需重新初始化)
+    
+    管理器與其快取 (備註自動完成索引、分類建議統計等) 在開啟時建立一次；開啟時也補產生到期的
+    定期交易，並在背景由歷史交易建立分類建議。
+    """
+    
+    def __init__(self, ledger_id: str, name: str, path: str, created_at: Optional[str] = None):
+        self.id = ledger_id
+        self.name = name
+        self.path = path
+        self.created_at = created_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+        self.db_manager: Optional[DatabaseManager] = None
+        self.category_manager: Optional[CategoryManager] = None
+        self.transaction_manager = None
+        self.maintenance_manager: Optional[MaintenanceManager] = None
+        self.change_monitor = None
+        self.fx_rate_manager: Optional[FxRateManager] = None
+        self.account_manager: Optional[AccountManager] = None
+        self.recurring_manager: Optional[RecurringManager] = None
+        self.budget_manager: Optional[BudgetManager] = None
+        self.category_rule_manager: Optional[CategoryRuleManager] = None
+        self.classifier: Optional[CategoryClassifier] = None
+        self.description_completer: Optional[DescriptionCompleter] = None
+        self.reconciliation_manager: Optional[ReconciliationManager] = None
+        self._training: Optional[threading.Thread] = None
+    
+    @property
+    def is_open(self) -> bool:
+        return self.db_manager is not None
+    
+    def open(self, prepare: bool = True, **db_options) -> 'Ledger':
+        """
+        開啟帳本 (已開啟時直接回傳)
+        
+        Args:
+            prepare: 是否補產生到期的定期交易並在背景建立分類建議 (只供查詢的暫時開啟可略過)
+            db_options: 傳給 DatabaseManager 的選項 (例如 group_commit_ms)
+        """
+        if self.is_open:
+            return self
+        
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self.db_manager = DatabaseManager(self.path, **db_options)
+        self.category_manager = CategoryManager(self.db_manager)
+        self.transaction_manager = create_transaction_manager(self.db_manager)
+        self.maintenance_manager = MaintenanceManager(self.db_manager)
+        self.change_monitor = self.db_manager.create_change_monitor()
+        self.fx_rate_manager = FxRateManager(self.db_manager)
+        self.account_manager = AccountManager(self.db_manager)
+        self.recurring_manager = RecurringManager(self.transaction_manager)
+        self.budget_manager = BudgetManager(self.transaction_manager)
+        self.category_rule_manager = CategoryRuleManager(self.transaction_manager)
+        self.classifier = CategoryClassifier(self.transaction_manager)
+        self.description_completer = DescriptionCompleter(self.transaction_manager)
+        self.reconciliation_manager = ReconciliationManager(self.transaction_manager)
+        
+        if prepare:
+            # 補產生上次開啟後到期的定期交易 (單一寫入交易，重複執行不會重複記帳)
+            self.recurring_manager.materialize_due()
+            
+            # 既有帳本第一次開啟時由歷史交易建立分類建議 (只執行一次，在背景進行)
+            self._training = threading.Thread(target=self.classifier.ensure_trained, daemon=True)
+            self._training.start()
+        return self
+    
+    def close(self):
+        """關閉帳本的常駐連線並提交待提交的寫入 (等待背景建立分類建議完成)"""
+        if not self.is_open:
+            return
+        if self._training is not None:
+            self._training.join()
+        self.change_monitor.close()
+        self.db_manager.close()
+        self.db_manager = None
+        self.category_manager = None
+        self.transaction_manager = None
+        self.maintenance_manager = None
+        self.change_monitor = None
+        self.fx_rate_manager = None
+        self.account_manager = None
+        self.recurring_manager = None
+        self.budget_manager = None
+        self.category_rule_manager = None
+        self.classifier = None
+        self.description_completer = None
+        self.reconciliation_manager = None
+        self._training = None
+    
+    def get_files(self) -> List[str]:
+        """帳本在磁碟上的所有檔案 (主資料庫、年度分區與封存檔，不含不存在的檔案)"""
+        if not os.path.exists(self.path):
+            return []
+        base, ext = os.path.splitext(self.path)
+        files = [self.path] + [partition['path'] for partition in list_partitions(self.path)]
+        files.append(f"{base}_archive{ext or '.db'}")
+        return [candidate for path in files for candidate in (path, f"{path}-wal", f"{path}-shm")
+                if os.path.exists(candidate)]
+    
+    def to_dict(self) -> Dict:
+        return {'id': self.id, 'name': self.name, 'path': self.path, 'created_at': self.created_at}
+
+
+class LedgerRegistry:
+    """
+    帳本登錄管理類別
+    
+    登錄檔不存在時，會把既有的 accounting.db 登錄為預設帳本，原本的資料不需搬移。
+    新帳本的檔案放在 ledger_dir 目錄下；帳本 ID 的編號只增不減 (記錄在登錄檔)，
+    移除帳本後留下的檔案不會被新帳本沿用。
+    """
+    
+    DEFAULT_LEDGER_ID = 'default'
+    DEFAULT_LEDGER_NAME = '主帳本'
+    
+    def __init__(self, registry_path: str = "ledgers.json", ledger_dir: str = "ledgers",
+                 default_db_path: str = "accounting.db", **db_options):
+        """
+        初始化帳本登錄
+        
+        Args:
+            registry_path: 登錄檔路徑 (JSON)
+            ledger_dir: 新帳本檔案存放目錄
+            default_db_path: 預設帳本的資料庫檔案
+            db_options: 開啟帳本時傳給 DatabaseManager 的選項
+        """
+        self.registry_path = registry_path
+        self.ledger_dir = ledger_dir
+        self.db_options = db_options
+        self._ledgers: Dict[str, Ledger] = {}
+        self._active_id = self.DEFAULT_LEDGER_ID
+        self._next_number = 1
+        
+        if os.path.exists(registry_path):
+            self._load()
+        else:
+            self._ledgers[self.DEFAULT_LEDGER_ID] = Ledger(
+                self.DEFAULT_LEDGER_ID, self.DEFAULT_LEDGER_NAME, default_db_path)
+            self._save()
+    
+    def _load(self):
+        with open(self.registry_path, encoding='utf-8') as f:
+            data = json.load(f)
+        for item in data.get('ledgers', []):
+            ledger = Ledger(item['id'], item['name'], item['path'], item.get('created_at'))
+            self._ledgers[ledger.id] = ledger
+        if not self._ledgers:
+            raise ValueError(f"帳本登錄檔 {self.registry_path} 沒有任何帳本")
+        active_id = data.get('active')
+        self._active_id = active_id if active_id in self._ledgers else next(iter(self._ledgers))
+        self._next_number = data.get('next_ledger_number', 1)
+    
+    def _save(self):
+        """寫入登錄檔 (先寫暫存檔再替換，避免中途當機留下損毀的檔案)"""
+        data = {
+            'active': self._active_id,
+            'next_ledger_number': self._next_number,
+            'ledgers': [ledger.to_dict() for ledger in self._ledgers.values()],
+        }
+        temp_path = f"{self.registry_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.registry_path)
+    
+    @property
+    def active_ledger_id(self) -> str:
+        """目前使用中的帳本 ID"""
+        return self._active_id
+    
+    def list_ledgers(self) -> List[Dict]:
+        """
+        取得所有帳本
+        
+        Returns:
+            帳本列表，每個項目包含 id, name, path, created_at, is_open, is_active
+        """
+        return [dict(ledger.to_dict(), is_open=ledger.is_open, is_active=ledger.id == self._active_id)
+                for ledger in self._ledgers.values()]
+    
+    def get_ledger(self, ledger_id: str) -> Ledger:
+        """取得帳本 (不一定已開啟)"""
+        if ledger_id not in self._ledgers:
+            raise ValueError(f"帳本 '{ledger_id}' 不存在")
+        return self._ledgers[ledger_id]
+    
+    def find_by_name(self, name: str) -> Optional[Ledger]:
+        """依名稱尋找帳本"""
+        for ledger in self._ledgers.values():
+            if ledger.name == name:
+                return ledger
+        return None
+    
+    def open_ledger(self, ledger_id: str, activate: bool = True) -> Ledger:
+        """
+        開啟帳本 (已開啟的帳本直接沿用，切換不需重新初始化)
+        
+        Args:
+            ledger_id: 帳本 ID
+            activate: 是否設為使用中的帳本 (下次啟動時預設開啟)
+        """
+        ledger = self.get_ledger(ledger_id).open(**self.db_options)
+        if activate and ledger_id != self._active_id:
+            self._active_id = ledger_id
+            self._save()
+            logger.info("切換到帳本 %s", ledger.name, extra={'event': 'ledger_switched', 'ledger_id': ledger_id})
+        return ledger
+    
+    def add_ledger(self, name: str) -> Ledger:
+        """
+        新增帳本 (建立新的資料庫檔案)
+        
+        Args:
+            name: 帳本名稱 (不可重複)
+        """
+        name = name.strip()
+        if not name:
+            raise ValueError("帳本名稱不可為空白")
+        if self.find_by_name(name):
+            raise ValueError(f"帳本「{name}」已存在")
+        
+        # 舊版登錄檔沒有編號計數，仍要略過目錄中已有檔案的 ID
+        number = self._next_number
+        while f"ledger{number}" in self._ledgers or self._has_files(f"ledger{number}"):
+            number += 1
+        ledger_id = f"ledger{number}"
+        self._next_number = number + 1
+        
+        ledger = Ledger(ledger_id, name, os.path.join(self.ledger_dir, f"{ledger_id}.db"))
+        self._ledgers[ledger_id] = ledger
+        self._save()
+        logger.info("新增帳本 %s", name, extra={'event': 'ledger_added', 'ledger_id': ledger_id})
+        return ledger
+    
+    def _has_files(self, ledger_id: str) -> bool:
+        """ledger_dir 中是否已有此 ID 的資料庫檔案 ({ID}.db 或 {ID}_*.db)"""
+        pattern = os.path.join(glob.escape(self.ledger_dir), glob.escape(ledger_id))
+        return bool(glob.glob(f"{pattern}.db") or glob.glob(f"{pattern}_*.db"))
+    
+    def rename_ledger(self, ledger_id: str, name: str):
+        """重新命名帳本"""
+        name = name.strip()
+        if not name:
+            raise ValueError("帳本名稱不可為空白")
+        existing = self.find_by_name(name)
+        if existing and existing.id != ledger_id:
+            raise ValueError(f"帳本「{name}」已存在")
+        self.get_ledger(ledger_id).name = name
+        self._save()
+    
+    def remove_ledger(self, ledger_id: str, delete_file: bool = False):
+        """
+        移除帳本 (不可移除使用中的帳本)
+        
+        Args:
+            delete_file: 是否一併刪除帳本的所有檔案 (含年度分區與封存檔，預設保留)
+        """
+        ledger = self.get_ledger(ledger_id)
+        if ledger_id == self._active_id:
+            raise ValueError("無法移除使用中的帳本")
+        
+        ledger.close()
+        files = ledger.get_files() if delete_file else []
+        del self._ledgers[ledger_id]
+        self._save()
+        for path in files:
+            # 已結帳年度的分區是唯讀檔案
+            os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+            os.remove(path)
+    
+    def close_all(self):
+        """關閉所有已開啟的帳本"""
+        for ledger in self._ledgers.values():
+            ledger.close()
+
+
+class ConsolidatedReporter:
+    """
+    跨帳本合併報表
+    
+    每個帳本是獨立檔案與連線，因此以執行緒池平行查詢各帳本，再合併結果。
+    """
+    
+    def __init__(self, registry: LedgerRegistry, max_workers: Optional[int] = None):
+        self.registry = registry
+        self.max_workers = max_workers
+    
+    def _run(self, ledger_ids: Optional[Iterable[str]], query: Callable[[Ledger], Any]) -> Dict[str, Any]:
+        """
+        對每個帳本平行執行 query，回傳 {帳本 ID: 結果}
+        
+        尚未開啟的帳本在工作執行緒中暫時開啟 (不補產生定期交易、不建立分類建議)，查詢後即關閉。
+        """
+        if ledger_ids is None:
+            ledger_ids = [ledger['id'] for ledger in self.registry.list_ledgers()]
+        ledgers = [self.registry.get_ledger(ledger_id) for ledger_id in ledger_ids]
+        if not ledgers:
+            return {}
+        
+        def run(ledger: Ledger, temporary: bool):
+            if not temporary:
+                return query(ledger)
+            ledger.open(prepare=False, **self.registry.db_options)
+            try:
+                return query(ledger)
+            finally:
+                ledger.close()
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers or len(ledgers)) as executor:
+            futures = {ledger.id: executor.submit(run, ledger, not ledger.is_open) for ledger in ledgers}
+            return {ledger_id: future.result() for ledger_id, future in futures.items()}
+    
+    def get_monthly_summary(self, year: int, month: int,
+                            ledger_ids: Optional[Iterable[str]] = None) -> Dict:
+        """
+        取得合併的月度統計
+        
+        Returns:
+            包含 year, month, total_income, total_expense, balance 與
+            ledgers (各帳本的月度統計) 的字典
+        """
+        results = self._run(ledger_ids, lambda ledger: ledger.transaction_manager.get_monthly_summary(year, month))
+        total_income = sum(summary['total_income'] for summary in results.values())
+        total_expense = sum(summary['total_expense'] for summary in results.values())
+        return {
+            'year': year,
+            'month': month,
+            'total_income': total_income,
+            'total_expense': total_expense,
+            'balance': total_income - total_expense,
+            'ledgers': results,
+        }
+    
+    def get_category_totals(self, start_date: str, end_date: str, transaction_type: str = 'expense',
+                            ledger_ids: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """取得合併的分類合計 (以分類名稱合併)，依金額由大到小排序"""
+        results = self._run(ledger_ids, lambda ledger: ledger.transaction_manager.get_category_totals(
+            start_date, end_date, transaction_type))
+        merged: Dict[str, float] = {}
+        for totals in results.values():
+            for name, total in totals.items():
+                merged[name] = merged.get(name, 0.0) + total
+        return dict(sorted(merged.items(), key=lambda item: item[1], reverse=True))
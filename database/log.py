@@ -0,0 +1,111 @@
+"""
+記帳應用程式 - 日誌設定
+資料層統一透過 logging 輸出：預設安靜 (NullHandler)，由應用程式決定層級與輸出位置
+"""
+
+import logging
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, TextIO, Tuple
+
+# 資料層所有 logger 的共同上層名稱
+LOGGER_NAME = 'accounting'
+
+# LogRecord 本身的屬性；其餘透過 extra 傳入的欄位視為結構化欄位
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'suppressed'}
+
+# 預設安靜：未設定輸出時不顯示任何訊息 (也不使用 logging 的 lastResort 輸出到 stderr)
+logging.getLogger(LOGGER_NAME).addHandler(logging.NullHandler())
+
+
+def get_logger(name: str) -> logging.Logger:
+    """取得資料層模組使用的 logger (accounting.<name>)"""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def get_fields(record: logging.LogRecord) -> Dict:
+    """取得紀錄中透過 extra 傳入的結構化欄位"""
+    return {key: value for key, value in vars(record).items()
+            if key not in _RECORD_ATTRS and not key.startswith('_')}
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    頻率限制過濾器
+    
+    同一個 logger、層級與訊息模板在每個時間窗內最多輸出 max_per_window 筆，
+    超出的紀錄直接略過；下一個時間窗的第一筆會帶上 suppressed (略過筆數)。
+    以訊息模板 (而非格式化後的字串) 分組，因此大量匯入時的逐筆訊息會被合併。
+    """
+    
+    def __init__(self, max_per_window: int = 10, window_seconds: float = 60.0):
+        super().__init__()
+        self.max_per_window = max_per_window
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        # {(logger, 層級, 模板): [時間窗開始, 已輸出筆數, 已略過筆數]}
+        self._windows: Dict[Tuple[str, int, str], List] = {}
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.window_seconds:
+                suppressed = window[2] if window else 0
+                window = self._windows[key] = [now, 0, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+            
+            if window[1] >= self.max_per_window:
+                window[2] += 1
+                return False
+            window[1] += 1
+            return True
+
+
+class StructuredFormatter(logging.Formatter):
+    """在訊息後附加 key=value 形式的結構化欄位 (以及頻率限制略過的筆數)"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = get_fields(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            fields['suppressed'] = suppressed
+        if fields:
+            text += ' ' + ' '.join(f"{key}={value!r}" for key, value in fields.items())
+        return text
+
+
+_configured_handler: Optional[logging.Handler] = None
+
+
+def configure_logging(level: int = logging.WARNING, stream: Optional[TextIO] = None,
+                      max_per_window: int = 10, window_seconds: float = 60.0) -> logging.Handler:
+    """
+    設定資料層日誌輸出 (重複呼叫會取代先前的設定)
+    
+    Args:
+        level: 輸出層級 (預設只顯示警告與錯誤)
+        stream: 輸出目標 (預設 stderr)
+        max_per_window: 同一訊息在每個時間窗內最多輸出筆數
+        window_seconds: 頻率限制時間窗 (秒)
+    
+    Returns:
+        新增的 handler
+    """
+    global _configured_handler
+    
+    logger = logging.getLogger(LOGGER_NAME)
+    if _configured_handler is not None:
+        logger.removeHandler(_configured_handler)
+    
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(StructuredFormatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    handler.addFilter(RateLimitFilter(max_per_window, window_seconds))
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    _configured_handler = handler
+    return handler
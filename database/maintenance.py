@@ -0,0 +1,253 @@
+"""
+記帳應用程式 - 資料庫維護
+提供統計資訊更新 (ANALYZE / PRAGMA optimize)、增量空間回收與離線壓縮 (VACUUM INTO)
+"""
+
+import os
+import sqlite3
+import time
+from typing import Dict, Optional
+
+from .log import get_logger
+from .partitions import list_partitions
+
+logger = get_logger('maintenance')
+
+
+class MaintenanceManager:
+    """資料庫維護管理類別"""
+    
+    # 累積異動筆數達到此數量才重新 ANALYZE (例如大量匯入之後)
+    ANALYZE_THRESHOLD = 1000
+    
+    # 閒置時每次最多回收的頁數，避免單次維護佔用太久
+    IDLE_VACUUM_PAGES = 256
+    
+    # 壓縮前後用來比較查詢時間的代表性查詢
+    BENCHMARK_QUERIES = {
+        'recent_transactions': '''
+            SELECT t.id, t.date, t.amount, c.name
+            FROM transactions t LEFT JOIN categories c ON t.category_id = c.id
+            ORDER BY t.date DESC, t.created_at DESC LIMIT 100
+        ''',
+        'yearly_category_totals': '''
+            SELECT c.name, SUM(t.amount)
+            FROM transactions t LEFT JOIN categories c ON t.category_id = c.id
+            WHERE t.type = 'expense' AND t.date >= date('now', '-1 year')
+            GROUP BY c.name
+        ''',
+        'full_scan_totals': '''
+            SELECT type, COUNT(*), SUM(amount) FROM transactions GROUP BY type
+        ''',
+    }
+    
+    def __init__(self, db_manager):
+        """
+        初始化維護管理器
+        
+        Args:
+            db_manager: DatabaseManager 實例
+        """
+        self.db_manager = db_manager
+        self._pending_changes = 0
+    
+    def optimize(self) -> None:
+        """執行 PRAGMA optimize (只會重新分析統計資訊過期的資料表，成本很低)"""
+        self.db_manager.run_write(lambda conn: conn.execute('PRAGMA optimize'))
+    
+    def analyze(self) -> float:
+        """
+        重新收集所有資料表與索引的統計資訊
+        
+        Returns:
+            花費秒數
+        """
+        start = time.perf_counter()
+        self.db_manager.run_write(lambda conn: conn.execute('ANALYZE'))
+        self._pending_changes = 0
+        return time.perf_counter() - start
+    
+    def record_bulk_change(self, row_count: int) -> bool:
+        """
+        記錄大量異動 (例如匯入)，累積超過門檻時自動 ANALYZE
+        
+        Args:
+            row_count: 本次新增/修改/刪除的筆數
+        
+        Returns:
+            是否執行了 ANALYZE
+        """
+        self._pending_changes += row_count
+        if self._pending_changes < self.ANALYZE_THRESHOLD:
+            return False
+        self.analyze()
+        return True
+    
+    def get_space_stats(self, db_path: Optional[str] = None) -> Dict:
+        """
+        取得資料庫空間使用狀況
+        
+        Args:
+            db_path: 要檢查的檔案 (預設為目前資料庫)
+        
+        Returns:
+            包含 file_size, page_size, page_count, freelist_count,
+            free_bytes, auto_vacuum 的字典
+        """
+        path = db_path or self.db_manager.db_path
+        conn = sqlite3.connect(path)
+        try:
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+            page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+            freelist_count = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+        finally:
+            conn.close()
+        
+        return {
+            'file_size': os.path.getsize(path),
+            'page_size': page_size,
+            'page_count': page_count,
+            'freelist_count': freelist_count,
+            'free_bytes': freelist_count * page_size,
+            'auto_vacuum': {0: 'NONE', 1: 'FULL', 2: 'INCREMENTAL'}.get(auto_vacuum, str(auto_vacuum)),
+        }
+    
+    def incremental_vacuum(self, max_pages: Optional[int] = None) -> int:
+        """
+        回收空閒頁 (僅在 auto_vacuum=INCREMENTAL 時有效)
+        
+        Args:
+            max_pages: 最多回收頁數 (None 表示全部)
+        
+        Returns:
+            回收的位元組數
+        """
+        before = self.get_space_stats()
+        if before['auto_vacuum'] != 'INCREMENTAL' or before['freelist_count'] == 0:
+            return 0
+        
+        pages = before['freelist_count']
+        if max_pages:
+            pages = min(pages, int(max_pages))
+        
+        def reclaim(conn):
+            # sqlite3 模組只會執行 PRAGMA incremental_vacuum 的第一步 (回收一頁)，因此逐頁呼叫
+            for _ in range(pages):
+                conn.execute('PRAGMA incremental_vacuum(1)')
+        
+        self.db_manager.run_write(reclaim)
+        self.db_manager.flush()
+        after = self.get_space_stats()
+        return before['file_size'] - after['file_size']
+    
+    def run_idle_maintenance(self) -> int:
+        """
+        閒置時執行的輕量維護：分批回收空閒頁
+        
+        Returns:
+            回收的位元組數
+        """
+        try:
+            return self.incremental_vacuum(self.IDLE_VACUUM_PAGES)
+        except sqlite3.Error as e:
+            logger.warning("閒置維護錯誤：%s", e, extra={'event': 'idle_maintenance_failed'})
+            return 0
+    
+    def benchmark_queries(self, db_path: Optional[str] = None, repeat: int = 3) -> Dict[str, float]:
+        """
+        量測代表性查詢的執行時間
+        
+        Args:
+            db_path: 要量測的檔案 (預設為目前資料庫)
+            repeat: 每個查詢執行次數，取最短時間以降低快取影響
+        
+        Returns:
+            {查詢名稱: 毫秒}
+        """
+        conn = sqlite3.connect(db_path or self.db_manager.db_path)
+        try:
+            results = {}
+            for name, sql in self.BENCHMARK_QUERIES.items():
+                best = float('inf')
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    conn.execute(sql).fetchall()
+                    best = min(best, time.perf_counter() - start)
+                results[name] = best * 1000
+            return results
+        finally:
+            conn.close()
+    
+    def compact(self, incremental: bool = True) -> Dict:
+        """
+        離線壓縮：以 VACUUM INTO 產生重整後的新檔，驗證無誤後原子性替換原檔
+        
+        年度分區的帳本一併壓縮尚未結帳的年度分區 (已結帳的年度在結帳時已重整且為唯讀)。
+        呼叫前必須關閉其他連線 (例如 ChangeMonitor)；群組提交的待提交寫入會先提交。
+        
+        Args:
+            incremental: 是否讓壓縮後的檔案使用 auto_vacuum=INCREMENTAL
+        
+        Returns:
+            包含 size_before, size_after, reclaimed_bytes (皆含年度分區),
+            query_ms_before, query_ms_after, partitions_compacted 的報告
+        """
+        db_path = self.db_manager.db_path
+        
+        # 提交待提交的寫入並釋放共用連線，替換時不可有開啟中的連線
+        self.db_manager.close()
+        
+        partitions = [partition['path'] for partition in list_partitions(db_path)
+                      if not partition['closed'] and os.path.exists(partition['path'])]
+        paths = [db_path] + partitions
+        size_before = sum(os.path.getsize(path) for path in paths)
+        query_ms_before = self.benchmark_queries(db_path)
+        
+        query_ms_after = self._compact_file(db_path, incremental, benchmark=True)
+        for path in partitions:
+            self._compact_file(path, incremental)
+        
+        size_after = sum(os.path.getsize(path) for path in paths)
+        return {
+            'size_before': size_before,
+            'size_after': size_after,
+            'reclaimed_bytes': size_before - size_after,
+            'query_ms_before': query_ms_before,
+            'query_ms_after': query_ms_after,
+            'partitions_compacted': len(partitions),
+        }
+    
+    def _compact_file(self, path: str, incremental: bool, benchmark: bool = False) -> Optional[Dict[str, float]]:
+        """壓縮單一檔案 (benchmark 時回傳壓縮後的代表性查詢時間)"""
+        temp_path = f"{path}.compact"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        
+        conn = sqlite3.connect(path)
+        try:
+            if incremental:
+                # 設定值會套用到 VACUUM INTO 產生的新檔
+                conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM INTO ?', (temp_path,))
+        finally:
+            conn.close()
+        
+        try:
+            check = sqlite3.connect(temp_path)
+            try:
+                result = check.execute('PRAGMA integrity_check').fetchone()[0]
+                check.execute('ANALYZE')
+                check.commit()
+            finally:
+                check.close()
+            if result != 'ok':
+                raise sqlite3.DatabaseError(f"壓縮後的檔案完整性檢查失敗：{result}")
+            
+            query_ms_after = self.benchmark_queries(temp_path) if benchmark else None
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return query_ms_after
@@ -3,34 +3,474 @@
 提供 SQLite 資料庫的連接管理和基本 CRUD 操作
 """
 
+import hashlib
+import logging
+import math
 import sqlite3
 import os
+import random
+import re
+import sys
+import threading
+import time
+import unicodedata
+from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from typing import Any, Callable, List, Dict, Iterator, Optional, Sequence, Set, Tuple, TypeVar
+
+from .changes import ChangeMonitor
+from .log import configure_logging, get_logger
+from .profiler import QueryProfiler
+
+T = TypeVar('T')
+
+logger = get_logger('models')
+
+
+def is_busy_error(error: Exception) -> bool:
+    """判斷是否為其他連線持有鎖造成的暫時性錯誤 (database is locked / busy)"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+# 基準幣別 (報表金額一律換算為此幣別)
+BASE_CURRENCY = 'TWD'
+
+# 建立資料表後才新增的交易欄位 (既有資料庫開啟時以 ALTER TABLE 補上)
+TRANSACTION_ADDED_COLUMNS = {
+    'currency': f"TEXT NOT NULL DEFAULT '{BASE_CURRENCY}'",
+    'account_id': 'INTEGER',
+    'recurring_rule_id': 'INTEGER',
+    'external_id': 'TEXT',
+    'fingerprint': 'TEXT',
+    'reconciled': 'INTEGER NOT NULL DEFAULT 0',
+}
+
+def normalize_description(description: Optional[str]) -> str:
+    """正規化備註以比對重複交易 (全形轉半形、不分大小寫、標點視為空白、合併連續空白)"""
+    text = unicodedata.normalize('NFKC', description or '').casefold()
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text).split())
+
+
+def transaction_fingerprint(date: str, transaction_type: str, amount: float, currency: str,
+                            account_id: Optional[int], description: Optional[str],
+                            external_id: Optional[str] = None) -> str:
+    """
+    計算交易指紋 (供匯入時偵測重複)
+    
+    記入帳戶且有外部 ID (例如 OFX 的 FITID) 時以帳戶與外部 ID 識別，銀行修改備註後仍視為同一筆；
+    否則以日期、類型、金額、幣別、帳戶與正規化的備註識別 (外部 ID 只在同一家銀行內唯一，
+    沒有帳戶時不同銀行的 FITID 可能相同)。
+    """
+    if external_id and account_id:
+        key = f"id|{account_id}|{external_id}"
+    else:
+        key = (f"{date}|{transaction_type}|{float(amount):.2f}|{currency}|{account_id or ''}|"
+               f"{normalize_description(description)}")
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+
+# 補齊指紋欄位新增前的交易 (由 get_connection 註冊的 SQL 函式計算)
+FINGERPRINT_BACKFILL_SQL = '''
+    UPDATE {table} SET fingerprint = transaction_fingerprint(
+        date, type, amount, currency, account_id, description, external_id)
+    WHERE fingerprint IS NULL
+'''
+
+# 中日韓文字 (沒有空白分詞，改取相鄰兩字)
+_CJK_RUN = re.compile(r'([\u3400-\u9fff\uf900-\ufaff]+)')
+
+
+def description_tokens(description: Optional[str]) -> List[str]:
+    """將備註切成分類建議使用的詞 (正規化後依空白分詞，中日韓文字取相鄰兩字，忽略純數字)"""
+    tokens = set()
+    for word in normalize_description(description).split():
+        for index, run in enumerate(_CJK_RUN.split(word)):
+            if not run:
+                continue
+            if index % 2 == 0:
+                if not run.isdigit():
+                    tokens.add(run)
+            elif len(run) == 1:
+                tokens.add(run)
+            else:
+                tokens.update(run[start:start + 2] for start in range(len(run) - 1))
+    return sorted(tokens)
+
+
+def amount_bucket(amount: float) -> str:
+    """金額級距特徵 (每半個數量級一級，例如 100 ~ 316 為 $4)"""
+    return f"${int(math.log10(max(float(amount), 1)) * 2)}"
+
+
+def classifier_features(description: Optional[str], amount: float) -> List[str]:
+    """分類建議的特徵：備註的詞加上金額級距"""
+    return description_tokens(description) + [amount_bucket(amount)]
+
+
+# 餘額檢查點中代表整個帳本 (收入減支出的累計結餘) 的範圍，帳戶 ID 由 1 開始
+LEDGER_SCOPE = 0
+
+
+def add_missing_columns(conn: sqlite3.Connection, table: str, columns: Dict[str, str],
+                        schema: str = 'main') -> List[str]:
+    """
+    補上資料表缺少的欄位
+    
+    Args:
+        table: 資料表名稱
+        columns: {欄位名稱: 欄位定義}
+        schema: 資料庫別名 (ATTACH 的資料庫)
+    
+    Returns:
+        新增的欄位名稱
+    """
+    existing = {row[1] for row in conn.execute(f'PRAGMA {schema}.table_info({table})')}
+    added = []
+    for name, definition in columns.items():
+        if name not in existing:
+            conn.execute(f'ALTER TABLE {schema}.{table} ADD COLUMN {name} {definition}')
+            added.append(name)
+    return added
+
+
+def _add_generations(totals: Dict[str, int], before: Dict[str, int], after: Dict[str, int]):
+    """將兩次版本計數的差累加到 totals"""
+    for table, generation in after.items():
+        delta = generation - before.get(table, 0)
+        if delta:
+            totals[table] = totals.get(table, 0) + delta
+
+
+def converted_amount_sql(alias: str = 't') -> str:
+    """
+    回傳將交易金額換算為基準幣別的 SQL 運算式
+    
+    匯率取交易日當天或之前最近的一筆 (as-of)，由 fx_rates 主鍵 (currency, rate_date)
+    一次索引查找即可取得；早於第一筆匯率的交易使用最早的匯率，完全沒有匯率時
+    視為 1:1。基準幣別的交易不查匯率，因此單一幣別的報表沒有額外成本。
+    """
+    return f'''({alias}.amount * CASE WHEN {alias}.currency = '{BASE_CURRENCY}' THEN 1 ELSE COALESCE(
+            (SELECT r.rate FROM fx_rates r WHERE r.currency = {alias}.currency AND r.rate_date <= {alias}.date
+             ORDER BY r.rate_date DESC LIMIT 1),
+            (SELECT r.rate FROM fx_rates r WHERE r.currency = {alias}.currency
+             ORDER BY r.rate_date LIMIT 1),
+            1) END)'''
+
 
 class DatabaseManager:
     """資料庫管理類別"""
     
-    def __init__(self, db_path: str = "accounting.db"):
+    # 需要追蹤變更版本的資料表 (供 ChangeMonitor 判斷哪些資料過期)
+    TRACKED_TABLES = ('categories', 'transactions', 'transaction_summaries', 'accounts', 'transfers',
+                      'fx_rates')
+    
+    # PRAGMA synchronous 可用的耐久性等級
+    SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+    
+    def __init__(self, db_path: str = "accounting.db", group_commit_ms: int = 0,
+                 synchronous: str = 'FULL', busy_timeout_ms: int = 5000,
+                 max_retries: int = 5, retry_base_delay: float = 0.05,
+                 retry_max_delay: float = 2.0):
         """
         初始化資料庫管理器
         
         Args:
             db_path: 資料庫檔案路徑
+            group_commit_ms: 群組提交視窗 (毫秒)。0 表示每筆寫入立即提交；
+                大於 0 時，視窗內陸續到達的寫入會合併成一個交易一次提交，
+                代價是當機時最多遺失這段時間內已回傳成功的寫入
+            synchronous: PRAGMA synchronous 等級 ('OFF', 'NORMAL', 'FULL', 'EXTRA')，
+                決定每次提交時 fsync 的強度
+            busy_timeout_ms: 遇到其他連線持有鎖時，SQLite 內部等待的時間 (毫秒)
+            max_retries: busy_timeout 後仍被鎖住時，整個操作重試的次數上限
+            retry_base_delay: 第一次重試前的等待秒數，之後每次加倍
+            retry_max_delay: 單次重試等待秒數上限
         """
+        synchronous = synchronous.upper()
+        if synchronous not in self.SYNCHRONOUS_LEVELS:
+            raise ValueError(f"synchronous 必須是 {', '.join(self.SYNCHRONOUS_LEVELS)} 之一")
+        if group_commit_ms < 0:
+            raise ValueError("group_commit_ms 不可為負數")
+        
         self.db_path = db_path
+        self.group_commit_ms = group_commit_ms
+        self.synchronous = synchronous
+        self.busy_timeout_ms = busy_timeout_ms
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        
+        # 鎖定重試統計
+        self._metrics_lock = threading.Lock()
+        self._retry_metrics = {
+            'operations_retried': 0,   # 曾經重試過的操作數
+            'retries': 0,              # 重試總次數
+            'retry_wait_seconds': 0.0, # 重試前等待的總秒數
+            'busy_failures': 0,        # 重試用盡仍失敗的操作數
+        }
+        
+        # 群組提交狀態：共用寫入連線、保護它的鎖與延遲提交計時器
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_lock = threading.RLock()
+        self._commit_timer: Optional[threading.Timer] = None
+        
+        # 本程式自己提交的版本遞增 (累計)，ChangeMonitor 據此區分自身與外部的寫入；
+        # 群組提交模式下尚未提交的部分先記在 _pending_generations
+        self._generation_lock = threading.Lock()
+        self._own_generations: Dict[str, int] = {}
+        self._pending_generations: Dict[str, int] = {}
+        
+        # 查詢效能分析器 (預設關閉，見 enable_profiling)
+        self.profiler: Optional[QueryProfiler] = None
+        
         self.init_database()
     
+    @property
+    def group_commit(self) -> bool:
+        """是否啟用群組提交"""
+        return self.group_commit_ms > 0
+    
     def get_connection(self) -> sqlite3.Connection:
         """取得資料庫連接"""
-        conn = sqlite3.connect(self.db_path)
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000)
         conn.row_factory = sqlite3.Row  # 讓查詢結果可以用欄位名稱存取
+        # 讓 SQL 也能計算交易指紋 (補齊舊資料與年度分區的指紋)
+        conn.create_function('transaction_fingerprint', 7, transaction_fingerprint, deterministic=True)
+        if self.synchronous != 'FULL':
+            conn.execute(f'PRAGMA synchronous = {self.synchronous}')
         return conn
     
+    @contextmanager
+    def read_connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        取得讀取用連接 (離開時自動關閉)
+        
+        群組提交模式下改用共用寫入連線，才能讀到尚未提交的自身寫入。
+        """
+        if self.group_commit:
+            with self._writer_lock:
+                yield self._get_writer()
+            return
+        
+        conn = self.get_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+    
+    @contextmanager
+    def write_connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        取得寫入用連接，區塊正常結束即提交、發生例外則回復並重新拋出
+        
+        群組提交模式下每次寫入包在一個 SAVEPOINT 中：失敗只回復這一筆，
+        成功則留在共用交易裡，等群組提交視窗結束時一起 COMMIT。
+        """
+        if self.group_commit:
+            with self._writer_lock:
+                conn = self._get_writer()
+                if not conn.in_transaction:
+                    # IMMEDIATE：開始時就取得寫入鎖，避免持有讀取鎖時升級失敗 (該情況 busy_timeout 無效)
+                    conn.execute('BEGIN IMMEDIATE')
+                conn.execute('SAVEPOINT group_write')
+                before = self.get_table_generations(conn)
+                try:
+                    yield conn
+                except BaseException:
+                    conn.execute('ROLLBACK TO group_write')
+                    conn.execute('RELEASE group_write')
+                    raise
+                _add_generations(self._pending_generations, before, self.get_table_generations(conn))
+                conn.execute('RELEASE group_write')
+                self._schedule_commit()
+            return
+        
+        conn = self.get_connection()
+        try:
+            # 先讀 data_version 再讀版本：兩者之間有外部提交時 data_version 會改變
+            version = conn.execute('PRAGMA data_version').fetchone()[0]
+            before = self.get_table_generations(conn)
+            yield conn
+            after = self.get_table_generations(conn) if conn.in_transaction else before
+            # 寫入取得鎖之前有其他連線提交時無法區分，整批視為外部變更 (只會多通知一次)
+            own = version == conn.execute('PRAGMA data_version').fetchone()[0]
+            with self._generation_lock:
+                conn.commit()
+                if own:
+                    _add_generations(self._own_generations, before, after)
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def _get_writer(self) -> sqlite3.Connection:
+        """取得 (必要時建立) 群組提交用的共用寫入連線"""
+        if self._writer is None:
+            # 由計時器執行緒提交，因此允許跨執行緒使用 (存取一律經過 _writer_lock)
+            self._writer = sqlite3.connect(self.db_path, check_same_thread=False,
+                                           isolation_level=None,
+                                           timeout=self.busy_timeout_ms / 1000)
+            self._writer.row_factory = sqlite3.Row
+            self._writer.execute(f'PRAGMA synchronous = {self.synchronous}')
+        return self._writer
+    
+    def _schedule_commit(self):
+        """在群組提交視窗結束時提交 (視窗從第一筆待提交寫入開始計算)"""
+        if self._commit_timer is None:
+            self._commit_timer = threading.Timer(self.group_commit_ms / 1000, self._timed_flush)
+            self._commit_timer.daemon = True
+            self._commit_timer.start()
+    
+    def flush(self):
+        """立即提交群組提交模式下所有待提交的寫入"""
+        with self._writer_lock:
+            if self._commit_timer is not None:
+                self._commit_timer.cancel()
+                self._commit_timer = None
+            
+            if self._writer is not None and self._writer.in_transaction:
+                try:
+                    # COMMIT 被鎖住時交易仍保持開啟，可以安全地重試
+                    with self._generation_lock:
+                        self._retry_on_busy(self._writer.commit)
+                        pending, self._pending_generations = self._pending_generations, {}
+                        for table, count in pending.items():
+                            self._own_generations[table] = self._own_generations.get(table, 0) + count
+                except sqlite3.Error as e:
+                    logger.error("群組提交錯誤：%s", e, extra={'event': 'group_commit_failed'})
+                    self._writer.rollback()
+                    self._pending_generations = {}
+                    raise
+    
+    def run_read(self, operation: Callable[[sqlite3.Connection], T]) -> T:
+        """
+        以讀取連接執行操作，資料庫被鎖住時以指數退避重試
+        
+        Args:
+            operation: 接收連接並回傳結果的函式 (重試時會整個重新執行)
+        """
+        return self._retry_on_busy(lambda: self._run_with(self.read_connection, 'read', operation))
+    
+    def run_write(self, operation: Callable[[sqlite3.Connection], T]) -> T:
+        """
+        以寫入連接執行操作並提交，資料庫被鎖住時回復並以指數退避重試
+        
+        Args:
+            operation: 接收連接並回傳結果的函式 (重試時會整個重新執行)
+        """
+        return self._retry_on_busy(lambda: self._run_with(self.write_connection, 'write', operation))
+    
+    def query(self, sql: str, params: Sequence[Any] = ()) -> List[Dict]:
+        """執行查詢並以字典列表回傳所有結果"""
+        return self.run_read(lambda conn: [dict(row) for row in conn.execute(sql, params).fetchall()])
+    
+    def query_one(self, sql: str, params: Sequence[Any] = ()) -> Optional[Dict]:
+        """執行查詢並回傳第一筆結果 (沒有結果時回傳 None)"""
+        def fetch(conn):
+            row = conn.execute(sql, params).fetchone()
+            return dict(row) if row else None
+        return self.run_read(fetch)
+    
+    def _run_with(self, connection_factory, kind, operation):
+        with connection_factory() as conn:
+            profiler = self.profiler
+            if profiler is not None:
+                return profiler.profile(conn, kind, operation)
+            return operation(conn)
+    
+    def enable_profiling(self, slow_threshold_ms: float = 100.0,
+                         log_path: Optional[str] = None) -> QueryProfiler:
+        """
+        開啟查詢效能分析
+        
+        Args:
+            slow_threshold_ms: 慢查詢門檻 (毫秒)
+            log_path: 慢查詢日誌檔路徑 (含 EXPLAIN QUERY PLAN，None 表示不寫日誌)
+        
+        Returns:
+            QueryProfiler，可用 get_stats() / dump() 讀取統計
+        """
+        self.disable_profiling()
+        self.profiler = QueryProfiler(slow_threshold_ms, log_path)
+        return self.profiler
+    
+    def disable_profiling(self):
+        """關閉查詢效能分析"""
+        if self.profiler is not None:
+            self.profiler.close()
+            self.profiler = None
+    
+    def dump_profile(self, stream=None):
+        """輸出查詢效能統計與鎖定重試統計 (未開啟分析時不輸出)"""
+        if self.profiler is not None:
+            self.profiler.dump(stream, self.get_retry_metrics())
+    
+    def _retry_on_busy(self, attempt: Callable[[], T]) -> T:
+        """執行 attempt，遇到鎖定錯誤時等待 (指數退避加隨機抖動) 後重試"""
+        retries = 0
+        while True:
+            try:
+                return attempt()
+            except sqlite3.OperationalError as e:
+                if not is_busy_error(e):
+                    raise
+                if retries >= self.max_retries:
+                    with self._metrics_lock:
+                        self._retry_metrics['busy_failures'] += 1
+                    raise
+                
+                delay = min(self.retry_base_delay * (2 ** retries), self.retry_max_delay)
+                delay *= random.uniform(0.5, 1.0)
+                with self._metrics_lock:
+                    if retries == 0:
+                        self._retry_metrics['operations_retried'] += 1
+                    self._retry_metrics['retries'] += 1
+                    self._retry_metrics['retry_wait_seconds'] += delay
+                retries += 1
+                time.sleep(delay)
+    
+    def get_retry_metrics(self) -> Dict:
+        """取得鎖定重試統計 (重試次數、等待時間、重試用盡的失敗數)"""
+        with self._metrics_lock:
+            return dict(self._retry_metrics)
+    
+    def _timed_flush(self):
+        """計時器觸發的提交 (錯誤已在 flush 中回報，不再往計時器執行緒拋出)"""
+        try:
+            self.flush()
+        except sqlite3.Error:
+            pass
+    
+    def close(self):
+        """提交所有待提交的寫入、更新查詢統計資訊並關閉共用連線"""
+        with self._writer_lock:
+            self.flush()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        
+        # PRAGMA optimize 只會重新分析統計資訊過期的資料表，適合在關閉時執行
+        try:
+            conn = self.get_connection()
+            try:
+                conn.execute('PRAGMA optimize')
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning("最佳化查詢統計錯誤：%s", e, extra={'event': 'optimize_failed'})
+    
     def init_database(self):
         """初始化資料庫表格和預設資料"""
         conn = self.get_connection()
         try:
+            # 新資料庫使用增量空間回收 (既有資料庫需經 MaintenanceManager.compact 轉換)
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            
             # 建立分類表
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS categories (
@@ -51,27 +491,249 @@ class DatabaseManager:
                     amount DECIMAL(10,2) NOT NULL CHECK (amount > 0),
                     description TEXT,
                     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    currency TEXT NOT NULL DEFAULT 'TWD',
+                    account_id INTEGER REFERENCES accounts(id),
+                    recurring_rule_id INTEGER REFERENCES recurring_rules(id),
+                    external_id TEXT,
+                    fingerprint TEXT,
+                    reconciled INTEGER NOT NULL DEFAULT 0,
                     FOREIGN KEY (category_id) REFERENCES categories(id)
                 )
             ''')
+            if 'fingerprint' in add_missing_columns(conn, 'transactions', TRANSACTION_ADDED_COLUMNS):
+                conn.execute(FINGERPRINT_BACKFILL_SQL.format(table='transactions'))
+            
+            # 建立匯率表 (rate 為 1 單位外幣等於多少基準幣別)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS fx_rates (
+                    currency TEXT NOT NULL,
+                    rate_date DATE NOT NULL,
+                    rate REAL NOT NULL CHECK (rate > 0),
+                    PRIMARY KEY (currency, rate_date)
+                ) WITHOUT ROWID
+            ''')
             
             # 建立索引提升查詢效能
             conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(date)')
             conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_type ON transactions(type)')
             conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions(category_id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_account ON transactions(account_id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_fingerprint ON transactions(fingerprint)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_amount_date ON transactions(amount, date)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_reconciled ON transactions(reconciled, date)')
+            
+            # 建立帳戶、帳戶餘額與轉帳表
+            # 餘額由寫入路徑隨交易/轉帳增減 (不需加總歷史)，entry_count 為記入該帳戶的筆數
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS accounts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL UNIQUE,
+                    currency TEXT NOT NULL DEFAULT 'TWD',
+                    opening_balance DECIMAL(12,2) NOT NULL DEFAULT 0,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS account_balances (
+                    account_id INTEGER PRIMARY KEY,
+                    balance DECIMAL(12,2) NOT NULL DEFAULT 0,
+                    entry_count INTEGER NOT NULL DEFAULT 0,
+                    FOREIGN KEY (account_id) REFERENCES accounts(id)
+                )
+            ''')
+            # 轉帳不是收入或支出，獨立存放，因此不會出現在收支報表中
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS transfers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    date DATE NOT NULL,
+                    from_account_id INTEGER NOT NULL,
+                    to_account_id INTEGER NOT NULL,
+                    amount DECIMAL(12,2) NOT NULL CHECK (amount > 0),
+                    to_amount DECIMAL(12,2) NOT NULL CHECK (to_amount > 0),
+                    description TEXT,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    CHECK (from_account_id != to_account_id),
+                    FOREIGN KEY (from_account_id) REFERENCES accounts(id),
+                    FOREIGN KEY (to_account_id) REFERENCES accounts(id)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_transfers_date ON transfers(date)')
+            
+            # 建立月底餘額檢查點 (account_id 為 LEDGER_SCOPE 時是整個帳本的累計結餘)
+            # 寫入路徑刪除編輯日期所在月份之後的檢查點，查詢時再補算
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS balance_checkpoints (
+                    account_id INTEGER NOT NULL,
+                    period TEXT NOT NULL,
+                    balance DECIMAL(14,2) NOT NULL,
+                    PRIMARY KEY (account_id, period)
+                ) WITHOUT ROWID
+            ''')
+            
+            # 建立定期交易規則 (每週/每月/每年)
+            # occurrence_count 為已產生的次數，next_date 為下一次尚未產生的日期 (NULL 表示已結束)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS recurring_rules (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    type TEXT NOT NULL CHECK (type IN ('income', 'expense')),
+                    category_id INTEGER NOT NULL,
+                    amount DECIMAL(10,2) NOT NULL CHECK (amount > 0),
+                    currency TEXT NOT NULL DEFAULT 'TWD',
+                    account_id INTEGER,
+                    description TEXT,
+                    frequency TEXT NOT NULL CHECK (frequency IN ('weekly', 'monthly', 'yearly')),
+                    interval INTEGER NOT NULL DEFAULT 1 CHECK (interval > 0),
+                    start_date DATE NOT NULL,
+                    end_date DATE,
+                    occurrence_count INTEGER NOT NULL DEFAULT 0,
+                    next_date DATE,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (category_id) REFERENCES categories(id),
+                    FOREIGN KEY (account_id) REFERENCES accounts(id)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_recurring_rules_next ON recurring_rules(next_date)')
+            
+            # 建立分類月預算與當月已支出計數器 (支出寫入時同步增減，評估預算不需掃描交易)
+            # spend_valid 為 0 時計數器需要重建 (剛建立的預算或匯率異動後)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS budgets (
+                    category_id INTEGER PRIMARY KEY,
+                    amount DECIMAL(12,2) NOT NULL CHECK (amount > 0),
+                    alert_threshold REAL NOT NULL DEFAULT 0.8,
+                    spend_valid INTEGER NOT NULL DEFAULT 0,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (category_id) REFERENCES categories(id)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS budget_spend (
+                    category_id INTEGER NOT NULL,
+                    period TEXT NOT NULL,
+                    spent DECIMAL(12,2) NOT NULL DEFAULT 0,
+                    PRIMARY KEY (category_id, period)
+                ) WITHOUT ROWID
+            ''')
+            
+            # 建立自動分類規則表 (keyword / regex 比對備註，amount 只依金額範圍)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS category_rules (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    match_type TEXT NOT NULL CHECK (match_type IN ('keyword', 'regex', 'amount')),
+                    pattern TEXT NOT NULL DEFAULT '',
+                    min_amount DECIMAL(10,2),
+                    max_amount DECIMAL(10,2),
+                    category_id INTEGER NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (category_id) REFERENCES categories(id)
+                )
+            ''')
+            
+            # 建立分類建議的計數 (單純貝氏：每個分類的特徵次數與交易數，隨交易寫入增減)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS classifier_tokens (
+                    token TEXT NOT NULL,
+                    category_id INTEGER NOT NULL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (token, category_id)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS classifier_categories (
+                    category_id INTEGER PRIMARY KEY,
+                    documents INTEGER NOT NULL DEFAULT 0,
+                    tokens INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            
+            # 建立封存期間的月度彙總表 (明細已移到封存檔，報表改用彙總)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS transaction_summaries (
+                    period TEXT NOT NULL,
+                    type TEXT NOT NULL CHECK (type IN ('income', 'expense')),
+                    category_id INTEGER NOT NULL,
+                    total DECIMAL(12,2) NOT NULL DEFAULT 0,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (period, type, category_id),
+                    FOREIGN KEY (category_id) REFERENCES categories(id)
+                )
+            ''')
+            
+            # 建立變更版本計數器
+            self._create_change_tracking(conn)
             
             # 插入預設分類（如果不存在）
             self._insert_default_categories(conn)
             
             conn.commit()
-            print("資料庫初始化完成")
+            logger.info("資料庫初始化完成", extra={'event': 'database_initialized', 'db_path': self.db_path})
             
         except sqlite3.Error as e:
-            print(f"資料庫初始化錯誤：{e}")
+            logger.error("資料庫初始化錯誤：%s", e, extra={'event': 'database_init_failed', 'db_path': self.db_path})
             conn.rollback()
         finally:
             conn.close()
     
+    def _create_change_tracking(self, conn: sqlite3.Connection):
+        """建立各資料表的版本計數器與維護觸發器"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS table_generations (
+                table_name TEXT PRIMARY KEY,
+                generation INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
+        for table in self.TRACKED_TABLES:
+            conn.execute(
+                'INSERT OR IGNORE INTO table_generations (table_name, generation) VALUES (?, 0)',
+                (table,)
+            )
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                conn.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_generation
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE table_generations SET generation = generation + 1
+                        WHERE table_name = '{table}';
+                    END
+                ''')
+    
+    def get_table_generations(self, conn: Optional[sqlite3.Connection] = None) -> Dict[str, int]:
+        """
+        取得各資料表目前的版本計數
+        
+        Args:
+            conn: 沿用的連接 (None 時自行開啟)
+        
+        Returns:
+            {資料表名稱: 版本}，任何寫入都會讓對應版本遞增
+        """
+        own_conn = conn is None
+        if own_conn:
+            conn = self.get_connection()
+        try:
+            cursor = conn.execute('SELECT table_name, generation FROM table_generations')
+            return {row['table_name']: row['generation'] for row in cursor.fetchall()}
+        finally:
+            if own_conn:
+                conn.close()
+    
+    def get_generation_snapshot(self, conn: sqlite3.Connection) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """
+        同時取得目前的版本計數與本程式自己提交的版本遞增 (與提交互斥，兩者一致)
+        
+        Returns:
+            (目前版本, 自身提交的累計遞增)；兩次快照間某資料表的版本增加超過自身遞增，即有外部寫入
+        """
+        with self._generation_lock:
+            return self.get_table_generations(conn), dict(self._own_generations)
+    
+    def create_change_monitor(self) -> ChangeMonitor:
+        """建立此資料庫的變更監視器"""
+        return ChangeMonitor(self)
+    
     def _insert_default_categories(self, conn: sqlite3.Connection):
         """插入預設分類"""
         default_categories = [
@@ -96,7 +758,7 @@ class DatabaseManager:
                     (name, category_type)
                 )
             except sqlite3.Error as e:
-                print(f"插入預設分類 '{name}' 失敗：{e}")
+                logger.error("插入預設分類 '%s' 失敗：%s", name, e, extra={'event': 'default_category_failed'})
 
 class CategoryManager:
     """分類管理類別"""
@@ -106,58 +768,46 @@ class CategoryManager:
     
     def get_all_categories(self) -> List[Dict]:
         """取得所有分類"""
-        conn = self.db_manager.get_connection()
         try:
-            cursor = conn.execute(
+            return self.db_manager.query(
                 'SELECT id, name, type FROM categories ORDER BY type, name'
             )
-            return [dict(row) for row in cursor.fetchall()]
         except sqlite3.Error as e:
-            print(f"查詢分類錯誤：{e}")
+            logger.error("查詢分類錯誤：%s", e, extra={'event': 'query_failed'})
             return []
-        finally:
-            conn.close()
     
     def get_categories_by_type(self, category_type: str) -> List[Dict]:
         """取得指定類型的分類"""
         if category_type not in ['income', 'expense']:
             raise ValueError("分類類型必須是 'income' 或 'expense'")
         
-        conn = self.db_manager.get_connection()
         try:
-            cursor = conn.execute(
+            return self.db_manager.query(
                 'SELECT id, name, type FROM categories WHERE type = ? ORDER BY name',
                 (category_type,)
             )
-            return [dict(row) for row in cursor.fetchall()]
         except sqlite3.Error as e:
-            print(f"查詢 {category_type} 分類錯誤：{e}")
+            logger.error("查詢 %s 分類錯誤：%s", category_type, e, extra={'event': 'query_failed'})
             return []
-        finally:
-            conn.close()
     
     def add_category(self, name: str, category_type: str) -> bool:
         """新增分類"""
         if category_type not in ['income', 'expense']:
             raise ValueError("分類類型必須是 'income' 或 'expense'")
         
-        conn = self.db_manager.get_connection()
         try:
-            conn.execute(
+            self.db_manager.run_write(lambda conn: conn.execute(
                 'INSERT INTO categories (name, type) VALUES (?, ?)',
                 (name, category_type)
-            )
-            conn.commit()
-            print(f"成功新增分類：{name}")
+            ))
+            logger.debug("成功新增分類：%s", name, extra={'event': 'category_added', 'category_type': category_type})
             return True
         except sqlite3.IntegrityError:
-            print(f"分類 '{name}' 已存在")
+            logger.warning("分類 '%s' 已存在", name, extra={'event': 'category_exists'})
             return False
         except sqlite3.Error as e:
-            print(f"新增分類錯誤：{e}")
+            logger.error("新增分類錯誤：%s", e, extra={'event': 'category_add_failed'})
             return False
-        finally:
-            conn.close()
 
 class TransactionManager:
     """交易記錄管理類別"""
@@ -165,8 +815,180 @@ class TransactionManager:
     def __init__(self, db_manager: DatabaseManager):
         self.db_manager = db_manager
     
+    # 交易查詢共用欄位 (含分類名稱)
+    _SELECT_COLUMNS = '''
+        SELECT 
+            t.id,
+            t.date,
+            t.type,
+            t.category_id,
+            t.amount,
+            t.currency,
+            {amount_base} as amount_base,
+            t.description,
+            t.account_id,
+            t.reconciled,
+            c.name as category_name,
+            a.name as account_name
+        FROM transactions t
+        LEFT JOIN categories c ON t.category_id = c.id
+        LEFT JOIN accounts a ON t.account_id = a.id
+    '''.format(amount_base=converted_amount_sql('t'))
+    
+    # 單次 IN (...) 查詢的 ID 上限，避免超過 SQLite 參數數量限制
+    _IDS_CHUNK_SIZE = 500
+    
+    def _read(self, operation: Callable[[sqlite3.Connection], T],
+              start_date: Optional[str] = None, end_date: Optional[str] = None,
+              ids: Optional[Sequence[int]] = None) -> T:
+        """
+        執行交易記錄的讀取操作
+        
+        日期範圍與交易 ID 是給子類別的提示 (例如年度分區只需 ATTACH 涵蓋的年度)，
+        此處直接以一般讀取連接執行。
+        """
+        return self.db_manager.run_read(operation)
+    
+    @staticmethod
+    def _check_category(conn: sqlite3.Connection, category_id: int, transaction_type: str):
+        """驗證分類是否存在且類型與交易相符"""
+        cursor = conn.execute(
+            'SELECT type FROM categories WHERE id = ?',
+            (category_id,)
+        )
+        category = cursor.fetchone()
+        
+        if not category:
+            raise ValueError(f"分類 ID {category_id} 不存在")
+        
+        if category['type'] != transaction_type:
+            raise ValueError(f"分類類型不匹配：分類是 {category['type']}，但交易類型是 {transaction_type}")
+    
+    @staticmethod
+    def _check_account(conn: sqlite3.Connection, account_id: Optional[int], currency: str):
+        """驗證帳戶是否存在且幣別與交易相符 (未指定帳戶時不檢查)"""
+        if account_id is None:
+            return
+        account = conn.execute('SELECT currency FROM accounts WHERE id = ?', (account_id,)).fetchone()
+        if not account:
+            raise ValueError(f"帳戶 ID {account_id} 不存在")
+        if account['currency'] != currency:
+            raise ValueError(f"幣別不符：帳戶使用 {account['currency']}，但交易幣別是 {currency}")
+    
+    @staticmethod
+    def _invalidate_checkpoints(conn: sqlite3.Connection, account_id: int, date: Optional[str] = None):
+        """刪除日期所在月份及之後的餘額檢查點 (date 為 None 時全部刪除)，下次查詢時再補算"""
+        if date is None:
+            conn.execute('DELETE FROM balance_checkpoints WHERE account_id = ?', (account_id,))
+        else:
+            conn.execute('DELETE FROM balance_checkpoints WHERE account_id = ? AND period >= ?',
+                         (account_id, date[:7]))
+    
+    @classmethod
+    def _adjust_balance(cls, conn: sqlite3.Connection, account_id: Optional[int], delta: float,
+                        entries: int, date: str):
+        """增減帳戶餘額與記入筆數，並使該日之後的帳戶檢查點失效 (與交易寫入在同一個交易中執行)"""
+        if account_id is None:
+            return
+        conn.execute('''
+            UPDATE account_balances
+            SET balance = ROUND(balance + ?, 2), entry_count = entry_count + ?
+            WHERE account_id = ?
+        ''', (delta, entries, account_id))
+        cls._invalidate_checkpoints(conn, account_id, date)
+    
+    # 有預算的分類才累計支出 (以交易日匯率換算為基準幣別)
+    _BUDGET_SPEND_SQL = f'''
+        INSERT INTO budget_spend (category_id, period, spent)
+        SELECT ?, ?, ROUND({converted_amount_sql('t')}, 2)
+        FROM (SELECT ? AS amount, ? AS currency, ? AS date) t
+        WHERE EXISTS (SELECT 1 FROM budgets WHERE category_id = ?)
+        ON CONFLICT (category_id, period) DO UPDATE SET spent = ROUND(spent + excluded.spent, 2)
+    '''
+    
+    @classmethod
+    def _budget_spend_params(cls, row, sign: int) -> Tuple:
+        """_BUDGET_SPEND_SQL 的參數"""
+        return (row['category_id'], row['date'][:7], sign * float(row['amount']), row['currency'], row['date'],
+                row['category_id'])
+    
+    _CLASSIFIER_TOKEN_SQL = '''
+        INSERT INTO classifier_tokens (token, category_id, count) VALUES (?, ?, ?)
+        ON CONFLICT (token, category_id) DO UPDATE SET count = count + excluded.count
+    '''
+    _CLASSIFIER_CATEGORY_SQL = '''
+        INSERT INTO classifier_categories (category_id, documents, tokens) VALUES (?, ?, ?)
+        ON CONFLICT (category_id) DO UPDATE SET
+            documents = documents + excluded.documents, tokens = tokens + excluded.tokens
+    '''
+    
+    @classmethod
+    def _learn(cls, conn: sqlite3.Connection, rows: Sequence, sign: int):
+        """
+        將交易的特徵記入 (sign=1) 或移出 (sign=-1) 分類建議的計數 (與交易寫入在同一個交易中)
+        
+        rows 的每個項目需包含 category_id, amount, description；相同的 (特徵, 分類) 只寫入一次
+        """
+        tokens: Counter = Counter()
+        categories: Dict[int, List[int]] = {}
+        for row in rows:
+            features = classifier_features(row['description'], row['amount'])
+            tokens.update((feature, row['category_id']) for feature in features)
+            entry = categories.setdefault(row['category_id'], [0, 0])
+            entry[0] += 1
+            entry[1] += len(features)
+        conn.executemany(cls._CLASSIFIER_TOKEN_SQL,
+                         [(token, category_id, sign * count) for (token, category_id), count in tokens.items()])
+        conn.executemany(cls._CLASSIFIER_CATEGORY_SQL,
+                         [(category_id, sign * documents, sign * count)
+                          for category_id, (documents, count) in categories.items()])
+    
+    @classmethod
+    def _post(cls, conn: sqlite3.Connection, row, sign: int):
+        """
+        將交易記入 (sign=1) 或沖回 (sign=-1) 帳戶餘額、預算計數器與分類建議
+        
+        row 需包含 date, type, category_id, amount, currency, account_id, description
+        """
+        amount = float(row['amount']) if row['type'] == 'income' else -float(row['amount'])
+        cls._invalidate_checkpoints(conn, LEDGER_SCOPE, row['date'])
+        cls._adjust_balance(conn, row['account_id'], sign * amount, sign, row['date'])
+        if row['type'] == 'expense':
+            conn.execute(cls._BUDGET_SPEND_SQL, cls._budget_spend_params(row, sign))
+        cls._learn(conn, [row], sign)
+    
+    @classmethod
+    def _post_many(cls, conn: sqlite3.Connection, rows: Sequence[Dict]):
+        """批次記入多筆交易 (每個帳戶只更新一次餘額，檢查點從最早的日期起失效)"""
+        if not rows:
+            return
+        cls._invalidate_checkpoints(conn, LEDGER_SCOPE, min(row['date'] for row in rows))
+        accounts: Dict[int, List] = {}
+        for row in rows:
+            if row['account_id'] is None:
+                continue
+            amount = row['amount'] if row['type'] == 'income' else -row['amount']
+            entry = accounts.setdefault(row['account_id'], [0.0, 0, row['date']])
+            entry[0] += amount
+            entry[1] += 1
+            entry[2] = min(entry[2], row['date'])
+        for account_id, (delta, entries, first_date) in accounts.items():
+            cls._adjust_balance(conn, account_id, round(delta, 2), entries, first_date)
+        conn.executemany(cls._BUDGET_SPEND_SQL,
+                         [cls._budget_spend_params(row, 1) for row in rows if row['type'] == 'expense'])
+        cls._learn(conn, rows, 1)
+    
+    @staticmethod
+    def _normalize_currency(currency: str) -> str:
+        """驗證並回傳大寫的 ISO 4217 幣別代碼"""
+        code = (currency or '').strip().upper()
+        if len(code) != 3 or not code.isalpha():
+            raise ValueError(f"幣別代碼必須是 3 個英文字母：{currency}")
+        return code
+    
     def add_transaction(self, date: str, transaction_type: str, 
-                       category_id: int, amount: float, description: str = '') -> bool:
+                       category_id: int, amount: float, description: str = '',
+                       currency: str = BASE_CURRENCY, account_id: Optional[int] = None) -> Optional[int]:
         """
         新增交易記錄
         
@@ -174,8 +996,13 @@ class TransactionManager:
             date: 交易日期 (YYYY-MM-DD)
             transaction_type: 交易類型 ('income' 或 'expense')
             category_id: 分類ID
-            amount: 金額
+            amount: 金額 (交易幣別)
             description: 備註
+            currency: 幣別代碼 (預設為基準幣別)
+            account_id: 帳戶ID (指定時同步增減帳戶餘額，幣別需與帳戶相同)
+        
+        Returns:
+            新交易記錄的 ID，失敗時回傳 None
         """
         if transaction_type not in ['income', 'expense']:
             raise ValueError("交易類型必須是 'income' 或 'expense'")
@@ -183,158 +1010,736 @@ class TransactionManager:
         if amount <= 0:
             raise ValueError("金額必須大於 0")
         
-        conn = self.db_manager.get_connection()
-        try:
-            # 驗證分類是否存在且類型匹配
-            cursor = conn.execute(
-                'SELECT type FROM categories WHERE id = ?',
-                (category_id,)
-            )
-            category = cursor.fetchone()
-            
-            if not category:
-                raise ValueError(f"分類 ID {category_id} 不存在")
-            
-            if category['type'] != transaction_type:
-                raise ValueError(f"分類類型不匹配：分類是 {category['type']}，但交易類型是 {transaction_type}")
+        currency = self._normalize_currency(currency)
+        
+        values = {'date': date, 'type': transaction_type, 'category_id': category_id, 'amount': round(amount, 2),
+                  'currency': currency, 'account_id': account_id, 'description': description}
+        fingerprint = transaction_fingerprint(date, transaction_type, values['amount'], currency, account_id,
+                                              description)
+        
+        def insert(conn):
+            self._check_category(conn, category_id, transaction_type)
+            self._check_account(conn, account_id, currency)
             
             # 插入交易記錄
-            conn.execute('''
-                INSERT INTO transactions (date, type, category_id, amount, description)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (date, transaction_type, category_id, round(amount, 2), description))
-            
-            conn.commit()
-            print(f"成功新增交易記錄：{transaction_type} ${amount:.2f}")
-            return True
+            cursor = conn.execute('''
+                INSERT INTO transactions (date, type, category_id, amount, description, currency, account_id,
+                                          fingerprint)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (date, transaction_type, category_id, values['amount'], description, currency, account_id,
+                  fingerprint))
+            self._post(conn, values, 1)
+            return cursor.lastrowid
+        
+        try:
+            transaction_id = self.db_manager.run_write(insert)
+            logger.debug("成功新增交易記錄：%s %s %.2f", transaction_type, currency, amount,
+                         extra={'event': 'transaction_added', 'transaction_id': transaction_id})
+            return transaction_id
             
         except sqlite3.Error as e:
-            print(f"新增交易記錄錯誤：{e}")
-            return False
-        finally:
-            conn.close()
+            logger.error("新增交易記錄錯誤：%s", e, extra={'event': 'transaction_add_failed'})
+            return None
+    
+    # 批次寫入的欄位 (recurring_rule_id、external_id 可省略，fingerprint 由 _normalize_row 計算)
+    _BULK_COLUMNS = ('date', 'type', 'category_id', 'amount', 'description', 'currency', 'account_id',
+                     'recurring_rule_id', 'external_id', 'fingerprint')
+    
+    @classmethod
+    def _normalize_row(cls, row: Dict) -> Dict:
+        """驗證並正規化一筆批次新增的交易 (格式錯誤時拋出 ValueError)"""
+        if row.get('type') not in ['income', 'expense']:
+            raise ValueError("交易類型必須是 'income' 或 'expense'")
+        if row['amount'] <= 0:
+            raise ValueError("金額必須大於 0")
+        normalized = {
+            'date': row['date'],
+            'type': row['type'],
+            'category_id': row['category_id'],
+            'amount': round(row['amount'], 2),
+            'description': row.get('description', ''),
+            'currency': cls._normalize_currency(row.get('currency', BASE_CURRENCY)),
+            'account_id': row.get('account_id'),
+            'recurring_rule_id': row.get('recurring_rule_id'),
+            'external_id': row.get('external_id') or None,
+        }
+        normalized['fingerprint'] = transaction_fingerprint(
+            normalized['date'], normalized['type'], normalized['amount'], normalized['currency'],
+            normalized['account_id'], normalized['description'], normalized['external_id'])
+        return normalized
+    
+    def _check_rows(self, conn: sqlite3.Connection, rows: Sequence[Dict]):
+        """驗證批次交易的分類與帳戶 (相同的組合只查詢一次)"""
+        for category_id, transaction_type in {(row['category_id'], row['type']) for row in rows}:
+            self._check_category(conn, category_id, transaction_type)
+        for account_id, currency in {(row['account_id'], row['currency']) for row in rows}:
+            self._check_account(conn, account_id, currency)
+    
+    def _insert_many(self, conn: sqlite3.Connection, rows: Sequence[Dict]) -> int:
+        """
+        在呼叫端的寫入交易中批次新增交易 (executemany，並同步帳戶餘額)
+        
+        Args:
+            rows: 經 _normalize_row 正規化且已驗證的交易
+        
+        Returns:
+            新增的筆數
+        """
+        placeholders = ', '.join('?' * len(self._BULK_COLUMNS))
+        conn.executemany(
+            f'INSERT INTO transactions ({", ".join(self._BULK_COLUMNS)}) VALUES ({placeholders})',
+            [[row[column] for column in self._BULK_COLUMNS] for row in rows])
+        self._post_many(conn, rows)
+        return len(rows)
+    
+    def _bulk_groups(self, rows: Sequence[Dict]) -> List[List[Dict]]:
+        """將批次交易分成可在單一寫入交易中寫入的組 (單一資料庫不需分組)"""
+        return [list(rows)]
+    
+    # 配置交易 ID 的 AUTOINCREMENT 資料表
+    _ID_SEQUENCE_TABLE = 'transactions'
+    
+    def _last_transaction_id(self) -> int:
+        """目前已配置的最大交易 ID (ID 只增不減，可作為「此時已存在的交易」的界線)"""
+        row = self.db_manager.query_one('SELECT seq FROM sqlite_sequence WHERE name = ?',
+                                        (self._ID_SEQUENCE_TABLE,))
+        return row['seq'] if row else 0
+    
+    def _match_tables(self, conn: sqlite3.Connection, rows: Sequence[Dict]) -> List[str]:
+        """比對重複時要查詢的交易資料表 (需在寫入交易開始前掛載)"""
+        return ['transactions']
+    
+    def _match_existing(self, conn: sqlite3.Connection, rows: Sequence[Dict], before_id: int,
+                        near_days: int = 0) -> Tuple[Set[int], Dict[int, List[Dict]]]:
+        """
+        以集合運算比對批次交易與既有交易 (在呼叫端的寫入交易中、寫入之前執行)
+        
+        整批的指紋先寫入暫存表，再與 transactions 的指紋索引做一次反連接 (anti-join)，
+        不需逐筆查詢；近似重複以 (amount, date) 索引找出類型、金額與幣別相同、
+        日期相差 near_days 天以內的交易。只比對 ID 不大於 before_id 的交易，
+        同一次匯入中內容相同的交易 (例如同一天兩筆相同的消費) 不會互相排除。
+        
+        Args:
+            rows: 經 _normalize_row 正規化的交易
+            before_id: 比對的交易 ID 上限 (匯入開始時的 _last_transaction_id)
+            near_days: 近似重複的日期範圍 (0 表示不檢查)
+        
+        Returns:
+            (重複的交易在 rows 中的位置, {位置: [近似的既有交易 (id, date, amount, description)]})；
+            已重複的交易不列入近似重複
+        """
+        tables = self._match_tables(conn, rows)
+        conn.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS import_staging (
+                position INTEGER PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                date TEXT NOT NULL,
+                type TEXT NOT NULL,
+                amount REAL NOT NULL,
+                currency TEXT NOT NULL
+            )
+        ''')
+        conn.execute('DELETE FROM temp.import_staging')
+        conn.executemany(
+            'INSERT INTO temp.import_staging VALUES (?, ?, ?, ?, ?, ?)',
+            [(position, row['fingerprint'], row['date'], row['type'], row['amount'], row['currency'])
+             for position, row in enumerate(rows)])
+        
+        duplicates: Set[int] = set()
+        for table in tables:
+            duplicates.update(row[0] for row in conn.execute(f'''
+                SELECT s.position FROM temp.import_staging s
+                WHERE EXISTS (SELECT 1 FROM {table} t WHERE t.fingerprint = s.fingerprint AND t.id <= ?)
+            ''', (before_id,)))
+        
+        near: Dict[int, List[Dict]] = {}
+        if near_days > 0:
+            for table in tables:
+                for row in conn.execute(f'''
+                    SELECT s.position, t.id, t.date, t.amount, t.description
+                    FROM temp.import_staging s
+                    JOIN {table} t ON t.amount = s.amount
+                        AND t.date BETWEEN date(s.date, ?) AND date(s.date, ?)
+                    WHERE t.type = s.type AND t.currency = s.currency AND t.id <= ?
+                    ORDER BY s.position, t.date, t.id
+                ''', (f'-{near_days} days', f'+{near_days} days', before_id)):
+                    if row['position'] not in duplicates:
+                        near.setdefault(row['position'], []).append(
+                            {key: row[key] for key in ('id', 'date', 'amount', 'description')})
+        conn.execute('DELETE FROM temp.import_staging')
+        return duplicates, near
+    
+    def add_transactions_bulk(self, rows: Sequence[Dict]) -> int:
+        """
+        在單一寫入交易中批次新增交易記錄
+        
+        Args:
+            rows: 交易列表，每個項目包含 date, type, category_id, amount，
+                  可選 description, currency, account_id, recurring_rule_id, external_id
+        
+        Returns:
+            新增的筆數，失敗時回傳 0 (任何一筆驗證失敗時拋出 ValueError，全部不寫入)
+        """
+        rows = [self._normalize_row(row) for row in rows]
+        if not rows:
+            return 0
+        
+        def insert(conn):
+            self._check_rows(conn, rows)
+            return self._insert_many(conn, rows)
+        
+        try:
+            count = self.db_manager.run_write(insert)
+            logger.debug("成功批次新增 %d 筆交易記錄", count, extra={'event': 'transactions_bulk_added'})
+            return count
+        except sqlite3.Error as e:
+            logger.error("批次新增交易記錄錯誤：%s", e, extra={'event': 'transaction_add_failed'})
+            return 0
+    
+    def _recategorize(self, conn: sqlite3.Connection, changes: Dict[int, int],
+                      table: str = 'transactions') -> int:
+        """
+        在呼叫端的寫入交易中批次變更交易的分類 (支出的預算計數器與分類建議的計數由原分類移到新分類)
+        
+        Args:
+            changes: {交易ID: 新分類ID}
+            table: 交易所在的資料表
+        
+        Returns:
+            變更的筆數 (分類相同或不存在的交易不計)
+        """
+        ids = list(changes)
+        rows = []
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            rows.extend(dict(row) for row in conn.execute(f'''
+                SELECT id, date, type, category_id, amount, currency, description FROM {table}
+                WHERE id IN ({','.join('?' * len(batch))})
+            ''', batch))
+        rows = [row for row in rows if row['category_id'] != changes[row['id']]]
+        for category_id, transaction_type in {(changes[row['id']], row['type']) for row in rows}:
+            self._check_category(conn, category_id, transaction_type)
+        
+        conn.executemany(f'UPDATE {table} SET category_id = ? WHERE id = ?',
+                         [(changes[row['id']], row['id']) for row in rows])
+        expenses = [row for row in rows if row['type'] == 'expense']
+        conn.executemany(self._BUDGET_SPEND_SQL,
+                         [self._budget_spend_params(row, -1) for row in expenses] +
+                         [self._budget_spend_params(dict(row, category_id=changes[row['id']]), 1)
+                          for row in expenses])
+        self._learn(conn, rows, -1)
+        self._learn(conn, [dict(row, category_id=changes[row['id']]) for row in rows], 1)
+        return len(rows)
+    
+    def set_categories(self, changes: Dict[int, int]) -> int:
+        """
+        在單一寫入交易中批次變更交易的分類
+        
+        Args:
+            changes: {交易ID: 新分類ID} (新分類的類型需與交易相同，否則拋出 ValueError)
+        
+        Returns:
+            變更的筆數，失敗時回傳 0
+        """
+        if not changes:
+            return 0
+        try:
+            count = self.db_manager.run_write(lambda conn: self._recategorize(conn, changes))
+            logger.debug("成功變更 %d 筆交易的分類", count, extra={'event': 'transactions_recategorized'})
+            return count
+        except sqlite3.Error as e:
+            logger.error("變更交易分類錯誤：%s", e, extra={'event': 'transaction_update_failed'})
+            return 0
+    
+    @staticmethod
+    def _mark_reconciled(conn: sqlite3.Connection, transaction_ids: Sequence[int], reconciled: bool,
+                         table: str = 'transactions') -> int:
+        """在呼叫端的寫入交易中設定交易的對帳狀態 (回傳實際變更的筆數)"""
+        ids = list(transaction_ids)
+        count = 0
+        for start in range(0, len(ids), TransactionManager._IDS_CHUNK_SIZE):
+            chunk = ids[start:start + TransactionManager._IDS_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            count += conn.execute(f'''
+                UPDATE {table} SET reconciled = ? WHERE id IN ({placeholders}) AND reconciled != ?
+            ''', [int(reconciled), *chunk, int(reconciled)]).rowcount
+        return count
+    
+    def set_reconciled(self, transaction_ids: Sequence[int], reconciled: bool = True) -> int:
+        """
+        在單一寫入交易中標記 (或取消標記) 交易為已對帳
+        
+        Args:
+            transaction_ids: 交易ID列表
+            reconciled: True 為已對帳，False 為取消
+        
+        Returns:
+            變更的筆數，失敗時回傳 0
+        """
+        if not transaction_ids:
+            return 0
+        try:
+            count = self.db_manager.run_write(lambda conn: self._mark_reconciled(conn, transaction_ids, reconciled))
+            logger.debug("成功變更 %d 筆交易的對帳狀態", count, extra={'event': 'transactions_reconciled'})
+            return count
+        except sqlite3.Error as e:
+            logger.error("變更對帳狀態錯誤：%s", e, extra={'event': 'transaction_update_failed'})
+            return 0
+    
+    @staticmethod
+    def _fetch_unreconciled(conn: sqlite3.Connection, start_date: str, end_date: str,
+                            account_id: Optional[int]) -> List[Dict]:
+        """查詢日期範圍內尚未對帳的交易 (id, date, type, amount, currency, account_id, description, external_id)"""
+        account_filter = 'AND account_id = ?' if account_id is not None else ''
+        cursor = conn.execute(f'''
+            SELECT id, date, type, amount, currency, account_id, description, external_id FROM transactions
+            WHERE reconciled = 0 AND date >= ? AND date <= ? {account_filter}
+            ORDER BY date, id
+        ''', [start_date, end_date] + ([account_id] if account_id is not None else []))
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def _unreconciled(self, start_date: str, end_date: str, account_id: Optional[int] = None) -> List[Dict]:
+        """取得日期範圍內尚未對帳的交易 (查詢失敗時直接拋出 sqlite3.Error)"""
+        return self._read(lambda conn: self._fetch_unreconciled(conn, start_date, end_date, account_id),
+                          start_date, end_date)
+    
+    @staticmethod
+    def _fetch_category_rows(conn: sqlite3.Connection, category_ids: Sequence[int], after_id: int,
+                             limit: int) -> List[Dict]:
+        """依 ID 順序查詢指定分類中 ID 大於 after_id 的交易 (id, date, type, category_id, amount, description)"""
+        placeholders = ','.join('?' * len(category_ids))
+        cursor = conn.execute(f'''
+            SELECT id, date, type, category_id, amount, description FROM transactions
+            WHERE category_id IN ({placeholders}) AND id > ?
+            ORDER BY id
+            LIMIT ?
+        ''', [*category_ids, after_id, limit])
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def _scan_category_rows(self, read: Callable, category_ids: Sequence[int],
+                            batch_size: int) -> Iterator[List[Dict]]:
+        """以 ID 為游標 (keyset) 分批讀取，處理中的批次被修改也不會重複或遺漏"""
+        after_id = 0
+        while True:
+            rows = read(lambda conn: self._fetch_category_rows(conn, category_ids, after_id, batch_size))
+            if not rows:
+                return
+            yield rows
+            after_id = rows[-1]['id']
+    
+    def _iter_category_rows(self, category_ids: Sequence[int], batch_size: int = 5000) -> Iterator[List[Dict]]:
+        """分批讀取指定分類的所有交易 (查詢失敗時直接拋出 sqlite3.Error)"""
+        return self._scan_category_rows(self._read, category_ids, batch_size)
     
     def get_transactions(self, limit: int = 100, offset: int = 0) -> List[Dict]:
         """取得交易記錄列表"""
-        conn = self.db_manager.get_connection()
         try:
-            cursor = conn.execute('''
-                SELECT 
-                    t.id,
-                    t.date,
-                    t.type,
-                    t.amount,
-                    t.description,
-                    c.name as category_name
-                FROM transactions t
-                LEFT JOIN categories c ON t.category_id = c.id
+            return self.db_manager.query(self._SELECT_COLUMNS + '''
                 ORDER BY t.date DESC, t.created_at DESC
                 LIMIT ? OFFSET ?
             ''', (limit, offset))
-            
-            return [dict(row) for row in cursor.fetchall()]
         except sqlite3.Error as e:
-            print(f"查詢交易記錄錯誤：{e}")
+            logger.error("查詢交易記錄錯誤：%s", e, extra={'event': 'query_failed'})
             return []
-        finally:
-            conn.close()
+    
+    def get_transaction(self, transaction_id: int) -> Optional[Dict]:
+        """依 ID 取得單筆交易記錄，不存在時回傳 None"""
+        def fetch(conn):
+            row = conn.execute(self._SELECT_COLUMNS + 'WHERE t.id = ?', (transaction_id,)).fetchone()
+            return dict(row) if row else None
+        
+        try:
+            return self._read(fetch, ids=[transaction_id])
+        except sqlite3.Error as e:
+            logger.error("查詢交易記錄 ID %s 錯誤：%s", transaction_id, e, extra={'event': 'query_failed'})
+            return None
+    
+    def get_transactions_by_ids(self, transaction_ids: List[int]) -> List[Dict]:
+        """
+        依 ID 批次取得交易記錄
+        
+        Args:
+            transaction_ids: 交易記錄 ID 列表（不存在的 ID 會被略過）
+        
+        Returns:
+            交易記錄列表，依日期由新到舊排序
+        """
+        ids = list(dict.fromkeys(transaction_ids))
+        if not ids:
+            return []
+        
+        try:
+            results = self._read(lambda conn: self._fetch_by_ids(conn, ids), ids=ids)
+            results.sort(key=lambda t: (t['date'], t['id']), reverse=True)
+            return results
+        except sqlite3.Error as e:
+            logger.error("批次查詢交易記錄錯誤：%s", e, extra={'event': 'query_failed'})
+            return []
+    
+    def _fetch_by_ids(self, conn: sqlite3.Connection, ids: List[int]) -> List[Dict]:
+        """以 IN (...) 分批查詢交易記錄 (未排序)"""
+        results = []
+        for start in range(0, len(ids), self._IDS_CHUNK_SIZE):
+            chunk = ids[start:start + self._IDS_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            cursor = conn.execute(
+                self._SELECT_COLUMNS + f'WHERE t.id IN ({placeholders})',
+                chunk
+            )
+            results.extend(dict(row) for row in cursor.fetchall())
+        return results
+    
+    def _fetch_by_date_range(self, conn: sqlite3.Connection, start_date: str, end_date: str) -> List[Dict]:
+        """查詢日期範圍內的交易記錄 (由新到舊)"""
+        cursor = conn.execute(self._SELECT_COLUMNS + '''
+            WHERE t.date >= ? AND t.date <= ?
+            ORDER BY t.date DESC, t.created_at DESC
+        ''', (start_date, end_date))
+        return [dict(row) for row in cursor.fetchall()]
     
     def get_transactions_by_date_range(self, start_date: str, end_date: str) -> List[Dict]:
         """取得指定日期範圍的交易記錄"""
-        conn = self.db_manager.get_connection()
         try:
-            cursor = conn.execute('''
-                SELECT 
-                    t.id,
-                    t.date,
-                    t.type,
-                    t.amount,
-                    t.description,
-                    c.name as category_name
-                FROM transactions t
-                LEFT JOIN categories c ON t.category_id = c.id
-                WHERE t.date >= ? AND t.date <= ?
-                ORDER BY t.date DESC, t.created_at DESC
-            ''', (start_date, end_date))
-            
-            return [dict(row) for row in cursor.fetchall()]
+            return self._read(lambda conn: self._fetch_by_date_range(conn, start_date, end_date),
+                              start_date, end_date)
         except sqlite3.Error as e:
-            print(f"查詢日期範圍交易記錄錯誤：{e}")
+            logger.error("查詢日期範圍交易記錄錯誤：%s", e, extra={'event': 'query_failed'})
             return []
-        finally:
-            conn.close()
+    
+    @staticmethod
+    def _filter_clause(filters: Optional[Dict]) -> Tuple[str, List]:
+        """
+        將列表的篩選條件轉為 WHERE 條件 (與主視窗的篩選相同)
+        
+        Args:
+            filters: 可包含 start_date, end_date, type ('all' 表示不限)、
+                     category (分類名稱，'全部分類' 表示不限)、keyword (備註包含的小寫文字)
+        """
+        filters = filters or {}
+        # 類型與分類前加 + 不使用其索引，讓查詢沿日期索引依序讀取 (不需每批重新排序)
+        clauses, params = ['1 = 1'], []
+        if filters.get('start_date'):
+            clauses.append('t.date >= ?')
+            params.append(filters['start_date'])
+        if filters.get('end_date'):
+            clauses.append('t.date <= ?')
+            params.append(filters['end_date'])
+        if filters.get('type', 'all') != 'all':
+            clauses.append('+t.type = ?')
+            params.append(filters['type'])
+        if filters.get('category') and filters['category'] != '全部分類':
+            clauses.append('+c.name = ?')
+            params.append(filters['category'])
+        if filters.get('keyword'):
+            clauses.append("instr(lower(COALESCE(t.description, '')), ?) > 0")
+            params.append(filters['keyword'].lower())
+        return ' AND '.join(clauses), params
+    
+    def _fetch_filtered(self, conn: sqlite3.Connection, where: str, params: List,
+                        after: Optional[Tuple[str, int]], limit: int) -> List[Dict]:
+        """依 (日期, ID) 由新到舊查詢在 after 之後的一批交易"""
+        if after is not None:
+            where += ' AND t.date <= ? AND (t.date < ? OR t.id < ?)'
+            params = params + [after[0], after[0], after[1]]
+        cursor = conn.execute(self._SELECT_COLUMNS + f'''
+            WHERE {where}
+            ORDER BY t.date DESC, t.id DESC
+            LIMIT ?
+        ''', params + [limit])
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def _scan_transactions(self, read: Callable, filters: Optional[Dict], batch_size: int) -> Iterator[List[Dict]]:
+        """以 (日期, ID) 為游標 (keyset) 分批讀取，每批一次查詢，記憶體只保留一批"""
+        where, params = self._filter_clause(filters)
+        after = None
+        while True:
+            rows = read(lambda conn: self._fetch_filtered(conn, where, params, after, batch_size))
+            if not rows:
+                return
+            yield rows
+            after = (rows[-1]['date'], rows[-1]['id'])
+    
+    def iter_transactions(self, filters: Optional[Dict] = None, batch_size: int = 5000) -> Iterator[List[Dict]]:
+        """
+        分批讀取符合篩選條件的所有交易 (由新到舊，欄位與 get_transactions 相同)
+        
+        Args:
+            filters: 篩選條件 (見 _filter_clause，None 為全部)
+            batch_size: 每批筆數
+        
+        Yields:
+            一批交易；查詢失敗時直接拋出 sqlite3.Error
+        """
+        filters = filters or {}
+        return self._scan_transactions(
+            lambda operation: self._read(operation, filters.get('start_date') or None, filters.get('end_date') or None),
+            filters, batch_size)
+    
+    def count_transactions(self, filters: Optional[Dict] = None) -> int:
+        """符合篩選條件的交易筆數 (查詢失敗時回傳 0)"""
+        where, params = self._filter_clause(filters)
+        filters = filters or {}
+        try:
+            return self._read(lambda conn: self._fetch_count(conn, where, params),
+                              filters.get('start_date') or None, filters.get('end_date') or None)
+        except sqlite3.Error as e:
+            logger.error("查詢交易筆數錯誤：%s", e, extra={'event': 'query_failed'})
+            return 0
+    
+    @staticmethod
+    def _fetch_count(conn: sqlite3.Connection, where: str, params: List) -> int:
+        return conn.execute(f'''
+            SELECT COUNT(*) FROM transactions t
+            LEFT JOIN categories c ON t.category_id = c.id
+            WHERE {where}
+        ''', params).fetchone()[0]
+    
+    @staticmethod
+    def _fetch_filtered_totals(conn: sqlite3.Connection, where: str, params: List) -> List[Dict]:
+        """查詢符合條件的交易每月、每類型、每分類的筆數與基準幣別合計"""
+        cursor = conn.execute(f'''
+            SELECT substr(t.date, 1, 7) as period, t.type, c.name as category_name,
+                   COUNT(*) as count, ROUND(SUM({converted_amount_sql('t')}), 2) as total
+            FROM transactions t
+            LEFT JOIN categories c ON t.category_id = c.id
+            WHERE {where}
+            GROUP BY period, t.type, t.category_id
+        ''', params)
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def _filtered_totals(self, filters: Optional[Dict] = None) -> List[Dict]:
+        """
+        取得符合篩選條件的交易依 (月份, 類型, 分類) 彙總的筆數與合計 (供匯出的摘要工作表)
+        
+        與 iter_transactions 一致，不含封存彙總。查詢失敗時直接拋出 sqlite3.Error。
+        """
+        where, params = self._filter_clause(filters)
+        filters = filters or {}
+        return self._read(lambda conn: self._fetch_filtered_totals(conn, where, params),
+                          filters.get('start_date') or None, filters.get('end_date') or None)
     
     def update_transaction(self, transaction_id: int, date: str, 
                           transaction_type: str, category_id: int, 
-                          amount: float, description: str = '') -> bool:
-        """更新交易記錄"""
+                          amount: float, description: str = '',
+                          currency: str = BASE_CURRENCY, account_id: Optional[int] = None) -> bool:
+        """更新交易記錄 (帳戶餘額先沖回原交易再記入新內容)"""
         if transaction_type not in ['income', 'expense']:
             raise ValueError("交易類型必須是 'income' 或 'expense'")
         
         if amount <= 0:
             raise ValueError("金額必須大於 0")
         
-        conn = self.db_manager.get_connection()
-        try:
-            # 驗證分類類型匹配
-            cursor = conn.execute(
-                'SELECT type FROM categories WHERE id = ?',
-                (category_id,)
-            )
-            category = cursor.fetchone()
-            
-            if not category:
-                raise ValueError(f"分類 ID {category_id} 不存在")
+        currency = self._normalize_currency(currency)
+        
+        values = {'date': date, 'type': transaction_type, 'category_id': category_id, 'amount': round(amount, 2),
+                  'currency': currency, 'account_id': account_id, 'description': description}
+        
+        def update(conn):
+            self._check_category(conn, category_id, transaction_type)
+            self._check_account(conn, account_id, currency)
             
-            if category['type'] != transaction_type:
-                raise ValueError(f"分類類型不匹配")
+            old = conn.execute(
+                'SELECT date, type, category_id, amount, currency, account_id, description FROM transactions WHERE id = ?',
+                (transaction_id,)).fetchone()
+            if old is None:
+                return 0
             
-            # 更新交易記錄
-            cursor = conn.execute('''
+            # 更新交易記錄 (依匯入時的外部 ID 重新計算指紋，帳戶變更後改以新帳戶識別)
+            conn.execute('''
                 UPDATE transactions 
-                SET date = ?, type = ?, category_id = ?, amount = ?, description = ?
+                SET date = ?, type = ?, category_id = ?, amount = ?, description = ?, currency = ?, account_id = ?,
+                    fingerprint = transaction_fingerprint(?, ?, ?, ?, ?, ?, external_id)
                 WHERE id = ?
-            ''', (date, transaction_type, category_id, round(amount, 2), description, transaction_id))
-            
-            if cursor.rowcount == 0:
-                print(f"交易記錄 ID {transaction_id} 不存在")
+            ''', (date, transaction_type, category_id, values['amount'], description, currency, account_id,
+                  date, transaction_type, values['amount'], currency, account_id, description,
+                  transaction_id))
+            self._post(conn, old, -1)
+            self._post(conn, values, 1)
+            return 1
+        
+        try:
+            if self.db_manager.run_write(update) == 0:
+                logger.warning("交易記錄 ID %s 不存在", transaction_id, extra={'event': 'transaction_not_found'})
                 return False
             
-            conn.commit()
-            print(f"成功更新交易記錄 ID {transaction_id}")
+            logger.debug("成功更新交易記錄 ID %s", transaction_id, extra={'event': 'transaction_updated'})
             return True
             
         except sqlite3.Error as e:
-            print(f"更新交易記錄錯誤：{e}")
+            logger.error("更新交易記錄錯誤：%s", e, extra={'event': 'transaction_update_failed'})
             return False
-        finally:
-            conn.close()
     
     def delete_transaction(self, transaction_id: int) -> bool:
-        """刪除交易記錄"""
-        conn = self.db_manager.get_connection()
+        """刪除交易記錄 (同時沖回帳戶餘額)"""
+        def delete(conn):
+            old = conn.execute(
+                'SELECT date, type, category_id, amount, currency, account_id, description FROM transactions WHERE id = ?',
+                (transaction_id,)).fetchone()
+            if old is None:
+                return 0
+            conn.execute('DELETE FROM transactions WHERE id = ?', (transaction_id,))
+            self._post(conn, old, -1)
+            return 1
+        
         try:
-            cursor = conn.execute(
-                'DELETE FROM transactions WHERE id = ?',
-                (transaction_id,)
-            )
-            
-            if cursor.rowcount == 0:
-                print(f"交易記錄 ID {transaction_id} 不存在")
+            if self.db_manager.run_write(delete) == 0:
+                logger.warning("交易記錄 ID %s 不存在", transaction_id, extra={'event': 'transaction_not_found'})
                 return False
             
-            conn.commit()
-            print(f"成功刪除交易記錄 ID {transaction_id}")
+            logger.debug("成功刪除交易記錄 ID %s", transaction_id, extra={'event': 'transaction_deleted'})
             return True
             
         except sqlite3.Error as e:
-            print(f"刪除交易記錄錯誤：{e}")
+            logger.error("刪除交易記錄錯誤：%s", e, extra={'event': 'transaction_delete_failed'})
             return False
-        finally:
-            conn.close()
+    
+    def _fetch_monthly_net(self, conn: sqlite3.Connection, start_date: str, end_date: str,
+                           account_id: Optional[int]) -> Dict[str, float]:
+        """查詢日期範圍內每月的收入減支出 {YYYY-MM: 淨額}"""
+        if account_id is None:
+            amount, condition, params = converted_amount_sql('t'), '', (start_date, end_date)
+        else:
+            amount, condition, params = 't.amount', 'AND t.account_id = ?', (start_date, end_date, account_id)
+        cursor = conn.execute(f'''
+            SELECT substr(t.date, 1, 7) as period,
+                   SUM(CASE WHEN t.type = 'income' THEN {amount} ELSE -{amount} END) as net
+            FROM transactions t
+            WHERE t.date >= ? AND t.date <= ? {condition}
+            GROUP BY period
+        ''', params)
+        return {row['period']: float(row['net']) for row in cursor.fetchall()}
+    
+    def _monthly_net(self, start_date: str, end_date: str, account_id: Optional[int] = None) -> Dict[str, float]:
+        """
+        取得日期範圍內每月的收入減支出 (供餘額檢查點計算，不含封存彙總與轉帳)
+        
+        未指定帳戶時換算為基準幣別；指定帳戶時只計入該帳戶的交易並使用原幣別金額。
+        查詢失敗時直接拋出 sqlite3.Error，避免呼叫端快取不完整的結果。
+        """
+        return self._read(lambda conn: self._fetch_monthly_net(conn, start_date, end_date, account_id),
+                          start_date, end_date)
+    
+    def _first_date(self) -> Optional[str]:
+        """取得最早一筆交易的日期 (沒有交易時回傳 None)"""
+        return self._read(lambda conn: conn.execute('SELECT MIN(date) FROM transactions').fetchone()[0])
+    
+    def _fetch_category_spend(self, conn: sqlite3.Connection, category_ids: Sequence[int],
+                              start_date: Optional[str], end_date: Optional[str]) -> List[Tuple[int, str, float]]:
+        """查詢分類每月的支出合計 [(分類ID, YYYY-MM, 基準幣別金額)]"""
+        placeholders = ','.join('?' * len(category_ids))
+        cursor = conn.execute(f'''
+            SELECT t.category_id, substr(t.date, 1, 7) as period, ROUND(SUM({converted_amount_sql('t')}), 2) as total
+            FROM transactions t
+            WHERE t.type = 'expense' AND t.category_id IN ({placeholders})
+              AND t.date >= ? AND t.date <= ?
+            GROUP BY t.category_id, period
+        ''', [*category_ids, start_date or '0000-01-01', end_date or '9999-12-31'])
+        return [(row['category_id'], row['period'], float(row['total'])) for row in cursor.fetchall()]
+    
+    def _category_spend(self, category_ids: Sequence[int], start_date: Optional[str] = None,
+                        end_date: Optional[str] = None) -> List[Tuple[int, str, float]]:
+        """
+        取得分類每月的支出合計 (供重建預算計數器，不含封存彙總)
+        
+        查詢失敗時直接拋出 sqlite3.Error。
+        """
+        return self._read(lambda conn: self._fetch_category_spend(conn, category_ids, start_date, end_date),
+                          start_date, end_date)
+    
+    @staticmethod
+    def _fetch_description_usage(conn: sqlite3.Connection) -> List[Tuple[str, str, int]]:
+        """查詢每個備註每月的使用次數 [(備註, YYYY-MM, 次數)]"""
+        cursor = conn.execute('''
+            SELECT description, substr(date, 1, 7) as period, COUNT(*) as count FROM transactions
+            WHERE description IS NOT NULL AND description != ''
+            GROUP BY description, period
+        ''')
+        return [(row['description'], row['period'], row['count']) for row in cursor.fetchall()]
+    
+    def _description_usage(self) -> List[Tuple[str, str, int]]:
+        """取得每個備註每月的使用次數 (供備註自動完成建立索引，查詢失敗時直接拋出 sqlite3.Error)"""
+        return self._read(self._fetch_description_usage)
+    
+    @staticmethod
+    def _fetch_category_totals(conn: sqlite3.Connection, transaction_type: str, start_date: str, end_date: str,
+                               summaries: bool = True) -> Dict[str, float]:
+        """查詢各分類的基準幣別金額合計，依金額由大到小排序 (summaries 為 True 時加上封存的月度彙總)"""
+        summary_select = '''
+                    UNION ALL
+                    SELECT category_id, SUM(total) as total
+                    FROM transaction_summaries
+                    WHERE type = ? AND period >= ? AND period <= ?
+                    GROUP BY category_id''' if summaries else ''
+        cursor = conn.execute(f'''
+                SELECT c.name as category_name, SUM(amounts.total) as total
+                FROM (
+                    SELECT t.category_id, SUM({converted_amount_sql('t')}) as total
+                    FROM transactions t
+                    WHERE t.type = ? AND t.date >= ? AND t.date <= ?
+                    GROUP BY t.category_id{summary_select}
+                ) amounts
+                LEFT JOIN categories c ON amounts.category_id = c.id
+                GROUP BY amounts.category_id
+                ORDER BY total DESC
+            ''', (transaction_type, start_date, end_date)
+                 + ((transaction_type, start_date[:7], end_date[:7]) if summaries else ()))
+        return {row['category_name']: float(row['total']) for row in cursor.fetchall()}
+    
+    def _category_totals(self, transaction_type: str, start_date: str, end_date: str) -> Dict[str, float]:
+        """各分類的金額合計 (含封存彙總，查詢失敗時直接拋出 sqlite3.Error)"""
+        return self._read(lambda conn: self._fetch_category_totals(conn, transaction_type, start_date, end_date),
+                          start_date, end_date)
+    
+    @staticmethod
+    def _fetch_month_totals(conn: sqlite3.Connection, start_date: str, end_date: str,
+                            period: Optional[str]) -> Tuple[float, float]:
+        """查詢 [start_date, end_date) 的基準幣別收入與支出合計 (period 不為 None 時加上該月的封存彙總)"""
+        totals = []
+        for transaction_type in ('income', 'expense'):
+            cursor = conn.execute(f'''
+                SELECT COALESCE(SUM({converted_amount_sql('t')}), 0) + (
+                    SELECT COALESCE(SUM(total), 0) FROM transaction_summaries
+                    WHERE type = ? AND period = ?
+                ) as total
+                FROM transactions t
+                WHERE t.type = ? AND t.date >= ? AND t.date < ?
+            ''', (transaction_type, period, transaction_type, start_date, end_date))
+            totals.append(cursor.fetchone()['total'])
+        return totals[0], totals[1]
+    
+    def _month_totals(self, start_date: str, end_date: str) -> Tuple[float, float]:
+        """[start_date, end_date) 的收入與支出合計 (含封存彙總，查詢失敗時直接拋出 sqlite3.Error)"""
+        return self._read(lambda conn: self._fetch_month_totals(conn, start_date, end_date, start_date[:7]),
+                          start_date, end_date)
+    
+    def get_category_totals(self, start_date: str, end_date: str,
+                            transaction_type: str = 'expense') -> Dict[str, float]:
+        """
+        取得日期範圍內各分類的金額合計
+        
+        已封存的月份以月度彙總計入 (月份與範圍重疊即計入整月)，
+        因此跨越封存期間的年度/月度報表結果不變。外幣交易在 SQL 中
+        依交易日匯率換算為基準幣別後加總。
+        
+        Args:
+            start_date: 開始日期 (YYYY-MM-DD)
+            end_date: 結束日期 (YYYY-MM-DD，包含)
+            transaction_type: 交易類型 ('income' 或 'expense')
+        
+        Returns:
+            {分類名稱: 金額合計}，依金額由大到小排序
+        """
+        if transaction_type not in ['income', 'expense']:
+            raise ValueError("交易類型必須是 'income' 或 'expense'")
+        
+        try:
+            return self._category_totals(transaction_type, start_date, end_date)
+        except sqlite3.Error as e:
+            logger.error("查詢分類合計錯誤：%s", e, extra={'event': 'query_failed'})
+            return {}
     
     def get_monthly_summary(self, year: int, month: int) -> Dict:
-        """取得月度統計摘要"""
+        """取得月度統計摘要 (金額換算為基準幣別)"""
         # 計算該月的起始和結束日期
         start_date = f"{year:04d}-{month:02d}-01"
         if month == 12:
@@ -342,23 +1747,9 @@ class TransactionManager:
         else:
             end_date = f"{year:04d}-{month+1:02d}-01"
         
-        conn = self.db_manager.get_connection()
         try:
-            # 查詢收入總額
-            cursor = conn.execute('''
-                SELECT COALESCE(SUM(amount), 0) as total_income
-                FROM transactions
-                WHERE type = 'income' AND date >= ? AND date < ?
-            ''', (start_date, end_date))
-            total_income = cursor.fetchone()['total_income']
-            
-            # 查詢支出總額
-            cursor = conn.execute('''
-                SELECT COALESCE(SUM(amount), 0) as total_expense
-                FROM transactions
-                WHERE type = 'expense' AND date >= ? AND date < ?
-            ''', (start_date, end_date))
-            total_expense = cursor.fetchone()['total_expense']
+            # 收入與支出總額 (含已封存的月度彙總)
+            total_income, total_expense = self._month_totals(start_date, end_date)
             
             # 計算結餘
             balance = total_income - total_expense
@@ -372,7 +1763,7 @@ class TransactionManager:
             }
             
         except sqlite3.Error as e:
-            print(f"查詢月度統計錯誤：{e}")
+            logger.error("查詢月度統計錯誤：%s", e, extra={'event': 'query_failed'})
             return {
                 'year': year,
                 'month': month,
@@ -380,13 +1771,12 @@ class TransactionManager:
                 'total_expense': 0.0,
                 'balance': 0.0
             }
-        finally:
-            conn.close()
 
 # 測試用的示例函數
 def test_database():
     """測試資料庫功能"""
     print("=== 測試資料庫功能 ===")
+    configure_logging(logging.DEBUG, sys.stdout)
     
     # 初始化資料庫
     db_manager = DatabaseManager("test_accounting.db")
@@ -0,0 +1,783 @@
+"""
+記帳應用程式 - 年度分區儲存
+每個年度的交易記錄存放在獨立的 SQLite 檔案，操作時只 ATTACH 涵蓋的年度
+"""
+
+import os
+import sqlite3
+import stat
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .log import get_logger
+from .models import (BASE_CURRENCY, FINGERPRINT_BACKFILL_SQL, TRANSACTION_ADDED_COLUMNS, DatabaseManager,
+                     TransactionManager, T, add_missing_columns, transaction_fingerprint)
+
+logger = get_logger('partitions')
+
+
+# 分區資料表欄位 (與主資料庫 transactions 相同，ID 由主資料庫統一配置)
+PARTITION_COLUMNS = ('id', 'date', 'type', 'category_id', 'amount', 'description', 'created_at', 'currency',
+                     'account_id', 'recurring_rule_id', 'external_id', 'fingerprint', 'reconciled')
+
+# 舊分區檔缺少的欄位在視圖中以預設值代替 (已結帳的年度是唯讀檔案，無法補欄位)
+PARTITION_COLUMN_DEFAULTS = {'currency': f"'{BASE_CURRENCY}'", 'reconciled': '0'}
+
+PARTITION_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {alias}.transactions (
+        id INTEGER PRIMARY KEY,
+        date DATE NOT NULL,
+        type TEXT NOT NULL CHECK (type IN ('income', 'expense')),
+        category_id INTEGER NOT NULL,
+        amount DECIMAL(10,2) NOT NULL CHECK (amount > 0),
+        description TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        currency TEXT NOT NULL DEFAULT 'TWD',
+        account_id INTEGER,
+        recurring_rule_id INTEGER,
+        external_id TEXT,
+        fingerprint TEXT,
+        reconciled INTEGER NOT NULL DEFAULT 0
+    )
+'''
+
+PARTITION_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS {alias}.idx_transactions_date ON transactions(date)',
+    'CREATE INDEX IF NOT EXISTS {alias}.idx_transactions_type ON transactions(type)',
+    'CREATE INDEX IF NOT EXISTS {alias}.idx_transactions_category ON transactions(category_id)',
+    'CREATE INDEX IF NOT EXISTS {alias}.idx_transactions_account ON transactions(account_id)',
+    'CREATE INDEX IF NOT EXISTS {alias}.idx_transactions_fingerprint ON transactions(fingerprint)',
+    'CREATE INDEX IF NOT EXISTS {alias}.idx_transactions_amount_date ON transactions(amount, date)',
+    'CREATE INDEX IF NOT EXISTS {alias}.idx_transactions_reconciled ON transactions(reconciled, date)',
+)
+
+
+def partition_path(db_path: str, year: int, partition_dir: Optional[str] = None) -> str:
+    """年度分區檔案路徑 ({資料庫名稱}_{年度}.db，預設與主資料庫在同一目錄)"""
+    db_path = os.path.abspath(db_path)
+    prefix = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(partition_dir or os.path.dirname(db_path), f"{prefix}_{year}.db")
+
+
+def list_partitions(db_path: str, partition_dir: Optional[str] = None) -> List[Dict]:
+    """
+    直接讀取資料庫檔案的分區清單 (供備份、還原與壓縮等檔案層級的操作，不需建立管理器)
+    
+    Returns:
+        分區列表 (由新到舊)，每個項目包含 year, closed, path；未啟用年度分區時為空列表
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        if conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'partitions'").fetchone() is None:
+            return []
+        rows = conn.execute('SELECT year, closed FROM partitions ORDER BY year DESC').fetchall()
+    finally:
+        conn.close()
+    return [{'year': year, 'closed': bool(closed), 'path': partition_path(db_path, year, partition_dir)}
+            for year, closed in rows]
+
+
+def is_partitioned(db_manager: DatabaseManager) -> bool:
+    """判斷資料庫是否已啟用年度分區"""
+    row = db_manager.query_one(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'partitions'"
+    )
+    return row is not None
+
+
+def create_transaction_manager(db_manager: DatabaseManager) -> TransactionManager:
+    """依資料庫是否已啟用年度分區，建立對應的交易記錄管理器"""
+    if is_partitioned(db_manager):
+        return PartitionedTransactionManager(db_manager)
+    return TransactionManager(db_manager)
+
+
+class PartitionedTransactionManager(TransactionManager):
+    """
+    年度分區交易記錄管理類別
+    
+    主資料庫保留分類、分區清單 (partitions) 與全域交易 ID 配置表 (transaction_ids)，
+    交易記錄依日期寫入 {資料庫名稱}_{年度}.db。每次操作只 ATTACH 日期範圍或交易 ID
+    涵蓋的年度，並建立名為 transactions 的 TEMP VIEW (UNION ALL) 遮蔽主資料庫的
+    同名資料表，因此跨年度報表可以沿用一般的 SQL。已結帳的年度設為唯讀，之後
+    不會再變動，備份時只需複製一次。
+    """
+    
+    # SQLite 預設每條連線最多 ATTACH 10 個資料庫
+    MAX_ATTACHED = 10
+    
+    def __init__(self, db_manager: DatabaseManager, partition_dir: Optional[str] = None):
+        """
+        初始化年度分區交易記錄管理器 (主資料庫中尚未分區的交易會自動搬移)
+        
+        Args:
+            db_manager: DatabaseManager 實例 (不支援群組提交模式)
+            partition_dir: 分區檔案目錄 (預設與主資料庫相同)
+        """
+        if db_manager.group_commit:
+            raise ValueError("年度分區不支援群組提交模式 (交易進行中無法 ATTACH 資料庫)")
+        
+        super().__init__(db_manager)
+        db_path = os.path.abspath(db_manager.db_path)
+        self.partition_dir = partition_dir or os.path.dirname(db_path)
+        
+        self._init_registry()
+        self.migrate_to_partitions()
+    
+    def _init_registry(self):
+        """在主資料庫建立分區清單與全域 ID 配置表"""
+        def create(conn):
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS partitions (
+                    year INTEGER PRIMARY KEY,
+                    closed INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS transaction_ids (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    year INTEGER NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_transaction_ids_year ON transaction_ids(year)')
+        
+        self.db_manager.run_write(create)
+    
+    # 分區清單
+    def get_partition_path(self, year: int) -> str:
+        """取得年度分區檔案路徑"""
+        return partition_path(self.db_manager.db_path, year, self.partition_dir)
+    
+    def get_partitions(self) -> List[Dict]:
+        """
+        取得所有分區
+        
+        Returns:
+            分區列表 (由新到舊)，每個項目包含 year, closed, path
+        """
+        rows = self.db_manager.query('SELECT year, closed FROM partitions ORDER BY year DESC')
+        return [{'year': row['year'], 'closed': bool(row['closed']),
+                 'path': self.get_partition_path(row['year'])} for row in rows]
+    
+    def _get_years(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[int]:
+        """取得與日期範圍重疊的已存在年度 (由新到舊)"""
+        sql = 'SELECT year FROM partitions WHERE 1 = 1'
+        params = []
+        if start_date:
+            sql += ' AND year >= ?'
+            params.append(int(start_date[:4]))
+        if end_date:
+            sql += ' AND year <= ?'
+            params.append(int(end_date[:4]))
+        return [row['year'] for row in self.db_manager.query(sql + ' ORDER BY year DESC', params)]
+    
+    def _get_years_for_ids(self, ids: Sequence[int]) -> Dict[int, int]:
+        """查詢交易 ID 所在的年度，回傳 {交易 ID: 年度}"""
+        def fetch(conn):
+            years = {}
+            for start in range(0, len(ids), self._IDS_CHUNK_SIZE):
+                chunk = ids[start:start + self._IDS_CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                cursor = conn.execute(
+                    f'SELECT id, year FROM transaction_ids WHERE id IN ({placeholders})', chunk)
+                years.update((row['id'], row['year']) for row in cursor.fetchall())
+            return years
+        
+        return self.db_manager.run_read(fetch)
+    
+    def _check_open(self, conn: sqlite3.Connection, year: int):
+        """已結帳的年度不可再修改"""
+        row = conn.execute('SELECT closed FROM partitions WHERE year = ?', (year,)).fetchone()
+        if row and row['closed']:
+            raise ValueError(f"{year} 年度已結帳，無法新增或修改交易記錄")
+    
+    # 連線上的分區掛載
+    @staticmethod
+    def _alias(year: int) -> str:
+        return f"y{year}"
+    
+    def _attach(self, conn: sqlite3.Connection, years: Iterable[int], create: bool = False):
+        """
+        將年度分區 ATTACH 到連線上 (必須在交易開始前呼叫)
+        
+        Args:
+            create: 分區不存在時建立資料表與索引 (寫入用)
+        
+        已掛載的年度會被略過 (同一個寫入交易可先比對重複再寫入)。
+        """
+        attached = {row[1] for row in conn.execute('PRAGMA database_list')}
+        for year in years:
+            alias = self._alias(year)
+            if alias in attached:
+                continue
+            conn.execute(f'ATTACH DATABASE ? AS {alias}', (self.get_partition_path(year),))
+            if create:
+                conn.execute(f'PRAGMA {alias}.auto_vacuum = INCREMENTAL')
+                conn.execute(PARTITION_SCHEMA.format(alias=alias))
+                if 'fingerprint' in add_missing_columns(conn, 'transactions', TRANSACTION_ADDED_COLUMNS, alias):
+                    conn.execute(FINGERPRINT_BACKFILL_SQL.format(table=f'{alias}.transactions'))
+                for index_sql in PARTITION_INDEXES:
+                    conn.execute(index_sql.format(alias=alias))
+    
+    @staticmethod
+    def _view_columns(conn: sqlite3.Connection, alias: str) -> str:
+        """分區的 SELECT 欄位清單 (舊分區缺少的欄位以預設值代替)"""
+        existing = {row[1] for row in conn.execute(f'PRAGMA {alias}.table_info(transactions)')}
+        return ', '.join(
+            column if column in existing else f"{PARTITION_COLUMN_DEFAULTS.get(column, 'NULL')} AS {column}"
+            for column in PARTITION_COLUMNS
+        )
+    
+    def _create_view(self, conn: sqlite3.Connection, years: Sequence[int]):
+        """建立遮蔽主資料庫 transactions 的 UNION ALL 暫存視圖"""
+        columns = ', '.join(PARTITION_COLUMNS)
+        # 主資料庫的 transactions 在分區後應為空，保留它讓沒有任何分區時視圖仍然有效
+        selects = [f'SELECT {columns} FROM main.transactions']
+        selects.extend(f'SELECT {self._view_columns(conn, self._alias(year))} FROM {self._alias(year)}.transactions'
+                       for year in years)
+        conn.execute('DROP VIEW IF EXISTS temp.transactions')
+        conn.execute(f'CREATE TEMP VIEW transactions AS {" UNION ALL ".join(selects)}')
+    
+    def _read_years(self, operation: Callable[[sqlite3.Connection], T], years: Sequence[int]) -> T:
+        """只掛載指定年度並以 UNION ALL 視圖執行讀取操作"""
+        if len(years) > self.MAX_ATTACHED:
+            raise ValueError(f"單次查詢最多涵蓋 {self.MAX_ATTACHED} 個年度")
+        
+        def run(conn):
+            self._attach(conn, years)
+            self._create_view(conn, years)
+            return operation(conn)
+        
+        return self.db_manager.run_read(run)
+    
+    def _read_batches(self, operation: Callable[[sqlite3.Connection], T],
+                      years: Sequence[int]) -> Iterator[T]:
+        """年度超過 ATTACH 上限時分批執行 (依傳入的年度順序)"""
+        for start in range(0, len(years), self.MAX_ATTACHED):
+            yield self._read_years(operation, years[start:start + self.MAX_ATTACHED])
+    
+    def _read(self, operation, start_date=None, end_date=None, ids=None):
+        """依日期範圍或交易 ID 只掛載需要的年度 (分區剪枝)"""
+        if ids is not None:
+            years = sorted(set(self._get_years_for_ids(list(ids)).values()), reverse=True)
+        else:
+            years = self._get_years(start_date, end_date)
+        return self._read_years(operation, years)
+    
+    def _bump_generation(self, conn: sqlite3.Connection):
+        """分區寫入不會觸發主資料庫的觸發器，手動遞增版本讓 ChangeMonitor 得知變更"""
+        conn.execute(
+            "UPDATE table_generations SET generation = generation + 1 WHERE table_name = 'transactions'"
+        )
+    
+    # 查詢
+    def get_transactions(self, limit: int = 100, offset: int = 0) -> List[Dict]:
+        """取得交易記錄列表 (由最新的年度往回讀，湊滿筆數即停止)"""
+        needed = limit + offset
+        
+        def fetch(conn):
+            return [dict(row) for row in conn.execute(self._SELECT_COLUMNS + '''
+                ORDER BY t.date DESC, t.created_at DESC
+                LIMIT ?
+            ''', (needed,)).fetchall()]
+        
+        try:
+            results = []
+            for year in self._get_years():
+                results.extend(self._read_years(fetch, [year]))
+                if len(results) >= needed:
+                    break
+            return results[offset:needed]
+        except sqlite3.Error as e:
+            logger.error("查詢交易記錄錯誤：%s", e, extra={'event': 'query_failed'})
+            return []
+    
+    def get_transactions_by_ids(self, transaction_ids: List[int]) -> List[Dict]:
+        """依 ID 批次取得交易記錄 (只讀取這些交易所在的年度)"""
+        ids = list(dict.fromkeys(transaction_ids))
+        if not ids:
+            return []
+        
+        try:
+            years = sorted(set(self._get_years_for_ids(ids).values()), reverse=True)
+            results = []
+            for batch in self._read_batches(lambda conn: self._fetch_by_ids(conn, ids), years):
+                results.extend(batch)
+            results.sort(key=lambda t: (t['date'], t['id']), reverse=True)
+            return results
+        except sqlite3.Error as e:
+            logger.error("批次查詢交易記錄錯誤：%s", e, extra={'event': 'query_failed'})
+            return []
+    
+    def get_transactions_by_date_range(self, start_date: str, end_date: str) -> List[Dict]:
+        """取得指定日期範圍的交易記錄 (只讀取範圍涵蓋的年度)"""
+        try:
+            results = []
+            # 年度由新到舊分批，串接後仍維持由新到舊的順序
+            for batch in self._read_batches(
+                    lambda conn: self._fetch_by_date_range(conn, start_date, end_date),
+                    self._get_years(start_date, end_date)):
+                results.extend(batch)
+            return results
+        except sqlite3.Error as e:
+            logger.error("查詢日期範圍交易記錄錯誤：%s", e, extra={'event': 'query_failed'})
+            return []
+    
+    def _monthly_net(self, start_date: str, end_date: str, account_id: Optional[int] = None) -> Dict[str, float]:
+        """每月淨額 (年度超過 ATTACH 上限時分批，月份不會跨年度因此可直接合併)"""
+        results = {}
+        for batch in self._read_batches(
+                lambda conn: self._fetch_monthly_net(conn, start_date, end_date, account_id),
+                self._get_years(start_date, end_date)):
+            results.update(batch)
+        return results
+    
+    def _category_spend(self, category_ids: Sequence[int], start_date: Optional[str] = None,
+                        end_date: Optional[str] = None) -> List:
+        """分類每月支出 (年度超過 ATTACH 上限時分批)"""
+        results = []
+        for batch in self._read_batches(
+                lambda conn: self._fetch_category_spend(conn, category_ids, start_date, end_date),
+                self._get_years(start_date, end_date)):
+            results.extend(batch)
+        return results
+    
+    def _unreconciled(self, start_date: str, end_date: str, account_id: Optional[int] = None) -> List[Dict]:
+        """未對帳的交易 (年度超過 ATTACH 上限時分批，合併後依日期與 ID 排序)"""
+        results = []
+        for batch in self._read_batches(
+                lambda conn: self._fetch_unreconciled(conn, start_date, end_date, account_id),
+                self._get_years(start_date, end_date)):
+            results.extend(batch)
+        results.sort(key=lambda t: (t['date'], t['id']))
+        return results
+    
+    def _summary_batches(self, operation: Callable[[sqlite3.Connection, bool], T],
+                         start_date: str, end_date: str) -> Iterator[T]:
+        """
+        年度超過 ATTACH 上限時分批執行含封存彙總的查詢
+        
+        operation(conn, summaries) 只在第一批收到 summaries=True，封存的月度彙總不會重複計入；
+        範圍內沒有任何分區時仍執行一次。
+        """
+        years = self._get_years(start_date, end_date)
+        for start in range(0, max(len(years), 1), self.MAX_ATTACHED):
+            yield self._read_years(lambda conn, first=start == 0: operation(conn, first),
+                                   years[start:start + self.MAX_ATTACHED])
+    
+    def _category_totals(self, transaction_type: str, start_date: str, end_date: str) -> Dict[str, float]:
+        """各分類的金額合計 (年度超過 ATTACH 上限時分批，合併後依金額由大到小排序)"""
+        totals: Dict[str, float] = {}
+        for batch in self._summary_batches(
+                lambda conn, summaries: self._fetch_category_totals(conn, transaction_type, start_date, end_date,
+                                                                    summaries),
+                start_date, end_date):
+            for name, total in batch.items():
+                totals[name] = totals.get(name, 0) + total
+        return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+    
+    def _month_totals(self, start_date: str, end_date: str) -> Tuple[float, float]:
+        """收入與支出合計 (年度超過 ATTACH 上限時分批)"""
+        income = expense = 0
+        for batch_income, batch_expense in self._summary_batches(
+                lambda conn, summaries: self._fetch_month_totals(conn, start_date, end_date,
+                                                                 start_date[:7] if summaries else None),
+                start_date, end_date):
+            income, expense = income + batch_income, expense + batch_expense
+        return income, expense
+    
+    def iter_transactions(self, filters: Optional[Dict] = None, batch_size: int = 5000) -> Iterator[List[Dict]]:
+        """分批讀取符合篩選條件的所有交易 (由新到舊，一次只掛載一個年度)"""
+        filters = filters or {}
+        for year in self._get_years(filters.get('start_date') or None, filters.get('end_date') or None):
+            yield from self._scan_transactions(lambda operation, year=year: self._read_years(operation, [year]),
+                                               filters, batch_size)
+    
+    def count_transactions(self, filters: Optional[Dict] = None) -> int:
+        """符合篩選條件的交易筆數 (年度超過 ATTACH 上限時分批)"""
+        where, params = self._filter_clause(filters)
+        filters = filters or {}
+        try:
+            return sum(self._read_batches(lambda conn: self._fetch_count(conn, where, params),
+                                          self._get_years(filters.get('start_date') or None,
+                                                          filters.get('end_date') or None)))
+        except sqlite3.Error as e:
+            logger.error("查詢交易筆數錯誤：%s", e, extra={'event': 'query_failed'})
+            return 0
+    
+    def _filtered_totals(self, filters: Optional[Dict] = None) -> List[Dict]:
+        """符合篩選條件的每月彙總 (年度超過 ATTACH 上限時分批，各年度的月份不重複)"""
+        where, params = self._filter_clause(filters)
+        filters = filters or {}
+        results = []
+        for batch in self._read_batches(lambda conn: self._fetch_filtered_totals(conn, where, params),
+                                        self._get_years(filters.get('start_date') or None,
+                                                        filters.get('end_date') or None)):
+            results.extend(batch)
+        return results
+    
+    def _description_usage(self) -> List:
+        """備註每月的使用次數 (年度超過 ATTACH 上限時分批)"""
+        results = []
+        for batch in self._read_batches(self._fetch_description_usage, self._get_years()):
+            results.extend(batch)
+        return results
+    
+    def _first_date(self) -> Optional[str]:
+        """由最舊的年度往後找第一筆交易的日期"""
+        for year in reversed(self._get_years()):
+            first = self._read_years(
+                lambda conn: conn.execute('SELECT MIN(date) FROM transactions').fetchone()[0], [year])
+            if first is not None:
+                return first
+        return None
+    
+    # 寫入
+    def _insert_row(self, conn: sqlite3.Connection, year: int, values: Dict):
+        """將一筆交易寫入年度分區 (分區需已掛載)"""
+        columns = [column for column in PARTITION_COLUMNS if column in values]
+        placeholders = ', '.join('?' * len(columns))
+        conn.execute(
+            f'INSERT INTO {self._alias(year)}.transactions ({", ".join(columns)}) VALUES ({placeholders})',
+            [values[column] for column in columns]
+        )
+    
+    def _insert_many(self, conn: sqlite3.Connection, rows: Sequence[Dict]) -> int:
+        """批次寫入各年度分區 (ID 由 transaction_ids 一次配置，AUTOINCREMENT 保證連號)"""
+        years = sorted({int(row['date'][:4]) for row in rows})
+        self._attach(conn, years, create=True)
+        for year in years:
+            self._check_open(conn, year)
+        
+        conn.executemany('INSERT OR IGNORE INTO partitions (year) VALUES (?)', [(year,) for year in years])
+        conn.executemany('INSERT INTO transaction_ids (year) VALUES (?)', [(int(row['date'][:4]),) for row in rows])
+        last_id = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transaction_ids'").fetchone()[0]
+        columns = ('id',) + self._BULK_COLUMNS
+        placeholders = ', '.join('?' * len(columns))
+        for year in years:
+            conn.executemany(
+                f'INSERT INTO {self._alias(year)}.transactions ({", ".join(columns)}) VALUES ({placeholders})',
+                [[last_id - len(rows) + 1 + index] + [row[column] for column in self._BULK_COLUMNS]
+                 for index, row in enumerate(rows) if int(row['date'][:4]) == year])
+        self._post_many(conn, rows)
+        self._bump_generation(conn)
+        return len(rows)
+    
+    def _bulk_groups(self, rows: Sequence[Dict]) -> List[List[Dict]]:
+        """依年度分組 (每個年度分別寫入，已結帳的年度不影響其他年度)"""
+        by_year: Dict[int, List[Dict]] = {}
+        for row in rows:
+            by_year.setdefault(int(row['date'][:4]), []).append(row)
+        return [by_year[year] for year in sorted(by_year)]
+    
+    _ID_SEQUENCE_TABLE = 'transaction_ids'
+    
+    def _match_tables(self, conn: sqlite3.Connection, rows: Sequence[Dict]) -> List[str]:
+        """
+        掛載批次交易所屬年度的分區 (重複交易日期相同，必在同一年度)
+        
+        近似重複只比對同一年度，日期範圍跨年的部分不檢查。
+        """
+        years = sorted({int(row['date'][:4]) for row in rows})
+        self._attach(conn, years, create=True)
+        return ['main.transactions'] + [f'{self._alias(year)}.transactions' for year in years]
+    
+    def _iter_category_rows(self, category_ids: Sequence[int], batch_size: int = 5000) -> Iterator[List[Dict]]:
+        """分批讀取指定分類的所有交易 (年度超過 ATTACH 上限時分批掛載)"""
+        years = self._get_years()
+        for start in range(0, len(years), self.MAX_ATTACHED):
+            batch = years[start:start + self.MAX_ATTACHED]
+            yield from self._scan_category_rows(lambda operation: self._read_years(operation, batch),
+                                                category_ids, batch_size)
+    
+    def set_categories(self, changes: Dict[int, int]) -> int:
+        """批次變更交易的分類 (每個年度一個寫入交易，已結帳年度的交易不變更)"""
+        by_year: Dict[int, Dict[int, int]] = {}
+        for transaction_id, year in self._get_years_for_ids(list(changes)).items():
+            by_year.setdefault(year, {})[transaction_id] = changes[transaction_id]
+        
+        closed = {row['year'] for row in self.db_manager.query('SELECT year FROM partitions WHERE closed = 1')}
+        
+        count = 0
+        for year, year_changes in sorted(by_year.items()):
+            if year in closed:
+                logger.warning("%s 年度已結帳，略過 %d 筆分類變更", year, len(year_changes),
+                               extra={'event': 'recategorize_skipped', 'year': year})
+                continue
+            
+            def update(conn):
+                self._attach(conn, [year])
+                self._check_open(conn, year)
+                changed = self._recategorize(conn, year_changes, f'{self._alias(year)}.transactions')
+                self._bump_generation(conn)
+                return changed
+            
+            try:
+                count += self.db_manager.run_write(update)
+            except sqlite3.Error as e:
+                logger.error("變更交易分類錯誤：%s", e, extra={'event': 'transaction_update_failed'})
+        return count
+    
+    def set_reconciled(self, transaction_ids: Sequence[int], reconciled: bool = True) -> int:
+        """標記 (或取消標記) 交易為已對帳 (每個年度一個寫入交易，已結帳年度的交易不變更)"""
+        by_year: Dict[int, List[int]] = {}
+        for transaction_id, year in self._get_years_for_ids(list(transaction_ids)).items():
+            by_year.setdefault(year, []).append(transaction_id)
+        
+        closed = {row['year'] for row in self.db_manager.query('SELECT year FROM partitions WHERE closed = 1')}
+        
+        count = 0
+        for year, year_ids in sorted(by_year.items()):
+            if year in closed:
+                logger.warning("%s 年度已結帳，略過 %d 筆對帳狀態變更", year, len(year_ids),
+                               extra={'event': 'reconcile_skipped', 'year': year})
+                continue
+            
+            def update(conn):
+                self._attach(conn, [year])
+                self._check_open(conn, year)
+                changed = self._mark_reconciled(conn, year_ids, reconciled, f'{self._alias(year)}.transactions')
+                self._bump_generation(conn)
+                return changed
+            
+            try:
+                count += self.db_manager.run_write(update)
+            except sqlite3.Error as e:
+                logger.error("變更對帳狀態錯誤：%s", e, extra={'event': 'transaction_update_failed'})
+        return count
+    
+    def add_transaction(self, date: str, transaction_type: str,
+                        category_id: int, amount: float, description: str = '',
+                        currency: str = BASE_CURRENCY, account_id: Optional[int] = None) -> Optional[int]:
+        """新增交易記錄 (依日期寫入對應年度的分區；帳戶餘額在主資料庫同步增減)"""
+        if transaction_type not in ['income', 'expense']:
+            raise ValueError("交易類型必須是 'income' 或 'expense'")
+        
+        if amount <= 0:
+            raise ValueError("金額必須大於 0")
+        
+        currency = self._normalize_currency(currency)
+        
+        year = int(date[:4])
+        
+        def insert(conn):
+            self._attach(conn, [year], create=True)
+            self._check_open(conn, year)
+            self._check_category(conn, category_id, transaction_type)
+            self._check_account(conn, account_id, currency)
+            
+            conn.execute('INSERT OR IGNORE INTO partitions (year) VALUES (?)', (year,))
+            transaction_id = conn.execute(
+                'INSERT INTO transaction_ids (year) VALUES (?)', (year,)).lastrowid
+            values = {
+                'id': transaction_id, 'date': date, 'type': transaction_type,
+                'category_id': category_id, 'amount': round(amount, 2), 'description': description,
+                'currency': currency, 'account_id': account_id,
+            }
+            values['fingerprint'] = transaction_fingerprint(date, transaction_type, values['amount'], currency,
+                                                            account_id, description)
+            self._insert_row(conn, year, values)
+            self._post(conn, values, 1)
+            self._bump_generation(conn)
+            return transaction_id
+        
+        try:
+            transaction_id = self.db_manager.run_write(insert)
+            logger.debug("成功新增交易記錄：%s %s %.2f", transaction_type, currency, amount,
+                         extra={'event': 'transaction_added', 'transaction_id': transaction_id, 'year': year})
+            return transaction_id
+        
+        except sqlite3.Error as e:
+            logger.error("新增交易記錄錯誤：%s", e, extra={'event': 'transaction_add_failed'})
+            return None
+    
+    def update_transaction(self, transaction_id: int, date: str,
+                           transaction_type: str, category_id: int,
+                           amount: float, description: str = '',
+                           currency: str = BASE_CURRENCY, account_id: Optional[int] = None) -> bool:
+        """更新交易記錄 (日期跨年度時搬移到新年度的分區)"""
+        if transaction_type not in ['income', 'expense']:
+            raise ValueError("交易類型必須是 'income' 或 'expense'")
+        
+        if amount <= 0:
+            raise ValueError("金額必須大於 0")
+        
+        currency = self._normalize_currency(currency)
+        
+        old_year = self._get_years_for_ids([transaction_id]).get(transaction_id)
+        if old_year is None:
+            logger.warning("交易記錄 ID %s 不存在", transaction_id, extra={'event': 'transaction_not_found'})
+            return False
+        new_year = int(date[:4])
+        values = {'date': date, 'type': transaction_type, 'category_id': category_id,
+                  'amount': round(amount, 2), 'description': description, 'currency': currency,
+                  'account_id': account_id}
+        
+        def update(conn):
+            self._attach(conn, sorted({old_year, new_year}), create=True)
+            self._check_open(conn, old_year)
+            self._check_open(conn, new_year)
+            self._check_category(conn, category_id, transaction_type)
+            self._check_account(conn, account_id, currency)
+            
+            old_alias = self._alias(old_year)
+            old = conn.execute(
+                f'SELECT date, type, category_id, amount, currency, account_id, description, created_at, '
+                f'external_id, fingerprint, reconciled FROM {old_alias}.transactions WHERE id = ?',
+                (transaction_id,)).fetchone()
+            if old is None:
+                return 0
+            
+            # 依匯入時的外部 ID 重新計算指紋 (帳戶變更後改以新帳戶識別)
+            fingerprint = transaction_fingerprint(date, transaction_type, values['amount'], currency, account_id,
+                                                  description, old['external_id'])
+            if new_year == old_year:
+                conn.execute(f'''
+                    UPDATE {old_alias}.transactions
+                    SET date = ?, type = ?, category_id = ?, amount = ?, description = ?, currency = ?,
+                        account_id = ?, fingerprint = ?
+                    WHERE id = ?
+                ''', (date, transaction_type, category_id, values['amount'], description, currency,
+                      account_id, fingerprint, transaction_id))
+            else:
+                conn.execute(f'DELETE FROM {old_alias}.transactions WHERE id = ?', (transaction_id,))
+                conn.execute('INSERT OR IGNORE INTO partitions (year) VALUES (?)', (new_year,))
+                self._insert_row(conn, new_year, dict(values, id=transaction_id, created_at=old['created_at'],
+                                                      external_id=old['external_id'], fingerprint=fingerprint,
+                                                      reconciled=old['reconciled']))
+                conn.execute('UPDATE transaction_ids SET year = ? WHERE id = ?', (new_year, transaction_id))
+            
+            self._post(conn, old, -1)
+            self._post(conn, values, 1)
+            self._bump_generation(conn)
+            return 1
+        
+        try:
+            if self.db_manager.run_write(update) == 0:
+                logger.warning("交易記錄 ID %s 不存在", transaction_id, extra={'event': 'transaction_not_found'})
+                return False
+            
+            logger.debug("成功更新交易記錄 ID %s", transaction_id, extra={'event': 'transaction_updated'})
+            return True
+        
+        except sqlite3.Error as e:
+            logger.error("更新交易記錄錯誤：%s", e, extra={'event': 'transaction_update_failed'})
+            return False
+    
+    def delete_transaction(self, transaction_id: int) -> bool:
+        """刪除交易記錄"""
+        year = self._get_years_for_ids([transaction_id]).get(transaction_id)
+        if year is None:
+            logger.warning("交易記錄 ID %s 不存在", transaction_id, extra={'event': 'transaction_not_found'})
+            return False
+        
+        def delete(conn):
+            self._attach(conn, [year])
+            self._check_open(conn, year)
+            alias = self._alias(year)
+            old = conn.execute(
+                f'SELECT date, type, category_id, amount, currency, account_id, description '
+                f'FROM {alias}.transactions WHERE id = ?',
+                (transaction_id,)).fetchone()
+            if old is None:
+                return 0
+            conn.execute(f'DELETE FROM {alias}.transactions WHERE id = ?', (transaction_id,))
+            conn.execute('DELETE FROM transaction_ids WHERE id = ?', (transaction_id,))
+            self._post(conn, old, -1)
+            self._bump_generation(conn)
+            return 1
+        
+        try:
+            if self.db_manager.run_write(delete) == 0:
+                logger.warning("交易記錄 ID %s 不存在", transaction_id, extra={'event': 'transaction_not_found'})
+                return False
+            
+            logger.debug("成功刪除交易記錄 ID %s", transaction_id, extra={'event': 'transaction_deleted'})
+            return True
+        
+        except sqlite3.Error as e:
+            logger.error("刪除交易記錄錯誤：%s", e, extra={'event': 'transaction_delete_failed'})
+            return False
+    
+    # 分區管理
+    def migrate_to_partitions(self) -> int:
+        """
+        將主資料庫中尚未分區的交易記錄搬移到年度分區 (保留原 ID)
+        
+        Returns:
+            搬移的筆數
+        """
+        rows = self.db_manager.query('SELECT DISTINCT substr(date, 1, 4) AS year FROM transactions')
+        years = sorted(int(row['year']) for row in rows)
+        if not years:
+            return 0
+        
+        columns = ', '.join(PARTITION_COLUMNS)
+        moved = 0
+        for start in range(0, len(years), self.MAX_ATTACHED):
+            batch = years[start:start + self.MAX_ATTACHED]
+            
+            def migrate(conn):
+                self._attach(conn, batch, create=True)
+                count = 0
+                for year in batch:
+                    self._check_open(conn, year)
+                    conn.execute('INSERT OR IGNORE INTO partitions (year) VALUES (?)', (year,))
+                    where = "WHERE substr(date, 1, 4) = ?"
+                    conn.execute(f'''
+                        INSERT INTO {self._alias(year)}.transactions ({columns})
+                        SELECT {columns} FROM main.transactions {where}
+                    ''', (str(year),))
+                    # 保留原 ID；AUTOINCREMENT 序號會跟著推進，新交易不會與其衝突
+                    conn.execute(f'''
+                        INSERT INTO transaction_ids (id, year)
+                        SELECT id, ? FROM main.transactions {where}
+                    ''', (year, str(year)))
+                    count += conn.execute(f'DELETE FROM main.transactions {where}', (str(year),)).rowcount
+                return count
+            
+            moved += self.db_manager.run_write(migrate)
+        
+        logger.info("已將 %d 筆交易記錄搬移到年度分區", moved, extra={'event': 'partitions_migrated'})
+        return moved
+    
+    def close_year(self, year: int) -> bool:
+        """
+        結帳：將年度分區重整後設為唯讀
+        
+        Returns:
+            是否成功 (年度不存在時回傳 False)
+        """
+        path = self.get_partition_path(year)
+        if not self.db_manager.query_one('SELECT year FROM partitions WHERE year = ?', (year,)):
+            logger.warning("%s 年度沒有分區", year, extra={'event': 'partition_not_found'})
+            return False
+        
+        try:
+            conn = sqlite3.connect(path)
+            try:
+                conn.execute('VACUUM')
+            finally:
+                conn.close()
+            self.db_manager.run_write(lambda conn: conn.execute(
+                'UPDATE partitions SET closed = 1 WHERE year = ?', (year,)))
+        except sqlite3.Error as e:
+            logger.error("結帳 %s 年度錯誤：%s", year, e, extra={'event': 'close_year_failed'})
+            return False
+        
+        os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        logger.info("%s 年度已結帳並設為唯讀", year, extra={'event': 'year_closed'})
+        return True
+    
+    def reopen_year(self, year: int) -> bool:
+        """取消結帳，讓年度分區可再次修改"""
+        path = self.get_partition_path(year)
+        if os.path.exists(path):
+            os.chmod(path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
+        
+        try:
+            cursor = self.db_manager.run_write(lambda conn: conn.execute(
+                'UPDATE partitions SET closed = 0 WHERE year = ?', (year,)))
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.error("取消結帳 %s 年度錯誤：%s", year, e, extra={'event': 'reopen_year_failed'})
+            return False
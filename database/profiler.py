@@ -0,0 +1,230 @@
+"""
+記帳應用程式 - 查詢效能分析
+選用的查詢計時工具：依呼叫位置累計耗時分布，慢查詢連同執行計畫寫入輪替日誌
+"""
+
+import bisect
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from typing import Any, Callable, Dict, List, Optional, TextIO
+
+# 耗時分布的區間上限 (毫秒)，最後一格收集超過 1 秒的查詢
+HISTOGRAM_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# 尋找呼叫位置時略過的 DatabaseManager 內部函式
+_PLUMBING_FUNCTIONS = {
+    '_run_with', '_retry_on_busy', 'run_read', 'run_write', 'query', 'query_one',
+    '_read', '_read_years', '_read_batches', 'profile', '<lambda>',
+}
+
+# 需要擷取執行計畫的語句開頭
+_EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+class QueryStats:
+    """單一呼叫位置的累計統計"""
+    
+    def __init__(self, call_site: str, kind: str):
+        self.call_site = call_site
+        self.kind = kind
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.slow_count = 0
+        self.buckets = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+    
+    def add(self, elapsed_ms: float, rows: int, slow: bool):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.rows += rows
+        self.slow_count += slow
+        self.buckets[bisect.bisect_left(HISTOGRAM_BUCKETS_MS, elapsed_ms)] += 1
+    
+    def percentile(self, fraction: float) -> float:
+        """由分布估計百分位數 (回傳所在區間的上限，最後一格回傳最大值)"""
+        target = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= target and bucket_count:
+                return HISTOGRAM_BUCKETS_MS[index] if index < len(HISTOGRAM_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+    
+    def to_dict(self) -> Dict:
+        return {
+            'call_site': self.call_site,
+            'kind': self.kind,
+            'count': self.count,
+            'total_ms': self.total_ms,
+            'avg_ms': self.total_ms / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'max_ms': self.max_ms,
+            'rows': self.rows,
+            'slow_count': self.slow_count,
+            'histogram': dict(zip([f"<={b}ms" for b in HISTOGRAM_BUCKETS_MS] + ['>1000ms'], self.buckets)),
+        }
+
+
+class QueryProfiler:
+    """
+    查詢效能分析器
+    
+    由 DatabaseManager.enable_profiling 掛上後，每次 run_read/run_write 操作都會
+    記錄耗時、回傳 (或異動) 筆數與呼叫位置 (例如 TransactionManager.get_transactions)。
+    超過門檻的操作會連同其中每個語句的 EXPLAIN QUERY PLAN 寫入輪替的慢查詢日誌。
+    """
+    
+    def __init__(self, slow_threshold_ms: float = 100.0, log_path: Optional[str] = None,
+                 max_bytes: int = 1024 * 1024, backup_count: int = 3):
+        """
+        初始化分析器
+        
+        Args:
+            slow_threshold_ms: 慢查詢門檻 (毫秒)
+            log_path: 慢查詢日誌檔路徑 (None 表示不寫日誌，只計數)
+            max_bytes: 日誌檔輪替大小
+            backup_count: 保留的舊日誌檔數量
+        """
+        self.slow_threshold_ms = slow_threshold_ms
+        self._lock = threading.Lock()
+        self._stats: Dict[str, QueryStats] = {}
+        
+        self.slow_log: Optional[logging.Logger] = None
+        self._handler: Optional[RotatingFileHandler] = None
+        if log_path:
+            self._handler = RotatingFileHandler(log_path, maxBytes=max_bytes,
+                                                backupCount=backup_count, encoding='utf-8')
+            self._handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            # 每個分析器使用獨立的 logger，避免多個資料庫互相寫入對方的日誌
+            self.slow_log = logging.getLogger(f"{__name__}.slow.{id(self)}")
+            self.slow_log.setLevel(logging.INFO)
+            self.slow_log.propagate = False
+            self.slow_log.addHandler(self._handler)
+    
+    @staticmethod
+    def _find_call_site() -> str:
+        """找出發起查詢的函式 (略過 DatabaseManager 的轉接層)"""
+        frame = sys._getframe(2)
+        while frame is not None:
+            code = frame.f_code
+            if code.co_name not in _PLUMBING_FUNCTIONS and not code.co_filename.endswith('profiler.py'):
+                name = getattr(code, 'co_qualname', code.co_name)
+                if '.<locals>.' in name:
+                    # 管理器方法中的內部函式，往外一層取得方法名稱
+                    frame = frame.f_back
+                    continue
+                return f"{name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+            frame = frame.f_back
+        return '<unknown>'
+    
+    @staticmethod
+    def _count_rows(result: Any, changes: int) -> int:
+        """估計操作涉及的筆數：寫入以異動筆數 (含觸發器) 計，讀取以回傳結果計"""
+        if changes:
+            return changes
+        if isinstance(result, (list, tuple, set)):
+            return len(result)
+        if isinstance(result, dict):
+            return 1
+        return 0
+    
+    def profile(self, conn: sqlite3.Connection, kind: str,
+                operation: Callable[[sqlite3.Connection], Any]) -> Any:
+        """
+        執行並記錄一個資料庫操作
+        
+        Args:
+            conn: 操作使用的連接 (慢查詢時在同一連接上擷取執行計畫)
+            kind: 'read' 或 'write'
+            operation: 接收連接並回傳結果的函式
+        """
+        call_site = self._find_call_site()
+        statements: List[str] = []
+        conn.set_trace_callback(statements.append)
+        changes_before = conn.total_changes
+        start = time.perf_counter()
+        try:
+            result = operation(conn)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            conn.set_trace_callback(None)
+        
+        rows = self._count_rows(result, conn.total_changes - changes_before)
+        slow = elapsed_ms >= self.slow_threshold_ms
+        with self._lock:
+            stats = self._stats.get(call_site)
+            if stats is None:
+                stats = self._stats[call_site] = QueryStats(call_site, kind)
+            stats.add(elapsed_ms, rows, slow)
+        
+        if slow and self.slow_log is not None:
+            self._log_slow(conn, call_site, elapsed_ms, rows, statements)
+        return result
+    
+    def _log_slow(self, conn: sqlite3.Connection, call_site: str, elapsed_ms: float,
+                  rows: int, statements: List[str]):
+        """將慢查詢與每個語句的執行計畫寫入日誌"""
+        lines = [f"SLOW {elapsed_ms:.1f}ms rows={rows} {call_site}"]
+        for sql in statements:
+            sql = ' '.join(sql.split())
+            lines.append(f"  SQL: {sql}")
+            if not sql.upper().startswith(_EXPLAINABLE):
+                continue
+            try:
+                plan = conn.execute(f'EXPLAIN QUERY PLAN {sql}').fetchall()
+                lines.extend(f"    PLAN: {row[3]}" for row in plan)
+            except sqlite3.Error as e:
+                lines.append(f"    PLAN: <無法取得：{e}>")
+        self.slow_log.info('\n'.join(lines))
+    
+    def get_stats(self) -> List[Dict]:
+        """
+        取得各呼叫位置的統計
+        
+        Returns:
+            統計列表 (依總耗時由大到小)，每個項目包含 call_site, kind, count,
+            total_ms, avg_ms, p50_ms, p95_ms, max_ms, rows, slow_count, histogram
+        """
+        with self._lock:
+            stats = [s.to_dict() for s in self._stats.values()]
+        stats.sort(key=lambda s: s['total_ms'], reverse=True)
+        return stats
+    
+    def reset(self):
+        """清除累計統計"""
+        with self._lock:
+            self._stats.clear()
+    
+    def dump(self, stream: Optional[TextIO] = None, retry_metrics: Optional[Dict] = None):
+        """
+        以表格輸出統計 (預設輸出到 stdout)
+        
+        Args:
+            stream: 輸出目標
+            retry_metrics: 一併輸出的鎖定重試統計 (DatabaseManager.get_retry_metrics)
+        """
+        stream = stream or sys.stdout
+        stream.write(f"{'呼叫位置':<60} {'類型':>5} {'次數':>7} {'總計ms':>10} "
+                     f"{'平均ms':>9} {'p95ms':>8} {'最大ms':>9} {'筆數':>8} {'慢':>5}\n")
+        for s in self.get_stats():
+            stream.write(f"{s['call_site']:<60} {s['kind']:>5} {s['count']:>7} {s['total_ms']:>10.1f} "
+                         f"{s['avg_ms']:>9.2f} {s['p95_ms']:>8.1f} {s['max_ms']:>9.1f} "
+                         f"{s['rows']:>8} {s['slow_count']:>5}\n")
+        if retry_metrics:
+            stream.write("鎖定重試：" + ', '.join(f"{k}={v}" for k, v in retry_metrics.items()) + "\n")
+    
+    def close(self):
+        """關閉慢查詢日誌檔"""
+        if self._handler is not None:
+            self.slow_log.removeHandler(self._handler)
+            self._handler.close()
+            self._handler = None
+            self.slow_log = None
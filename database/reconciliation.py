@@ -0,0 +1,139 @@
+"""
+記帳應用程式 - 對帳
+將銀行對帳單的交易與帳上尚未對帳的交易配對：相同外部 ID 直接配對，其餘依
+(類型, 幣別, 金額) 分組後依日期合併，每筆對帳單交易取日期最接近且在容許範圍內的帳上交易。
+配對確認後標記為已對帳 (transactions.reconciled)，下次對帳不再列入
+"""
+
+import sqlite3
+from collections import deque
+from datetime import date, timedelta
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from .log import get_logger
+from .models import TransactionManager
+
+logger = get_logger('reconciliation')
+
+# 預設的日期容許範圍 (±天數，銀行入帳日常比交易日晚一兩天)
+DEFAULT_DATE_WINDOW = 3
+
+
+def _match_key(row: Dict) -> Tuple[str, str, int]:
+    """配對用的鍵 (類型, 幣別, 金額的分)"""
+    return row['type'], row['currency'], round(float(row['amount']) * 100)
+
+
+def _ordinal(day: str) -> int:
+    return date.fromisoformat(day[:10]).toordinal()
+
+
+def match_statement(lines: Sequence[Dict], transactions: Sequence[Dict],
+                    date_window: int = DEFAULT_DATE_WINDOW) -> Tuple[List[Tuple[int, Dict]], List[int], List[Dict]]:
+    """
+    配對對帳單交易與帳上交易 (每筆最多配對一次)
+    
+    先以外部 ID 配對，其餘依 (類型, 幣別, 金額) 分組：對帳單依日期順序處理，每組的帳上交易
+    也依日期排序，早於目前日期減容許範圍的帳上交易之後不可能再配對，直接移出；
+    整體為一次排序加一次合併。
+    
+    Args:
+        lines: 對帳單交易 (date, type, amount, currency，可選 external_id)
+        transactions: 帳上交易 (id, date, type, amount, currency，可選 external_id)
+        date_window: 日期容許範圍 (±天數)
+    
+    Returns:
+        ([(對帳單交易的位置, 配對的帳上交易)] 依位置排序, 未配對的對帳單交易位置, 未配對的帳上交易 (依日期))
+    """
+    pairs: Dict[int, Dict] = {}
+    used = set()
+    
+    by_external_id = {row['external_id']: row for row in transactions if row.get('external_id')}
+    for position, line in enumerate(lines):
+        candidate = by_external_id.get(line.get('external_id') or None)
+        if candidate is not None and candidate['id'] not in used and _match_key(candidate) == _match_key(line):
+            pairs[position] = candidate
+            used.add(candidate['id'])
+    
+    groups: Dict[Tuple[str, str, int], Deque[Tuple[int, Dict]]] = {}
+    for row in sorted(transactions, key=lambda row: (row['date'], row['id'])):
+        if row['id'] not in used:
+            groups.setdefault(_match_key(row), deque()).append((_ordinal(row['date']), row))
+    
+    expired: List[Dict] = []
+    pending = sorted((position for position in range(len(lines)) if position not in pairs),
+                     key=lambda position: lines[position]['date'])
+    for position in pending:
+        group = groups.get(_match_key(lines[position]))
+        if not group:
+            continue
+        day = _ordinal(lines[position]['date'])
+        while group and group[0][0] < day - date_window:
+            expired.append(group.popleft()[1])
+        best = None
+        for index, (candidate_day, _) in enumerate(group):
+            if candidate_day > day + date_window:
+                break
+            if best is None or abs(candidate_day - day) < abs(group[best][0] - day):
+                best = index
+        if best is not None:
+            pairs[position] = group[best][1]
+            del group[best]
+    
+    unmatched_transactions = expired + [row for group in groups.values() for _, row in group]
+    unmatched_transactions.sort(key=lambda row: (row['date'], row['id']))
+    return (sorted(pairs.items()), [position for position in range(len(lines)) if position not in pairs],
+            unmatched_transactions)
+
+
+class ReconciliationManager:
+    """對帳管理類別"""
+    
+    def __init__(self, transaction_manager: TransactionManager):
+        self.transaction_manager = transaction_manager
+    
+    def match(self, lines: Sequence[Dict], account_id: Optional[int] = None,
+              date_window: int = DEFAULT_DATE_WINDOW) -> Optional[Dict]:
+        """
+        將對帳單交易與帳上尚未對帳的交易配對
+        
+        Args:
+            lines: 對帳單交易 (例如 TransactionImporter.parse_file 解析的結果)
+            account_id: 只與此帳戶的交易配對 (None 為所有交易)
+            date_window: 日期容許範圍 (±天數)
+        
+        Returns:
+            包含 matched ([(對帳單交易, 帳上交易)])、unmatched_lines (對帳單有、帳上沒有) 與
+            unmatched_transactions (對帳單期間內帳上有、對帳單沒有) 的字典；查詢失敗時回傳 None
+        """
+        if not lines:
+            return {'matched': [], 'unmatched_lines': [], 'unmatched_transactions': []}
+        first = min(line['date'] for line in lines)
+        last = max(line['date'] for line in lines)
+        try:
+            transactions = self.transaction_manager._unreconciled(
+                (date.fromisoformat(first) - timedelta(days=date_window)).isoformat(),
+                (date.fromisoformat(last) + timedelta(days=date_window)).isoformat(), account_id)
+        except sqlite3.Error as e:
+            logger.error("查詢對帳交易錯誤：%s", e, extra={'event': 'query_failed'})
+            return None
+        
+        pairs, unmatched_lines, unmatched_transactions = match_statement(lines, transactions, date_window)
+        result = {
+            'matched': [(lines[position], transaction) for position, transaction in pairs],
+            'unmatched_lines': [lines[position] for position in unmatched_lines],
+            # 容許範圍內、對帳單期間外的交易屬於前後期的對帳單
+            'unmatched_transactions': [row for row in unmatched_transactions if first <= row['date'] <= last],
+        }
+        logger.info("對帳：%d 筆配對，對帳單未配對 %d 筆，帳上未配對 %d 筆", len(result['matched']),
+                    len(result['unmatched_lines']), len(result['unmatched_transactions']),
+                    extra={'event': 'statement_matched'})
+        return result
+    
+    def reconcile(self, transaction_ids: Sequence[int]) -> int:
+        """將交易標記為已對帳 (回傳變更的筆數)"""
+        return self.transaction_manager.set_reconciled(transaction_ids, True)
+    
+    def unreconcile(self, transaction_ids: Sequence[int]) -> int:
+        """取消交易的已對帳標記 (回傳變更的筆數)"""
+        return self.transaction_manager.set_reconciled(transaction_ids, False)
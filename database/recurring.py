@@ -0,0 +1,210 @@
+"""
+記帳應用程式 - 定期交易
+依規則 (每週/每月/每年) 產生到期的交易，補產生多期時在單一寫入交易中批次寫入
+"""
+
+import calendar
+import sqlite3
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from .log import get_logger
+from .models import BASE_CURRENCY, TransactionManager
+
+logger = get_logger('recurring')
+
+# 可用的重複頻率
+FREQUENCIES = ('weekly', 'monthly', 'yearly')
+
+
+def occurrence_date(start_date: str, frequency: str, interval: int, index: int) -> str:
+    """
+    計算規則第 index 次 (由 0 起算) 的日期
+    
+    每次都由開始日推算而不是由上一次累加，因此 31 日開始的每月規則
+    在小月取月底後，下個大月仍回到 31 日 (2 月 29 日開始的每年規則同理)。
+    """
+    start = datetime.strptime(start_date, '%Y-%m-%d').date()
+    if frequency == 'weekly':
+        return (start + timedelta(weeks=interval * index)).isoformat()
+    months = interval * index * (12 if frequency == 'yearly' else 1)
+    year, month = divmod(start.year * 12 + start.month - 1 + months, 12)
+    day = min(start.day, calendar.monthrange(year, month + 1)[1])
+    return date(year, month + 1, day).isoformat()
+
+
+class _AlreadyMaterialized(Exception):
+    """其他連線已先產生同一批定期交易 (回復本次寫入)"""
+
+
+class RecurringManager:
+    """
+    定期交易管理類別
+    
+    每個規則記錄已產生的次數 (occurrence_count) 與下一次的日期 (next_date)。
+    materialize_due 在一個寫入交易中產生所有到期的交易並推進規則，更新時
+    比對原本的次數，若已被其他程式推進就整批回復，因此重複執行也不會重複記帳。
+    """
+    
+    def __init__(self, transaction_manager: TransactionManager):
+        self.transaction_manager = transaction_manager
+        self.db_manager = transaction_manager.db_manager
+    
+    def add_rule(self, name: str, transaction_type: str, category_id: int, amount: float,
+                 frequency: str, start_date: str, interval: int = 1, end_date: Optional[str] = None,
+                 description: str = '', currency: str = BASE_CURRENCY,
+                 account_id: Optional[int] = None) -> Optional[int]:
+        """
+        新增定期交易規則 (到期的交易在下次 materialize_due 時產生)
+        
+        Args:
+            name: 規則名稱
+            transaction_type: 交易類型 ('income' 或 'expense')
+            category_id: 分類ID
+            amount: 金額 (交易幣別)
+            frequency: 頻率 ('weekly', 'monthly', 'yearly')
+            start_date: 第一次的日期 (YYYY-MM-DD，每月/每年規則以此日為準)
+            interval: 每隔幾個週期 (例如 frequency='weekly', interval=2 為每兩週)
+            end_date: 最後可產生的日期 (包含，None 表示不結束)
+            description: 備註
+            currency: 幣別代碼
+            account_id: 帳戶ID
+        
+        Returns:
+            新規則的 ID，失敗時回傳 None
+        """
+        name = name.strip()
+        if not name:
+            raise ValueError("規則名稱不可為空白")
+        if frequency not in FREQUENCIES:
+            raise ValueError(f"頻率必須是 {', '.join(FREQUENCIES)} 之一")
+        if interval < 1:
+            raise ValueError("間隔必須至少為 1")
+        if end_date is not None and end_date < start_date:
+            raise ValueError("結束日期不可早於開始日期")
+        row = self.transaction_manager._normalize_row({
+            'date': start_date, 'type': transaction_type, 'category_id': category_id, 'amount': amount,
+            'description': description, 'currency': currency, 'account_id': account_id,
+        })
+        
+        def insert(conn):
+            self.transaction_manager._check_rows(conn, [row])
+            return conn.execute('''
+                INSERT INTO recurring_rules (name, type, category_id, amount, currency, account_id, description,
+                                             frequency, interval, start_date, end_date, next_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (name, row['type'], category_id, row['amount'], row['currency'], account_id, description,
+                  frequency, interval, start_date, end_date, start_date)).lastrowid
+        
+        try:
+            rule_id = self.db_manager.run_write(insert)
+            logger.debug("成功新增定期交易規則：%s", name,
+                         extra={'event': 'recurring_rule_added', 'rule_id': rule_id})
+            return rule_id
+        except sqlite3.Error as e:
+            logger.error("新增定期交易規則錯誤：%s", e, extra={'event': 'recurring_rule_add_failed'})
+            return None
+    
+    def delete_rule(self, rule_id: int) -> bool:
+        """刪除定期交易規則 (已產生的交易保留)"""
+        try:
+            cursor = self.db_manager.run_write(
+                lambda conn: conn.execute('DELETE FROM recurring_rules WHERE id = ?', (rule_id,)))
+            if cursor.rowcount == 0:
+                logger.warning("定期交易規則 ID %s 不存在", rule_id, extra={'event': 'recurring_rule_not_found'})
+                return False
+            logger.debug("成功刪除定期交易規則 ID %s", rule_id, extra={'event': 'recurring_rule_deleted'})
+            return True
+        except sqlite3.Error as e:
+            logger.error("刪除定期交易規則錯誤：%s", e, extra={'event': 'recurring_rule_delete_failed'})
+            return False
+    
+    def get_rules(self) -> List[Dict]:
+        """
+        取得所有定期交易規則
+        
+        Returns:
+            規則列表 (依下一次日期排序，已結束的在最後)，包含 category_name 與 account_name
+        """
+        try:
+            return self.db_manager.query('''
+                SELECT r.*, c.name as category_name, a.name as account_name
+                FROM recurring_rules r
+                LEFT JOIN categories c ON r.category_id = c.id
+                LEFT JOIN accounts a ON r.account_id = a.id
+                ORDER BY r.next_date IS NULL, r.next_date, r.id
+            ''')
+        except sqlite3.Error as e:
+            logger.error("查詢定期交易規則錯誤：%s", e, extra={'event': 'query_failed'})
+            return []
+    
+    def materialize_due(self, today: Optional[str] = None) -> int:
+        """
+        產生所有到期 (日期不晚於 today) 且尚未產生的定期交易
+        
+        所有規則的所有到期次數在同一個寫入交易中以 executemany 批次寫入，
+        長時間未開啟程式後補產生多期也只需一次提交。
+        
+        Args:
+            today: 產生到哪一天為止 (YYYY-MM-DD，預設為今天)
+        
+        Returns:
+            產生的交易筆數
+        """
+        today = today or date.today().isoformat()
+        
+        def materialize(conn):
+            rules = conn.execute('''
+                SELECT * FROM recurring_rules WHERE next_date IS NOT NULL AND next_date <= ?
+            ''', (today,)).fetchall()
+            rows, updates = [], []
+            for rule in rules:
+                try:
+                    self.transaction_manager._check_rows(conn, [rule])
+                except ValueError as e:
+                    logger.warning("略過定期交易規則 ID %s：%s", rule['id'], e,
+                                   extra={'event': 'recurring_rule_invalid', 'rule_id': rule['id']})
+                    continue
+                
+                count, next_date = rule['occurrence_count'], rule['next_date']
+                limit = min(today, rule['end_date']) if rule['end_date'] else today
+                while next_date <= limit:
+                    rows.append(self.transaction_manager._normalize_row({
+                        'date': next_date, 'type': rule['type'], 'category_id': rule['category_id'],
+                        'amount': float(rule['amount']), 'description': rule['description'] or '',
+                        'currency': rule['currency'], 'account_id': rule['account_id'],
+                        'recurring_rule_id': rule['id'],
+                    }))
+                    count += 1
+                    next_date = occurrence_date(rule['start_date'], rule['frequency'], rule['interval'], count)
+                if rule['end_date'] and next_date > rule['end_date']:
+                    next_date = None
+                updates.append((count, next_date, rule['id'], rule['occurrence_count']))
+            
+            if rows:
+                self.transaction_manager._insert_many(conn, rows)
+            for update in updates:
+                cursor = conn.execute('''
+                    UPDATE recurring_rules SET occurrence_count = ?, next_date = ?
+                    WHERE id = ? AND occurrence_count = ?
+                ''', update)
+                if cursor.rowcount == 0:
+                    raise _AlreadyMaterialized()
+            return len(rows)
+        
+        try:
+            count = self.db_manager.run_write(materialize)
+        except _AlreadyMaterialized:
+            logger.info("定期交易已由其他程式產生", extra={'event': 'recurring_already_materialized'})
+            return 0
+        except ValueError as e:
+            # 例如到期日落在已結帳的年度分區
+            logger.warning("無法產生定期交易：%s", e, extra={'event': 'recurring_materialize_failed'})
+            return 0
+        except sqlite3.Error as e:
+            logger.error("產生定期交易錯誤：%s", e, extra={'event': 'recurring_materialize_failed'})
+            return 0
+        
+        if count:
+            logger.info("已產生 %d 筆定期交易", count, extra={'event': 'recurring_materialized'})
+        return count
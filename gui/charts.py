@@ -9,6 +9,8 @@ import calendar
 import math
 from typing import Dict, List, Tuple, Optional
 
+from database.balances import BalanceHistory
+
 try:
     from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
     from matplotlib.figure import Figure
@@ -49,6 +51,8 @@ class ChartManager:
     
     def __init__(self, transaction_manager):
         self.transaction_manager = transaction_manager
+        # 累計結餘折線使用月底餘額檢查點，不需加總全部歷史
+        self.balance_history = BalanceHistory(transaction_manager)
         
     def get_category_color(self, category_name: str) -> str:
         """取得分類對應的固定顏色"""
@@ -130,7 +134,7 @@ class ChartManager:
     @staticmethod
     def create_bar_chart(income_data: List[float], expense_data: List[float], 
                         labels: List[str], title: str, y_interval: Optional[int] = None,
-                        bar_width: float = 0.6) -> Figure:
+                        bar_width: float = 0.6, balance_data: Optional[List[float]] = None) -> Figure:
         """
         建立長條圖（收支對比）
         
@@ -141,6 +145,7 @@ class ChartManager:
             title: 圖表標題
             y_interval: Y 軸刻度間隔（可選）
             bar_width: 直條寬度（預設 0.6）
+            balance_data: 累計結餘列表（可選，以右側 Y 軸的折線顯示）
         
         Returns:
             Figure: matplotlib 圖表物件
@@ -209,6 +214,14 @@ class ChartManager:
             # 確保 y 軸從 0 開始
             ax.set_ylim(bottom=0)
         
+        # 累計結餘折線 (數值範圍與單期支出差異大，使用右側獨立的 Y 軸)
+        if balance_data:
+            balance_ax = ax.twinx()
+            balance_ax.plot(x_positions, balance_data, color='#3b82f6', marker='o', linewidth=2,
+                            label='累計結餘')
+            balance_ax.set_ylabel('累計結餘 (元)', fontsize=12, fontweight='bold', color='#3b82f6')
+            balance_ax.tick_params(axis='y', labelsize=12, labelcolor='#3b82f6')
+        
         fig.tight_layout()
         return fig
     
@@ -216,20 +229,8 @@ class ChartManager:
         """顯示年度分類圓餅圖"""
         start_date = f"{year}-01-01"
         end_date = f"{year}-12-31"
-        transactions = self.transaction_manager.get_transactions_by_date_range(start_date, end_date)
-        
-        if not transactions:
-            no_data_label = tk.Label(parent_frame, text="無交易資料", 
-                                     font=('Microsoft YaHei', 40), fg='#94a3b8', bg='#FFFFFF')
-            no_data_label.pack(expand=True)
-            return
-        
-        # 統計分類資料
-        expense_stats = defaultdict(float)
-        
-        for trans in transactions:
-            if trans['type'] == 'expense':
-                expense_stats[trans['category_name']] += trans['amount']
+        # 統計分類資料 (含已封存月份的彙總)
+        expense_stats = self.transaction_manager.get_category_totals(start_date, end_date, 'expense')
         
         if not expense_stats:
             no_data_label = tk.Label(parent_frame, text="無交易資料", 
@@ -251,20 +252,8 @@ class ChartManager:
         last_day = calendar.monthrange(year, month)[1]
         end_date = f"{year}-{month:02d}-{last_day}"
         
-        transactions = self.transaction_manager.get_transactions_by_date_range(start_date, end_date)
-        
-        if not transactions:
-            no_data_label = tk.Label(parent_frame, text="無交易資料", 
-                                     font=('Microsoft YaHei', 40), fg='#94a3b8', bg='#FFFFFF')
-            no_data_label.pack(expand=True)
-            return
-        
-        # 統計資料
-        expense_stats = defaultdict(float)
-        
-        for trans in transactions:
-            if trans['type'] == 'expense':
-                expense_stats[trans['category_name']] += trans['amount']
+        # 統計資料 (含已封存月份的彙總)
+        expense_stats = self.transaction_manager.get_category_totals(start_date, end_date, 'expense')
         
         if not expense_stats:
             no_data_label = tk.Label(parent_frame, text="無交易資料", 
@@ -311,6 +300,11 @@ class ChartManager:
         # 計算年度總計
         year_total = sum(i - e for i, e in zip(income_data, expense_data))
         
+        # 各月月底的累計結餘 (由餘額檢查點取得)
+        month_end_balances = self.balance_history.get_month_end_balances(f"{year}-01", f"{year}-12")
+        balance_data = [month_end_balances.get(f"{year}-{detail['month']:02d}", 0.0)
+                        for detail in monthly_details]
+        
         # 上方：年度總計標籤
         header_frame = tk.Frame(parent_frame, bg='#F8FAFC')
         header_frame.pack(fill=tk.X, pady=(0, 10))
@@ -323,7 +317,7 @@ class ChartManager:
         
         # 中間：長條圖
         fig = self.create_bar_chart(income_data, expense_data, months_labels, 
-                                    f'{year}年月度收支', y_interval=5000)
+                                    f'{year}年月度收支', y_interval=5000, balance_data=balance_data)
         
         if fig:
             canvas = FigureCanvasTkAgg(fig, parent_frame)
@@ -389,7 +383,7 @@ class ChartManager:
         
         for trans in transactions:
             date = trans['date']
-            daily_stats[date][trans['type']] += trans['amount']
+            daily_stats[date][trans['type']] += trans['amount_base']
         
         # 準備資料
         dates = sorted(daily_stats.keys())
@@ -412,6 +406,15 @@ class ChartManager:
         # 計算月度總計
         month_total = sum(i - e for i, e in zip(income_data, expense_data))
         
+        # 累計結餘：上月底的餘額 (一次檢查點查找) 加上本月逐日的收支
+        previous_period = f"{year - 1}-12" if month == 1 else f"{year}-{month - 1:02d}"
+        running_balance = self.balance_history.get_month_end_balances(
+            previous_period, previous_period).get(previous_period, 0.0)
+        balance_data = []
+        for income, expense in zip(income_data, expense_data):
+            running_balance += income - expense
+            balance_data.append(running_balance)
+        
         # 上方：月度總計標籤
         header_frame = tk.Frame(parent_frame, bg='#F8FAFC')
         header_frame.pack(fill=tk.X, pady=(0, 10))
@@ -424,7 +427,8 @@ class ChartManager:
         
         # 中間：長條圖 (高度固定)
         fig = self.create_bar_chart(income_data, expense_data, day_labels, 
-                                    f'{year}年{month}月每日收支', y_interval=500, bar_width=0.4)
+                                    f'{year}年{month}月每日收支', y_interval=500, bar_width=0.4,
+                                    balance_data=balance_data)
         
         if fig:
             ax = fig.axes[0]
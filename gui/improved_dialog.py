@@ -3,25 +3,45 @@
 """
 
 import tkinter as tk
+from tkinter import ttk
 import customtkinter as ctk
 from datetime import datetime
 import calendar
 from .ui_config import COLORS, FONTS, SPACING, PADDING, ICONS
 
+# 帳戶選單中「不記入帳戶」的選項
+NO_ACCOUNT = "(不指定)"
+
+# 重複選項對應的定期交易頻率 (None 表示一般的單筆交易)
+REPEAT_OPTIONS = {"不重複": None, "每週": 'weekly', "每月": 'monthly', "每年": 'yearly'}
+
+# 備註自動完成清單最多顯示的筆數
+COMPLETION_ROWS = 5
+
 class ImprovedTransactionDialog:
     """改進的交易記錄新增/編輯對話框 (Modern Style)"""
     
-    def __init__(self, parent, category_manager, transaction_manager, transaction_data=None):
+    def __init__(self, parent, category_manager, transaction_manager, transaction_data=None, currencies=None,
+                 accounts=None, classifier=None, completer=None):
         self.parent = parent
         self.category_manager = category_manager
         self.transaction_manager = transaction_manager
         self.transaction_data = transaction_data
+        # 可選用的幣別 (第一個為基準幣別)
+        self.currencies = currencies or ['TWD']
+        # 可記入的帳戶 (AccountManager.get_accounts 的結果)
+        self.accounts = accounts or []
+        # 分類建議 (CategoryClassifier，None 時不顯示建議)；使用者自行選擇分類後不再自動套用建議
+        self.classifier = classifier
+        self._category_chosen = False
+        # 備註自動完成 (DescriptionCompleter，None 時不顯示)
+        self.completer = completer
         self.result = None
         
         # 建立對話框視窗 (CTkToplevel)
         self.dialog = ctk.CTkToplevel(parent)
         self.dialog.title("新增交易" if transaction_data is None else "編輯交易")
-        self.dialog.geometry("450x550")
+        self.dialog.geometry("450x680")
         self.dialog.transient(parent)
         self.dialog.grab_set()
         self.dialog.resizable(False, False)
@@ -40,7 +60,7 @@ class ImprovedTransactionDialog:
         """將對話框置中顯示"""
         self.dialog.update_idletasks()
         width = 450
-        height = 550
+        height = 650
         x = (self.dialog.winfo_screenwidth() // 2) - (width // 2)
         y = (self.dialog.winfo_screenheight() // 2) - (height // 2)
         self.dialog.geometry(f"{width}x{height}+{x}+{y}")
@@ -130,7 +150,7 @@ class ImprovedTransactionDialog:
 
         # 3. 分類選擇
         cat_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
-        cat_frame.pack(fill="x", pady=(0, 15))
+        cat_frame.pack(fill="x", pady=(0, 2))
         ctk.CTkLabel(cat_frame, text="分類", font=FONTS['body'], width=60, anchor="w").pack(side="left")
         
         self.category_var = tk.StringVar()
@@ -138,9 +158,15 @@ class ImprovedTransactionDialog:
             cat_frame, 
             variable=self.category_var, 
             width=250,
-            state="readonly"
+            state="readonly",
+            command=self.on_category_select
         )
         self.category_combo.pack(side="left", fill="x", expand=True)
+        
+        # 依備註與金額建議的分類
+        self.suggestion_label = ctk.CTkLabel(self.main_frame, text="", font=FONTS['caption'],
+                                             text_color=COLORS['text_secondary'], anchor="w")
+        self.suggestion_label.pack(fill="x", padx=(60, 0), pady=(0, 13))
 
         # 4. 金額輸入
         amount_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
@@ -151,12 +177,52 @@ class ImprovedTransactionDialog:
         self.amount_entry = ctk.CTkEntry(
             amount_frame, 
             textvariable=self.amount_var, 
-            width=250,
+            width=170,
             placeholder_text="輸入金額"
         )
         self.amount_entry.pack(side="left", fill="x", expand=True)
+        
+        # 幣別 (可直接輸入尚未設定匯率的幣別代碼)
+        self.currency_var = tk.StringVar(value=self.currencies[0])
+        self.currency_combo = ctk.CTkComboBox(
+            amount_frame,
+            variable=self.currency_var,
+            width=75,
+            values=self.currencies
+        )
+        self.currency_combo.pack(side="left", padx=(5, 0))
+
+        # 5. 帳戶 (選擇後幣別跟隨帳戶)
+        account_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
+        account_frame.pack(fill="x", pady=(0, 15))
+        ctk.CTkLabel(account_frame, text="帳戶", font=FONTS['body'], width=60, anchor="w").pack(side="left")
+        
+        self.account_var = tk.StringVar(value=NO_ACCOUNT)
+        self.account_combo = ctk.CTkComboBox(
+            account_frame,
+            variable=self.account_var,
+            width=250,
+            values=[NO_ACCOUNT] + [account['name'] for account in self.accounts],
+            state="readonly",
+            command=self.on_account_change
+        )
+        self.account_combo.pack(side="left", fill="x", expand=True)
+
+        # 6. 重複 (僅新增時；選擇後以所選日期為第一次建立定期交易)
+        self.repeat_var = tk.StringVar(value=next(iter(REPEAT_OPTIONS)))
+        if self.transaction_data is None:
+            repeat_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
+            repeat_frame.pack(fill="x", pady=(0, 15))
+            ctk.CTkLabel(repeat_frame, text="重複", font=FONTS['body'], width=60, anchor="w").pack(side="left")
+            ctk.CTkComboBox(
+                repeat_frame,
+                variable=self.repeat_var,
+                width=250,
+                values=list(REPEAT_OPTIONS),
+                state="readonly"
+            ).pack(side="left", fill="x", expand=True)
 
-        # 5. 備註輸入
+        # 7. 備註輸入
         desc_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
         desc_frame.pack(fill="x", pady=(0, 20))
         ctk.CTkLabel(desc_frame, text="備註", font=FONTS['body'], width=60, anchor="w").pack(side="left")
@@ -200,7 +266,21 @@ class ImprovedTransactionDialog:
         # Bindings
         # CTk doesn't support bind <Return> on Toplevel consistently, but we can try on entries
         self.amount_entry.bind('<Return>', lambda e: self.on_ok())
-        self.description_entry.bind('<Return>', lambda e: self.on_ok())
+        self.description_entry.bind('<Return>', lambda e: self.accept_completion() or self.on_ok())
+        
+        # 備註自動完成清單 (疊在備註欄下方，有候選時才顯示)
+        self.completion_list = tk.Listbox(self.dialog, height=COMPLETION_ROWS, font=FONTS['body'],
+                                          activestyle="none", exportselection=False)
+        self.completion_list.bind('<ButtonRelease-1>', lambda e: self.accept_completion())
+        if self.completer is not None:
+            self.description_entry.bind('<KeyRelease>', self.update_completions)
+            self.description_entry.bind('<Down>', lambda e: self.move_completion(1))
+            self.description_entry.bind('<Up>', lambda e: self.move_completion(-1))
+            self.description_entry.bind('<Escape>', lambda e: self.hide_completions())
+            self.description_entry.bind('<FocusOut>', lambda e: self.dialog.after(150, self.hide_completions))
+        if self.classifier is not None:
+            self.description_var.trace_add('write', lambda *args: self.update_suggestion())
+            self.amount_var.trace_add('write', lambda *args: self.update_suggestion())
 
     def update_day_options(self, event=None):
         try:
@@ -217,6 +297,17 @@ class ImprovedTransactionDialog:
         except:
             pass
 
+    def _selected_account(self):
+        for account in self.accounts:
+            if account['name'] == self.account_var.get():
+                return account
+        return None
+
+    def on_account_change(self, choice=None):
+        account = self._selected_account()
+        if account:
+            self.currency_var.set(account['currency'])
+
     def on_type_change(self):
         transaction_type = self.type_var.get()
         categories = self.category_manager.get_categories_by_type(transaction_type)
@@ -228,6 +319,65 @@ class ImprovedTransactionDialog:
             self.category_combo.set(category_names[0])
         else:
             self.category_combo.set("無分類")
+        self._category_chosen = False
+        self.update_suggestion()
+    
+    def update_completions(self, event=None):
+        """依目前輸入的備註更新自動完成清單"""
+        if event is not None and event.keysym in ('Up', 'Down', 'Return', 'Escape', 'Tab'):
+            return
+        completions = self.completer.complete(self.description_var.get(), COMPLETION_ROWS)
+        if not completions:
+            self.hide_completions()
+            return
+        self.completion_list.delete(0, "end")
+        for completion in completions:
+            self.completion_list.insert("end", completion)
+        self.completion_list.configure(height=len(completions))
+        self.completion_list.place(in_=self.description_entry, x=0, rely=1.0, relwidth=1.0)
+        self.completion_list.lift()
+    
+    def move_completion(self, step):
+        """以上下鍵移動自動完成清單的選取項目"""
+        if not self.completion_list.winfo_ismapped():
+            return
+        selection = self.completion_list.curselection()
+        index = (selection[0] + step if selection else 0) % self.completion_list.size()
+        self.completion_list.selection_clear(0, "end")
+        self.completion_list.selection_set(index)
+        self.completion_list.see(index)
+    
+    def accept_completion(self):
+        """套用選取的自動完成項目 (沒有選取時回傳 False)"""
+        selection = self.completion_list.curselection() if self.completion_list.winfo_ismapped() else ()
+        if not selection:
+            return False
+        self.description_var.set(self.completion_list.get(selection[0]))
+        self.description_entry.icursor("end")
+        self.hide_completions()
+        return True
+    
+    def hide_completions(self):
+        self.completion_list.place_forget()
+    
+    def on_category_select(self, choice=None):
+        self._category_chosen = True
+    
+    def update_suggestion(self):
+        """依目前的備註與金額更新分類建議；尚未自行選擇分類時直接選取最可能的分類"""
+        if self.classifier is None:
+            return
+        try:
+            amount = float(self.amount_var.get().strip())
+        except ValueError:
+            amount = None
+        suggestions = self.classifier.suggest(self.description_var.get(), self.type_var.get(), amount)
+        self.suggestion_label.configure(text="建議：" + "、".join(
+            f"{item['category_name']} {item['probability']:.0%}" for item in suggestions) if suggestions else "")
+        if suggestions and not self._category_chosen:
+            choice = f"{suggestions[0]['category_id']}: {suggestions[0]['category_name']}"
+            if choice in self.category_combo.cget('values'):
+                self.category_combo.set(choice)
 
     def fill_existing_data(self):
         data = self.transaction_data
@@ -239,6 +389,8 @@ class ImprovedTransactionDialog:
         
         self.type_var.set(data['type'])
         self.amount_var.set(str(data['amount']))
+        self.currency_var.set(data.get('currency') or self.currencies[0])
+        self.account_var.set(data.get('account_name') or NO_ACCOUNT)
         self.description_var.set(data.get('description', ''))
         
         self.on_type_change() # refresh categories
@@ -256,6 +408,7 @@ class ImprovedTransactionDialog:
             if val.endswith(f": {data.get('category_name', '')}"):
                 self.category_combo.set(val)
                 break
+        self._category_chosen = True
     
     def on_ok(self):
         try:
@@ -280,13 +433,17 @@ class ImprovedTransactionDialog:
             date = f"{year}-{month}-{day}"
             
             category_id = int(self.category_var.get().split(':')[0])
+            account = self._selected_account()
             
             self.result = {
                 'date': date,
                 'type': self.type_var.get(),
                 'category_id': category_id,
                 'amount': amount,
-                'description': self.description_var.get().strip()
+                'currency': self.currency_var.get().strip().upper(),
+                'account_id': account['id'] if account else None,
+                'description': self.description_var.get().strip(),
+                'frequency': REPEAT_OPTIONS.get(self.repeat_var.get())
             }
             self.dialog.destroy()
             
@@ -298,3 +455,309 @@ class ImprovedTransactionDialog:
     def on_cancel(self):
         self.result = None
         self.dialog.destroy()
+
+
+class TransferDialog:
+    """帳戶間轉帳對話框"""
+    
+    def __init__(self, parent, accounts):
+        self.accounts = accounts
+        self.result = None
+        
+        self.dialog = ctk.CTkToplevel(parent)
+        self.dialog.title("帳戶轉帳")
+        self.dialog.geometry("420x400")
+        self.dialog.transient(parent)
+        self.dialog.grab_set()
+        self.dialog.resizable(False, False)
+        self.dialog.lift()
+        self.dialog.focus_force()
+        
+        self.setup_ui()
+    
+    def _add_row(self, label):
+        frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
+        frame.pack(fill="x", pady=(0, 15))
+        ctk.CTkLabel(frame, text=label, font=FONTS['body'], width=80, anchor="w").pack(side="left")
+        return frame
+    
+    def setup_ui(self):
+        """設定對話框界面"""
+        self.main_frame = ctk.CTkFrame(self.dialog, corner_radius=0, fg_color=COLORS['bg_card'])
+        self.main_frame.pack(expand=True, fill="both", padx=20, pady=20)
+        
+        names = [account['name'] for account in self.accounts]
+        
+        self.date_var = tk.StringVar(value=datetime.now().strftime('%Y-%m-%d'))
+        ctk.CTkEntry(self._add_row("日期"), textvariable=self.date_var, width=220).pack(side="left")
+        
+        self.from_var = tk.StringVar(value=names[0])
+        ctk.CTkComboBox(self._add_row("轉出帳戶"), variable=self.from_var, values=names,
+                        width=220, state="readonly").pack(side="left")
+        
+        self.to_var = tk.StringVar(value=names[1] if len(names) > 1 else names[0])
+        ctk.CTkComboBox(self._add_row("轉入帳戶"), variable=self.to_var, values=names,
+                        width=220, state="readonly").pack(side="left")
+        
+        self.amount_var = tk.StringVar()
+        ctk.CTkEntry(self._add_row("轉出金額"), textvariable=self.amount_var, width=220).pack(side="left")
+        
+        self.to_amount_var = tk.StringVar()
+        ctk.CTkEntry(self._add_row("轉入金額"), textvariable=self.to_amount_var, width=220,
+                     placeholder_text="不同幣別時填寫").pack(side="left")
+        
+        self.description_var = tk.StringVar()
+        ctk.CTkEntry(self._add_row("備註"), textvariable=self.description_var, width=220).pack(side="left")
+        
+        btn_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
+        btn_frame.pack(fill="x", pady=(10, 0))
+        ctk.CTkButton(btn_frame, text="確定", command=self.on_ok, fg_color=COLORS['primary'],
+                      hover_color=COLORS['primary_dark'], width=100).pack(side="left", padx=(50, 10))
+        ctk.CTkButton(btn_frame, text="取消", command=self.on_cancel, fg_color="transparent",
+                      border_width=1, border_color=COLORS['text_secondary'],
+                      text_color=COLORS['text_primary'], width=100).pack(side="left", padx=10)
+    
+    def on_ok(self):
+        accounts = {account['name']: account['id'] for account in self.accounts}
+        try:
+            amount = float(self.amount_var.get().strip())
+            to_amount_str = self.to_amount_var.get().strip()
+            to_amount = float(to_amount_str) if to_amount_str else None
+            datetime.strptime(self.date_var.get().strip(), '%Y-%m-%d')
+        except ValueError:
+            tk.messagebox.showerror("錯誤", "日期或金額格式錯誤")
+            return
+        
+        self.result = {
+            'date': self.date_var.get().strip(),
+            'from_account_id': accounts[self.from_var.get()],
+            'to_account_id': accounts[self.to_var.get()],
+            'amount': amount,
+            'to_amount': to_amount,
+            'description': self.description_var.get().strip(),
+        }
+        self.dialog.destroy()
+    
+    def on_cancel(self):
+        self.result = None
+        self.dialog.destroy()
+
+
+class CsvImportDialog:
+    """CSV / Excel 匯入的欄位對應對話框"""
+    
+    # 欄位名稱 (依 MAPPING_FIELDS 的順序顯示)
+    FIELD_LABELS = {
+        'date': '日期 *', 'type': '類型', 'category': '分類', 'amount': '金額',
+        'debit': '支出金額', 'credit': '存入金額', 'currency': '幣別', 'description': '備註',
+    }
+    
+    # 欄位選單中「不使用」的選項
+    UNUSED = "(不使用)"
+    
+    def __init__(self, parent, header, accounts, default_mapping=None):
+        self.header = header
+        self.accounts = accounts
+        self.default_mapping = default_mapping or {}
+        self.result = None
+        
+        self.dialog = ctk.CTkToplevel(parent)
+        self.dialog.title("匯入交易記錄")
+        self.dialog.geometry("440x640")
+        self.dialog.transient(parent)
+        self.dialog.grab_set()
+        self.dialog.resizable(False, False)
+        self.dialog.lift()
+        self.dialog.focus_force()
+        
+        self.setup_ui()
+    
+    def _add_row(self, label):
+        frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
+        frame.pack(fill="x", pady=(0, 10))
+        ctk.CTkLabel(frame, text=label, font=FONTS['body'], width=100, anchor="w").pack(side="left")
+        return frame
+    
+    def setup_ui(self):
+        """設定對話框界面"""
+        self.main_frame = ctk.CTkFrame(self.dialog, corner_radius=0, fg_color=COLORS['bg_card'])
+        self.main_frame.pack(expand=True, fill="both", padx=20, pady=20)
+        
+        ctk.CTkLabel(self.main_frame, text="選擇每個欄位對應的檔案欄位。\n只有一個金額欄時，負數為支出、正數為收入。",
+                     justify="left", text_color=COLORS['text_secondary']).pack(anchor="w", pady=(0, 10))
+        
+        # 欄位對應 (標題與預設對應相同的欄位自動選取)
+        options = [self.UNUSED] + list(self.header)
+        self.field_vars = {}
+        for field, label in self.FIELD_LABELS.items():
+            default = self.default_mapping.get(field)
+            var = tk.StringVar(value=default if default in self.header else self.UNUSED)
+            ctk.CTkComboBox(self._add_row(label), variable=var, values=options,
+                            width=240, state="readonly").pack(side="left")
+            self.field_vars[field] = var
+        
+        self.date_format_var = tk.StringVar()
+        ctk.CTkEntry(self._add_row("日期格式"), textvariable=self.date_format_var, width=240,
+                     placeholder_text="自動辨識 (例如 %d/%m/%Y)").pack(side="left")
+        
+        names = [NO_ACCOUNT] + [account['name'] for account in self.accounts]
+        self.account_var = tk.StringVar(value=NO_ACCOUNT)
+        ctk.CTkComboBox(self._add_row("記入帳戶"), variable=self.account_var, values=names,
+                        width=240, state="readonly").pack(side="left")
+        
+        btn_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
+        btn_frame.pack(fill="x", pady=(10, 0))
+        ctk.CTkButton(btn_frame, text="匯入", command=self.on_ok, fg_color=COLORS['primary'],
+                      hover_color=COLORS['primary_dark'], width=100).pack(side="left", padx=(50, 10))
+        ctk.CTkButton(btn_frame, text="取消", command=self.on_cancel, fg_color="transparent",
+                      border_width=1, border_color=COLORS['text_secondary'],
+                      text_color=COLORS['text_primary'], width=100).pack(side="left", padx=10)
+    
+    def on_ok(self):
+        mapping = {field: var.get() for field, var in self.field_vars.items() if var.get() != self.UNUSED}
+        if 'date' not in mapping or not {'amount', 'debit', 'credit'} & set(mapping):
+            tk.messagebox.showerror("錯誤", "請至少選擇日期與金額 (或支出/存入) 欄位")
+            return
+        
+        accounts = {account['name']: account for account in self.accounts}
+        account = accounts.get(self.account_var.get())
+        self.result = {
+            'mapping': mapping,
+            'date_format': self.date_format_var.get().strip() or None,
+            'account_id': account['id'] if account else None,
+            'currency': account['currency'] if account else None,
+        }
+        self.dialog.destroy()
+    
+    def on_cancel(self):
+        self.result = None
+        self.dialog.destroy()
+
+
+class ReconciliationDialog:
+    """對帳結果對話框 (配對的交易確認後標記為已對帳)"""
+    
+    def __init__(self, parent, result, error_count=0):
+        self.match_result = result
+        self.error_count = error_count
+        self.result = None
+        
+        self.dialog = ctk.CTkToplevel(parent)
+        self.dialog.title("對帳")
+        self.dialog.geometry("760x560")
+        self.dialog.transient(parent)
+        self.dialog.grab_set()
+        self.dialog.lift()
+        self.dialog.focus_force()
+        
+        self.setup_ui()
+    
+    def _add_table(self, parent, columns, rows):
+        """建立一個列表 (columns 為 [(標題, 寬度)])"""
+        frame = ctk.CTkFrame(parent, fg_color="transparent")
+        frame.pack(expand=True, fill="both")
+        tree = ttk.Treeview(frame, columns=[title for title, _ in columns], show='headings')
+        for title, width in columns:
+            tree.heading(title, text=title)
+            tree.column(title, width=width, anchor="e" if title.endswith("金額") else "w")
+        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side="left", expand=True, fill="both")
+        scrollbar.pack(side="right", fill="y")
+        for row in rows:
+            tree.insert("", "end", values=row)
+    
+    @staticmethod
+    def _signed(row):
+        amount = float(row['amount'])
+        return f"{amount if row['type'] == 'income' else -amount:,.2f} {row['currency']}"
+    
+    def setup_ui(self):
+        """設定對話框界面"""
+        main_frame = ctk.CTkFrame(self.dialog, corner_radius=0, fg_color=COLORS['bg_card'])
+        main_frame.pack(expand=True, fill="both", padx=20, pady=20)
+        
+        matched = self.match_result['matched']
+        lines = self.match_result['unmatched_lines']
+        transactions = self.match_result['unmatched_transactions']
+        summary = f"配對 {len(matched):,} 筆，對帳單未配對 {len(lines):,} 筆，帳上未配對 {len(transactions):,} 筆"
+        if self.error_count:
+            summary += f" (對帳單有 {self.error_count:,} 列無法解析)"
+        ctk.CTkLabel(main_frame, text=summary, font=FONTS['body']).pack(anchor="w", pady=(0, 10))
+        
+        tabs = ctk.CTkTabview(main_frame)
+        tabs.pack(expand=True, fill="both")
+        matched_tab = tabs.add(f"配對 ({len(matched):,})")
+        lines_tab = tabs.add(f"對帳單未配對 ({len(lines):,})")
+        transactions_tab = tabs.add(f"帳上未配對 ({len(transactions):,})")
+        
+        self._add_table(matched_tab, [("對帳單日期", 90), ("帳上日期", 90), ("金額", 130), ("對帳單備註", 180),
+                                      ("帳上備註", 180)],
+                        [(line['date'], transaction['date'], self._signed(line), line['description'],
+                          transaction['description'] or '') for line, transaction in matched])
+        self._add_table(lines_tab, [("列號", 60), ("日期", 90), ("金額", 130), ("備註", 380)],
+                        [(line.get('line', ''), line['date'], self._signed(line), line['description'])
+                         for line in lines])
+        self._add_table(transactions_tab, [("日期", 90), ("金額", 130), ("備註", 440)],
+                        [(row['date'], self._signed(row), row['description'] or '') for row in transactions])
+        
+        btn_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        btn_frame.pack(fill="x", pady=(10, 0))
+        ctk.CTkButton(btn_frame, text="標記配對為已對帳", command=self.on_ok, fg_color=COLORS['primary'],
+                      hover_color=COLORS['primary_dark'], width=160,
+                      state="normal" if matched else "disabled").pack(side="left")
+        ctk.CTkButton(btn_frame, text="關閉", command=self.on_cancel, fg_color="transparent",
+                      border_width=1, border_color=COLORS['text_secondary'],
+                      text_color=COLORS['text_primary'], width=100).pack(side="left", padx=10)
+    
+    def on_ok(self):
+        self.result = [transaction['id'] for _, transaction in self.match_result['matched']]
+        self.dialog.destroy()
+    
+    def on_cancel(self):
+        self.result = None
+        self.dialog.destroy()
+
+
+class ProgressDialog:
+    """長時間工作的進度對話框 (取消時設定 cancel 事件，由工作執行緒自行停止)"""
+    
+    def __init__(self, parent, title, cancel_event):
+        self.cancel_event = cancel_event
+        
+        self.dialog = ctk.CTkToplevel(parent)
+        self.dialog.title(title)
+        self.dialog.geometry("400x160")
+        self.dialog.transient(parent)
+        self.dialog.grab_set()
+        self.dialog.resizable(False, False)
+        self.dialog.protocol("WM_DELETE_WINDOW", self.on_cancel)
+        self.dialog.lift()
+        
+        main_frame = ctk.CTkFrame(self.dialog, corner_radius=0, fg_color=COLORS['bg_card'])
+        main_frame.pack(expand=True, fill="both", padx=20, pady=20)
+        self.message_label = ctk.CTkLabel(main_frame, text="準備中...", font=FONTS['body'], anchor="w")
+        self.message_label.pack(fill="x", pady=(0, 10))
+        self.progress = ctk.CTkProgressBar(main_frame, progress_color=COLORS['primary'])
+        self.progress.set(0)
+        self.progress.pack(fill="x", pady=(0, 15))
+        self.cancel_button = ctk.CTkButton(main_frame, text="取消", command=self.on_cancel, fg_color="transparent",
+                                           border_width=1, border_color=COLORS['text_secondary'],
+                                           text_color=COLORS['text_primary'], width=100)
+        self.cancel_button.pack()
+    
+    def update(self, done, total):
+        """更新進度 (total 為 0 時只顯示已處理的筆數)"""
+        if total:
+            self.progress.set(done / total)
+            self.message_label.configure(text=f"已處理 {done:,} / {total:,} 筆 ({done / total:.0%})")
+        else:
+            self.message_label.configure(text=f"已處理 {done:,} 筆")
+    
+    def on_cancel(self):
+        self.cancel_event.set()
+        self.cancel_button.configure(state="disabled")
+        self.message_label.configure(text="正在取消...")
+    
+    def close(self):
+        self.dialog.destroy()
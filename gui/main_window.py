@@ -4,23 +4,28 @@
 """
 
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox, filedialog, simpledialog
 import customtkinter as ctk
 from datetime import datetime
 import sys
 import os
-import csv
+import threading
 
 # 匯入資料庫模組
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-from database.models import DatabaseManager, CategoryManager, TransactionManager
+from database.ledgers import LedgerRegistry, ConsolidatedReporter
+from database.budgets import budget_status
+from database.category_rules import RULE_AMOUNT, RULE_KEYWORD, RULE_REGEX
+from database.models import BASE_CURRENCY
+from database.archive import ArchiveManager
 
 # 匯入 GUI 模組
 from .dialogs import TransactionDialog, CategoryManagementDialog
+from .improved_dialog import TransferDialog, CsvImportDialog, ReconciliationDialog, ProgressDialog, REPEAT_OPTIONS
 from .charts import ChartManager, MATPLOTLIB_AVAILABLE
 from .filters import FilterPanel
 from .ui_config import COLORS, FONTS, SPACING, PADDING, ICONS
-from .ui_components import StatCard, ModernButton, SectionFrame
+from .ui_components import StatCard, BudgetCard, ModernButton, SectionFrame
 
 # 匯入工具模組
 try:
@@ -30,6 +35,27 @@ try:
 except ImportError:
     BACKUP_AVAILABLE = False
 
+try:
+    from utils.importers import (CsvImporter, XlsxImporter, OfxImporter, QifImporter, DEFAULT_MAPPING,
+                                 OPENPYXL_AVAILABLE, read_header, read_xlsx_header)
+    from utils.exporters import CsvExporter, XlsxExporter
+    IMPORT_AVAILABLE = True
+except ImportError:
+    IMPORT_AVAILABLE = False
+
+# 外部資料變更輪詢間隔 (毫秒)
+CHANGE_POLL_INTERVAL_MS = 2000
+
+# 帳本選單中的「新增帳本」選項
+NEW_LEDGER_OPTION = "＋ 新增帳本..."
+
+# 閒置維護 (增量空間回收) 間隔 (毫秒)
+IDLE_MAINTENANCE_INTERVAL_MS = 5 * 60 * 1000
+
+# 設定此環境變數 (值為慢查詢門檻毫秒數) 即開啟查詢效能分析，結束時輸出統計
+PROFILE_ENV_VAR = 'ACCOUNTING_PROFILE_MS'
+SLOW_QUERY_LOG = 'slow_queries.log'
+
 
 class MainWindow:
     """主視窗類別 - 重構版本 (CustomTkinter)"""
@@ -37,32 +63,29 @@ class MainWindow:
     def __init__(self):
         print("正在初始化個人記帳本...")
         
-        # 初始化資料庫
+        # 初始化備份管理器 (資料庫路徑隨使用中的帳本切換)
+        if BACKUP_AVAILABLE:
+            self.backup_manager = BackupManager()
+        else:
+            self.backup_manager = None
+        
+        # 初始化帳本 (每個帳本是獨立的資料庫檔案；既有的 accounting.db 為預設帳本)
         try:
-            self.db_manager = DatabaseManager("accounting.db")
-            self.category_manager = CategoryManager(self.db_manager)
-            self.transaction_manager = TransactionManager(self.db_manager)
+            self.ledger_registry = LedgerRegistry()
+            self.consolidated_reporter = ConsolidatedReporter(self.ledger_registry)
+            self._bind_ledger(self.ledger_registry.open_ledger(self.ledger_registry.active_ledger_id))
             print("✅ 資料庫初始化完成")
         except Exception as e:
             print(f"❌ 資料庫初始化失敗: {e}")
             messagebox.showerror("資料庫錯誤", f"無法初始化資料庫：{e}")
             sys.exit(1)
         
-        # 初始化圖表管理器
-        self.chart_manager = ChartManager(self.transaction_manager)
-        
-        # 初始化備份管理器
-        if BACKUP_AVAILABLE:
-            self.backup_manager = BackupManager()
-        else:
-            self.backup_manager = None
-        
         # 建立主視窗 (CustomTkinter)
         ctk.set_appearance_mode("Light")  # 極簡白風格
         ctk.set_default_color_theme("blue")
         
         self.root = ctk.CTk()
-        self.root.title("個人記帳本 v2.0 (Modern UI)")
+        self.root.title(f"個人記帳本 v2.0 (Modern UI) - {self.ledger.name}")
         self.root.geometry("1100x850") # 稍微加大以適應寬鬆排版
         self.root.minsize(900, 700)
         
@@ -70,11 +93,110 @@ class MainWindow:
         # self.root.option_add("*Font", FONTS['body']) # CTk 不吃這個，但 tk 元件 (如 Treeview) 吃
         
         self.current_transactions = []
+        self.current_limit = None     # 列表載入的筆數上限 (None 表示不限)
+        self.current_view_name = None
+        self.current_filters = None   # 目前列表套用的篩選條件 (None 表示未篩選)
+        self.current_summary = None   # 統計卡片快取 (本月收支)
         
         self.setup_ui()
         
         print("✅ 界面初始化完成")
     
+    def _bind_ledger(self, ledger):
+        """將主視窗使用的管理器切換到指定帳本 (管理器與快取在帳本開啟時建立，這裡只切換參照)"""
+        self.ledger = ledger
+        self.db_manager = ledger.db_manager
+        self.category_manager = ledger.category_manager
+        self.transaction_manager = ledger.transaction_manager
+        self.maintenance_manager = ledger.maintenance_manager
+        self.fx_rate_manager = ledger.fx_rate_manager
+        self.account_manager = ledger.account_manager
+        self.recurring_manager = ledger.recurring_manager
+        self.budget_manager = ledger.budget_manager
+        self.category_rule_manager = ledger.category_rule_manager
+        self.classifier = ledger.classifier
+        self.description_completer = ledger.description_completer
+        self.reconciliation_manager = ledger.reconciliation_manager
+        
+        if os.environ.get(PROFILE_ENV_VAR) and self.db_manager.profiler is None:
+            self.db_manager.enable_profiling(float(os.environ[PROFILE_ENV_VAR]), SLOW_QUERY_LOG)
+        
+        # 變更監視器 (偵測其他程式或同步軟體對資料庫的寫入)，每個帳本只訂閱一次
+        self.change_monitor = ledger.change_monitor
+        self.change_monitor.unsubscribe(self._on_external_change)
+        self.change_monitor.subscribe(self._on_external_change)
+        
+        # 圖表管理器
+        self.chart_manager = ChartManager(self.transaction_manager)
+        
+        if self.backup_manager:
+            self.backup_manager.db_path = ledger.path
+        if hasattr(self, 'filter_panel'):
+            self.filter_panel.category_manager = self.category_manager
+    
+    def switch_ledger(self, ledger_id):
+        """切換帳本 (已開啟過的帳本沿用既有連線與快取，不需重新啟動)"""
+        if ledger_id == self.ledger.id:
+            return
+        
+        self._bind_ledger(self.ledger_registry.open_ledger(ledger_id))
+        # 篩選條件與統計快取屬於前一個帳本 (分類 ID 不通用)
+        self.current_filters = None
+        self.current_summary = None
+        self.root.title(f"個人記帳本 v2.0 (Modern UI) - {self.ledger.name}")
+        self.ledger_menu.set(self.ledger.name)
+        
+        self.refresh_data()
+        if self.current_view_name and self.current_view_name.startswith('report_'):
+            self._refresh_current_chart()
+        self.status_label.configure(text=f"已切換到帳本：{self.ledger.name}")
+    
+    def _ledger_menu_values(self):
+        return [ledger['name'] for ledger in self.ledger_registry.list_ledgers()] + [NEW_LEDGER_OPTION]
+    
+    def _on_ledger_selected(self, choice):
+        """帳本選單選取事件"""
+        if choice == NEW_LEDGER_OPTION:
+            self.ledger_menu.set(self.ledger.name)
+            self.add_ledger()
+            return
+        
+        ledger = self.ledger_registry.find_by_name(choice)
+        if ledger:
+            self.switch_ledger(ledger.id)
+    
+    def add_ledger(self):
+        """新增帳本並切換過去"""
+        name = simpledialog.askstring("新增帳本", "帳本名稱：", parent=self.root)
+        if not name:
+            return
+        
+        try:
+            ledger = self.ledger_registry.add_ledger(name)
+        except ValueError as e:
+            messagebox.showerror("錯誤", str(e))
+            return
+        
+        self.ledger_menu.configure(values=self._ledger_menu_values())
+        self.switch_ledger(ledger.id)
+    
+    def show_consolidated_summary(self):
+        """顯示所有帳本本月的合併收支 (各帳本平行查詢後合併)"""
+        now = datetime.now()
+        summary = self.consolidated_reporter.get_monthly_summary(now.year, now.month)
+        
+        lines = []
+        for ledger_id, ledger_summary in summary['ledgers'].items():
+            name = self.ledger_registry.get_ledger(ledger_id).name
+            lines.append(f"{name}：收入 ${ledger_summary['total_income']:,.0f} / "
+                         f"支出 ${ledger_summary['total_expense']:,.0f}")
+        
+        messagebox.showinfo(f"{now.year}年{now.month}月 合併報表",
+            "\n".join(lines) + "\n\n"
+            f"合計收入：${summary['total_income']:,.0f}\n"
+            f"合計支出：${summary['total_expense']:,.0f}\n"
+            f"合計結餘：${summary['balance']:,.0f}")
+    
     def setup_ui(self):
         """設定主界面 (Dashboard Layout)"""
         # self.setup_menu() - 已移除，改用 Sidebar + Settings View
@@ -143,6 +265,17 @@ class MainWindow:
         self.nav_frame = ctk.CTkFrame(self.sidebar, fg_color="transparent")
         self.nav_frame.grid(row=3, column=0, sticky="ew", pady=10)
         
+        # 帳本切換
+        self.ledger_menu = ctk.CTkOptionMenu(
+            self.nav_frame,
+            values=self._ledger_menu_values(),
+            command=self._on_ledger_selected,
+            font=(FONTS['body'][0], 13),
+            dynamic_resizing=False
+        )
+        self.ledger_menu.set(self.ledger.name)
+        self.ledger_menu.pack(fill="x", padx=10, pady=(0, 10))
+        
         # 主導航
         self.create_nav_button("dashboard", f"{ICONS['chart']} 首頁", self.nav_frame)
         
@@ -237,6 +370,7 @@ class MainWindow:
             
         self.current_view_frame = self.views[view_name]
         self.current_view_frame.pack(fill="both", expand=True)
+        self.current_view_name = view_name
         
         # 觸發特定視圖的刷新邏輯
         if view_name == 'dashboard':
@@ -308,6 +442,13 @@ class MainWindow:
         self.balance_card = StatCard(stats_frame, card_type='balance')
         self.balance_card.grid(row=0, column=2, sticky="ew", padx=(10, 0))
         
+        # 預算卡片 (有設定預算時才顯示在統計卡片下方)
+        self.budget_frame = ctk.CTkFrame(parent, fg_color="transparent")
+        for column in range(3):
+            self.budget_frame.grid_columnconfigure(column, weight=1)
+        self.budget_anchor = stats_frame
+        self.budget_cards = []
+        
         # 2. 快速篩選按鈕列
         filter_bar = ctk.CTkFrame(parent, fg_color="transparent")
         filter_bar.pack(fill="x", pady=(0, 10))
@@ -484,16 +625,18 @@ class MainWindow:
         """Settings / Data View"""
         ctk.CTkLabel(parent, text="資料管理", font=(FONTS['title'][0], 24, "bold")).pack(anchor="w", pady=(0, 20))
         
-        # 1. 匯出區
-        export_section = SectionFrame(parent, title="資料匯出")
+        # 1. 匯入與匯出區
+        export_section = SectionFrame(parent, title="資料匯入與匯出")
         export_section.pack(fill="x", pady=(0, 20))
         
-        ctk.CTkLabel(export_section.content, text="將交易記錄匯出為 CSV 或 Excel 檔案。").pack(anchor="w", pady=(0, 10))
+        ctk.CTkLabel(export_section.content, text="將交易記錄匯出為 CSV 或 Excel 檔案，或匯入銀行對帳單 (CSV、Excel、OFX、QIF) 並與帳上交易核對。").pack(anchor="w", pady=(0, 10))
         
         h_box = ctk.CTkFrame(export_section.content, fg_color="transparent")
         h_box.pack(fill="x")
         ModernButton(h_box, text="匯出 CSV", icon='export', command=self.export_to_csv).pack(side="left", padx=(0, 10))
-        ModernButton(h_box, text="匯出 Excel", icon='export', style='secondary', command=self.export_to_excel).pack(side="left")
+        ModernButton(h_box, text="匯出 Excel", icon='export', style='secondary', command=self.export_to_excel).pack(side="left", padx=(0, 10))
+        ModernButton(h_box, text="匯入對帳單", icon='add', style='secondary', command=self.import_transactions).pack(side="left", padx=(0, 10))
+        ModernButton(h_box, text="對帳", icon='success', style='secondary', command=self.reconcile_statement).pack(side="left")
         
         # 2. 備份區
         backup_section = SectionFrame(parent, title="備份與還原")
@@ -507,7 +650,74 @@ class MainWindow:
         cat_section.pack(fill="x", pady=(0, 20))
         ModernButton(cat_section.content, text="管理收支分類", icon='category', command=self.open_category_management).pack(anchor="w")
         
-        # 4. 系統與說明
+        # 4. 資料庫維護
+        maint_section = SectionFrame(parent, title="資料庫維護")
+        maint_section.pack(fill="x", pady=(0, 20))
+        
+        ctk.CTkLabel(maint_section.content, text="重整資料庫檔案以回收刪除資料後的空間，並更新查詢統計資訊。").pack(anchor="w", pady=(0, 10))
+        h_maint = ctk.CTkFrame(maint_section.content, fg_color="transparent")
+        h_maint.pack(fill="x")
+        ModernButton(h_maint, text="壓縮資料庫", icon='refresh', style='secondary', command=self.compact_database).pack(side="left", padx=(0, 10))
+        ModernButton(h_maint, text="封存舊資料", icon='backup', style='secondary', command=self.archive_old_transactions).pack(side="left", padx=(0, 10))
+        ModernButton(h_maint, text="匯入匯率 (CSV)", icon='dollar', style='secondary', command=self.import_fx_rates).pack(side="left")
+        
+        # 5. 帳戶
+        account_section = SectionFrame(parent, title="帳戶")
+        account_section.pack(fill="x", pady=(0, 20))
+        
+        self.account_list_label = ctk.CTkLabel(account_section.content, text="", justify="left")
+        self.account_list_label.pack(anchor="w", pady=(0, 10))
+        self._update_account_list()
+        h_account = ctk.CTkFrame(account_section.content, fg_color="transparent")
+        h_account.pack(fill="x")
+        ModernButton(h_account, text="新增帳戶", icon='add', style='secondary', command=self.add_account).pack(side="left", padx=(0, 10))
+        ModernButton(h_account, text="帳戶轉帳", icon='balance', style='secondary', command=self.add_transfer).pack(side="left")
+        
+        # 6. 預算
+        budget_section = SectionFrame(parent, title="預算")
+        budget_section.pack(fill="x", pady=(0, 20))
+        
+        self.budget_list_label = ctk.CTkLabel(budget_section.content, text="", justify="left")
+        self.budget_list_label.pack(anchor="w", pady=(0, 10))
+        self._update_budget_list()
+        ModernButton(budget_section.content, text="設定預算", icon='chart', style='secondary', command=self.set_budget).pack(anchor="w")
+        
+        # 7. 自動分類規則
+        rule_section = SectionFrame(parent, title="自動分類規則")
+        rule_section.pack(fill="x", pady=(0, 20))
+        
+        self.category_rule_list_label = ctk.CTkLabel(rule_section.content, text="", justify="left")
+        self.category_rule_list_label.pack(anchor="w", pady=(0, 10))
+        self._update_category_rule_list()
+        h_rule = ctk.CTkFrame(rule_section.content, fg_color="transparent")
+        h_rule.pack(fill="x")
+        ModernButton(h_rule, text="新增規則", icon='add', style='secondary', command=self.add_category_rule).pack(side="left", padx=(0, 10))
+        ModernButton(h_rule, text="刪除規則", icon='delete', style='secondary', command=self.delete_category_rule).pack(side="left", padx=(0, 10))
+        ModernButton(h_rule, text="套用到未分類交易", icon='refresh', style='secondary', command=self.apply_category_rules).pack(side="left")
+        
+        # 8. 定期交易
+        recurring_section = SectionFrame(parent, title="定期交易")
+        recurring_section.pack(fill="x", pady=(0, 20))
+        
+        self.recurring_list_label = ctk.CTkLabel(recurring_section.content, text="", justify="left")
+        self.recurring_list_label.pack(anchor="w", pady=(0, 10))
+        self._update_recurring_list()
+        h_recurring = ctk.CTkFrame(recurring_section.content, fg_color="transparent")
+        h_recurring.pack(fill="x")
+        ModernButton(h_recurring, text="產生到期交易", icon='refresh', style='secondary', command=self.materialize_recurring).pack(side="left", padx=(0, 10))
+        ModernButton(h_recurring, text="刪除定期交易", icon='delete', style='secondary', command=self.delete_recurring_rule).pack(side="left")
+        
+        # 9. 帳本
+        ledger_section = SectionFrame(parent, title="帳本")
+        ledger_section.pack(fill="x", pady=(0, 20))
+        
+        ctk.CTkLabel(ledger_section.content, text="每個帳本是獨立的資料檔，可從側邊欄切換；合併報表會彙總所有帳本。").pack(anchor="w", pady=(0, 10))
+        h_ledger = ctk.CTkFrame(ledger_section.content, fg_color="transparent")
+        h_ledger.pack(fill="x")
+        ModernButton(h_ledger, text="新增帳本", icon='add', style='secondary', command=self.add_ledger).pack(side="left", padx=(0, 10))
+        ModernButton(h_ledger, text="本月合併報表", icon='chart', style='secondary', command=self.show_consolidated_summary).pack(side="left")
+        
+        # 10. 系統與說明
         sys_section = SectionFrame(parent, title="系統與說明")
         sys_section.pack(fill="x")
         
@@ -669,36 +879,77 @@ class MainWindow:
         ).pack(side=tk.RIGHT)
     
     # 篩選相關方法
+    @staticmethod
+    def _transaction_matches(trans: dict, filters) -> bool:
+        """檢查交易是否符合篩選條件 (filters 為 None 時一律符合)"""
+        if not filters:
+            return True
+        
+        # 日期篩選
+        if filters.get('start_date') and trans['date'] < filters['start_date']:
+            return False
+        if filters.get('end_date') and trans['date'] > filters['end_date']:
+            return False
+        
+        # 類型篩選
+        if filters.get('type', 'all') != "all" and trans['type'] != filters['type']:
+            return False
+        
+        # 分類篩選
+        category = filters.get('category')
+        if category and category != "全部分類" and trans['category_name'] != category:
+            return False
+        
+        # 關鍵字篩選
+        if filters.get('keyword') and filters['keyword'] not in str(trans.get('description', '')).lower():
+            return False
+        
+        return True
+    
     def on_filter_applied(self, filters: dict):
         """當篩選條件套用時的回調"""
         transactions = self.transaction_manager.get_transactions(limit=1000)
         
-        filtered_transactions = []
-        for trans in transactions:
-            # 日期篩選
-            if filters['start_date'] and trans['date'] < filters['start_date']:
-                continue
-            if filters['end_date'] and trans['date'] > filters['end_date']:
-                continue
-            
-            # 類型篩選
-            if filters['type'] != "all" and trans['type'] != filters['type']:
-                continue
-            
-            # 分類篩選
-            if filters['category'] != "全部分類" and filters['category'] and trans['category_name'] != filters['category']:
-                continue
-            
-            # 關鍵字篩選
-            if filters['keyword'] and filters['keyword'] not in str(trans.get('description', '')).lower():
-                continue
-            
-            filtered_transactions.append(trans)
+        filtered_transactions = [t for t in transactions if self._transaction_matches(t, filters)]
         
-        self.display_transactions(filtered_transactions)
+        self.current_filters = filters
+        self.display_transactions(filtered_transactions, limit=1000)
+    
+    def _insert_transaction_row(self, trans, index='end'):
+        """在 Treeview 插入單筆交易 (iid 為交易 ID)"""
+        # 移除小數點顯，改為千分位整數
+        amount_display = f"${int(trans['amount']):,}"
+        if trans.get('currency', BASE_CURRENCY) != BASE_CURRENCY:
+            amount_display = f"{trans['currency']} {trans['amount']:,.2f}"
+        if trans['type'] == 'income':
+            amount_display = f"+{amount_display}"
+        else:
+            amount_display = f"-{amount_display}"
+        
+        type_display = "收入" if trans['type'] == 'income' else "支出"
+        tags = ('income' if trans['type'] == 'income' else 'expense',)
+        
+        self.transaction_tree.insert('', index, iid=str(trans['id']), values=(
+            trans['date'],
+            type_display,
+            trans['category_name'],
+            amount_display,
+            trans.get('description', '')
+        ), tags=(str(trans['id']),) + tags)
+    
+    def _update_list_status(self):
+        """更新列表筆數狀態"""
+        if hasattr(self, 'list_status_label'):
+            self.list_status_label.configure(text=f"共 {len(self.current_transactions)} 筆記錄")
     
-    def display_transactions(self, transactions):
-        """顯示交易記錄"""
+    def display_transactions(self, transactions, limit=None):
+        """
+        顯示交易記錄
+        
+        Args:
+            transactions: 交易列表 (日期由新到舊)
+            limit: 載入的筆數上限，局部新增交易時列表不會超過此筆數
+        """
         # 防禦性檢查：確保 transaction_tree 已建立
         if not hasattr(self, 'transaction_tree'):
             return
@@ -707,39 +958,71 @@ class MainWindow:
         for item in self.transaction_tree.get_children():
             self.transaction_tree.delete(item)
         
-        self.current_transactions = transactions
+        self.current_transactions = list(transactions)
+        self.current_limit = limit
         
-        for trans in transactions:
-            # 移除小數點顯，改為千分位整數
-            amount_display = f"${int(trans['amount']):,}"
-            if trans['type'] == 'income':
-                amount_display = f"+{amount_display}"
-            else:
-                amount_display = f"-{amount_display}"
-            
-            type_display = "收入" if trans['type'] == 'income' else "支出"
-            tags = ('income' if trans['type'] == 'income' else 'expense',)
-            
-            self.transaction_tree.insert('', 'end', values=(
-                trans['date'],
-                type_display,
-                trans['category_name'],
-                amount_display,
-                trans.get('description', '')
-            ), tags=(str(trans['id']),) + tags)
+        for trans in self.current_transactions:
+            self._insert_transaction_row(trans)
         
         # 設定顏色
         self.transaction_tree.tag_configure('income', foreground='green')
         self.transaction_tree.tag_configure('expense', foreground='red')
         
         # 更新狀態
-        if hasattr(self, 'list_status_label'):
-             self.list_status_label.configure(text=f"共 {len(transactions)} 筆記錄")
+        self._update_list_status()
         
         # 隱藏操作區域
         if hasattr(self, 'action_frame'):
             self.action_frame.pack_forget()
     
+    def apply_transaction_change(self, old=None, new=None):
+        """
+        局部套用單筆交易異動，不重新載入整個列表與統計
+        
+        Args:
+            old: 異動前的交易資料 (新增時為 None)
+            new: 異動後的交易資料 (刪除時為 None)
+        """
+        # 1. 統計卡片依差額調整，備註自動完成逐筆更新
+        self.description_completer.record(old, new)
+        self._adjust_statistics(old, -1)
+        self._adjust_statistics(new, 1)
+        
+        if not hasattr(self, 'transaction_tree'):
+            return
+        
+        # 2. 移除舊列 (記住原位置，日期未變時原地更新)
+        old_index = None
+        if old is not None:
+            for i, trans in enumerate(self.current_transactions):
+                if trans['id'] == old['id']:
+                    old_index = i
+                    break
+            if old_index is not None:
+                del self.current_transactions[old_index]
+            if self.transaction_tree.exists(str(old['id'])):
+                self.transaction_tree.delete(str(old['id']))
+        
+        # 3. 新列若符合目前篩選條件則插入正確排序位置 (日期由新到舊)
+        if new is not None and self._transaction_matches(new, self.current_filters):
+            if old_index is not None and old['date'] == new['date']:
+                index = old_index
+            else:
+                index = next((i for i, trans in enumerate(self.current_transactions)
+                              if trans['date'] <= new['date']), len(self.current_transactions))
+            # 比最舊的已載入交易更舊且列表已達上限時，重新載入也不會顯示，不插入
+            limit = self.current_limit
+            if limit is None or index < len(self.current_transactions) or len(self.current_transactions) < limit:
+                self.current_transactions.insert(index, new)
+                self._insert_transaction_row(new, index)
+                # 超過上限時移除最舊的列
+                while limit is not None and len(self.current_transactions) > limit:
+                    removed = self.current_transactions.pop()
+                    if self.transaction_tree.exists(str(removed['id'])):
+                        self.transaction_tree.delete(str(removed['id']))
+        
+        self._update_list_status()
+    
     def refresh_data(self):
         """重新整理資料顯示"""
         try:
@@ -753,6 +1036,10 @@ class MainWindow:
             if hasattr(self, 'filter_panel'):
                 self.filter_panel.update_category_filter_options()
             
+            # 4. 重建備註自動完成 (批次異動後，在背景進行)
+            self.description_completer.invalidate()
+            
+            self.change_monitor.mark_seen()
             self.status_label.configure(text="資料已更新")
             
         except Exception as e:
@@ -760,6 +1047,35 @@ class MainWindow:
             if hasattr(self, 'status_label'):
                 self.status_label.configure(text="更新失敗")
 
+    def _poll_changes(self):
+        """定期檢查資料庫是否被外部修改"""
+        self.change_monitor.poll()
+        self.root.after(CHANGE_POLL_INTERVAL_MS, self._poll_changes)
+    
+    def _on_external_change(self, tables):
+        """資料庫被外部修改時，只重新載入受影響的部分"""
+        if 'categories' in tables and hasattr(self, 'filter_panel'):
+            self.filter_panel.update_category_filter_options()
+        
+        if tables & {'accounts', 'transfers', 'transactions'}:
+            self._update_account_list()
+        
+        if 'transactions' in tables:
+            self.description_completer.invalidate()
+        
+        # 列表顯示分類名稱與換算後的金額，分類或匯率變更時也需重新載入
+        if tables & {'transactions', 'categories', 'fx_rates'}:
+            if hasattr(self, 'income_card'):
+                self.update_statistics()
+            if self.current_view_name == 'dashboard':
+                self.filter_by_period(self.current_period)
+            elif self.current_view_name == 'transactions':
+                self.refresh_transactions()
+            elif self.current_view_name and self.current_view_name.startswith('report_'):
+                self._refresh_current_chart()
+        
+        self.status_label.configure(text="偵測到資料變更，已更新")
+    
     def refresh_dashboard(self):
         """刷新 Dashboard 數據"""
         if hasattr(self, 'income_card'):
@@ -810,19 +1126,28 @@ class MainWindow:
         else:
             filtered = transactions
         
-        self.display_transactions(filtered)
+        self.current_filters = {'start_date': start_date, 'end_date': end_date}
+        self.display_transactions(filtered, limit=500)
 
     def refresh_transactions(self):
         """刷新交易列表數據"""
         if hasattr(self, 'transaction_tree'):
             # 默認重新載入最新 200 筆
             transactions = self.transaction_manager.get_transactions(limit=200)
-            self.display_transactions(transactions)
+            self.current_filters = None
+            self.display_transactions(transactions, limit=200)
     
     def update_statistics(self):
         """更新統計顯示"""
         now = datetime.now()
-        summary = self.transaction_manager.get_monthly_summary(now.year, now.month)
+        self.current_summary = self.transaction_manager.get_monthly_summary(now.year, now.month)
+        self._show_statistics()
+    
+    def _show_statistics(self):
+        """將快取的統計數據顯示到卡片"""
+        summary = self.current_summary
+        if not summary:
+            return
         
         # 更新卡片數值
         if hasattr(self, 'income_card'):
@@ -831,6 +1156,67 @@ class MainWindow:
             self.expense_card.set_value(summary['total_expense'])
         if hasattr(self, 'balance_card'):
             self.balance_card.set_value(summary['balance'])
+        self._update_budget_cards()
+    
+    def _update_budget_cards(self):
+        """更新本月預算卡片 (讀取預先累計的支出，不需掃描交易)"""
+        if not hasattr(self, 'budget_frame') or not self.budget_frame.winfo_exists():
+            return
+        summary = self.current_summary
+        statuses = self.budget_manager.get_budget_status(summary['year'], summary['month'])
+        
+        # 卡片數量與預算數量不同時才重建
+        if len(self.budget_cards) != len(statuses):
+            for card in self.budget_cards:
+                card.destroy()
+            self.budget_cards = []
+            for index in range(len(statuses)):
+                row, column = divmod(index, 3)
+                card = BudgetCard(self.budget_frame)
+                padx = (0, 10) if column == 0 else (10, 0) if column == 2 else 10
+                card.grid(row=row, column=column, sticky="ew", padx=padx, pady=(0, 10))
+                self.budget_cards.append(card)
+        for card, status in zip(self.budget_cards, statuses):
+            card.set_status(status)
+        
+        if statuses:
+            self.budget_frame.pack(fill="x", pady=(0, 5), after=self.budget_anchor)
+        else:
+            self.budget_frame.pack_forget()
+    
+    def _warn_budget(self, trans):
+        """新增支出後，若使分類預算跨過提醒門檻或超支就提醒"""
+        if not trans or trans['type'] != 'expense':
+            return
+        year, month = int(trans['date'][:4]), int(trans['date'][5:7])
+        for status in self.budget_manager.get_budget_status(year, month):
+            if status['category_id'] != trans['category_id']:
+                continue
+            before = budget_status(status['spent'] - float(trans['amount_base']), status['amount'],
+                                   status['alert_threshold'])
+            if status['status'] == before:
+                return
+            if status['status'] == 'over':
+                messagebox.showwarning("預算提醒", f"「{status['category_name']}」本月已超支 ${-status['remaining']:,.0f}")
+            elif status['status'] == 'warning':
+                messagebox.showwarning("預算提醒", f"「{status['category_name']}」本月已使用預算的 {status['ratio']:.0%}")
+            return
+    
+    def _adjust_statistics(self, trans, sign):
+        """依單筆交易差額調整快取統計 (sign: +1 加入, -1 扣除)"""
+        summary = self.current_summary
+        if not trans or not summary:
+            return
+        if trans['date'][:7] != f"{summary['year']:04d}-{summary['month']:02d}":
+            return
+        
+        amount = sign * float(trans['amount_base'])
+        if trans['type'] == 'income':
+            summary['total_income'] += amount
+        else:
+            summary['total_expense'] += amount
+        summary['balance'] = summary['total_income'] - summary['total_expense']
+        self._show_statistics()
     
     # update_filtered_statistics 已移除 (不再需要)
     
@@ -842,22 +1228,36 @@ class MainWindow:
     # 交易管理方法
     def add_transaction(self):
         """新增交易記錄"""
-        dialog = TransactionDialog(self.root, self.category_manager, self.transaction_manager)
+        dialog = TransactionDialog(self.root, self.category_manager, self.transaction_manager,
+                                   currencies=self.fx_rate_manager.get_currencies(),
+                                   accounts=self.account_manager.get_accounts(), classifier=self.classifier,
+                                   completer=self.description_completer)
         self.root.wait_window(dialog.dialog)
         
-        if dialog.result:
+        if dialog.result and dialog.result['frequency']:
+            self._add_recurring_rule(dialog.result)
+        elif dialog.result:
             data = dialog.result
-            success = self.transaction_manager.add_transaction(
-                date=data['date'],
-                transaction_type=data['type'],
-                category_id=data['category_id'],
-                amount=data['amount'],
-                description=data['description']
-            )
+            try:
+                transaction_id = self.transaction_manager.add_transaction(
+                    date=data['date'],
+                    transaction_type=data['type'],
+                    category_id=data['category_id'],
+                    amount=data['amount'],
+                    description=data['description'],
+                    currency=data['currency'],
+                    account_id=data['account_id']
+                )
+            except ValueError as e:
+                messagebox.showerror("錯誤", str(e))
+                return
             
-            if success:
+            if transaction_id:
                 messagebox.showinfo("成功", "交易記錄新增成功！")
-                self.refresh_data()
+                new = self.transaction_manager.get_transaction(transaction_id)
+                self.apply_transaction_change(new=new)
+                self.change_monitor.mark_seen()
+                self._warn_budget(new)
                 self.status_label.configure(text="新增記錄成功")
             else:
                 messagebox.showerror("錯誤", "交易記錄新增失敗！")
@@ -872,35 +1272,41 @@ class MainWindow:
         
         transaction_id = int(self.transaction_tree.item(selected_item[0])['tags'][0])
         
-        transactions = self.transaction_manager.get_transactions()
-        transaction_data = None
-        for trans in transactions:
-            if trans['id'] == transaction_id:
-                transaction_data = trans
-                break
+        transaction_data = self.transaction_manager.get_transaction(transaction_id)
         
         if not transaction_data:
             messagebox.showerror("錯誤", "找不到交易記錄")
             return
         
         dialog = TransactionDialog(self.root, self.category_manager, 
-                                 self.transaction_manager, transaction_data)
+                                 self.transaction_manager, transaction_data,
+                                 currencies=self.fx_rate_manager.get_currencies(),
+                                 accounts=self.account_manager.get_accounts(), classifier=self.classifier,
+                                 completer=self.description_completer)
         self.root.wait_window(dialog.dialog)
         
         if dialog.result:
             data = dialog.result
-            success = self.transaction_manager.update_transaction(
-                transaction_id=transaction_id,
-                date=data['date'],
-                transaction_type=data['type'],
-                category_id=data['category_id'],
-                amount=data['amount'],
-                description=data['description']
-            )
+            try:
+                success = self.transaction_manager.update_transaction(
+                    transaction_id=transaction_id,
+                    date=data['date'],
+                    transaction_type=data['type'],
+                    category_id=data['category_id'],
+                    amount=data['amount'],
+                    description=data['description'],
+                    currency=data['currency'],
+                    account_id=data['account_id']
+                )
+            except ValueError as e:
+                messagebox.showerror("錯誤", str(e))
+                return
             
             if success:
                 messagebox.showinfo("成功", "交易記錄更新成功！")
-                self.refresh_data()
+                self.apply_transaction_change(old=transaction_data,
+                                              new=self.transaction_manager.get_transaction(transaction_id))
+                self.change_monitor.mark_seen()
                 self.status_label.configure(text="更新記錄成功")
             else:
                 messagebox.showerror("錯誤", "交易記錄更新失敗！")
@@ -917,12 +1323,21 @@ class MainWindow:
             return
         
         transaction_id = int(self.transaction_tree.item(selected_item[0])['tags'][0])
+        transaction_data = self.transaction_manager.get_transaction(transaction_id)
         
-        success = self.transaction_manager.delete_transaction(transaction_id)
+        try:
+            success = self.transaction_manager.delete_transaction(transaction_id)
+        except ValueError as e:
+            messagebox.showerror("錯誤", str(e))
+            return
         
         if success:
             messagebox.showinfo("成功", "交易記錄刪除成功！")
-            self.refresh_data()
+            if transaction_data:
+                self.apply_transaction_change(old=transaction_data)
+                self.change_monitor.mark_seen()
+            else:
+                self.refresh_data()
             self.status_label.configure(text="刪除記錄成功")
         else:
             messagebox.showerror("錯誤", "交易記錄刪除失敗！")
@@ -937,11 +1352,186 @@ class MainWindow:
         # 重新整理資料以更新分類選項
         self.refresh_data()
     
+    # 匯入功能
+    def import_transactions(self):
+        """從 CSV、Excel、OFX 或 QIF 檔案匯入交易 (在背景執行緒中串流匯入，狀態列顯示進度)"""
+        if not IMPORT_AVAILABLE:
+            messagebox.showerror("錯誤", "匯入功能不可用\n請確認 utils/importers.py 存在")
+            return
+        filename = filedialog.askopenfilename(
+            title="匯入交易記錄",
+            filetypes=[("對帳單檔案", "*.csv *.xlsx *.ofx *.qfx *.qif"), ("所有檔案", "*.*")]
+        )
+        if not filename:
+            return
+        importer = self._choose_importer(filename)
+        if importer is not None:
+            self._run_import(importer, filename)
+    
+    def _choose_importer(self, filename):
+        """依副檔名建立匯入器 (CSV / Excel 需選擇欄位對應，對帳單需選擇帳戶)，取消或失敗時回傳 None"""
+        extension = os.path.splitext(filename)[1].lower()
+        if extension in ('.ofx', '.qfx', '.qif'):
+            return self._statement_importer(extension)
+        
+        is_xlsx = extension == '.xlsx'
+        if is_xlsx:
+            if not OPENPYXL_AVAILABLE:
+                messagebox.showerror("缺少套件", "Excel 匯入需要安裝 openpyxl 套件。\n\n請在終端機執行：pip install openpyxl")
+                return
+            try:
+                header = read_xlsx_header(filename)
+            except Exception as e:
+                messagebox.showerror("錯誤", f"無法讀取 Excel 檔案：{str(e)}")
+                return None
+        else:
+            # 國內銀行的對帳單常為 Big5 (cp950) 編碼
+            for encoding in ('utf-8-sig', 'cp950'):
+                try:
+                    header = read_header(filename, encoding)
+                    break
+                except UnicodeDecodeError:
+                    continue
+            else:
+                messagebox.showerror("錯誤", "無法辨識檔案編碼 (支援 UTF-8 與 Big5)")
+                return None
+        
+        dialog = CsvImportDialog(self.root, header, self.account_manager.get_accounts(), DEFAULT_MAPPING)
+        self.root.wait_window(dialog.dialog)
+        if not dialog.result:
+            return None
+        
+        options = dialog.result
+        settings = dict(mapping=options['mapping'], date_format=options['date_format'],
+                        currency=options['currency'] or BASE_CURRENCY, account_id=options['account_id'])
+        try:
+            if is_xlsx:
+                return XlsxImporter(self.transaction_manager, **settings)
+            return CsvImporter(self.transaction_manager, encoding=encoding, **settings)
+        except ValueError as e:
+            messagebox.showerror("錯誤", str(e))
+            return None
+    
+    def _statement_importer(self, extension):
+        """OFX / QIF 對帳單的匯入器 (欄位固定，只需選擇記入的帳戶)"""
+        accounts = {account['name']: account for account in self.account_manager.get_accounts()}
+        account = None
+        if accounts:
+            name = simpledialog.askstring("匯入對帳單", f"記入帳戶 ({'、'.join(accounts)}，空白表示不指定)：",
+                                          parent=self.root)
+            if name is None:
+                return None
+            if name.strip() and name.strip() not in accounts:
+                messagebox.showerror("錯誤", f"找不到帳戶「{name}」")
+                return None
+            account = accounts.get(name.strip())
+        
+        settings = dict(account_id=account['id'] if account else None,
+                        currency=account['currency'] if account else BASE_CURRENCY)
+        if extension == '.qif':
+            return QifImporter(self.transaction_manager, **settings)
+        return OfxImporter(self.transaction_manager, **settings)
+    
+    def reconcile_statement(self):
+        """以銀行對帳單核對帳上交易 (只比對不匯入)，確認後將配對的交易標記為已對帳"""
+        if not IMPORT_AVAILABLE:
+            messagebox.showerror("錯誤", "對帳功能不可用\n請確認 utils/importers.py 存在")
+            return
+        filename = filedialog.askopenfilename(
+            title="選擇要核對的對帳單",
+            filetypes=[("對帳單檔案", "*.csv *.xlsx *.ofx *.qfx *.qif"), ("所有檔案", "*.*")]
+        )
+        if not filename:
+            return
+        importer = self._choose_importer(filename)
+        if importer is None:
+            return
+        
+        try:
+            rows, errors = importer.parse_file(filename)
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            messagebox.showerror("對帳失敗", str(e))
+            return
+        result = self.reconciliation_manager.match([dict(row, line=line) for line, row in rows],
+                                                   importer.account_id)
+        if result is None:
+            messagebox.showerror("對帳失敗", "查詢帳上交易失敗")
+            return
+        
+        dialog = ReconciliationDialog(self.root, result, len(errors))
+        self.root.wait_window(dialog.dialog)
+        if dialog.result:
+            count = self.reconciliation_manager.reconcile(dialog.result)
+            self.change_monitor.mark_seen()
+            self.status_label.configure(text=f"已將 {count:,} 筆交易標記為已對帳")
+    
+    def _run_import(self, importer, filename):
+        """在背景執行緒中執行匯入並開始輪詢進度"""
+        state = {'done': 0, 'total': 0, 'result': None, 'error': None}
+        
+        def on_progress(done, total):
+            state['done'], state['total'] = done, total
+        
+        def run():
+            try:
+                state['result'] = importer.import_file(filename, progress=on_progress)
+            except Exception as e:
+                # 任何例外都要回報，否則輪詢會一直停在「匯入中」
+                state['error'] = str(e) or type(e).__name__
+        
+        threading.Thread(target=run, daemon=True).start()
+        self._poll_import(state)
+    
+    def _poll_import(self, state):
+        """在主執行緒中更新匯入進度，完成後顯示結果"""
+        if state['result'] is None and state['error'] is None:
+            if state['total']:
+                self.status_label.configure(text=f"匯入中... {state['done'] / state['total']:.0%}")
+            else:
+                self.status_label.configure(text=f"匯入中... 已讀取 {state['done']:,} 列")
+            self.root.after(200, lambda: self._poll_import(state))
+            return
+        
+        if state['error']:
+            messagebox.showerror("匯入失敗", state['error'])
+            self.status_label.configure(text="匯入失敗")
+            return
+        
+        result = state['result']
+        message = f"已匯入 {result['imported']:,} 筆交易記錄"
+        if result['error_count']:
+            details = "\n".join(f"第 {line} 列：{error}" for line, error in result['errors'][:10])
+            message += f"\n\n{result['error_count']:,} 筆無法匯入：\n{details}"
+        if result['duplicates']:
+            message += f"\n\n已略過 {result['duplicates']:,} 筆先前匯入過的交易"
+        if result['near_duplicates']:
+            details = "\n".join(
+                f"第 {line} 列：與 {matches[0]['date']} 的「{matches[0]['description'] or '(無備註)'}」"
+                f"金額相同" for line, matches in result['near_duplicates'][:10])
+            message += f"\n\n{len(result['near_duplicates']):,} 筆可能重複 (已匯入，請確認)：\n{details}"
+        messagebox.showinfo("匯入交易記錄", message)
+        
+        if result['imported']:
+            self.maintenance_manager.record_bulk_change(result['imported'])
+            self.refresh_data()
+            self._update_account_list()
+            self.change_monitor.mark_seen()
+        self.status_label.configure(text=f"已匯入 {result['imported']:,} 筆交易記錄")
+    
     # 匯出功能
+    def _has_export_rows(self):
+        """依目前的篩選條件查詢資料庫是否有可匯出的交易 (不看列表中已載入的列)"""
+        if self.transaction_manager.count_transactions(self.current_filters):
+            return True
+        messagebox.showwarning("提醒", "沒有資料可匯出")
+        return False
+    
     def export_to_csv(self):
-        """匯出資料到 CSV 檔案"""
-        if not self.current_transactions:
-            messagebox.showwarning("提醒", "沒有資料可匯出")
+        """將目前篩選條件的所有交易匯出到 CSV 檔案 (由資料庫分批讀取，在背景執行緒寫入)"""
+        if not IMPORT_AVAILABLE:
+            messagebox.showerror("錯誤", "匯出功能不可用\n請確認 utils/exporters.py 存在")
+            return
+        if not self._has_export_rows():
             return
         
         try:
@@ -957,60 +1547,55 @@ class MainWindow:
         
         if not filename:
             return
+        self._run_export(CsvExporter(self.transaction_manager), filename, "CSV")
+    
+    def _run_export(self, exporter, filename, label):
+        """在背景執行緒中執行匯出，顯示進度對話框並開始輪詢"""
+        state = {'done': 0, 'total': 0, 'result': None, 'error': None}
+        cancel = threading.Event()
+        filters = dict(self.current_filters) if self.current_filters else None
+        
+        def on_progress(done, total):
+            state['done'], state['total'] = done, total
+        
+        def run():
+            try:
+                state['result'] = exporter.export(filename, filters, progress=on_progress, cancel=cancel)
+            except Exception as e:
+                # 任何例外都要回報，否則進度對話框不會關閉
+                state['error'] = str(e) or type(e).__name__
+        
+        dialog = ProgressDialog(self.root, f"匯出 {label}", cancel)
+        self.status_label.configure(text=f"{label} 匯出中...")
+        threading.Thread(target=run, daemon=True).start()
+        self._poll_export(state, dialog, filename, label)
+    
+    def _poll_export(self, state, dialog, filename, label):
+        """在主執行緒中更新匯出進度，完成後顯示結果"""
+        if state['result'] is None and state['error'] is None:
+            dialog.update(state['done'], state['total'])
+            self.root.after(200, lambda: self._poll_export(state, dialog, filename, label))
+            return
         
-        try:
-            with open(filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
-                writer = csv.writer(csvfile)
-                
-                # 寫入標題
-                writer.writerow(['日期', '類型', '分類', '金額', '備註'])
-                
-                # 寫入交易資料
-                for trans in self.current_transactions:
-                    type_display = "收入" if trans['type'] == 'income' else "支出"
-                    writer.writerow([
-                        trans['date'],
-                        type_display,
-                        trans['category_name'],
-                        trans['amount'],
-                        trans.get('description', '')
-                    ])
-                
-                # 寫入統計摘要
-                writer.writerow([])
-                writer.writerow(['統計摘要'])
-                
-                total_income = sum(trans['amount'] for trans in self.current_transactions if trans['type'] == 'income')
-                total_expense = sum(trans['amount'] for trans in self.current_transactions if trans['type'] == 'expense')
-                balance = total_income - total_expense
-                
-                writer.writerow(['總收入', f'${total_income:.2f}'])
-                writer.writerow(['總支出', f'${total_expense:.2f}'])
-                writer.writerow(['結餘', f'${balance:.2f}'])
-                
-                # 寫入匯出資訊
-                writer.writerow([])
-                writer.writerow(['匯出資訊'])
-                writer.writerow(['匯出時間', datetime.now().strftime('%Y-%m-%d %H:%M:%S')])
-                writer.writerow(['記錄筆數', len(self.current_transactions)])
-            
-            messagebox.showinfo("成功", f"資料已成功匯出到：\n{filename}")
-            self.status_label.configure(text="CSV 匯出成功")
-            
-        except Exception as e:
-            messagebox.showerror("錯誤", f"匯出失敗：{str(e)}")
-            self.status_label.configure(text="CSV 匯出失敗")
+        dialog.close()
+        if state['error']:
+            messagebox.showerror("錯誤", f"匯出失敗：{state['error']}")
+            self.status_label.configure(text=f"{label} 匯出失敗")
+        elif state['result']['cancelled']:
+            self.status_label.configure(text=f"已取消 {label} 匯出")
+        else:
+            messagebox.showinfo("成功", f"已匯出 {state['result']['rows']:,} 筆交易到：\n{filename}")
+            self.status_label.configure(text=f"{label} 匯出成功")
     
     def export_to_excel(self):
-        """匯出資料到 Excel 檔案"""
-        if not self.current_transactions:
-            messagebox.showwarning("提醒", "沒有資料可匯出")
+        """將目前篩選條件的所有交易匯出到 Excel 檔案 (含月份摘要與分類樞紐工作表，在背景執行緒寫入)"""
+        if not IMPORT_AVAILABLE:
+            messagebox.showerror("錯誤", "匯出功能不可用\n請確認 utils/exporters.py 存在")
+            return
+        if not self._has_export_rows():
             return
         
-        try:
-            import openpyxl
-            from openpyxl.styles import Font, PatternFill, Alignment
-        except ImportError:
+        if not OPENPYXL_AVAILABLE:
             result = messagebox.askyesno("缺少套件", 
                 "Excel 匯出需要安裝 openpyxl 套件。\n\n" +
                 "請在終端機執行：pip install openpyxl\n\n" +
@@ -1032,43 +1617,351 @@ class MainWindow:
         
         if not filename:
             return
+        self._run_export(XlsxExporter(self.transaction_manager), filename, "Excel")
+    
+    # 資料庫維護
+    def _schedule_idle_maintenance(self):
+        """定期在事件迴圈閒置時回收空閒頁"""
+        def run():
+            reclaimed = self.maintenance_manager.run_idle_maintenance()
+            if reclaimed > 0 and BACKUP_AVAILABLE:
+                self.status_label.configure(text=f"已回收 {format_file_size(reclaimed)} 空間")
+            self._schedule_idle_maintenance()
+        
+        self.root.after(IDLE_MAINTENANCE_INTERVAL_MS, lambda: self.root.after_idle(run))
+    
+    def compact_database(self):
+        """離線壓縮資料庫並顯示回收空間與查詢時間變化"""
+        if not messagebox.askyesno("壓縮資料庫",
+            "壓縮期間無法進行其他操作，資料量大時可能需要一些時間。\n\n確定要繼續嗎？"):
+            return
         
+        self.status_label.configure(text="正在壓縮資料庫...")
+        self.root.update_idletasks()
+        
+        # 替換檔案前需關閉所有連線 (變更監視器下次輪詢時會自動重新連線)
+        self.change_monitor.close()
         try:
-            wb = openpyxl.Workbook()
-            ws_data = wb.active
-            ws_data.title = "交易記錄"
-            
-            # 設定標題樣式
-            header_font = Font(bold=True, color="FFFFFF")
-            header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            
-            headers = ['日期', '類型', '分類', '金額', '備註']
-            for col, header in enumerate(headers, 1):
-                cell = ws_data.cell(row=1, column=col, value=header)
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = Alignment(horizontal='center')
-            
-            # 寫入交易資料
-            for row, trans in enumerate(self.current_transactions, 2):
-                ws_data.cell(row=row, column=1, value=trans['date'])
-                ws_data.cell(row=row, column=2, value="收入" if trans['type'] == 'income' else "支出")
-                ws_data.cell(row=row, column=3, value=trans['category_name'])
-                ws_data.cell(row=row, column=4, value=trans['amount'])
-                ws_data.cell(row=row, column=5, value=trans.get('description', ''))
-            
-            # 調整欄寬
-            column_widths = [12, 8, 15, 12, 30]
-            for col, width in enumerate(column_widths, 1):
-                ws_data.column_dimensions[openpyxl.utils.get_column_letter(col)].width = width
-            
-            wb.save(filename)
-            messagebox.showinfo("成功", f"Excel 檔案已成功匯出到：\n{filename}")
-            self.status_label.configure(text="Excel 匯出成功")
-            
+            report = self.maintenance_manager.compact()
         except Exception as e:
-            messagebox.showerror("錯誤", f"Excel 匯出失敗：{str(e)}")
-            self.status_label.configure(text="Excel 匯出失敗")
+            messagebox.showerror("錯誤", f"壓縮資料庫失敗：{e}")
+            self.status_label.configure(text="壓縮失敗")
+            return
+        finally:
+            self.change_monitor.mark_seen()
+        
+        query_lines = []
+        for name, before_ms in report['query_ms_before'].items():
+            after_ms = report['query_ms_after'].get(name, before_ms)
+            query_lines.append(f"  {name}: {before_ms:.2f} ms → {after_ms:.2f} ms")
+        
+        size_text = format_file_size if BACKUP_AVAILABLE else (lambda size: f"{size:,} bytes")
+        messagebox.showinfo("壓縮完成",
+            f"檔案大小：{size_text(report['size_before'])} → {size_text(report['size_after'])}\n"
+            f"回收空間：{size_text(max(report['reclaimed_bytes'], 0))}\n\n"
+            f"查詢時間：\n" + "\n".join(query_lines))
+        self.status_label.configure(text="資料庫壓縮完成")
+    
+    def archive_old_transactions(self):
+        """將 N 年前的交易明細移到封存檔，主資料庫只保留月度彙總"""
+        years = simpledialog.askinteger("封存舊資料",
+            "封存幾年前的交易明細？\n(報表仍會以月度彙總呈現這些期間)",
+            parent=self.root, minvalue=1, initialvalue=5)
+        if not years:
+            return
+        
+        try:
+            archive_manager = ArchiveManager(self.db_manager)
+            cutoff_date = archive_manager.get_cutoff_date(years)
+            count = archive_manager.archive_before(cutoff_date)
+        except ValueError as e:
+            messagebox.showerror("錯誤", str(e))
+            return
+        
+        messagebox.showinfo("封存完成",
+            f"已封存 {count} 筆 {cutoff_date} 之前的交易記錄\n封存檔：{archive_manager.archive_path}")
+        self.refresh_data()
+    
+    # 帳戶
+    def _update_account_list(self):
+        """更新設定頁的帳戶餘額列表 (餘額為預先累計的值，不需加總交易)"""
+        if not hasattr(self, 'account_list_label') or not self.account_list_label.winfo_exists():
+            return
+        accounts = self.account_manager.get_accounts()
+        if not accounts:
+            self.account_list_label.configure(text="尚未建立帳戶。新增帳戶後，交易可指定記入的帳戶並自動計算餘額。")
+            return
+        lines = [f"{account['name']}：{account['currency']} {account['balance']:,.2f}" for account in accounts]
+        lines.append(f"合計 (換算 {BASE_CURRENCY})：{self.account_manager.get_net_worth():,.2f}")
+        self.account_list_label.configure(text="\n".join(lines))
+    
+    def add_account(self):
+        """新增帳戶"""
+        name = simpledialog.askstring("新增帳戶", "帳戶名稱：", parent=self.root)
+        if not name:
+            return
+        currency = simpledialog.askstring("新增帳戶", "幣別代碼：", parent=self.root, initialvalue=BASE_CURRENCY)
+        if not currency:
+            return
+        opening_balance = simpledialog.askfloat("新增帳戶", "期初餘額：", parent=self.root, initialvalue=0)
+        if opening_balance is None:
+            return
+        
+        try:
+            account_id = self.account_manager.add_account(name, currency, opening_balance)
+        except ValueError as e:
+            messagebox.showerror("錯誤", str(e))
+            return
+        
+        if account_id is None:
+            messagebox.showerror("錯誤", f"帳戶「{name}」已存在")
+            return
+        self._update_account_list()
+        self.status_label.configure(text=f"已新增帳戶：{name}")
+    
+    def add_transfer(self):
+        """帳戶間轉帳 (不計入收支)"""
+        accounts = self.account_manager.get_accounts()
+        if len(accounts) < 2:
+            messagebox.showwarning("提醒", "轉帳需要至少兩個帳戶")
+            return
+        
+        dialog = TransferDialog(self.root, accounts)
+        self.root.wait_window(dialog.dialog)
+        if not dialog.result:
+            return
+        
+        try:
+            transfer_id = self.account_manager.add_transfer(**dialog.result)
+        except ValueError as e:
+            messagebox.showerror("錯誤", str(e))
+            return
+        
+        if transfer_id is None:
+            messagebox.showerror("錯誤", "轉帳失敗！")
+            return
+        self.change_monitor.mark_seen()
+        self._update_account_list()
+        self.status_label.configure(text="轉帳完成")
+    
+    # 預算
+    def _update_budget_list(self):
+        """更新設定頁的預算列表"""
+        if not hasattr(self, 'budget_list_label') or not self.budget_list_label.winfo_exists():
+            return
+        budgets = self.budget_manager.get_budgets()
+        if not budgets:
+            self.budget_list_label.configure(text="尚未設定預算。為支出分類設定每月預算後，首頁會顯示本月的使用進度。")
+            return
+        lines = [
+            f"{budget['category_name']}：每月 {BASE_CURRENCY} {budget['amount']:,.0f}，提醒門檻 {budget['alert_threshold']:.0%}"
+            for budget in budgets
+        ]
+        self.budget_list_label.configure(text="\n".join(lines))
+    
+    def set_budget(self):
+        """設定或刪除支出分類的每月預算"""
+        categories = {category['name']: category['id'] for category in self.category_manager.get_categories_by_type('expense')}
+        name = simpledialog.askstring("設定預算", f"支出分類 ({'、'.join(categories)})：", parent=self.root)
+        if not name:
+            return
+        if name.strip() not in categories:
+            messagebox.showerror("錯誤", f"找不到支出分類「{name}」")
+            return
+        category_id = categories[name.strip()]
+        amount = simpledialog.askfloat("設定預算", f"每月預算 ({BASE_CURRENCY}，輸入 0 刪除預算)：", parent=self.root, minvalue=0)
+        if amount is None:
+            return
+        
+        if amount == 0:
+            if not self.budget_manager.delete_budget(category_id):
+                messagebox.showerror("錯誤", f"「{name}」沒有設定預算")
+                return
+        else:
+            threshold = simpledialog.askinteger("設定預算", "使用到幾 % 時提醒：", parent=self.root,
+                                                initialvalue=80, minvalue=1, maxvalue=100)
+            if threshold is None:
+                return
+            try:
+                success = self.budget_manager.set_budget(category_id, amount, threshold / 100)
+            except ValueError as e:
+                messagebox.showerror("錯誤", str(e))
+                return
+            if not success:
+                messagebox.showerror("錯誤", "預算設定失敗！")
+                return
+        
+        self._update_budget_list()
+        if hasattr(self, 'income_card'):
+            self.update_statistics()
+        self.status_label.configure(text=f"已更新「{name}」的預算")
+    
+    # 自動分類規則
+    def _update_category_rule_list(self):
+        """更新設定頁的分類規則列表"""
+        if not hasattr(self, 'category_rule_list_label') or not self.category_rule_list_label.winfo_exists():
+            return
+        rules = self.category_rule_manager.get_rules()
+        if not rules:
+            self.category_rule_list_label.configure(text="尚未建立規則。匯入沒有分類的交易時，備註符合規則的會自動分類。")
+            return
+        lines = []
+        for rule in rules:
+            condition = {RULE_KEYWORD: f"備註包含「{rule['pattern']}」", RULE_REGEX: f"備註符合 /{rule['pattern']}/",
+                         RULE_AMOUNT: "任何備註"}[rule['match_type']]
+            if rule['min_amount'] is not None or rule['max_amount'] is not None:
+                low = f"{rule['min_amount']:,.0f}" if rule['min_amount'] is not None else ""
+                high = f"{rule['max_amount']:,.0f}" if rule['max_amount'] is not None else ""
+                condition += f"，金額 {low}~{high}"
+            lines.append(f"#{rule['id']} {condition} → {rule['category_name']}")
+        self.category_rule_list_label.configure(text="\n".join(lines))
+    
+    def add_category_rule(self):
+        """新增分類規則 (關鍵字以 / 包住時為正規表示式，留空時只依金額範圍)"""
+        categories = {category['name']: category['id'] for category in self.category_manager.get_all_categories()}
+        name = simpledialog.askstring("新增規則", f"分類 ({'、'.join(categories)})：", parent=self.root)
+        if not name:
+            return
+        if name.strip() not in categories:
+            messagebox.showerror("錯誤", f"找不到分類「{name}」")
+            return
+        pattern = simpledialog.askstring(
+            "新增規則", "備註關鍵字 (以 / 包住為正規表示式，例如 /^ATM/；留空表示只看金額)：", parent=self.root)
+        if pattern is None:
+            return
+        amount_range = simpledialog.askstring("新增規則", "金額範圍 (例如 100-500 或 1000-，留空不限)：", parent=self.root)
+        if amount_range is None:
+            return
+        
+        pattern = pattern.strip()
+        if len(pattern) > 2 and pattern.startswith('/') and pattern.endswith('/'):
+            match_type, pattern = RULE_REGEX, pattern[1:-1]
+        else:
+            match_type = RULE_KEYWORD if pattern else RULE_AMOUNT
+        try:
+            low, _, high = amount_range.replace(',', '').partition('-')
+            min_amount = float(low) if low.strip() else None
+            max_amount = float(high) if high.strip() else (min_amount if '-' not in amount_range else None)
+            rule_id = self.category_rule_manager.add_rule(match_type, pattern, categories[name.strip()],
+                                                          min_amount, max_amount)
+        except ValueError as e:
+            messagebox.showerror("錯誤", str(e))
+            return
+        if rule_id is None:
+            messagebox.showerror("錯誤", "規則新增失敗！")
+            return
+        self._update_category_rule_list()
+        self.status_label.configure(text=f"已新增分類規則 #{rule_id}")
+    
+    def delete_category_rule(self):
+        """刪除分類規則 (已分類的交易不變)"""
+        rule_id = simpledialog.askinteger("刪除規則", "規則編號 (#)：", parent=self.root)
+        if rule_id is None:
+            return
+        if not self.category_rule_manager.delete_rule(rule_id):
+            messagebox.showerror("錯誤", f"規則 #{rule_id} 不存在")
+            return
+        self._update_category_rule_list()
+        self.status_label.configure(text=f"已刪除分類規則 #{rule_id}")
+    
+    def apply_category_rules(self):
+        """將規則套用到既有的未分類交易"""
+        count = self.category_rule_manager.apply_to_existing()
+        messagebox.showinfo("自動分類", f"已重新分類 {count:,} 筆交易記錄")
+        if count:
+            self.refresh_data()
+            self.change_monitor.mark_seen()
+        self.status_label.configure(text=f"已依規則重新分類 {count:,} 筆交易")
+    
+    # 定期交易
+    def _update_recurring_list(self):
+        """更新設定頁的定期交易規則列表"""
+        if not hasattr(self, 'recurring_list_label') or not self.recurring_list_label.winfo_exists():
+            return
+        rules = self.recurring_manager.get_rules()
+        if not rules:
+            self.recurring_list_label.configure(text="尚未建立定期交易。新增交易時選擇「重複」即可建立。")
+            return
+        frequency_names = {frequency: name for name, frequency in REPEAT_OPTIONS.items()}
+        lines = [
+            f"#{rule['id']} {rule['name']}：{frequency_names[rule['frequency']]} {rule['currency']} {rule['amount']:,.2f}"
+            f"，下次 {rule['next_date'] or '已結束'}"
+            for rule in rules
+        ]
+        self.recurring_list_label.configure(text="\n".join(lines))
+    
+    def _add_recurring_rule(self, data):
+        """以交易對話框的內容建立定期交易，並立即產生已到期的部分"""
+        try:
+            rule_id = self.recurring_manager.add_rule(
+                name=data['description'] or "定期交易",
+                transaction_type=data['type'],
+                category_id=data['category_id'],
+                amount=data['amount'],
+                frequency=data['frequency'],
+                start_date=data['date'],
+                description=data['description'],
+                currency=data['currency'],
+                account_id=data['account_id']
+            )
+        except ValueError as e:
+            messagebox.showerror("錯誤", str(e))
+            return
+        
+        if rule_id is None:
+            messagebox.showerror("錯誤", "定期交易新增失敗！")
+            return
+        count = self.recurring_manager.materialize_due()
+        messagebox.showinfo("成功", f"定期交易新增成功！已產生 {count} 筆到期的交易記錄")
+        self._after_recurring_change(count)
+    
+    def materialize_recurring(self):
+        """立即產生所有到期的定期交易"""
+        count = self.recurring_manager.materialize_due()
+        messagebox.showinfo("定期交易", f"已產生 {count} 筆到期的交易記錄")
+        self._after_recurring_change(count)
+    
+    def delete_recurring_rule(self):
+        """刪除定期交易規則 (已產生的交易保留)"""
+        rule_id = simpledialog.askinteger("刪除定期交易", "規則編號 (#)：", parent=self.root)
+        if rule_id is None:
+            return
+        if not self.recurring_manager.delete_rule(rule_id):
+            messagebox.showerror("錯誤", f"定期交易 #{rule_id} 不存在")
+            return
+        self._update_recurring_list()
+        self.status_label.configure(text=f"已刪除定期交易 #{rule_id}")
+    
+    def _after_recurring_change(self, count):
+        """定期交易產生後更新畫面"""
+        self._update_recurring_list()
+        if count:
+            self.refresh_data()
+            self._update_account_list()
+            self.change_monitor.mark_seen()
+        self.status_label.configure(text=f"已產生 {count} 筆定期交易")
+    
+    def import_fx_rates(self):
+        """從 CSV (currency, date, rate) 批次匯入匯率"""
+        filename = filedialog.askopenfilename(
+            title="匯入匯率",
+            filetypes=[("CSV 檔案", "*.csv"), ("所有檔案", "*.*")]
+        )
+        if not filename:
+            return
+        
+        result = self.fx_rate_manager.import_csv(filename)
+        message = f"已匯入 {result['imported']} 筆匯率"
+        if result['errors']:
+            details = "\n".join(f"第 {line} 列：{error}" for line, error in result['errors'][:10])
+            message += f"\n\n{len(result['errors'])} 筆無法匯入：\n{details}"
+        missing = self.fx_rate_manager.get_missing_currencies()
+        if missing:
+            message += f"\n\n下列幣別仍沒有匯率，報表以 1:1 計算：{', '.join(missing)}"
+        messagebox.showinfo("匯入匯率", message)
+        
+        # 匯率影響所有外幣交易的換算金額
+        self.refresh_data()
     
     # 備份和還原
     def backup_database(self):
@@ -1209,7 +2102,7 @@ Alt+F4    退出程式
 • 進階篩選
 • 統計報表
 • 圖表分析
-• 資料匯出
+• 資料匯入與匯出
 
 開發：Python + tkinter
         """
@@ -1218,6 +2111,8 @@ Alt+F4    退出程式
     def on_closing(self):
         """程式關閉時的處理"""
         if messagebox.askokcancel("退出", "確定要退出個人記帳本嗎？"):
+            self.db_manager.dump_profile()
+            self.ledger_registry.close_all()
             self.root.destroy()
     
     def run(self):
@@ -1228,6 +2123,13 @@ Alt+F4    退出程式
         # 顯示啟動訊息
         self.status_label.configure(text="個人記帳本已啟動")
         
+        # 開始輪詢外部資料變更
+        self.change_monitor.mark_seen()
+        self.root.after(CHANGE_POLL_INTERVAL_MS, self._poll_changes)
+        
+        # 排程閒置維護
+        self._schedule_idle_maintenance()
+        
         print("🚀 個人記帳本已啟動 (重構版)")
         print("📚 使用說明：")
         print("   - Ctrl+N: 新增交易")
@@ -7,12 +7,12 @@ from tkinter import ttk
 import customtkinter as ctk
 from datetime import datetime
 import calendar
-from .ui_config import COLORS, FONTS, SPACING, PADDING, ICONS, STAT_CARD_CONFIG, BUTTON_STYLES
+from .ui_config import COLORS, FONTS, SPACING, PADDING, ICONS, STAT_CARD_CONFIG, BUTTON_STYLES, BUDGET_STATUS_COLORS
 
 class StatCard(ctk.CTkFrame):
     """統計卡片元件"""
     
-    def __init__(self, parent, card_type='income', **kwargs):
+    def __init__(self, parent, card_type='income', title=None, **kwargs):
         config = STAT_CARD_CONFIG[card_type]
         
         # 初始化 CTkFrame (背景色、圓角)
@@ -26,13 +26,13 @@ class StatCard(ctk.CTkFrame):
         )
         
         # 標題
-        title_label = ctk.CTkLabel(
+        self.title_label = ctk.CTkLabel(
             self,
-            text=config['title'],
+            text=title or config['title'],
             font=(FONTS['subheading'][0], FONTS['subheading'][1], 'bold'), # CTk font tuple
             text_color=COLORS['text_secondary']
         )
-        title_label.pack(anchor='center', pady=(PADDING['normal'], SPACING['sm']))
+        self.title_label.pack(anchor='center', pady=(PADDING['normal'], SPACING['sm']))
         
         # 金額顯示
         self.value_label = ctk.CTkLabel(
@@ -59,6 +59,35 @@ class StatCard(ctk.CTkFrame):
             self.trend_label.configure(text=trend)
 
 
+class BudgetCard(StatCard):
+    """預算卡片元件 (已支出、進度條與剩餘金額)"""
+    
+    def __init__(self, parent, **kwargs):
+        super().__init__(parent, card_type='budget', **kwargs)
+        
+        # 進度條放在金額與說明之間
+        self.trend_label.pack_forget()
+        self.progress = ctk.CTkProgressBar(self, height=8, progress_color=BUDGET_STATUS_COLORS['ok'])
+        self.progress.pack(fill='x', padx=PADDING['normal'], pady=(SPACING['sm'], 0))
+        self.progress.set(0)
+        self.trend_label.pack(anchor='center', pady=(SPACING['xs'], PADDING['normal']))
+    
+    def set_status(self, status):
+        """依 BudgetManager.get_budget_status 的項目更新卡片"""
+        color = BUDGET_STATUS_COLORS[status['status']]
+        self.title_label.configure(text=status['category_name'])
+        self.value_label.configure(text=f"${status['spent']:,.0f} / ${status['amount']:,.0f}", text_color=color)
+        self.progress.configure(progress_color=color)
+        self.progress.set(min(status['ratio'], 1.0))
+        if status['status'] == 'over':
+            text = f"{ICONS['warning']} 超支 ${-status['remaining']:,.0f}"
+        elif status['status'] == 'warning':
+            text = f"{ICONS['warning']} 已用 {status['ratio']:.0%}，剩餘 ${status['remaining']:,.0f}"
+        else:
+            text = f"已用 {status['ratio']:.0%}，剩餘 ${status['remaining']:,.0f}"
+        self.trend_label.configure(text=text, text_color=color if status['status'] != 'ok' else COLORS['text_light'])
+
+
 class ModernButton(ctk.CTkButton):
     """現代化按鈕元件"""
     
@@ -171,5 +171,18 @@ STAT_CARD_CONFIG = {
         'title': '本月結餘',
         'color': COLORS['primary'],
         'bg': '#dbeafe',
+    },
+    'budget': {
+        'icon': ICONS['chart'],
+        'title': '預算',
+        'color': COLORS['primary'],
+        'bg': COLORS['bg_card'],
     }
 }
+
+# 預算狀態對應的顏色 (進度條與金額)
+BUDGET_STATUS_COLORS = {
+    'ok': COLORS['success'],
+    'warning': COLORS['warning'],
+    'over': COLORS['danger'],
+}
@@ -13,6 +13,8 @@ import os
 # 確保可以找到專案模組
 sys.path.insert(0, os.path.dirname(__file__))
 
+from database.log import configure_logging
+
 try:
     from gui.main_window import MainWindow
 except ImportError as e:
@@ -31,6 +33,9 @@ def main():
     """主程式"""
     print("啟動個人記帳本...")
     
+    # 資料層預設安靜，只在主控台顯示警告與錯誤 (同一訊息有頻率限制)
+    configure_logging()
+    
     try:
         # 建立並執行主視窗
         app = MainWindow()
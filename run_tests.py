@@ -8,9 +8,27 @@ import os
 # 將專案根目錄加入路徑
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+import unittest
+
 # 匯入測試模組
 from tests.test_database import run_tests as run_database_tests
 
+# 其他模組的測試 (依檔名探索 tests/test_*.py，資料庫模組測試已於上方執行)
+TESTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests')
+
+
+def run_module_tests():
+    """執行 tests/ 目錄下其餘模組的測試"""
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    
+    for filename in sorted(os.listdir(TESTS_DIR)):
+        if filename.startswith('test_') and filename.endswith('.py') and filename != 'test_database.py':
+            suite.addTests(loader.loadTestsFromName(f"tests.{filename[:-3]}"))
+    
+    runner = unittest.TextTestRunner(verbosity=2)
+    return runner.run(suite)
+
 
 def main():
     """執行所有測試"""
@@ -26,6 +44,15 @@ def main():
     print("-"*70)
     result = run_database_tests()
     
+    if not result.wasSuccessful():
+        all_success = False
+    
+    # 執行其他模組測試
+    print()
+    print("🧩 執行其他模組測試...")
+    print("-"*70)
+    result = run_module_tests()
+    
     if not result.wasSuccessful():
         all_success = False
     
@@ -0,0 +1,133 @@
+"""
+帳戶與轉帳測試
+測試 AccountManager 以及交易寫入時的帳戶餘額維護
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database.models import DatabaseManager, CategoryManager, TransactionManager
+from database.accounts import AccountManager
+from database.currency import FxRateManager
+from database.partitions import PartitionedTransactionManager
+
+
+class TestAccountManager(unittest.TestCase):
+    """測試 AccountManager 類別"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_manager = DatabaseManager(os.path.join(self.temp_dir, "accounts.db"))
+        self.category_manager = CategoryManager(self.db_manager)
+        self.transaction_manager = TransactionManager(self.db_manager)
+        self.account_manager = AccountManager(self.db_manager)
+        
+        self.food_id = self.category_manager.get_categories_by_type('expense')[0]['id']
+        self.salary_id = self.category_manager.get_categories_by_type('income')[0]['id']
+        self.bank_id = self.account_manager.add_account("銀行", opening_balance=1000)
+        self.cash_id = self.account_manager.add_account("現金")
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def test_add_account(self):
+        """測試新增帳戶與重複名稱"""
+        self.assertEqual(self.account_manager.get_balance(self.bank_id), 1000)
+        self.assertIsNone(self.account_manager.add_account("銀行"))
+        with self.assertRaises(ValueError):
+            self.account_manager.add_account(" ")
+        self.assertEqual([a['name'] for a in self.account_manager.get_accounts()], ["銀行", "現金"])
+    
+    def test_transactions_update_balance(self):
+        """測試新增、修改、刪除交易時餘額同步增減"""
+        salary = self.transaction_manager.add_transaction(
+            '2024-01-05', 'income', self.salary_id, 500, account_id=self.bank_id)
+        lunch = self.transaction_manager.add_transaction(
+            '2024-01-06', 'expense', self.food_id, 120, account_id=self.bank_id)
+        self.assertEqual(self.account_manager.get_balance(self.bank_id), 1380)
+        
+        # 改記到現金帳戶
+        self.transaction_manager.update_transaction(
+            lunch, '2024-01-06', 'expense', self.food_id, 100, account_id=self.cash_id)
+        self.assertEqual(self.account_manager.get_balance(self.bank_id), 1500)
+        self.assertEqual(self.account_manager.get_balance(self.cash_id), -100)
+        
+        self.transaction_manager.delete_transaction(salary)
+        self.assertEqual(self.account_manager.get_balance(self.bank_id), 1000)
+        
+        # 未指定帳戶的交易不影響餘額
+        self.transaction_manager.add_transaction('2024-01-07', 'expense', self.food_id, 50)
+        self.assertEqual(self.account_manager.get_balance(self.bank_id), 1000)
+    
+    def test_account_currency_must_match(self):
+        """測試交易幣別必須與帳戶相同"""
+        with self.assertRaises(ValueError):
+            self.transaction_manager.add_transaction(
+                '2024-01-05', 'expense', self.food_id, 10, currency='USD', account_id=self.bank_id)
+        with self.assertRaises(ValueError):
+            self.transaction_manager.add_transaction(
+                '2024-01-05', 'expense', self.food_id, 10, account_id=999)
+    
+    def test_transfer_not_in_reports(self):
+        """測試轉帳同時增減兩個帳戶，且不計入收支報表"""
+        transfer_id = self.account_manager.add_transfer('2024-01-10', self.bank_id, self.cash_id, 300)
+        self.assertEqual(self.account_manager.get_balance(self.bank_id), 700)
+        self.assertEqual(self.account_manager.get_balance(self.cash_id), 300)
+        
+        summary = self.transaction_manager.get_monthly_summary(2024, 1)
+        self.assertEqual((summary['total_income'], summary['total_expense']), (0, 0))
+        self.assertEqual(self.transaction_manager.get_category_totals('2024-01-01', '2024-01-31'), {})
+        
+        transfers = self.account_manager.get_transfers(self.cash_id)
+        self.assertEqual(transfers[0]['from_account_name'], "銀行")
+        
+        self.account_manager.delete_transfer(transfer_id)
+        self.assertEqual(self.account_manager.get_balance(self.bank_id), 1000)
+        self.assertEqual(self.account_manager.get_balance(self.cash_id), 0)
+    
+    def test_cross_currency_transfer(self):
+        """測試不同幣別帳戶的轉帳需指定轉入金額"""
+        usd_id = self.account_manager.add_account("美元帳戶", 'USD')
+        with self.assertRaises(ValueError):
+            self.account_manager.add_transfer('2024-01-10', self.bank_id, usd_id, 310)
+        self.account_manager.add_transfer('2024-01-10', self.bank_id, usd_id, 310, to_amount=10)
+        self.assertEqual(self.account_manager.get_balance(usd_id), 10)
+        
+        FxRateManager(self.db_manager).set_rate('USD', '2024-01-01', 31)
+        self.assertEqual(self.account_manager.get_net_worth(), 1000 - 310 + 310)
+    
+    def test_delete_account_with_entries(self):
+        """測試已有記錄的帳戶無法刪除"""
+        self.transaction_manager.add_transaction('2024-01-05', 'expense', self.food_id, 10, account_id=self.cash_id)
+        with self.assertRaises(ValueError):
+            self.account_manager.delete_account(self.cash_id)
+        self.assertTrue(self.account_manager.delete_account(self.bank_id))
+        self.assertIsNone(self.account_manager.get_balance(self.bank_id))
+    
+    def test_partitioned_balances(self):
+        """測試年度分區的寫入同樣維護餘額 (含跨年度搬移)"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        transaction_id = manager.add_transaction(
+            '2023-12-31', 'expense', self.food_id, 200, account_id=self.bank_id)
+        self.assertEqual(self.account_manager.get_balance(self.bank_id), 800)
+        
+        manager.update_transaction(transaction_id, '2024-01-01', 'expense', self.food_id, 250,
+                                   account_id=self.bank_id)
+        self.assertEqual(self.account_manager.get_balance(self.bank_id), 750)
+        self.assertEqual(manager.get_transaction(transaction_id)['account_name'], "銀行")
+        
+        manager.delete_transaction(transaction_id)
+        self.assertEqual(self.account_manager.get_balance(self.bank_id), 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+歷史資料封存測試
+測試 ArchiveManager 與封存後報表的一致性
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+from datetime import date
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database.models import DatabaseManager, CategoryManager, TransactionManager
+from database.archive import ArchiveManager
+
+
+class TestArchiveManager(unittest.TestCase):
+    """測試 ArchiveManager 類別"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_manager = DatabaseManager(os.path.join(self.temp_dir, "ledger.db"))
+        self.category_manager = CategoryManager(self.db_manager)
+        self.transaction_manager = TransactionManager(self.db_manager)
+        self.archive_manager = ArchiveManager(self.db_manager)
+        
+        self.food_id = self.category_manager.get_categories_by_type('expense')[0]['id']
+        self.salary_id = self.category_manager.get_categories_by_type('income')[0]['id']
+        
+        for day in ('2019-03-05', '2019-03-20', '2020-01-10', '2024-06-01'):
+            self.transaction_manager.add_transaction(day, 'expense', self.food_id, 100, day)
+        self.transaction_manager.add_transaction('2019-03-01', 'income', self.salary_id, 5000)
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def test_cutoff_date(self):
+        """測試截止日對齊到月初"""
+        self.assertEqual(ArchiveManager.get_cutoff_date(5, date(2025, 8, 17)), '2020-08-01')
+        with self.assertRaises(ValueError):
+            ArchiveManager.get_cutoff_date(0)
+        with self.assertRaises(ValueError):
+            self.archive_manager.archive_before('2020-01-15')
+    
+    def test_archive_moves_details(self):
+        """測試封存後明細移到封存檔，主資料庫只剩較新的交易"""
+        self.assertEqual(self.archive_manager.archive_before('2020-01-01'), 3)
+        
+        remaining = self.transaction_manager.get_transactions()
+        self.assertEqual(sorted(t['date'] for t in remaining), ['2020-01-10', '2024-06-01'])
+        
+        archived = self.archive_manager.get_archived_transactions('2019-01-01', '2019-12-31')
+        self.assertEqual(len(archived), 3)
+        self.assertEqual(archived[0]['category_name'], self.category_manager.get_categories_by_type('expense')[0]['name'])
+        
+        periods = self.archive_manager.get_archived_periods()
+        self.assertEqual(len(periods), 1)
+        self.assertEqual(periods[0]['period'], '2019-03')
+        self.assertEqual(periods[0]['total_income'], 5000)
+        self.assertEqual(periods[0]['total_expense'], 200)
+        self.assertEqual(periods[0]['count'], 3)
+    
+    def test_reports_unchanged_after_archive(self):
+        """測試月度統計與分類合計在封存前後一致"""
+        summary_before = self.transaction_manager.get_monthly_summary(2019, 3)
+        totals_before = self.transaction_manager.get_category_totals('2019-01-01', '2020-12-31')
+        
+        self.archive_manager.archive_before('2020-01-01')
+        
+        self.assertEqual(self.transaction_manager.get_monthly_summary(2019, 3), summary_before)
+        self.assertEqual(self.transaction_manager.get_category_totals('2019-01-01', '2020-12-31'), totals_before)
+        self.assertEqual(list(totals_before.values()), [300.0])
+    
+    def test_rearchive_accumulates(self):
+        """測試同一月份補登後再次封存會合併到既有彙總"""
+        self.archive_manager.archive_before('2020-01-01')
+        self.transaction_manager.add_transaction('2019-03-28', 'expense', self.food_id, 50)
+        self.assertEqual(self.transaction_manager.get_monthly_summary(2019, 3)['total_expense'], 250.0)
+        
+        self.assertEqual(self.archive_manager.archive_before('2020-01-01'), 1)
+        self.assertEqual(self.transaction_manager.get_monthly_summary(2019, 3)['total_expense'], 250.0)
+        self.assertEqual(self.archive_manager.get_archived_periods()[0]['count'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
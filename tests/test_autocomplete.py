@@ -0,0 +1,131 @@
+"""
+備註自動完成測試
+測試 DescriptionIndex 的排序與逐筆更新，以及 DescriptionCompleter 由交易建立索引
+"""
+
+import unittest
+import os
+import sys
+import random
+import shutil
+import tempfile
+import time
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database.models import DatabaseManager, CategoryManager, TransactionManager
+from database.autocomplete import DescriptionIndex, DescriptionCompleter
+from database.partitions import PartitionedTransactionManager
+
+
+class TestDescriptionIndex(unittest.TestCase):
+    """測試 DescriptionIndex 類別"""
+    
+    def test_rank_by_frequency_and_recency(self):
+        """測試依使用次數排序，較近期的使用分數較高"""
+        index = DescriptionIndex([
+            ('午餐', '2024-03', 10), ('午餐便當', '2024-03', 3), ('午茶', '2024-03', 5),
+            ('午夜場電影', '2021-03', 8), ('捷運', '2024-03', 30),
+        ])
+        self.assertEqual(index.complete('午'), ['午餐', '午茶', '午餐便當', '午夜場電影'])
+        self.assertEqual(index.complete('午餐'), ['午餐便當'])
+        self.assertEqual(index.complete('午', limit=2), ['午餐', '午茶'])
+        self.assertEqual(index.complete('晚'), [])
+        self.assertEqual(index.complete(''), [])
+    
+    def test_normalized_prefix(self):
+        """測試前綴比對忽略全形與大小寫"""
+        index = DescriptionIndex([('Uber Eats', '2024-03-01', 2), ('UBER 叫車', '2024-03-01', 1)])
+        self.assertEqual(index.complete('ｕｂｅｒ'), ['Uber Eats', 'UBER 叫車'])
+        self.assertEqual(index.complete('uber e'), ['Uber Eats'])
+    
+    def test_incremental_matches_rebuild(self):
+        """測試逐筆新增與移除後的結果與重新建立一致"""
+        rng = random.Random(7)
+        words = ['午餐', '午茶', '捷運', '房租', 'uber', 'ubike', '全聯', '全家']
+        usage = {}
+        index = DescriptionIndex()
+        index.complete('午')
+        index.complete('u')
+        history = []
+        for step in range(600):
+            description = rng.choice(words) + rng.choice(['', '便當', ' 台北', '2'])
+            day = f"2024-{rng.randint(1, 12):02d}-15"
+            if history and step % 4 == 0:
+                description, day = history.pop(rng.randrange(len(history)))
+                index.add(description, day, -1)
+                usage[(description, day)] -= 1
+            else:
+                history.append((description, day))
+                index.add(description, day)
+                usage[(description, day)] = usage.get((description, day), 0) + 1
+        rebuilt = DescriptionIndex([(d, day, count) for (d, day), count in usage.items() if count])
+        for prefix in ['午', '午餐', 'u', 'ub', 'uber', '全', '房租 ', 'x']:
+            self.assertEqual(index.complete(prefix, 10), rebuilt.complete(prefix, 10), prefix)
+        self.assertEqual(len(index), len(rebuilt))
+    
+    def test_completion_speed(self):
+        """測試十萬個不同備註時每次按鍵的查詢時間"""
+        rng = random.Random(1)
+        chars = '午餐晚早捷運房租水電全聯家樂福星巴克咖啡計程車加油停車'
+        usage = [(''.join(rng.choice(chars) for _ in range(rng.randint(2, 8))), '2024-03', rng.randint(1, 50))
+                 for _ in range(100000)]
+        index = DescriptionIndex(usage)
+        prefixes = [description[:length] for description, _, _ in usage[:2000] for length in (1, 2, 3)]
+        for prefix in prefixes:
+            index.complete(prefix)
+        start = time.perf_counter()
+        for prefix in prefixes:
+            index.complete(prefix)
+        self.assertLess((time.perf_counter() - start) / len(prefixes), 0.001)
+
+
+class TestDescriptionCompleter(unittest.TestCase):
+    """測試 DescriptionCompleter 類別"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_manager = DatabaseManager(os.path.join(self.temp_dir, "autocomplete.db"))
+        category_manager = CategoryManager(self.db_manager)
+        self.categories = {category['name']: category['id'] for category in category_manager.get_all_categories()}
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def test_build_and_record(self):
+        """測試由交易建立索引後，依寫入逐筆更新"""
+        manager = TransactionManager(self.db_manager)
+        for day in range(1, 4):
+            manager.add_transaction(f'2024-03-0{day}', 'expense', self.categories['飲食'], 100, '午餐')
+        manager.add_transaction('2024-03-04', 'expense', self.categories['飲食'], 100, '午茶')
+        completer = DescriptionCompleter(manager)
+        completer.invalidate(background=False)
+        self.assertTrue(completer.ready)
+        self.assertEqual(completer.complete('午'), ['午餐', '午茶'])
+        
+        old = manager.get_transaction(manager.add_transaction('2024-03-05', 'expense', self.categories['飲食'],
+                                                              100, '午茶'))
+        completer.record(new=old)
+        for _ in range(3):
+            completer.record(new={'date': '2024-03-06', 'description': '午茶'})
+        self.assertEqual(completer.complete('午'), ['午茶', '午餐'])
+        completer.record(old=old, new=dict(old, description='早餐'))
+        self.assertEqual(completer.complete('早'), ['早餐'])
+    
+    def test_partitioned(self):
+        """測試年度分區由所有年度建立索引"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        manager.add_transaction('2023-05-01', 'expense', self.categories['其他支出'], 15000, '房租')
+        manager.add_transaction('2024-05-01', 'expense', self.categories['其他支出'], 15000, '房租')
+        manager.add_transaction('2024-05-02', 'expense', self.categories['其他支出'], 800, '房屋保險')
+        completer = DescriptionCompleter(manager)
+        completer.invalidate(background=False)
+        self.assertEqual(completer.complete('房'), ['房租', '房屋保險'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+"""
+歷史餘額測試
+測試 BalanceHistory 的月底檢查點與寫入路徑的失效處理
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database.models import DatabaseManager, CategoryManager, TransactionManager, LEDGER_SCOPE
+from database.accounts import AccountManager
+from database.archive import ArchiveManager
+from database.balances import BalanceHistory
+from database.currency import FxRateManager
+from database.partitions import PartitionedTransactionManager
+
+
+class TestBalanceHistory(unittest.TestCase):
+    """測試 BalanceHistory 類別"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_manager = DatabaseManager(os.path.join(self.temp_dir, "balances.db"))
+        category_manager = CategoryManager(self.db_manager)
+        self.transaction_manager = TransactionManager(self.db_manager)
+        self.account_manager = AccountManager(self.db_manager)
+        self.history = BalanceHistory(self.transaction_manager)
+        
+        self.expense_id = category_manager.get_categories_by_type('expense')[0]['id']
+        self.income_id = category_manager.get_categories_by_type('income')[0]['id']
+        self.bank_id = self.account_manager.add_account("銀行", opening_balance=1000)
+        self.cash_id = self.account_manager.add_account("現金")
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def _add(self, date, transaction_type, amount, account_id=None, manager=None, currency='TWD'):
+        manager = manager or self.transaction_manager
+        category_id = self.income_id if transaction_type == 'income' else self.expense_id
+        return manager.add_transaction(date, transaction_type, category_id, amount,
+                                       currency=currency, account_id=account_id)
+    
+    def _checkpoint_periods(self, account_id):
+        return [row['period'] for row in self.db_manager.query(
+            'SELECT period FROM balance_checkpoints WHERE account_id = ? ORDER BY period', (account_id,))]
+    
+    def test_ledger_balance_at(self):
+        """測試帳本在某天的累計結餘等於檢查點加上當月明細"""
+        self._add('2024-01-05', 'income', 5000)
+        self._add('2024-01-20', 'expense', 1200)
+        self._add('2024-03-02', 'expense', 300)
+        self._add('2024-03-15', 'income', 800)
+        
+        self.assertEqual(self.history.balance_at('2023-12-31'), 0)
+        self.assertEqual(self.history.balance_at('2024-01-10'), 5000)
+        self.assertEqual(self.history.balance_at('2024-03-10'), 3500)
+        self.assertEqual(self.history.balance_at('2024-03-31'), 4300)
+        self.assertEqual(self._checkpoint_periods(LEDGER_SCOPE)[-2:], ['2024-01', '2024-02'])
+        
+        self.assertEqual(self.history.get_month_end_balances('2024-01', '2024-04'),
+                         {'2024-01': 3800, '2024-02': 3800, '2024-03': 4300, '2024-04': 4300})
+    
+    def test_edit_invalidates_from_month(self):
+        """測試編輯交易只讓該月份之後的檢查點失效並重新補算"""
+        for month in range(1, 7):
+            self._add(f'2024-{month:02d}-10', 'expense', 100)
+        self.history.get_month_end_balances('2024-01', '2024-06')
+        
+        transaction_id = self._add('2024-04-01', 'expense', 50)
+        self.assertEqual(self._checkpoint_periods(LEDGER_SCOPE), ['2024-01', '2024-02', '2024-03'])
+        self.assertEqual(self.history.balance_at('2024-06-30'), -650)
+        
+        self.transaction_manager.update_transaction(transaction_id, '2024-02-01', 'expense', self.expense_id, 80)
+        self.assertEqual(self._checkpoint_periods(LEDGER_SCOPE), ['2024-01'])
+        self.assertEqual(self.history.get_month_end_balances('2024-01', '2024-03'),
+                         {'2024-01': -100, '2024-02': -280, '2024-03': -380})
+        
+        self.transaction_manager.delete_transaction(transaction_id)
+        self.assertEqual(self.history.balance_at('2024-06-30'), -600)
+    
+    def test_account_balance_at(self):
+        """測試帳戶在某天的餘額包含期初餘額與轉帳"""
+        self._add('2024-01-05', 'income', 500, self.bank_id)
+        self._add('2024-02-10', 'expense', 200, self.bank_id)
+        self.account_manager.add_transfer('2024-02-20', self.bank_id, self.cash_id, 300)
+        self._add('2024-02-25', 'expense', 50, self.cash_id)
+        
+        self.assertEqual(self.history.balance_at('2023-12-31', self.bank_id), 1000)
+        self.assertEqual(self.history.balance_at('2024-01-31', self.bank_id), 1500)
+        self.assertEqual(self.history.balance_at('2024-02-15', self.bank_id), 1300)
+        self.assertEqual(self.history.balance_at('2024-02-29', self.bank_id), 1000)
+        self.assertEqual(self.history.balance_at('2024-02-29', self.cash_id), 250)
+        self.assertEqual(self.history.balance_at('2024-12-31', self.bank_id),
+                         self.account_manager.get_balance(self.bank_id))
+        self.assertIsNone(self.history.balance_at('2024-01-01', 999))
+        
+        self.account_manager.add_transfer('2024-01-15', self.cash_id, self.bank_id, 20)
+        self.assertNotIn('2024-01', self._checkpoint_periods(self.bank_id))
+        self.assertEqual(self.history.balance_at('2024-01-31', self.bank_id), 1520)
+        self.assertEqual(self.history.balance_at('2024-01-31', self.cash_id), -20)
+    
+    def test_fx_rate_invalidates_ledger(self):
+        """測試匯率異動讓帳本檢查點失效"""
+        self._add('2024-01-10', 'income', 10, currency='USD')
+        self.assertEqual(self.history.balance_at('2024-02-01'), 10)
+        
+        FxRateManager(self.db_manager).set_rate('USD', '2024-01-01', 30)
+        self.assertEqual(self._checkpoint_periods(LEDGER_SCOPE), [])
+        self.assertEqual(self.history.balance_at('2024-02-01'), 300)
+    
+    def test_archive_keeps_balances(self):
+        """測試封存後帳本與帳戶的歷史餘額不變"""
+        self._add('2023-03-01', 'income', 1000, self.bank_id)
+        self._add('2023-06-01', 'expense', 400, self.bank_id)
+        self._add('2024-02-01', 'expense', 100, self.bank_id)
+        
+        ArchiveManager(self.db_manager).archive_before('2024-01-01')
+        self.assertEqual(self.history.balance_at('2023-12-31'), 600)
+        self.assertEqual(self.history.balance_at('2024-02-29'), 500)
+        self.assertEqual(self.history.balance_at('2024-02-29', self.bank_id), 1500)
+        self.assertEqual(self.history.balance_at('2024-01-31', self.bank_id), 1600)
+    
+    def test_partitioned(self):
+        """測試年度分區的檢查點補算與失效"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        history = BalanceHistory(manager)
+        self._add('2022-06-01', 'income', 1000, manager=manager)
+        self._add('2024-02-01', 'expense', 300, self.bank_id, manager=manager)
+        
+        self.assertEqual(history.balance_at('2023-12-31'), 1000)
+        self.assertEqual(history.balance_at('2024-02-29'), 700)
+        self.assertEqual(history.balance_at('2024-01-31', self.bank_id), 1000)
+        
+        self._add('2023-05-01', 'expense', 100, manager=manager)
+        self.assertEqual(history.balance_at('2024-02-29'), 600)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+預算測試
+測試 BudgetManager 的支出計數器與提醒狀態
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database.models import DatabaseManager, CategoryManager, TransactionManager
+from database.archive import ArchiveManager
+from database.budgets import BudgetManager
+from database.currency import FxRateManager
+from database.partitions import PartitionedTransactionManager
+
+
+class TestBudgetManager(unittest.TestCase):
+    """測試 BudgetManager 類別"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_manager = DatabaseManager(os.path.join(self.temp_dir, "budgets.db"))
+        self.transaction_manager = TransactionManager(self.db_manager)
+        self.budget_manager = BudgetManager(self.transaction_manager)
+        
+        category_manager = CategoryManager(self.db_manager)
+        expense_categories = category_manager.get_categories_by_type('expense')
+        self.food_id = expense_categories[0]['id']
+        self.transport_id = expense_categories[1]['id']
+        self.income_id = category_manager.get_categories_by_type('income')[0]['id']
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def _status(self, year=2024, month=3):
+        return {item['category_id']: item for item in self.budget_manager.get_budget_status(year, month)}
+    
+    def _counters(self):
+        return self.db_manager.query('SELECT category_id, period, spent FROM budget_spend ORDER BY period')
+    
+    def test_rebuild_and_incremental(self):
+        """測試新預算由既有交易重建，之後的寫入同步更新計數器"""
+        self.transaction_manager.add_transaction('2024-03-02', 'expense', self.food_id, 300)
+        self.transaction_manager.add_transaction('2024-02-28', 'expense', self.food_id, 999)
+        self.assertTrue(self.budget_manager.set_budget(self.food_id, 1000))
+        
+        status = self._status()[self.food_id]
+        self.assertEqual(status['spent'], 300)
+        self.assertEqual(status['status'], 'ok')
+        
+        transaction_id = self.transaction_manager.add_transaction('2024-03-10', 'expense', self.food_id, 550)
+        status = self._status()[self.food_id]
+        self.assertEqual(status['spent'], 850)
+        self.assertEqual(status['remaining'], 150)
+        self.assertEqual(status['status'], 'warning')
+        
+        self.transaction_manager.update_transaction(transaction_id, '2024-03-10', 'expense', self.food_id, 800)
+        self.assertEqual(self._status()[self.food_id]['status'], 'over')
+        
+        self.transaction_manager.update_transaction(transaction_id, '2024-04-01', 'expense', self.food_id, 800)
+        self.assertEqual(self._status()[self.food_id]['spent'], 300)
+        self.assertEqual(self._status(2024, 4)[self.food_id]['spent'], 800)
+        
+        self.transaction_manager.delete_transaction(transaction_id)
+        self.assertEqual(self._status(2024, 4)[self.food_id]['spent'], 0)
+    
+    def test_unbudgeted_categories_not_counted(self):
+        """測試沒有預算的分類與收入不會產生計數器"""
+        self.budget_manager.set_budget(self.food_id, 1000)
+        self._status()
+        self.transaction_manager.add_transaction('2024-03-02', 'expense', self.transport_id, 100)
+        self.transaction_manager.add_transaction('2024-03-02', 'income', self.income_id, 100)
+        self.transaction_manager.add_transactions_bulk([
+            {'date': '2024-03-05', 'type': 'expense', 'category_id': self.food_id, 'amount': 40},
+            {'date': '2024-03-06', 'type': 'expense', 'category_id': self.food_id, 'amount': 60},
+            {'date': '2024-03-06', 'type': 'expense', 'category_id': self.transport_id, 'amount': 60},
+        ])
+        self.assertEqual(self._counters(), [{'category_id': self.food_id, 'period': '2024-03', 'spent': 100}])
+    
+    def test_fx_rate_marks_rebuild(self):
+        """測試匯率異動後以新匯率重建計數器"""
+        self.budget_manager.set_budget(self.food_id, 5000)
+        self.transaction_manager.add_transaction('2024-03-02', 'expense', self.food_id, 10, currency='USD')
+        self.assertEqual(self._status()[self.food_id]['spent'], 10)
+        
+        FxRateManager(self.db_manager).set_rate('USD', '2024-01-01', 30)
+        self.assertEqual(self._status()[self.food_id]['spent'], 300)
+        self.assertEqual(self._counters()[0]['spent'], 300)
+    
+    def test_archive_and_delete(self):
+        """測試封存彙總計入重建，刪除預算一併刪除計數器"""
+        self.transaction_manager.add_transaction('2023-05-02', 'expense', self.food_id, 200)
+        ArchiveManager(self.db_manager).archive_before('2024-01-01')
+        self.budget_manager.set_budget(self.food_id, 100, alert_threshold=0.5)
+        self.assertEqual(self._status(2023, 5)[self.food_id]['status'], 'over')
+        
+        self.assertTrue(self.budget_manager.delete_budget(self.food_id))
+        self.assertFalse(self.budget_manager.delete_budget(self.food_id))
+        self.assertEqual(self._counters(), [])
+        self.assertEqual(self.budget_manager.get_budget_status(2023, 5), [])
+    
+    def test_invalid_budget(self):
+        """測試無效的預算"""
+        with self.assertRaises(ValueError):
+            self.budget_manager.set_budget(self.income_id, 1000)
+        with self.assertRaises(ValueError):
+            self.budget_manager.set_budget(self.food_id, 0)
+        with self.assertRaises(ValueError):
+            self.budget_manager.set_budget(self.food_id, 1000, alert_threshold=1.5)
+    
+    def test_partitioned(self):
+        """測試年度分區的計數器重建與同步更新"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        budget_manager = BudgetManager(manager)
+        manager.add_transaction('2024-03-02', 'expense', self.food_id, 300)
+        budget_manager.set_budget(self.food_id, 1000)
+        self.assertEqual(budget_manager.get_budget_status(2024, 3)[0]['spent'], 300)
+        
+        transaction_id = manager.add_transaction('2024-03-03', 'expense', self.food_id, 200)
+        manager.update_transaction(transaction_id, '2023-03-03', 'expense', self.food_id, 200)
+        self.assertEqual(budget_manager.get_budget_status(2024, 3)[0]['spent'], 300)
+        self.assertEqual(budget_manager.get_budget_status(2023, 3)[0]['spent'], 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+"""
+自動分類規則測試
+測試 CategoryMatcher 的比對順位與 CategoryRuleManager 的匯入及回溯套用
+"""
+
+import unittest
+import os
+import sys
+import csv
+import shutil
+import tempfile
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database.models import DatabaseManager, CategoryManager, TransactionManager
+from database.budgets import BudgetManager
+from database.category_rules import CategoryMatcher, CategoryRuleManager
+from database.partitions import PartitionedTransactionManager
+from utils.importers import CsvImporter
+
+
+def _rule(rule_id, match_type, pattern, category_id, category_type='expense', min_amount=None, max_amount=None,
+          priority=0):
+    return {'id': rule_id, 'match_type': match_type, 'pattern': pattern, 'min_amount': min_amount,
+            'max_amount': max_amount, 'category_id': category_id, 'category_type': category_type,
+            'priority': priority}
+
+
+class TestCategoryMatcher(unittest.TestCase):
+    """測試 CategoryMatcher 類別"""
+    
+    def test_keyword_and_regex(self):
+        """測試關鍵字忽略全形與大小寫，正規表示式比對原始備註，收支類型需相同"""
+        matcher = CategoryMatcher([
+            _rule(1, 'keyword', 'Uber Eats', 10),
+            _rule(2, 'regex', r'^ATM\s*\d{4}$', 11),
+            _rule(3, 'keyword', '薪資', 12, category_type='income'),
+        ])
+        self.assertEqual(matcher.match('ＵＢＥＲ　ＥＡＴＳ 台北', 'expense', 300), 10)
+        self.assertEqual(matcher.match('atm 1234', 'expense', 300), 11)
+        self.assertIsNone(matcher.match('ATM 1234 手續費', 'expense', 300))
+        self.assertIsNone(matcher.match('三月薪資', 'expense', 300))
+        self.assertEqual(matcher.match('三月薪資', 'income', 300), 12)
+    
+    def test_priority_and_amount(self):
+        """測試多條規則符合時取優先順序最高者，金額範圍不符的規則略過"""
+        matcher = CategoryMatcher([
+            _rule(1, 'keyword', '全聯', 10),
+            _rule(2, 'keyword', '全聯', 11, min_amount=3000, priority=5),
+            _rule(3, 'amount', '', 12, max_amount=50),
+            _rule(4, 'amount', '', 13, min_amount=100000, priority=-1),
+        ])
+        self.assertEqual(matcher.match('全聯福利中心', 'expense', 500), 10)
+        self.assertEqual(matcher.match('全聯福利中心', 'expense', 3000), 11)
+        self.assertEqual(matcher.match('停車費', 'expense', 50), 12)
+        self.assertEqual(matcher.match('全聯福利中心', 'expense', 30), 10)
+        self.assertEqual(matcher.match('', 'expense', 200000), 13)
+        self.assertIsNone(matcher.match('停車費', 'expense', 51))
+    
+    def test_many_rules(self):
+        """測試大量關鍵字規則 (含互為子字串的關鍵字)"""
+        matcher = CategoryMatcher([_rule(index, 'keyword', f'商店{index}號', index) for index in range(1, 2001)])
+        self.assertEqual(matcher.match('在商店1234號消費', 'expense', 10), 1234)
+        self.assertEqual(matcher.match('商店12號', 'expense', 10), 12)
+        self.assertIsNone(matcher.match('商店號', 'expense', 10))
+
+
+class TestCategoryRuleManager(unittest.TestCase):
+    """測試 CategoryRuleManager 類別"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_manager = DatabaseManager(os.path.join(self.temp_dir, "rules.db"))
+        self.transaction_manager = TransactionManager(self.db_manager)
+        self.rule_manager = CategoryRuleManager(self.transaction_manager)
+        category_manager = CategoryManager(self.db_manager)
+        self.categories = {category['name']: category['id'] for category in category_manager.get_all_categories()}
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def test_import_applies_rules(self):
+        """測試匯入時沒有分類的列依規則分類，有分類欄位的列不受影響"""
+        self.rule_manager.add_rule('keyword', '捷運', self.categories['交通'])
+        self.rule_manager.add_rule('regex', r'^(早|午|晚)餐', self.categories['飲食'])
+        path = os.path.join(self.temp_dir, 'statement.csv')
+        with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+            csv.writer(f).writerows([
+                ['日期', '類型', '分類', '金額', '備註'],
+                ['2024-03-01', '支出', '', '35', '台北捷運'],
+                ['2024-03-01', '支出', '', '85', '早餐'],
+                ['2024-03-02', '支出', '購物', '35', '捷運卡'],
+                ['2024-03-02', '支出', '', '500', '其他'],
+            ])
+        mapping = {'date': '日期', 'type': '類型', 'category': '分類', 'amount': '金額', 'description': '備註'}
+        result = CsvImporter(self.transaction_manager, mapping=mapping).import_file(path)
+        
+        self.assertEqual(result['imported'], 4)
+        categories = {t['description']: t['category_name'] for t in self.transaction_manager.get_transactions()}
+        self.assertEqual(categories, {'台北捷運': '交通', '早餐': '飲食', '捷運卡': '購物', '其他': '其他支出'})
+    
+    def test_apply_to_existing(self):
+        """測試回溯套用到未分類交易並同步移動預算計數器"""
+        budget_manager = BudgetManager(self.transaction_manager)
+        budget_manager.set_budget(self.categories['飲食'], 1000)
+        for day in range(1, 8):
+            self.transaction_manager.add_transaction(f'2024-03-0{day}', 'expense', self.categories['其他支出'], 100,
+                                                     '便當' if day % 2 else '加油')
+        self.transaction_manager.add_transaction('2024-03-01', 'expense', self.categories['購物'], 100, '便當盒')
+        self.assertEqual(budget_manager.get_budget_status(2024, 3)[0]['spent'], 0)
+        
+        self.rule_manager.add_rule('keyword', '便當', self.categories['飲食'])
+        self.assertEqual(self.rule_manager.apply_to_existing(batch_size=3), 4)
+        self.assertEqual(self.rule_manager.apply_to_existing(), 0)
+        
+        self.assertEqual(budget_manager.get_budget_status(2024, 3)[0]['spent'], 400)
+        totals = self.transaction_manager.get_category_totals('2024-03-01', '2024-03-31')
+        self.assertEqual((totals['飲食'], totals['其他支出'], totals['購物']), (400, 300, 100))
+    
+    def test_invalid_rule(self):
+        """測試無效的規則"""
+        with self.assertRaises(ValueError):
+            self.rule_manager.add_rule('regex', '(未結束', self.categories['飲食'])
+        with self.assertRaises(ValueError):
+            self.rule_manager.add_rule('keyword', ' !! ', self.categories['飲食'])
+        with self.assertRaises(ValueError):
+            self.rule_manager.add_rule('amount', '', self.categories['飲食'])
+        with self.assertRaises(ValueError):
+            self.rule_manager.add_rule('keyword', '咖啡', 9999)
+        rule_id = self.rule_manager.add_rule('amount', '', self.categories['交通'], max_amount=50)
+        self.assertEqual([rule['id'] for rule in self.rule_manager.get_rules()], [rule_id])
+        self.assertTrue(self.rule_manager.delete_rule(rule_id))
+        self.assertFalse(self.rule_manager.delete_rule(rule_id))
+    
+    def test_partitioned_skips_closed_year(self):
+        """測試年度分區：各年度分別更新，已結帳年度不變更"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        for date in ('2022-06-01', '2023-06-01', '2024-06-01'):
+            manager.add_transaction(date, 'expense', self.categories['其他支出'], 30, 'Starbucks')
+        manager.close_year(2022)
+        rule_manager = CategoryRuleManager(manager)
+        rule_manager.add_rule('keyword', 'starbucks', self.categories['飲食'])
+        
+        self.assertEqual(rule_manager.apply_to_existing(), 2)
+        transactions = manager.get_transactions_by_date_range('2022-01-01', '2024-12-31')
+        self.assertEqual([t['category_name'] for t in transactions], ['飲食', '飲食', '其他支出'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+資料變更偵測測試
+測試 ChangeMonitor 與資料表版本計數器
+"""
+
+import unittest
+import os
+import sys
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database.models import DatabaseManager, CategoryManager, TransactionManager
+
+
+class TestChangeMonitor(unittest.TestCase):
+    """測試 ChangeMonitor 類別"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.test_db = "test_changes.db"
+        if os.path.exists(self.test_db):
+            os.remove(self.test_db)
+        
+        self.db_manager = DatabaseManager(self.test_db)
+        self.category_manager = CategoryManager(self.db_manager)
+        self.transaction_manager = TransactionManager(self.db_manager)
+        self.monitor = self.db_manager.create_change_monitor()
+        self.monitor.mark_seen()
+        
+        self.expense_category_id = self.category_manager.get_categories_by_type('expense')[0]['id']
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.monitor.close()
+        self.db_manager.close()
+        if os.path.exists(self.test_db):
+            os.remove(self.test_db)
+    
+    def test_no_changes_when_idle(self):
+        """測試閒置時輪詢不回報變更"""
+        self.assertEqual(self.monitor.poll(), set())
+        self.assertEqual(self.monitor.poll(), set())
+    
+    def test_detects_changed_tables(self):
+        """測試只回報實際變動的資料表"""
+        self.transaction_manager.add_transaction('2024-01-01', 'expense', self.expense_category_id, 100)
+        self.assertEqual(self.monitor.poll(), {'transactions'})
+        
+        self.category_manager.add_category('寵物', 'expense')
+        self.assertEqual(self.monitor.poll(), {'categories'})
+    
+    def test_subscribers_filtered_by_table(self):
+        """測試訂閱者只收到關心的資料表變更"""
+        received = []
+        self.monitor.subscribe(received.append, tables=['categories'])
+        
+        self.transaction_manager.add_transaction('2024-01-01', 'expense', self.expense_category_id, 100)
+        self.monitor.poll()
+        self.assertEqual(received, [])
+        
+        self.category_manager.add_category('寵物', 'expense')
+        self.monitor.poll()
+        self.assertEqual(received, [{'categories'}])
+    
+    def test_mark_seen_suppresses_notification(self):
+        """測試 mark_seen 後不再通知已知的變更"""
+        received = []
+        self.monitor.subscribe(received.append)
+        
+        self.transaction_manager.add_transaction('2024-01-01', 'expense', self.expense_category_id, 100)
+        self.monitor.mark_seen()
+        
+        self.assertEqual(self.monitor.poll(), set())
+        self.assertEqual(received, [])
+    
+    def test_mark_seen_reports_external_writes(self):
+        """測試上次輪詢後、自身寫入前的外部寫入在 mark_seen 時仍會通知"""
+        received = []
+        self.monitor.subscribe(received.append)
+        external = DatabaseManager(self.test_db)
+        try:
+            CategoryManager(external).add_category('寵物', 'expense')
+            TransactionManager(external).add_transaction('2024-01-01', 'expense', self.expense_category_id, 50)
+        finally:
+            external.close()
+        
+        self.transaction_manager.add_transaction('2024-01-02', 'expense', self.expense_category_id, 100)
+        self.assertEqual(self.monitor.mark_seen(), {'categories', 'transactions'})
+        self.assertEqual(received, [{'categories', 'transactions'}])
+        
+        self.transaction_manager.add_transaction('2024-01-03', 'expense', self.expense_category_id, 100)
+        self.assertEqual(self.monitor.mark_seen(), set())
+        self.assertEqual(len(received), 1)
+    
+    def test_mark_seen_group_commit(self):
+        """測試群組提交模式下自身的待提交寫入不視為外部變更"""
+        self.monitor.close()
+        self.db_manager.close()
+        self.db_manager = DatabaseManager(self.test_db, group_commit_ms=10000)
+        self.transaction_manager = TransactionManager(self.db_manager)
+        self.monitor = self.db_manager.create_change_monitor()
+        self.monitor.mark_seen()
+        
+        self.transaction_manager.add_transaction('2024-01-01', 'expense', self.expense_category_id, 100)
+        self.assertEqual(self.monitor.mark_seen(), set())
+        external = DatabaseManager(self.test_db)
+        try:
+            CategoryManager(external).add_category('寵物', 'expense')
+        finally:
+            external.close()
+        self.transaction_manager.add_transaction('2024-01-02', 'expense', self.expense_category_id, 100)
+        self.assertEqual(self.monitor.mark_seen(), {'categories'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+分類建議測試
+測試備註分詞、寫入路徑同步增減的計數與 CategoryClassifier 的建議
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database.models import DatabaseManager, CategoryManager, TransactionManager, amount_bucket, description_tokens
+from database.classifier import CategoryClassifier
+from database.partitions import PartitionedTransactionManager
+
+
+class TestFeatures(unittest.TestCase):
+    """測試分類建議的特徵"""
+    
+    def test_description_tokens(self):
+        """測試英文依空白分詞、中文取相鄰兩字、忽略純數字"""
+        self.assertEqual(description_tokens('台北捷運 Uber-Eats 2024'), ['eats', 'uber', '北捷', '台北', '捷運'])
+        self.assertEqual(description_tokens('ＡＴＭ 費'), ['atm', '費'])
+        self.assertEqual(description_tokens(None), [])
+    
+    def test_amount_bucket(self):
+        """測試金額每半個數量級一級"""
+        self.assertEqual(amount_bucket(150), amount_bucket(300))
+        self.assertNotEqual(amount_bucket(300), amount_bucket(400))
+        self.assertEqual(amount_bucket(0.5), amount_bucket(1))
+
+
+class TestCategoryClassifier(unittest.TestCase):
+    """測試 CategoryClassifier 類別"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_manager = DatabaseManager(os.path.join(self.temp_dir, "classifier.db"))
+        self.transaction_manager = TransactionManager(self.db_manager)
+        self.classifier = CategoryClassifier(self.transaction_manager)
+        category_manager = CategoryManager(self.db_manager)
+        self.categories = {category['name']: category['id'] for category in category_manager.get_all_categories()}
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def _top(self, description, transaction_type='expense', amount=None, classifier=None):
+        suggestions = (classifier or self.classifier).suggest(description, transaction_type, amount)
+        return suggestions[0]['category_name'] if suggestions else None
+    
+    def _counts(self):
+        return (self.db_manager.query('SELECT token, category_id, count FROM classifier_tokens '
+                                      'WHERE count != 0 ORDER BY token, category_id'),
+                self.db_manager.query('SELECT category_id, documents, tokens FROM classifier_categories '
+                                      'WHERE documents != 0 ORDER BY category_id'))
+    
+    def test_learns_on_write(self):
+        """測試新增、修改與刪除交易時同步更新建議"""
+        self.assertEqual(self.classifier.suggest('星巴克', 'expense'), [])
+        for _ in range(3):
+            self.transaction_manager.add_transaction('2024-03-01', 'expense', self.categories['飲食'], 150, '星巴克 拿鐵')
+        self.transaction_manager.add_transaction('2024-03-02', 'expense', self.categories['交通'], 35, '台北捷運')
+        transaction_id = self.transaction_manager.add_transaction('2024-03-03', 'expense', self.categories['購物'],
+                                                                  3000, '星巴克 隨行卡')
+        
+        self.assertEqual(self._top('星巴克'), '飲食')
+        self.assertEqual(self._top('捷運'), '交通')
+        self.assertEqual(self._top('隨行卡'), '購物')
+        self.assertIsNone(self._top('星巴克', 'income'))
+        self.assertIsNone(self._top('完全沒出現過'))
+        suggestions = self.classifier.suggest('星巴克', 'expense', 150)
+        probabilities = [item['probability'] for item in suggestions]
+        self.assertEqual(probabilities, sorted(probabilities, reverse=True))
+        self.assertGreater(probabilities[0], 0.5)
+        self.assertLessEqual(sum(probabilities), 1 + 1e-9)
+        
+        self.transaction_manager.update_transaction(transaction_id, '2024-03-03', 'expense',
+                                                    self.categories['交通'], 3000, '悠遊卡 隨行卡')
+        self.assertEqual(self._top('隨行卡'), '交通')
+        self.transaction_manager.delete_transaction(transaction_id)
+        self.assertIsNone(self._top('隨行卡'))
+    
+    def test_bulk_and_recategorize(self):
+        """測試批次新增與變更分類後的計數，與由歷史交易重建的結果一致"""
+        self.transaction_manager.add_transactions_bulk([
+            {'date': f'2024-03-{day:02d}', 'type': 'expense', 'category_id': self.categories['其他支出'],
+             'amount': 80 + day, 'description': '便當' if day % 2 else '加油站'}
+            for day in range(1, 11)])
+        ids = [t['id'] for t in self.transaction_manager.get_transactions() if t['description'] == '便當']
+        self.assertEqual(self.transaction_manager.set_categories({i: self.categories['飲食'] for i in ids}), 5)
+        self.assertEqual(self._top('便當'), '飲食')
+        self.assertEqual(self._top('加油'), '其他支出')
+        
+        incremental = self._counts()
+        self.assertEqual(self.classifier.ensure_trained(), 10)
+        self.assertEqual(self.classifier.ensure_trained(), 0)
+        self.assertEqual(self._counts(), incremental)
+    
+    def test_ensure_trained_existing_ledger(self):
+        """測試既有帳本的歷史交易在第一次 ensure_trained 時計入"""
+        for day in range(1, 6):
+            self.transaction_manager.add_transaction(f'2024-03-0{day}', 'income', self.categories['薪資'], 50000,
+                                                     '公司 薪資')
+        self.db_manager.run_write(lambda conn: (conn.execute('DELETE FROM classifier_tokens'),
+                                                conn.execute('DELETE FROM classifier_categories')))
+        self.transaction_manager.add_transaction('2024-03-06', 'income', self.categories['獎金'], 3000, '公司 年終')
+        self.assertEqual(self._top('公司', 'income'), '獎金')
+        
+        self.assertEqual(self.classifier.ensure_trained(batch_size=2), 6)
+        self.assertEqual(self._top('公司', 'income'), '薪資')
+        self.assertEqual(self._top('年終', 'income'), '獎金')
+    
+    def test_partitioned(self):
+        """測試年度分區的寫入路徑同樣更新計數"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        classifier = CategoryClassifier(manager)
+        transaction_id = manager.add_transaction('2023-06-01', 'expense', self.categories['娛樂'], 300, '電影票')
+        manager.add_transaction('2024-06-01', 'expense', self.categories['娛樂'], 320, '電影票')
+        self.assertEqual(self._top('電影', classifier=classifier), '娛樂')
+        
+        manager.update_transaction(transaction_id, '2024-06-02', 'expense', self.categories['購物'], 300, '電影票')
+        manager.delete_transaction(transaction_id)
+        self.assertEqual(self._counts()[1], [{'category_id': self.categories['娛樂'], 'documents': 1,
+                                              'tokens': len(description_tokens('電影票')) + 1}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+"""
+外幣與匯率測試
+測試 FxRateManager 與報表查詢的幣別換算
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database.models import DatabaseManager, CategoryManager, TransactionManager
+from database.currency import FxRateManager
+from database.partitions import PartitionedTransactionManager
+from database.archive import ArchiveManager
+
+
+class TestCurrencyConversion(unittest.TestCase):
+    """測試外幣交易的換算"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, "fx.db")
+        self.db_manager = DatabaseManager(self.db_path)
+        self.category_manager = CategoryManager(self.db_manager)
+        self.transaction_manager = TransactionManager(self.db_manager)
+        self.fx_rate_manager = FxRateManager(self.db_manager)
+        
+        self.food_id = self.category_manager.get_categories_by_type('expense')[0]['id']
+        self.fx_rate_manager.set_rate('USD', '2024-01-01', 30)
+        self.fx_rate_manager.set_rate('USD', '2024-01-15', 32)
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def _add(self, date, amount, currency='TWD', manager=None):
+        manager = manager or self.transaction_manager
+        return manager.add_transaction(date, 'expense', self.food_id, amount, currency=currency)
+    
+    def test_as_of_rate(self):
+        """測試依交易日取當天或之前最近的匯率"""
+        self._add('2024-01-10', 10, 'USD')   # 30
+        self._add('2024-01-15', 10, 'usd')   # 32 (當天匯率)
+        self._add('2024-01-20', 100)
+        
+        summary = self.transaction_manager.get_monthly_summary(2024, 1)
+        self.assertEqual(summary['total_expense'], 300 + 320 + 100)
+        
+        totals = self.transaction_manager.get_category_totals('2024-01-01', '2024-01-31')
+        self.assertEqual(list(totals.values()), [720])
+        
+        transactions = {t['date']: t for t in self.transaction_manager.get_transactions()}
+        self.assertEqual(transactions['2024-01-15']['currency'], 'USD')
+        self.assertEqual(transactions['2024-01-15']['amount'], 10)
+        self.assertEqual(transactions['2024-01-15']['amount_base'], 320)
+    
+    def test_missing_rates(self):
+        """測試早於第一筆匯率使用最早匯率，沒有匯率的幣別以 1:1 計算"""
+        self._add('2023-12-20', 10, 'USD')
+        self._add('2023-12-21', 500, 'JPY')
+        
+        self.assertEqual(self.transaction_manager.get_monthly_summary(2023, 12)['total_expense'], 300 + 500)
+        self.assertEqual(self.fx_rate_manager.get_missing_currencies(), ['JPY'])
+        self.assertIsNone(self.fx_rate_manager.get_rate('JPY', '2024-01-01'))
+        self.assertEqual(self.fx_rate_manager.get_rate('USD', '2024-02-01'), 32)
+        self.assertEqual(self.fx_rate_manager.get_currencies(), ['TWD', 'USD'])
+    
+    def test_invalid_currency(self):
+        """測試無效的幣別代碼"""
+        with self.assertRaises(ValueError):
+            self._add('2024-01-10', 10, 'US')
+        with self.assertRaises(ValueError):
+            self.fx_rate_manager.set_rate('TWD', '2024-01-01', 1)
+    
+    def test_import_csv(self):
+        """測試從 CSV 批次匯入匯率並回報錯誤列"""
+        csv_path = os.path.join(self.temp_dir, "rates.csv")
+        with open(csv_path, 'w', encoding='utf-8') as f:
+            f.write("currency,date,rate\n")
+            f.write("jpy,2024-01-01,0.21\n")
+            f.write("USD,2024-01-15,31.5\n")
+            f.write("EUR,2024/01/01,35\n")
+            f.write("EUR,2024-01-01,-1\n")
+        
+        result = self.fx_rate_manager.import_csv(csv_path)
+        self.assertEqual(result['imported'], 2)
+        self.assertEqual([line for line, _ in result['errors']], [4, 5])
+        self.assertEqual(self.fx_rate_manager.get_rate('JPY', '2024-06-01'), 0.21)
+        self.assertEqual(self.fx_rate_manager.get_rate('USD', '2024-01-15'), 31.5)
+    
+    def test_archive_converts_summaries(self):
+        """測試封存時以匯率換算為基準幣別的月度彙總"""
+        self._add('2024-01-10', 10, 'USD')
+        self._add('2024-01-20', 100)
+        
+        ArchiveManager(self.db_manager).archive_before('2024-02-01')
+        self.assertEqual(self.transaction_manager.get_monthly_summary(2024, 1)['total_expense'], 400)
+    
+    def test_partitioned_currency(self):
+        """測試年度分區保存幣別並在視圖中換算"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        transaction_id = self._add('2024-01-10', 10, 'USD', manager)
+        self._add('2023-05-01', 50, manager=manager)
+        
+        self.assertEqual(manager.get_transaction(transaction_id)['amount_base'], 300)
+        self.assertEqual(manager.get_category_totals('2023-01-01', '2024-12-31'),
+                         {manager.get_transaction(transaction_id)['category_name']: 350})
+        
+        manager.update_transaction(transaction_id, '2024-01-20', 'expense', self.food_id, 10, currency='TWD')
+        self.assertEqual(manager.get_transaction(transaction_id)['currency'], 'TWD')
+    
+    def test_existing_database_migrated(self):
+        """測試舊資料庫開啟時補上幣別欄位，既有交易視為基準幣別"""
+        old_path = os.path.join(self.temp_dir, "old.db")
+        conn = sqlite3.connect(old_path)
+        conn.execute('''
+            CREATE TABLE transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, date DATE NOT NULL, type TEXT NOT NULL,
+                category_id INTEGER NOT NULL, amount DECIMAL(10,2) NOT NULL, description TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute("INSERT INTO transactions (date, type, category_id, amount) VALUES ('2024-01-01', 'expense', 5, 80)")
+        conn.commit()
+        conn.close()
+        
+        db_manager = DatabaseManager(old_path)
+        try:
+            transactions = TransactionManager(db_manager).get_transactions()
+            self.assertEqual(transactions[0]['currency'], 'TWD')
+            self.assertEqual(transactions[0]['amount_base'], 80)
+        finally:
+            db_manager.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,7 @@
 
 import unittest
 import os
+import sqlite3
 import sys
 from datetime import datetime
 
@@ -68,6 +69,127 @@ class TestDatabaseManager(unittest.TestCase):
         self.assertEqual(len(expense_categories), 6)
 
 
+class TestGroupCommit(unittest.TestCase):
+    """測試 DatabaseManager 群組提交模式"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.test_db = "test_group_commit.db"
+        if os.path.exists(self.test_db):
+            os.remove(self.test_db)
+        
+        # 視窗設長一點，確保測試期間計時器不會自行提交
+        self.db_manager = DatabaseManager(self.test_db, group_commit_ms=60000, synchronous='NORMAL')
+        self.category_manager = CategoryManager(self.db_manager)
+        self.transaction_manager = TransactionManager(self.db_manager)
+        self.expense_category_id = self.category_manager.get_categories_by_type('expense')[0]['id']
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.db_manager.close()
+        if os.path.exists(self.test_db):
+            os.remove(self.test_db)
+    
+    def _committed_count(self):
+        """以獨立連線計算已提交的交易筆數"""
+        conn = sqlite3.connect(self.test_db)
+        try:
+            return conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+        finally:
+            conn.close()
+    
+    def test_writes_coalesced_until_flush(self):
+        """測試視窗內的寫入合併，flush 時一次提交"""
+        for i in range(5):
+            self.transaction_manager.add_transaction('2024-01-01', 'expense', self.expense_category_id, 10 + i)
+        
+        # 自身讀取看得到尚未提交的寫入，其他連線則看不到
+        self.assertEqual(len(self.transaction_manager.get_transactions()), 5)
+        self.assertEqual(self._committed_count(), 0)
+        
+        self.db_manager.flush()
+        self.assertEqual(self._committed_count(), 5)
+    
+    def test_close_flushes_pending_writes(self):
+        """測試關閉時提交待提交的寫入"""
+        self.transaction_manager.add_transaction('2024-01-01', 'expense', self.expense_category_id, 10)
+        self.db_manager.close()
+        
+        self.assertEqual(self._committed_count(), 1)
+    
+    def test_failed_write_does_not_discard_group(self):
+        """測試單筆寫入失敗只回復該筆，不影響同一群組的其他寫入"""
+        self.transaction_manager.add_transaction('2024-01-01', 'expense', self.expense_category_id, 10)
+        
+        with self.assertRaises(ValueError):
+            self.transaction_manager.add_transaction('2024-01-01', 'expense', 99999, 20)
+        
+        self.transaction_manager.add_transaction('2024-01-02', 'expense', self.expense_category_id, 30)
+        self.db_manager.flush()
+        
+        self.assertEqual(self._committed_count(), 2)
+    
+    def test_invalid_synchronous_level(self):
+        """測試無效的 synchronous 設定"""
+        with self.assertRaises(ValueError):
+            DatabaseManager(self.test_db, synchronous='SOMETIMES')
+
+
+class TestBusyRetry(unittest.TestCase):
+    """測試資料庫被其他連線鎖住時的重試機制"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.test_db = "test_busy_retry.db"
+        if os.path.exists(self.test_db):
+            os.remove(self.test_db)
+        
+        # busy_timeout 設為 0，讓鎖定錯誤立即浮現以測試退避重試
+        self.db_manager = DatabaseManager(self.test_db, busy_timeout_ms=0, max_retries=8,
+                                          retry_base_delay=0.02, retry_max_delay=0.1)
+        self.transaction_manager = TransactionManager(self.db_manager)
+        self.expense_category_id = CategoryManager(self.db_manager).get_categories_by_type('expense')[0]['id']
+        
+        # 另一條連線持有排他鎖，模擬備份或其他程式正在寫入
+        self.blocker = sqlite3.connect(self.test_db, isolation_level=None, check_same_thread=False)
+        self.blocker.execute('BEGIN EXCLUSIVE')
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        if self.blocker.in_transaction:
+            self.blocker.execute('ROLLBACK')
+        self.blocker.close()
+        if os.path.exists(self.test_db):
+            os.remove(self.test_db)
+    
+    def test_write_retried_until_lock_released(self):
+        """測試鎖釋放後寫入重試成功，並記錄重試統計"""
+        import threading
+        threading.Timer(0.15, lambda: self.blocker.execute('COMMIT')).start()
+        
+        transaction_id = self.transaction_manager.add_transaction(
+            '2024-01-01', 'expense', self.expense_category_id, 100)
+        
+        self.assertIsNotNone(transaction_id)
+        metrics = self.db_manager.get_retry_metrics()
+        self.assertEqual(metrics['operations_retried'], 1)
+        self.assertGreater(metrics['retries'], 0)
+        self.assertGreater(metrics['retry_wait_seconds'], 0)
+        self.assertEqual(metrics['busy_failures'], 0)
+    
+    def test_retries_exhausted(self):
+        """測試重試用盡時回報失敗並計入統計"""
+        self.db_manager.max_retries = 2
+        
+        transaction_id = self.transaction_manager.add_transaction(
+            '2024-01-01', 'expense', self.expense_category_id, 100)
+        
+        self.assertIsNone(transaction_id)
+        metrics = self.db_manager.get_retry_metrics()
+        self.assertEqual(metrics['retries'], 2)
+        self.assertEqual(metrics['busy_failures'], 1)
+
+
 class TestCategoryManager(unittest.TestCase):
     """測試 CategoryManager 類別"""
     
@@ -286,6 +408,48 @@ class TestTransactionManager(unittest.TestCase):
         transactions = self.transaction_manager.get_transactions()
         self.assertEqual(len(transactions), 0)
     
+    def test_add_transaction_returns_id(self):
+        """測試新增交易回傳新記錄 ID"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        
+        transaction_id = self.transaction_manager.add_transaction(
+            today, 'expense', self.expense_category_id, 80, '早餐')
+        
+        self.assertIsInstance(transaction_id, int)
+        self.assertEqual(self.transaction_manager.get_transactions()[0]['id'], transaction_id)
+    
+    def test_get_transaction(self):
+        """測試依 ID 取得單筆交易（不受最新 100 筆限制）"""
+        # 新增一筆較舊的交易，再新增 150 筆較新的交易
+        old_id = self.transaction_manager.add_transaction(
+            '2020-01-01', 'expense', self.expense_category_id, 999, '舊交易')
+        for i in range(150):
+            self.transaction_manager.add_transaction(
+                '2024-06-01', 'expense', self.expense_category_id, 10 + i, '新交易')
+        
+        trans = self.transaction_manager.get_transaction(old_id)
+        
+        self.assertIsNotNone(trans)
+        self.assertEqual(trans['id'], old_id)
+        self.assertEqual(trans['amount'], 999)
+        self.assertEqual(trans['category_id'], self.expense_category_id)
+        self.assertIn('category_name', trans)
+        
+        # 不存在的 ID
+        self.assertIsNone(self.transaction_manager.get_transaction(99999))
+    
+    def test_get_transactions_by_ids(self):
+        """測試依 ID 批次取得交易"""
+        id1 = self.transaction_manager.add_transaction('2024-01-01', 'expense', self.expense_category_id, 100, 'A')
+        id2 = self.transaction_manager.add_transaction('2024-03-01', 'income', self.income_category_id, 200, 'B')
+        self.transaction_manager.add_transaction('2024-02-01', 'expense', self.expense_category_id, 300, 'C')
+        
+        transactions = self.transaction_manager.get_transactions_by_ids([id1, id2, id1, 99999])
+        
+        # 去除重複、略過不存在的 ID，並依日期由新到舊排序
+        self.assertEqual([t['id'] for t in transactions], [id2, id1])
+        self.assertEqual(self.transaction_manager.get_transactions_by_ids([]), [])
+    
     def test_get_monthly_summary(self):
         """測試月度統計"""
         today = datetime.now()
@@ -312,6 +476,8 @@ def run_tests():
     
     # 加入測試
     suite.addTests(loader.loadTestsFromTestCase(TestDatabaseManager))
+    suite.addTests(loader.loadTestsFromTestCase(TestGroupCommit))
+    suite.addTests(loader.loadTestsFromTestCase(TestBusyRetry))
     suite.addTests(loader.loadTestsFromTestCase(TestCategoryManager))
     suite.addTests(loader.loadTestsFromTestCase(TestTransactionManager))
     
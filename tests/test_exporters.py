@@ -0,0 +1,170 @@
+"""
+交易匯出測試
+測試依篩選條件分批讀取交易、CSV 匯出的統計摘要與取消
+"""
+
+import unittest
+import os
+import sys
+import csv
+import shutil
+import tempfile
+import threading
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database.models import DatabaseManager, CategoryManager, TransactionManager
+from database.partitions import PartitionedTransactionManager
+from utils.exporters import CsvExporter, XlsxExporter, OPENPYXL_AVAILABLE
+from utils.importers import CsvImporter, XlsxImporter
+
+if OPENPYXL_AVAILABLE:
+    import openpyxl
+
+
+class TestCsvExporter(unittest.TestCase):
+    """測試 iter_transactions 與 CsvExporter / XlsxExporter 類別"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_manager = DatabaseManager(os.path.join(self.temp_dir, "export.db"))
+        category_manager = CategoryManager(self.db_manager)
+        self.categories = {category['name']: category['id'] for category in category_manager.get_all_categories()}
+        self.path = os.path.join(self.temp_dir, 'export.csv')
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def _add_ledger(self, manager):
+        """2022 到 2024 年每月同一天各一筆午餐 (0.1 元)、一筆捷運與一筆薪資"""
+        rows = []
+        for year in (2022, 2023, 2024):
+            for month in range(1, 13):
+                day = f'{year}-{month:02d}-10'
+                rows += [
+                    {'date': day, 'type': 'expense', 'category_id': self.categories['飲食'], 'amount': 0.1,
+                     'description': '午餐 Lunch'},
+                    {'date': day, 'type': 'expense', 'category_id': self.categories['交通'], 'amount': 35,
+                     'description': '捷運'},
+                    {'date': day, 'type': 'income', 'category_id': self.categories['薪資'], 'amount': 50000.3,
+                     'description': None},
+                ]
+        manager.add_transactions_bulk(rows)
+    
+    def _read_csv(self):
+        with open(self.path, newline='', encoding='utf-8-sig') as f:
+            return list(csv.reader(f))
+    
+    def test_iter_transactions_filters(self):
+        """測試分批讀取的結果與一次查詢相同，篩選條件與列表相同"""
+        for manager in (TransactionManager(self.db_manager), PartitionedTransactionManager(self.db_manager)):
+            with self.subTest(manager=type(manager).__name__):
+                self.db_manager.run_write(lambda conn: conn.execute('DELETE FROM transactions'))
+                self._add_ledger(manager)
+                everything = manager.get_transactions(limit=1000)
+                batches = list(manager.iter_transactions(batch_size=4))
+                self.assertTrue(all(len(batch) <= 4 for batch in batches))
+                self.assertEqual(sorted(row['id'] for batch in batches for row in batch),
+                                 sorted(row['id'] for row in everything))
+                self.assertEqual(manager.count_transactions(), 108)
+                
+                filters = {'start_date': '2023-06-01', 'end_date': '2024-02-10', 'type': 'expense',
+                           'category': '全部分類', 'keyword': 'lunch'}
+                rows = [row for batch in manager.iter_transactions(filters, batch_size=2) for row in batch]
+                self.assertEqual(len(rows), 9)
+                self.assertEqual([row['date'] for row in rows], sorted((row['date'] for row in rows), reverse=True))
+                self.assertEqual({row['category_name'] for row in rows}, {'飲食'})
+                self.assertEqual(manager.count_transactions(filters), 9)
+                self.assertEqual(manager.count_transactions({'category': '交通', 'start_date': '2024-01-01'}), 12)
+    
+    def test_export_summary(self):
+        """測試匯出所有年度的交易，統計摘要精確到分，匯出的檔案可直接匯回"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        self._add_ledger(manager)
+        progress = []
+        result = CsvExporter(manager, batch_size=10).export(self.path, progress=lambda *args: progress.append(args))
+        
+        self.assertEqual(result, {'rows': 108, 'total_income': 1800010.8, 'total_expense': 1263.6,
+                                  'balance': 1798747.2, 'cancelled': False})
+        self.assertEqual(progress[-1], (108, 108))
+        self.assertEqual(len(progress), 12)  # 每個年度 36 筆各分 4 批
+        lines = self._read_csv()
+        self.assertEqual(lines[0], ['日期', '類型', '分類', '金額', '幣別', '備註'])
+        self.assertEqual(lines[1][:3], ['2024-12-10', '收入', '薪資'])
+        self.assertIn(['總收入', '$1800010.80'], lines)
+        self.assertIn(['結餘', '$1798747.20'], lines)
+        self.assertIn(['記錄筆數', '108'], lines)
+        self.assertFalse(os.path.exists(self.path + '.part'))
+        
+        other = DatabaseManager(os.path.join(self.temp_dir, "import.db"))
+        try:
+            CategoryManager(other)
+            imported = CsvImporter(TransactionManager(other)).import_file(self.path)
+            self.assertEqual(imported['imported'], 108)
+        finally:
+            other.close()
+    
+    def test_cancel(self):
+        """測試取消後不留下檔案，原有的檔案不被覆寫"""
+        manager = TransactionManager(self.db_manager)
+        self._add_ledger(manager)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('previous')
+        cancel = threading.Event()
+        
+        def on_progress(done, total):
+            if done >= 20:
+                cancel.set()
+        
+        result = CsvExporter(manager, batch_size=10).export(self.path, {'type': 'expense'}, on_progress, cancel)
+        self.assertTrue(result['cancelled'])
+        self.assertEqual(result['rows'], 20)
+        with open(self.path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), 'previous')
+        self.assertFalse(os.path.exists(self.path + '.part'))
+    
+    @unittest.skipUnless(OPENPYXL_AVAILABLE, "需要 openpyxl")
+    def test_excel_summary_sheets(self):
+        """測試 Excel 匯出的交易記錄、月份摘要與分類樞紐工作表"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        self._add_ledger(manager)
+        path = os.path.join(self.temp_dir, 'export.xlsx')
+        filters = {'start_date': '2023-11-01', 'end_date': '2024-02-28', 'type': 'all', 'category': '全部分類'}
+        result = XlsxExporter(manager, batch_size=5).export(path, filters)
+        self.assertEqual(result['rows'], 12)
+        
+        workbook = openpyxl.load_workbook(path)
+        self.assertEqual(workbook.sheetnames, ['交易記錄', '月份摘要', '分類樞紐'])
+        data = workbook['交易記錄']
+        self.assertEqual(data['A1'].style, 'export_header')
+        self.assertEqual(data['D2'].number_format, '#,##0.00')
+        self.assertEqual(data.max_row, 13)
+        
+        monthly = [list(row) for row in workbook['月份摘要'].iter_rows(min_row=2, values_only=True)]
+        self.assertEqual(monthly[0], ['2023-11', 50000.3, 35.1, 49965.2, 3])
+        self.assertEqual(monthly[-1], ['合計', 200001.2, 140.4, 199860.8, 12])
+        pivot = [list(row) for row in workbook['分類樞紐'].iter_rows(values_only=True)]
+        self.assertEqual(pivot[0], ['類型', '分類', '2023-11', '2023-12', '2024-01', '2024-02', '合計'])
+        self.assertEqual([row[:2] for row in pivot[1:]], [['收入', '薪資'], ['支出', '交通'], ['支出', '飲食']])
+        self.assertEqual(pivot[2][2:], [35, 35, 35, 35, 140])
+        workbook.close()
+        
+        XlsxExporter(manager, summary_sheets=False).export(path, filters)
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        self.assertEqual(workbook.sheetnames, ['交易記錄'])
+        workbook.close()
+        other = DatabaseManager(os.path.join(self.temp_dir, "import.db"))
+        try:
+            CategoryManager(other)
+            imported = XlsxImporter(TransactionManager(other)).import_file(path)
+            self.assertEqual(imported['imported'], 12)
+        finally:
+            other.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,264 @@
+"""
+CSV 匯入測試
+測試日期與金額的正規化，以及 CsvImporter 的串流匯入與錯誤報告
+"""
+
+import unittest
+import os
+import sys
+import csv
+import shutil
+import tempfile
+from datetime import datetime
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database.models import DatabaseManager, CategoryManager, TransactionManager, transaction_fingerprint
+from database.accounts import AccountManager
+from database.partitions import PartitionedTransactionManager
+from utils.importers import (CsvImporter, XlsxImporter, OPENPYXL_AVAILABLE, parse_amount, parse_date,
+                             read_xlsx_header)
+
+
+class TestNormalization(unittest.TestCase):
+    """測試日期與金額的正規化"""
+    
+    def test_parse_date(self):
+        """測試西元年、民國年與指定格式"""
+        self.assertEqual(parse_date('2024/3/5'), '2024-03-05')
+        self.assertEqual(parse_date('20240305'), '2024-03-05')
+        self.assertEqual(parse_date('113/03/05 14:20:00'), '2024-03-05')
+        self.assertEqual(parse_date('05/03/2024', '%d/%m/%Y'), '2024-03-05')
+        self.assertEqual(parse_date('2024-03-05', '%d/%m/%Y'), '2024-03-05')
+        with self.assertRaises(ValueError):
+            parse_date('2024-02-30')
+    
+    def test_parse_amount(self):
+        """測試千分位、幣別符號與負數寫法"""
+        self.assertEqual(parse_amount('NT$1,234.50'), 1234.5)
+        self.assertEqual(parse_amount('(1,200)'), -1200)
+        self.assertEqual(parse_amount('300-'), -300)
+        self.assertEqual(parse_amount('-$45'), -45)
+        with self.assertRaises(ValueError):
+            parse_amount('12a')
+    
+    def test_fingerprint(self):
+        """測試指紋忽略備註的全形、大小寫與標點，記入帳戶且有外部 ID 時只看外部 ID"""
+        base = transaction_fingerprint('2024-03-02', 'expense', 120, 'TWD', None, 'ATM 手續費')
+        self.assertEqual(transaction_fingerprint('2024-03-02', 'expense', 120.0, 'TWD', None, 'ａｔｍ  手續費!'), base)
+        self.assertNotEqual(transaction_fingerprint('2024-03-02', 'income', 120, 'TWD', None, 'ATM 手續費'), base)
+        self.assertNotEqual(transaction_fingerprint('2024-03-02', 'expense', 120, 'TWD', 1, 'ATM 手續費'), base)
+        self.assertEqual(transaction_fingerprint('2024-03-02', 'expense', 120, 'TWD', 1, 'A', 'F1'),
+                         transaction_fingerprint('2024-03-03', 'expense', 99, 'TWD', 1, 'B', 'F1'))
+        self.assertNotEqual(transaction_fingerprint('2024-03-02', 'expense', 120, 'TWD', None, 'A', 'F1'),
+                            transaction_fingerprint('2024-03-03', 'expense', 99, 'TWD', None, 'A', 'F1'))
+
+
+class TestCsvImporter(unittest.TestCase):
+    """測試 CsvImporter 類別"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_manager = DatabaseManager(os.path.join(self.temp_dir, "import.db"))
+        self.transaction_manager = TransactionManager(self.db_manager)
+        category_manager = CategoryManager(self.db_manager)
+        self.categories = {category['name']: category['id'] for category in category_manager.get_all_categories()}
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def _write_csv(self, rows, name='statement.csv', encoding='utf-8-sig'):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w', newline='', encoding=encoding) as f:
+            csv.writer(f).writerows(rows)
+        return path
+    
+    def test_export_format_round_trip(self):
+        """測試匯出格式的檔案可直接匯入"""
+        path = self._write_csv([
+            ['日期', '類型', '分類', '金額', '幣別', '備註'],
+            ['2024-03-01', '支出', '飲食', '120', 'TWD', '午餐'],
+            ['2024-03-02', '收入', '薪資', '50000', 'TWD', ''],
+            [],
+            ['2024-03-03', '支出', '不存在', '10', 'TWD', ''],
+        ])
+        result = CsvImporter(self.transaction_manager).import_file(path)
+        
+        self.assertEqual(result['imported'], 2)
+        self.assertEqual(result['errors'], [(5, "找不到支出分類：不存在")])
+        summary = self.transaction_manager.get_monthly_summary(2024, 3)
+        self.assertEqual((summary['total_income'], summary['total_expense']), (50000, 120))
+    
+    def test_bank_statement_mapping(self):
+        """測試支出/存入分欄、民國年日期、記入帳戶與錯誤報告檔"""
+        account_id = AccountManager(self.db_manager).add_account("銀行")
+        path = self._write_csv([
+            ['交易日', '摘要', '支出', '存入', '餘額'],
+            ['113/03/01', '轉帳 "房租"', '15,000', '', '85,000'],
+            ['113/03/05', '薪轉', '', '52,000', '137,000'],
+            ['113/03/32', '錯誤日期', '100', '', ''],
+            ['113/03/06', '沒有金額', '', '', ''],
+        ], encoding='cp950')
+        report_path = os.path.join(self.temp_dir, 'errors.csv')
+        progress = []
+        importer = CsvImporter(
+            self.transaction_manager,
+            mapping={'date': '交易日', 'description': '摘要', 'debit': '支出', 'credit': '存入'},
+            encoding='cp950', account_id=account_id)
+        result = importer.import_file(path, progress=lambda done, total: progress.append((done, total)),
+                                      error_report_path=report_path)
+        
+        self.assertEqual(result['imported'], 2)
+        self.assertEqual(result['error_count'], 2)
+        self.assertEqual(AccountManager(self.db_manager).get_balance(account_id), 37000)
+        transactions = self.transaction_manager.get_transactions()
+        self.assertEqual(transactions[1]['description'], '轉帳 "房租"')
+        self.assertEqual(transactions[1]['category_id'], self.categories['其他支出'])
+        self.assertEqual(progress[-1], (os.path.getsize(path), os.path.getsize(path)))
+        with open(report_path, newline='', encoding='utf-8-sig') as f:
+            self.assertEqual([row[0] for row in csv.reader(f)], ['列號', '4', '5'])
+    
+    def test_missing_column(self):
+        """測試欄位對應與 CSV 標題不符"""
+        path = self._write_csv([['日期', '金額'], ['2024-03-01', '-10']])
+        with self.assertRaises(ValueError):
+            CsvImporter(self.transaction_manager).import_file(path)
+        with self.assertRaises(ValueError):
+            CsvImporter(self.transaction_manager, mapping={'amount': '金額'})
+        
+        result = CsvImporter(self.transaction_manager, mapping={'date': '日期', 'amount': '金額'}).import_file(path)
+        self.assertEqual(result['imported'], 1)
+        self.assertEqual(self.transaction_manager.get_transactions()[0]['type'], 'expense')
+    
+    def test_malformed_csv(self):
+        """測試超過欄位長度上限的 CSV 以 ValueError 回報 (匯入與對帳解析)"""
+        path = self._write_csv([['日期', '金額'], ['2024-03-01', '-10'],
+                                ['2024-03-02', '"' + 'x' * (csv.field_size_limit() + 1)]])
+        importer = CsvImporter(self.transaction_manager, mapping={'date': '日期', 'amount': '金額'})
+        with self.assertRaisesRegex(ValueError, "無法讀取 CSV 檔案"):
+            importer.import_file(path)
+        with self.assertRaisesRegex(ValueError, "無法讀取 CSV 檔案"):
+            importer.parse_file(path)
+    
+    def test_parallel_batches(self):
+        """測試行程池平行解析與分批寫入保持原本的順序"""
+        rows = [['日期', '金額', '備註']]
+        rows += [[f'2024-01-{day % 28 + 1:02d}', str(-(index + 1)), f'#{index}']
+                 for index, day in enumerate(range(250))]
+        rows.insert(100, ['bad', '1', ''])
+        path = self._write_csv(rows)
+        
+        importer = CsvImporter(self.transaction_manager, mapping={'date': '日期', 'amount': '金額', 'description': '備註'},
+                               max_workers=2)
+        importer.PARALLEL_MIN_BYTES = 0
+        importer.CHUNK_SIZE = 30
+        importer.WRITE_BATCH_SIZE = 70
+        result = importer.import_file(path)
+        
+        self.assertEqual(result['imported'], 250)
+        self.assertEqual(result['errors'], [(101, "無法辨識的日期：bad")])
+        ids = {t['description']: t['id'] for t in self.transaction_manager.get_transactions(limit=300)}
+        self.assertEqual(sorted(ids, key=ids.get), [f'#{index}' for index in range(250)])
+        self.assertEqual(self.transaction_manager.get_monthly_summary(2024, 1)['total_expense'], 250 * 251 / 2)
+    
+    def test_partitioned_closed_year(self):
+        """測試年度分區：已結帳年度的列記為錯誤，其他年度照常寫入"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        manager.add_transaction('2022-05-01', 'expense', self.categories['飲食'], 10)
+        manager.close_year(2022)
+        path = self._write_csv([
+            ['日期', '金額'],
+            ['2022-06-01', '-20'],
+            ['2023-06-01', '-30'],
+            ['2024-06-01', '40'],
+        ])
+        result = CsvImporter(manager, mapping={'date': '日期', 'amount': '金額'}).import_file(path)
+        
+        self.assertEqual(result['imported'], 2)
+        self.assertEqual([line for line, _ in result['errors']], [2])
+        self.assertEqual(len(manager.get_transactions_by_date_range('2023-01-01', '2024-12-31')), 2)
+    
+    def test_duplicates(self):
+        """測試重複匯入以指紋略過，同一檔案內相同的交易都保留，並回報金額相同、日期相近的交易"""
+        mapping = {'date': '日期', 'amount': '金額', 'description': '備註'}
+        self.transaction_manager.add_transaction('2024-03-02', 'expense', self.categories['飲食'], 120, 'ATM 手續費')
+        first = self._write_csv([
+            ['日期', '金額', '備註'],
+            ['2024-03-01', '-85', '早餐'],
+            ['2024-03-01', '-85', '早餐'],
+            ['2024-03-02', '-120', 'ａｔｍ　手續費'],
+        ], name='first.csv')
+        result = CsvImporter(self.transaction_manager, mapping=mapping).import_file(first)
+        self.assertEqual((result['imported'], result['duplicates'], result['near_duplicates']), (2, 1, []))
+        
+        second = self._write_csv([
+            ['日期', '金額', '備註'],
+            ['2024-03-01', '-85', '早餐'],
+            ['2024-03-02', '-120', 'ATM 手續費!'],
+            ['2024-03-04', '-85', '午餐'],
+        ], name='second.csv')
+        result = CsvImporter(self.transaction_manager, mapping=mapping).import_file(second)
+        self.assertEqual((result['imported'], result['duplicates']), (1, 2))
+        (line, matches), = result['near_duplicates']
+        self.assertEqual(line, 4)
+        self.assertEqual([match['date'] for match in matches], ['2024-03-01', '2024-03-01'])
+        self.assertEqual(len(self.transaction_manager.get_transactions()), 4)
+        
+        result = CsvImporter(self.transaction_manager, mapping=mapping, skip_duplicates=False,
+                             near_duplicate_days=0).import_file(second)
+        self.assertEqual((result['imported'], result['duplicates'], result['near_duplicates']), (3, 0, []))
+    
+    def test_partitioned_duplicates(self):
+        """測試年度分區：各年度的交易分別與該年度的分區比對"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        path = self._write_csv([
+            ['日期', '金額'],
+            ['2023-12-31', '-20'],
+            ['2024-01-01', '-30'],
+        ])
+        importer = CsvImporter(manager, mapping={'date': '日期', 'amount': '金額'})
+        self.assertEqual(importer.import_file(path)['imported'], 2)
+        result = importer.import_file(path)
+        self.assertEqual((result['imported'], result['duplicates']), (0, 2))
+        self.assertEqual(len(manager.get_transactions_by_date_range('2023-01-01', '2024-12-31')), 2)
+    
+    @unittest.skipUnless(OPENPYXL_AVAILABLE, "需要 openpyxl")
+    def test_xlsx(self):
+        """測試 Excel 日期/數字儲存格與文字儲存格使用相同的對應與驗證"""
+        import openpyxl
+        path = os.path.join(self.temp_dir, 'statement.xlsx')
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet('明細')
+        sheet.append(['交易日', '說明', '金額'])
+        sheet.append([datetime(2024, 3, 1), '早餐', -85])
+        sheet.append(['05/03/2024', '退款', 120.5])
+        sheet.append([None, None, None])
+        sheet.append(['32/03/2024', '錯誤日期', -1])
+        for day in range(1, 21):
+            sheet.append([datetime(2024, 4, day), f'#{day}', '(10)'])
+        workbook.save(path)
+        
+        self.assertEqual(read_xlsx_header(path, '明細'), ['交易日', '說明', '金額'])
+        progress = []
+        importer = XlsxImporter(self.transaction_manager, sheet_name='明細', date_format='%d/%m/%Y',
+                                mapping={'date': '交易日', 'description': '說明', 'amount': '金額'})
+        importer.CHUNK_SIZE = 8
+        result = importer.import_file(path, progress=lambda done, total: progress.append(done))
+        
+        self.assertEqual(result['imported'], 22)
+        self.assertEqual(result['errors'], [(5, "無法辨識的日期：32/03/2024")])
+        self.assertEqual(progress, sorted(progress))
+        summary = self.transaction_manager.get_monthly_summary(2024, 3)
+        self.assertEqual((summary['total_income'], summary['total_expense']), (120.5, 85))
+        self.assertEqual(self.transaction_manager.get_monthly_summary(2024, 4)['total_expense'], 200)
+        with self.assertRaises(ValueError):
+            XlsxImporter(self.transaction_manager, sheet_name='不存在',
+                         mapping={'date': '交易日', 'amount': '金額'}).import_file(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+"""
+多帳本測試
+測試 LedgerRegistry 的帳本管理與 ConsolidatedReporter 的合併報表
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database.ledgers import LedgerRegistry, ConsolidatedReporter
+from database.partitions import PartitionedTransactionManager
+
+
+class TestLedgerRegistry(unittest.TestCase):
+    """測試 LedgerRegistry 類別"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.registry = self._create_registry()
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.registry.close_all()
+        shutil.rmtree(self.temp_dir)
+    
+    def _create_registry(self):
+        return LedgerRegistry(
+            registry_path=os.path.join(self.temp_dir, "ledgers.json"),
+            ledger_dir=os.path.join(self.temp_dir, "ledgers"),
+            default_db_path=os.path.join(self.temp_dir, "accounting.db"))
+    
+    def _add_expense(self, ledger, day, amount):
+        category_id = ledger.category_manager.get_categories_by_type('expense')[0]['id']
+        return ledger.transaction_manager.add_transaction(day, 'expense', category_id, amount)
+    
+    def test_default_ledger(self):
+        """測試既有資料庫登錄為預設帳本"""
+        ledgers = self.registry.list_ledgers()
+        self.assertEqual(len(ledgers), 1)
+        self.assertEqual(ledgers[0]['id'], LedgerRegistry.DEFAULT_LEDGER_ID)
+        self.assertEqual(ledgers[0]['path'], os.path.join(self.temp_dir, "accounting.db"))
+        self.assertTrue(ledgers[0]['is_active'])
+        self.assertFalse(ledgers[0]['is_open'])
+    
+    def test_add_and_remove_ledger(self):
+        """測試新增、重複名稱與移除帳本"""
+        ledger = self.registry.add_ledger("公司")
+        self.assertEqual(ledger.id, "ledger1")
+        self.assertEqual(self.registry.find_by_name("公司").id, "ledger1")
+        
+        with self.assertRaises(ValueError):
+            self.registry.add_ledger("公司")
+        with self.assertRaises(ValueError):
+            self.registry.add_ledger("  ")
+        
+        self.registry.open_ledger(ledger.id)
+        self.assertTrue(os.path.exists(ledger.path))
+        with self.assertRaises(ValueError):
+            self.registry.remove_ledger(ledger.id)
+        
+        self.registry.open_ledger(LedgerRegistry.DEFAULT_LEDGER_ID)
+        self.registry.remove_ledger(ledger.id, delete_file=True)
+        self.assertIsNone(self.registry.find_by_name("公司"))
+        self.assertFalse(os.path.exists(ledger.path))
+    
+    def test_removed_ledger_files_not_reused(self):
+        """測試移除帳本後新增的帳本不會沿用舊帳本的 ID 與檔案 (含年度分區與封存檔)"""
+        kept = self.registry.open_ledger(self.registry.add_ledger("A").id, activate=False)
+        self._add_expense(kept, '2024-03-01', 100)
+        self.registry.remove_ledger(kept.id)
+        self.assertTrue(os.path.exists(kept.path))
+        
+        deleted = self.registry.open_ledger(self.registry.add_ledger("B").id, activate=False)
+        self.assertNotEqual(deleted.id, kept.id)
+        self.assertEqual(deleted.transaction_manager.count_transactions(), 0)
+        manager = PartitionedTransactionManager(deleted.db_manager)
+        manager.migrate_to_partitions()
+        category_id = deleted.category_manager.get_categories_by_type('expense')[0]['id']
+        manager.add_transaction('2024-03-01', 'expense', category_id, 100, "secret of B")
+        manager.close_year(2024)
+        # 封存檔 (ArchiveManager 預設的路徑)
+        open(os.path.join(self.temp_dir, "ledgers", f"{deleted.id}_archive.db"), 'w').close()
+        files = deleted.get_files()
+        self.assertEqual(len(files), 3)
+        self.registry.remove_ledger(deleted.id, delete_file=True)
+        self.assertFalse(any(os.path.exists(path) for path in files))
+        
+        reloaded = self._create_registry()
+        ledger = reloaded.open_ledger(reloaded.add_ledger("C").id, activate=False)
+        try:
+            self.assertNotIn(ledger.id, (kept.id, deleted.id))
+            self.assertEqual(ledger.transaction_manager.count_transactions(), 0)
+        finally:
+            reloaded.close_all()
+    
+    def test_active_ledger_persisted(self):
+        """測試使用中的帳本與帳本清單寫入登錄檔"""
+        ledger = self.registry.add_ledger("旅行")
+        self.registry.open_ledger(ledger.id)
+        self.registry.close_all()
+        
+        reloaded = self._create_registry()
+        self.assertEqual(reloaded.active_ledger_id, ledger.id)
+        self.assertEqual(reloaded.get_ledger(ledger.id).name, "旅行")
+    
+    def test_ledgers_are_isolated(self):
+        """測試各帳本資料互不影響，切換回來沿用已開啟的管理器"""
+        default = self.registry.open_ledger(LedgerRegistry.DEFAULT_LEDGER_ID)
+        other = self.registry.open_ledger(self.registry.add_ledger("公司").id)
+        
+        self._add_expense(default, '2024-03-01', 100)
+        self._add_expense(other, '2024-03-02', 250)
+        
+        self.assertEqual([t['amount'] for t in default.transaction_manager.get_transactions()], [100])
+        self.assertEqual([t['amount'] for t in other.transaction_manager.get_transactions()], [250])
+        
+        db_manager, completer = default.db_manager, default.description_completer
+        reopened = self.registry.open_ledger(LedgerRegistry.DEFAULT_LEDGER_ID)
+        self.assertIs(reopened.db_manager, db_manager)
+        self.assertIs(reopened.description_completer, completer)
+        self.assertIs(reopened.recurring_manager.transaction_manager, reopened.transaction_manager)
+    
+    def test_open_materializes_recurring(self):
+        """測試開啟帳本時補產生到期的定期交易 (切換回已開啟的帳本不再執行)"""
+        ledger = self.registry.open_ledger(LedgerRegistry.DEFAULT_LEDGER_ID)
+        category_id = ledger.category_manager.get_categories_by_type('expense')[0]['id']
+        ledger.recurring_manager.add_rule("房租", 'expense', category_id, 15000, 'monthly', '2024-01-05',
+                                          end_date='2024-03-31')
+        self.assertEqual(ledger.transaction_manager.count_transactions(), 0)
+        self.registry.open_ledger(LedgerRegistry.DEFAULT_LEDGER_ID)
+        self.assertEqual(ledger.transaction_manager.count_transactions(), 0)
+        
+        ledger.close()
+        ledger = self.registry.open_ledger(LedgerRegistry.DEFAULT_LEDGER_ID)
+        self.assertEqual(ledger.transaction_manager.count_transactions(), 3)
+
+
+class TestConsolidatedReporter(unittest.TestCase):
+    """測試 ConsolidatedReporter 類別"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.registry = LedgerRegistry(
+            registry_path=os.path.join(self.temp_dir, "ledgers.json"),
+            ledger_dir=os.path.join(self.temp_dir, "ledgers"),
+            default_db_path=os.path.join(self.temp_dir, "accounting.db"))
+        self.reporter = ConsolidatedReporter(self.registry)
+        
+        self.default = self.registry.open_ledger(LedgerRegistry.DEFAULT_LEDGER_ID)
+        self.other = self.registry.open_ledger(self.registry.add_ledger("公司").id, activate=False)
+        for ledger, amounts in ((self.default, (100, 200)), (self.other, (1000,))):
+            expense_id = ledger.category_manager.get_categories_by_type('expense')[0]['id']
+            income_id = ledger.category_manager.get_categories_by_type('income')[0]['id']
+            for amount in amounts:
+                ledger.transaction_manager.add_transaction('2024-05-10', 'expense', expense_id, amount)
+            ledger.transaction_manager.add_transaction('2024-05-01', 'income', income_id, 5000)
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.registry.close_all()
+        shutil.rmtree(self.temp_dir)
+    
+    def test_monthly_summary(self):
+        """測試合併月度統計等於各帳本加總"""
+        summary = self.reporter.get_monthly_summary(2024, 5)
+        self.assertEqual(summary['total_income'], 10000)
+        self.assertEqual(summary['total_expense'], 1300)
+        self.assertEqual(summary['balance'], 8700)
+        self.assertEqual(summary['ledgers']['ledger1']['total_expense'], 1000)
+        
+        only_default = self.reporter.get_monthly_summary(2024, 5, [LedgerRegistry.DEFAULT_LEDGER_ID])
+        self.assertEqual(only_default['total_expense'], 300)
+    
+    def test_temporarily_opened_ledgers_are_closed(self):
+        """測試報表暫時開啟的帳本在查詢後關閉，已開啟的帳本保持開啟"""
+        self.other.close()
+        summary = self.reporter.get_monthly_summary(2024, 5)
+        self.assertEqual(summary['total_expense'], 1300)
+        self.assertFalse(self.other.is_open)
+        self.assertTrue(self.default.is_open)
+    
+    def test_category_totals(self):
+        """測試合併分類合計以分類名稱合併"""
+        totals = self.reporter.get_category_totals('2024-05-01', '2024-05-31')
+        name = self.default.category_manager.get_categories_by_type('expense')[0]['name']
+        self.assertEqual(totals, {name: 1300})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+資料層日誌測試
+測試頻率限制、結構化欄位與資料層的日誌輸出
+"""
+
+import unittest
+import io
+import logging
+import os
+import sys
+import shutil
+import tempfile
+from unittest import mock
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database.log import LOGGER_NAME, RateLimitFilter, StructuredFormatter, configure_logging, get_fields
+from database.models import DatabaseManager, CategoryManager, TransactionManager
+
+
+def make_record(msg, *args, **fields):
+    record = logging.LogRecord('accounting.test', logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(fields)
+    return record
+
+
+class TestRateLimitFilter(unittest.TestCase):
+    """測試 RateLimitFilter 類別"""
+    
+    def test_limits_per_template(self):
+        """測試同一訊息模板在時間窗內超過上限即略過，不同模板分開計算"""
+        rate_filter = RateLimitFilter(max_per_window=2, window_seconds=60)
+        results = [rate_filter.filter(make_record("新增 %s", i)) for i in range(5)]
+        self.assertEqual(results, [True, True, False, False, False])
+        self.assertTrue(rate_filter.filter(make_record("其他訊息")))
+    
+    def test_reports_suppressed_count(self):
+        """測試下一個時間窗的第一筆帶上略過筆數"""
+        rate_filter = RateLimitFilter(max_per_window=1, window_seconds=10)
+        with mock.patch('database.log.time.monotonic', return_value=100.0):
+            for i in range(4):
+                rate_filter.filter(make_record("新增 %s", i))
+        with mock.patch('database.log.time.monotonic', return_value=111.0):
+            record = make_record("新增 %s", 99)
+            self.assertTrue(rate_filter.filter(record))
+        self.assertEqual(record.suppressed, 3)
+
+
+class TestStructuredLogging(unittest.TestCase):
+    """測試結構化欄位與資料層輸出"""
+    
+    def tearDown(self):
+        logger = logging.getLogger(LOGGER_NAME)
+        for handler in list(logger.handlers):
+            if not isinstance(handler, logging.NullHandler):
+                logger.removeHandler(handler)
+        logger.setLevel(logging.NOTSET)
+    
+    def test_formatter_appends_fields(self):
+        """測試格式化時附加 extra 欄位"""
+        record = make_record("新增 %s 筆", 3, event='imported', batch=2)
+        self.assertEqual(get_fields(record), {'event': 'imported', 'batch': 2})
+        self.assertEqual(StructuredFormatter('%(message)s').format(record),
+                         "新增 3 筆 event='imported' batch=2")
+    
+    def test_data_layer_logs_instead_of_printing(self):
+        """測試資料層以 DEBUG 記錄成功訊息並帶有結構化欄位，且不再輸出到 stdout"""
+        temp_dir = tempfile.mkdtemp()
+        stream = io.StringIO()
+        try:
+            configure_logging(logging.DEBUG, stream)
+            with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+                db_manager = DatabaseManager(os.path.join(temp_dir, "ledger.db"))
+                category_id = CategoryManager(db_manager).get_categories_by_type('expense')[0]['id']
+                transaction_id = TransactionManager(db_manager).add_transaction(
+                    '2024-01-01', 'expense', category_id, 100)
+                db_manager.close()
+            self.assertEqual(stdout.getvalue(), '')
+            self.assertIn("event='transaction_added'", stream.getvalue())
+            self.assertIn(f"transaction_id={transaction_id}", stream.getvalue())
+            
+            # 預設層級只輸出警告以上
+            configure_logging(stream=stream)
+            self.assertFalse(logging.getLogger('accounting.models').isEnabledFor(logging.DEBUG))
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
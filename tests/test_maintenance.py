@@ -0,0 +1,111 @@
+"""
+資料庫維護測試
+測試統計資訊更新、增量空間回收與離線壓縮
+"""
+
+import unittest
+import os
+import sys
+import sqlite3
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database.models import DatabaseManager, CategoryManager, TransactionManager
+from database.maintenance import MaintenanceManager
+
+
+class TestMaintenanceManager(unittest.TestCase):
+    """測試 MaintenanceManager 類別"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.test_db = "test_maintenance.db"
+        for path in (self.test_db, f"{self.test_db}.compact"):
+            if os.path.exists(path):
+                os.remove(path)
+        
+        self.db_manager = DatabaseManager(self.test_db)
+        self.category_manager = CategoryManager(self.db_manager)
+        self.transaction_manager = TransactionManager(self.db_manager)
+        self.maintenance = MaintenanceManager(self.db_manager)
+        
+        self.expense_category_id = self.category_manager.get_categories_by_type('expense')[0]['id']
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.db_manager.close()
+        for path in (self.test_db, f"{self.test_db}.compact"):
+            if os.path.exists(path):
+                os.remove(path)
+    
+    def _fill_and_delete(self, count=2000):
+        """新增大量交易後全部刪除，製造空閒頁"""
+        description = "x" * 200
+        rows = [('2024-01-15', 'expense', self.expense_category_id, 100, description)] * count
+        self.db_manager.run_write(lambda conn: conn.executemany('''
+            INSERT INTO transactions (date, type, category_id, amount, description)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows))
+        self.db_manager.run_write(lambda conn: conn.execute(
+            'DELETE FROM transactions WHERE description = ?', (description,)))
+    
+    def test_new_database_uses_incremental_auto_vacuum(self):
+        """測試新資料庫預設為增量空間回收模式"""
+        stats = self.maintenance.get_space_stats()
+        self.assertEqual(stats['auto_vacuum'], 'INCREMENTAL')
+        self.assertEqual(stats['free_bytes'], stats['freelist_count'] * stats['page_size'])
+    
+    def test_record_bulk_change_triggers_analyze(self):
+        """測試累積異動超過門檻才執行 ANALYZE"""
+        self.assertFalse(self.maintenance.record_bulk_change(10))
+        self.assertTrue(self.maintenance.record_bulk_change(MaintenanceManager.ANALYZE_THRESHOLD))
+        
+        tables = self.db_manager.query(
+            "SELECT name FROM sqlite_master WHERE name = 'sqlite_stat1'")
+        self.assertEqual(len(tables), 1)
+        
+        # 執行後計數歸零
+        self.assertFalse(self.maintenance.record_bulk_change(10))
+    
+    def test_incremental_vacuum_reclaims_space(self):
+        """測試增量回收會縮小檔案"""
+        self._fill_and_delete()
+        self.assertGreater(self.maintenance.get_space_stats()['freelist_count'], 0)
+        
+        reclaimed = self.maintenance.incremental_vacuum()
+        self.assertGreater(reclaimed, 0)
+        self.assertEqual(self.maintenance.get_space_stats()['freelist_count'], 0)
+        
+        # 沒有空閒頁時不做任何事
+        self.assertEqual(self.maintenance.run_idle_maintenance(), 0)
+    
+    def test_compact_report(self):
+        """測試壓縮後回報回收空間並保留資料"""
+        self.transaction_manager.add_transaction(
+            '2024-02-01', 'expense', self.expense_category_id, 300, "保留的交易")
+        self._fill_and_delete()
+        
+        report = self.maintenance.compact()
+        
+        self.assertGreater(report['reclaimed_bytes'], 0)
+        self.assertEqual(report['size_after'], os.path.getsize(self.test_db))
+        self.assertEqual(set(report['query_ms_before']), set(MaintenanceManager.BENCHMARK_QUERIES))
+        self.assertEqual(set(report['query_ms_after']), set(MaintenanceManager.BENCHMARK_QUERIES))
+        self.assertFalse(os.path.exists(f"{self.test_db}.compact"))
+        
+        # 壓縮後仍可正常讀寫
+        transactions = self.transaction_manager.get_transactions()
+        self.assertEqual(len(transactions), 1)
+        self.assertEqual(transactions[0]['description'], "保留的交易")
+        self.assertEqual(self.maintenance.get_space_stats()['auto_vacuum'], 'INCREMENTAL')
+        
+        conn = sqlite3.connect(self.test_db)
+        try:
+            self.assertEqual(conn.execute('PRAGMA integrity_check').fetchone()[0], 'ok')
+        finally:
+            conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
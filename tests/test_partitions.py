@@ -0,0 +1,226 @@
+"""
+年度分區測試
+測試 PartitionedTransactionManager 的寫入路由、分區剪枝與結帳
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import sqlite3
+import stat
+import tempfile
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database.models import DatabaseManager, CategoryManager, TransactionManager
+from database.maintenance import MaintenanceManager
+from database.partitions import PartitionedTransactionManager, create_transaction_manager
+from utils.backup import BackupManager
+
+
+class TestPartitionedTransactionManager(unittest.TestCase):
+    """測試 PartitionedTransactionManager 類別"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_db = os.path.join(self.temp_dir, "ledger.db")
+        
+        self.db_manager = DatabaseManager(self.test_db)
+        self.category_manager = CategoryManager(self.db_manager)
+        self.expense_category_id = self.category_manager.get_categories_by_type('expense')[0]['id']
+        self.income_category_id = self.category_manager.get_categories_by_type('income')[0]['id']
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.db_manager.close()
+        for name in os.listdir(self.temp_dir):
+            os.chmod(os.path.join(self.temp_dir, name), 0o644)
+        shutil.rmtree(self.temp_dir)
+    
+    def _partition_rows(self, manager, year):
+        """直接讀取分區檔案中的交易筆數"""
+        conn = sqlite3.connect(manager.get_partition_path(year))
+        try:
+            return conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+        finally:
+            conn.close()
+    
+    def test_writes_are_routed_by_year(self):
+        """測試交易依日期寫入對應年度的檔案，ID 全域唯一"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        id_2023 = manager.add_transaction('2023-12-31', 'expense', self.expense_category_id, 100, "跨年晚餐")
+        id_2024 = manager.add_transaction('2024-01-01', 'expense', self.expense_category_id, 200, "新年")
+        
+        self.assertNotEqual(id_2023, id_2024)
+        self.assertEqual(self._partition_rows(manager, 2023), 1)
+        self.assertEqual(self._partition_rows(manager, 2024), 1)
+        self.assertEqual([p['year'] for p in manager.get_partitions()], [2024, 2023])
+        
+        self.assertEqual(manager.get_transaction(id_2023)['description'], "跨年晚餐")
+        recent = manager.get_transactions(limit=10)
+        self.assertEqual([t['id'] for t in recent], [id_2024, id_2023])
+        self.assertEqual(len(manager.get_transactions(limit=1, offset=1)), 1)
+    
+    def test_range_queries_use_overlapping_partitions(self):
+        """測試範圍查詢只讀取涵蓋的年度，跨年度結果依日期排序"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        for year in (2021, 2022, 2023):
+            manager.add_transaction(f'{year}-06-01', 'income', self.income_category_id, 1000, str(year))
+        
+        self.assertEqual(manager._get_years('2022-01-01', '2022-12-31'), [2022])
+        
+        rows = manager.get_transactions_by_date_range('2022-01-01', '2023-12-31')
+        self.assertEqual([t['description'] for t in rows], ['2023', '2022'])
+        
+        summary = manager.get_monthly_summary(2021, 6)
+        self.assertEqual(summary['total_income'], 1000.0)
+    
+    def test_reports_span_more_years_than_attach_limit(self):
+        """測試涵蓋超過 ATTACH 上限的年度時，分類合計與未對帳查詢分批合併，封存彙總只計入一次"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        years = range(2010, 2010 + manager.MAX_ATTACHED + 3)
+        for year in years:
+            manager.add_transaction(f'{year}-12-31', 'expense', self.expense_category_id, 10, str(year))
+            manager.add_transaction(f'{year}-01-01', 'income', self.income_category_id, 100, str(year))
+        self.db_manager.run_write(lambda conn: conn.execute(
+            "INSERT INTO transaction_summaries (period, type, category_id, total, count) VALUES ('2009-12', 'expense', ?, 5, 1)",
+            (self.expense_category_id,)))
+        
+        expense = manager.get_category_totals('2009-01-01', '2030-12-31')
+        self.assertEqual(list(expense.values()), [10.0 * len(years) + 5])
+        income = manager.get_category_totals('2000-01-01', '2030-12-31', 'income')
+        self.assertEqual(list(income.values()), [100.0 * len(years)])
+        
+        rows = manager._unreconciled('2000-01-01', '2030-12-31')
+        self.assertEqual(len(rows), 2 * len(years))
+        self.assertEqual([row['date'] for row in rows], sorted(row['date'] for row in rows))
+        
+        self.assertEqual(manager.get_monthly_summary(2009, 12)['total_expense'], 5.0)
+        self.assertEqual(manager.get_monthly_summary(2015, 12)['total_expense'], 10.0)
+    
+    def test_update_moves_between_partitions(self):
+        """測試修改日期到其他年度時搬移分區並保留 ID"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        transaction_id = manager.add_transaction('2023-05-01', 'expense', self.expense_category_id, 100)
+        
+        self.assertTrue(manager.update_transaction(
+            transaction_id, '2024-05-01', 'expense', self.expense_category_id, 150, "改期"))
+        self.assertEqual(self._partition_rows(manager, 2023), 0)
+        self.assertEqual(self._partition_rows(manager, 2024), 1)
+        
+        updated = manager.get_transaction(transaction_id)
+        self.assertEqual(updated['date'], '2024-05-01')
+        self.assertEqual(updated['amount'], 150)
+        
+        self.assertTrue(manager.delete_transaction(transaction_id))
+        self.assertIsNone(manager.get_transaction(transaction_id))
+        self.assertFalse(manager.delete_transaction(transaction_id))
+    
+    def test_migrate_existing_transactions(self):
+        """測試啟用分區時搬移既有交易並保留 ID"""
+        plain = TransactionManager(self.db_manager)
+        old_id = plain.add_transaction('2022-03-01', 'expense', self.expense_category_id, 80, "舊資料")
+        
+        self.assertIsInstance(create_transaction_manager(self.db_manager), TransactionManager)
+        manager = PartitionedTransactionManager(self.db_manager)
+        self.assertIsInstance(create_transaction_manager(self.db_manager), PartitionedTransactionManager)
+        
+        self.assertEqual(self._partition_rows(manager, 2022), 1)
+        self.assertEqual(manager.get_transaction(old_id)['description'], "舊資料")
+        
+        new_id = manager.add_transaction('2022-04-01', 'expense', self.expense_category_id, 90)
+        self.assertGreater(new_id, old_id)
+    
+    def test_closed_year_is_read_only(self):
+        """測試結帳後的年度不可修改但仍可查詢"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        transaction_id = manager.add_transaction('2022-03-01', 'expense', self.expense_category_id, 80)
+        
+        self.assertTrue(manager.close_year(2022))
+        self.assertFalse(os.stat(manager.get_partition_path(2022)).st_mode & stat.S_IWUSR)
+        
+        with self.assertRaises(ValueError):
+            manager.add_transaction('2022-04-01', 'expense', self.expense_category_id, 90)
+        with self.assertRaises(ValueError):
+            manager.delete_transaction(transaction_id)
+        self.assertEqual(manager.get_transaction(transaction_id)['amount'], 80)
+        
+        self.assertTrue(manager.reopen_year(2022))
+        self.assertTrue(manager.delete_transaction(transaction_id))
+    
+    def test_group_commit_not_supported(self):
+        """測試群組提交模式下無法啟用分區"""
+        db_manager = DatabaseManager(os.path.join(self.temp_dir, "group.db"), group_commit_ms=50)
+        try:
+            with self.assertRaises(ValueError):
+                PartitionedTransactionManager(db_manager)
+        finally:
+            db_manager.close()
+    
+    def test_backup_and_restore_partitions(self):
+        """測試備份與還原包含年度分區檔案，已結帳年度以硬連結共用"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        manager.add_transaction('2023-06-01', 'expense', self.expense_category_id, 100, "舊年度")
+        manager.add_transaction('2024-06-01', 'expense', self.expense_category_id, 200, "今年")
+        self.assertTrue(manager.close_year(2023))
+        backup_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, backup_dir)
+        backup_manager = BackupManager(self.test_db, backup_dir)
+        
+        success, first = backup_manager.backup_database('first')
+        self.assertTrue(success, first)
+        success, second = backup_manager.backup_database('second')
+        self.assertTrue(success, second)
+        first_dir, second_dir = map(backup_manager.get_partition_dir, (first, second))
+        self.assertEqual(sorted(os.listdir(first_dir)), ['2023.db', '2024.db'])
+        self.assertEqual(os.stat(os.path.join(first_dir, '2023.db')).st_ino,
+                         os.stat(os.path.join(second_dir, '2023.db')).st_ino)
+        self.assertNotEqual(os.stat(os.path.join(first_dir, '2024.db')).st_ino,
+                            os.stat(os.path.join(second_dir, '2024.db')).st_ino)
+        self.assertGreater(backup_manager.list_backups()[0]['size'], os.path.getsize(first))
+        
+        manager.add_transaction('2024-07-01', 'expense', self.expense_category_id, 300, "備份後")
+        manager.add_transaction('2025-01-01', 'expense', self.expense_category_id, 400, "新年度")
+        success, message = backup_manager.restore_database(first)
+        self.assertTrue(success, message)
+        self.assertFalse(os.path.exists(manager.get_partition_path(2025)))
+        
+        restored_db = DatabaseManager(self.test_db)
+        self.addCleanup(restored_db.close)
+        restored = PartitionedTransactionManager(restored_db)
+        self.assertEqual(sorted(t['description'] for t in restored.get_transactions()), ["今年", "舊年度"])
+        self.assertEqual([p['closed'] for p in restored.get_partitions()], [False, True])
+        restored.add_transaction('2025-02-01', 'expense', self.expense_category_id, 50)
+        self.assertEqual(self._partition_rows(restored, 2025), 1)
+        
+        self.assertTrue(backup_manager.delete_backup(first)[0])
+        self.assertFalse(os.path.exists(first_dir))
+        shutil.rmtree(second_dir)
+        success, message = backup_manager.restore_database(second)
+        self.assertFalse(success)
+        self.assertIn('2023', message)
+    
+    def test_compact_open_partitions(self):
+        """測試壓縮資料庫時一併壓縮未結帳的年度分區"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        manager.add_transaction('2023-06-01', 'expense', self.expense_category_id, 100)
+        manager.add_transactions_bulk([{'date': '2024-01-15', 'type': 'expense', 'category_id': self.expense_category_id,
+                                        'amount': 10, 'description': 'x' * 1000}] * 300)
+        self.assertTrue(manager.close_year(2023))
+        ids = [t['id'] for t in manager.get_transactions(limit=500) if t['date'] == '2024-01-15']
+        for transaction_id in ids[1:]:
+            manager.delete_transaction(transaction_id)
+        size_before = os.path.getsize(manager.get_partition_path(2024))
+        
+        report = MaintenanceManager(self.db_manager).compact()
+        self.assertEqual(report['partitions_compacted'], 1)
+        self.assertLess(os.path.getsize(manager.get_partition_path(2024)), size_before)
+        self.assertGreater(report['reclaimed_bytes'], 0)
+        self.assertEqual(len(manager.get_transactions()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+查詢效能分析測試
+測試 QueryProfiler 的統計、呼叫位置與慢查詢日誌
+"""
+
+import unittest
+import io
+import os
+import sys
+import shutil
+import tempfile
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database.models import DatabaseManager, CategoryManager, TransactionManager
+from database.profiler import QueryProfiler, QueryStats
+
+
+class TestQueryProfiler(unittest.TestCase):
+    """測試 QueryProfiler 類別"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_manager = DatabaseManager(os.path.join(self.temp_dir, "ledger.db"))
+        self.category_manager = CategoryManager(self.db_manager)
+        self.transaction_manager = TransactionManager(self.db_manager)
+        self.expense_category_id = self.category_manager.get_categories_by_type('expense')[0]['id']
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.db_manager.disable_profiling()
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def _stats_for(self, profiler, method_name):
+        return [s for s in profiler.get_stats() if s['call_site'].startswith(method_name)]
+    
+    def test_disabled_by_default(self):
+        """測試預設不開啟分析"""
+        self.assertIsNone(self.db_manager.profiler)
+        self.transaction_manager.get_transactions()
+    
+    def test_records_call_site_and_rows(self):
+        """測試依管理器方法記錄次數、筆數與類型"""
+        profiler = self.db_manager.enable_profiling(slow_threshold_ms=10000)
+        for amount in (100, 200, 300):
+            self.transaction_manager.add_transaction('2024-01-01', 'expense', self.expense_category_id, amount)
+        self.transaction_manager.get_transactions()
+        self.transaction_manager.get_transactions()
+        
+        added = self._stats_for(profiler, 'TransactionManager.add_transaction')
+        self.assertEqual(len(added), 1)
+        self.assertEqual(added[0]['count'], 3)
+        self.assertEqual(added[0]['kind'], 'write')
+        # 異動筆數包含觸發器維護的資料列 (版本計數器)
+        self.assertGreaterEqual(added[0]['rows'], 3)
+        
+        listed = self._stats_for(profiler, 'TransactionManager.get_transactions')
+        self.assertEqual(listed[0]['count'], 2)
+        self.assertEqual(listed[0]['rows'], 6)
+        self.assertEqual(listed[0]['slow_count'], 0)
+        self.assertEqual(sum(listed[0]['histogram'].values()), 2)
+    
+    def test_slow_query_log_includes_plan(self):
+        """測試超過門檻的查詢連同執行計畫寫入日誌"""
+        log_path = os.path.join(self.temp_dir, "slow.log")
+        profiler = self.db_manager.enable_profiling(slow_threshold_ms=0, log_path=log_path)
+        self.transaction_manager.get_transactions_by_date_range('2024-01-01', '2024-12-31')
+        self.db_manager.disable_profiling()
+        
+        with open(log_path, encoding='utf-8') as f:
+            content = f.read()
+        self.assertIn('TransactionManager.get_transactions_by_date_range', content)
+        self.assertIn('SQL: SELECT', content)
+        self.assertIn('PLAN:', content)
+        self.assertGreater(self._stats_for(profiler, 'TransactionManager.get_transactions_by_date_range')[0]['slow_count'], 0)
+    
+    def test_dump_includes_retry_metrics(self):
+        """測試輸出統計表格與鎖定重試統計"""
+        self.db_manager.enable_profiling()
+        self.category_manager.get_all_categories()
+        
+        output = io.StringIO()
+        self.db_manager.dump_profile(output)
+        self.assertIn('CategoryManager.get_all_categories', output.getvalue())
+        self.assertIn('busy_failures=0', output.getvalue())
+    
+    def test_histogram_percentiles(self):
+        """測試由分布估計百分位數"""
+        stats = QueryStats('site', 'read')
+        for elapsed in (0.1, 0.2, 3, 4, 1500):
+            stats.add(elapsed, 1, False)
+        self.assertEqual(stats.percentile(0.4), 0.5)
+        self.assertEqual(stats.percentile(0.8), 5)
+        self.assertEqual(stats.percentile(1.0), 1500)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+對帳測試
+測試對帳單與帳上交易的配對、已對帳標記與年度分區
+"""
+
+import unittest
+import os
+import sys
+import csv
+import shutil
+import tempfile
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database.models import DatabaseManager, CategoryManager, TransactionManager
+from database.partitions import PartitionedTransactionManager
+from database.reconciliation import ReconciliationManager, match_statement
+from utils.importers import CsvImporter
+
+
+def _line(day, amount, transaction_type='expense', currency='TWD', external_id=None):
+    return {'date': day, 'type': transaction_type, 'amount': amount, 'currency': currency,
+            'description': '', 'external_id': external_id}
+
+
+def _row(transaction_id, day, amount, transaction_type='expense', currency='TWD', external_id=None):
+    return dict(_line(day, amount, transaction_type, currency, external_id), id=transaction_id)
+
+
+class TestMatchStatement(unittest.TestCase):
+    """測試 match_statement 函式"""
+    
+    def test_closest_date_within_window(self):
+        """測試取日期最接近的帳上交易，超出容許範圍、類型或幣別不同的不配對"""
+        lines = [_line('2024-03-10', 100), _line('2024-03-20', 250), _line('2024-03-25', 80),
+                 _line('2024-03-26', 80, 'income'), _line('2024-03-28', 60, currency='USD')]
+        transactions = [_row(1, '2024-03-06', 100), _row(2, '2024-03-09', 100), _row(3, '2024-03-16', 250),
+                        _row(4, '2024-03-25', 80, 'income'), _row(5, '2024-03-28', 60)]
+        pairs, unmatched_lines, unmatched_transactions = match_statement(lines, transactions, 3)
+        
+        self.assertEqual([(position, row['id']) for position, row in pairs], [(0, 2), (3, 4)])
+        self.assertEqual(unmatched_lines, [1, 2, 4])
+        self.assertEqual([row['id'] for row in unmatched_transactions], [1, 3, 5])
+    
+    def test_repeated_amounts(self):
+        """測試同金額的多筆交易各配對一次，外部 ID 優先"""
+        lines = [_line('2024-03-01', 50), _line('2024-03-01', 50), _line('2024-03-02', 50, external_id='B7'),
+                 _line('2024-03-03', 50)]
+        transactions = [_row(1, '2024-03-01', 50), _row(2, '2024-03-02', 50), _row(3, '2024-03-02', 50.0,
+                                                                                      external_id='B7')]
+        pairs, unmatched_lines, unmatched_transactions = match_statement(lines, transactions, 1)
+        
+        self.assertEqual([(position, row['id']) for position, row in pairs], [(0, 1), (1, 2), (2, 3)])
+        self.assertEqual(unmatched_lines, [3])
+        self.assertEqual(unmatched_transactions, [])
+
+
+class TestReconciliationManager(unittest.TestCase):
+    """測試 ReconciliationManager 類別"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_manager = DatabaseManager(os.path.join(self.temp_dir, "reconcile.db"))
+        category_manager = CategoryManager(self.db_manager)
+        self.categories = {category['name']: category['id'] for category in category_manager.get_all_categories()}
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def test_match_and_reconcile_file(self):
+        """測試以 CSV 對帳單配對，標記後的交易不再列入下次對帳"""
+        manager = TransactionManager(self.db_manager)
+        reconciliation = ReconciliationManager(manager)
+        food, salary = self.categories['飲食'], self.categories['薪資']
+        lunch = manager.add_transaction('2024-03-04', 'expense', food, 120, '午餐')
+        pay = manager.add_transaction('2024-03-05', 'income', salary, 50000, '三月薪資')
+        cash = manager.add_transaction('2024-03-15', 'expense', food, 300, '現金晚餐')
+        previous = manager.add_transaction('2024-02-29', 'expense', food, 99, '上期')
+        manager.add_transaction('2024-04-02', 'expense', food, 99, '下期')
+        
+        path = os.path.join(self.temp_dir, 'statement.csv')
+        with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+            csv.writer(f).writerows([
+                ['日期', '金額', '說明'],
+                ['2024/03/01', '-99', '上期刷卡'],
+                ['2024/03/05', '-120', '午餐'],
+                ['2024/03/06', '50000', '薪轉'],
+                ['2024/03/31', '-45', '手續費'],
+                ['not a date', '-1', '錯誤'],
+            ])
+        importer = CsvImporter(manager, mapping={'date': '日期', 'amount': '金額', 'description': '說明'})
+        rows, errors = importer.parse_file(path)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(manager.get_transactions(limit=10)[0]['reconciled'], 0)
+        
+        result = reconciliation.match([dict(row, line=line) for line, row in rows])
+        self.assertEqual([(line['line'], row['id']) for line, row in result['matched']],
+                         [(2, previous), (3, lunch), (4, pay)])
+        self.assertEqual([line['description'] for line in result['unmatched_lines']], ['手續費'])
+        self.assertEqual([row['id'] for row in result['unmatched_transactions']], [cash])
+        
+        self.assertEqual(reconciliation.reconcile([row['id'] for _, row in result['matched']]), 3)
+        self.assertEqual(manager.get_transaction(lunch)['reconciled'], 1)
+        again = reconciliation.match([dict(row, line=line) for line, row in rows])
+        self.assertEqual(again['matched'], [])
+        self.assertEqual(len(again['unmatched_lines']), 4)
+        
+        self.assertEqual(reconciliation.unreconcile([lunch, cash]), 1)
+        self.assertEqual(manager.get_transaction(lunch)['reconciled'], 0)
+    
+    def test_partitioned(self):
+        """測試年度分區：跨年度修改保留對帳狀態，已結帳年度不變更"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        food = self.categories['飲食']
+        old = manager.add_transaction('2023-12-30', 'expense', food, 500, '尾牙')
+        moved = manager.add_transaction('2024-01-02', 'expense', food, 200, '早午餐')
+        manager.add_transaction('2024-01-03', 'expense', food, 200, '早午餐')
+        reconciliation = ReconciliationManager(manager)
+        
+        result = reconciliation.match([_line('2023-12-31', 500), _line('2024-01-02', 200)])
+        self.assertEqual([row['id'] for _, row in result['matched']], [old, moved])
+        self.assertEqual(reconciliation.reconcile([old, moved]), 2)
+        manager.update_transaction(moved, '2023-12-29', 'expense', food, 200, '早午餐')
+        self.assertEqual(manager.get_transaction(moved)['reconciled'], 1)
+        
+        manager.close_year(2023)
+        self.assertEqual(reconciliation.unreconcile([old, moved]), 0)
+        self.assertEqual(manager.get_transaction(old)['reconciled'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
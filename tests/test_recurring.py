@@ -0,0 +1,118 @@
+"""
+定期交易測試
+測試 RecurringManager 的日期推算、批次產生與重複執行
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database.models import DatabaseManager, CategoryManager, TransactionManager
+from database.accounts import AccountManager
+from database.partitions import PartitionedTransactionManager
+from database.recurring import RecurringManager, occurrence_date
+
+
+class TestOccurrenceDate(unittest.TestCase):
+    """測試 occurrence_date 函式"""
+    
+    def test_monthly_end_of_month(self):
+        """測試月底開始的每月規則在小月取月底，之後回到原本的日期"""
+        dates = [occurrence_date('2024-01-31', 'monthly', 1, index) for index in range(4)]
+        self.assertEqual(dates, ['2024-01-31', '2024-02-29', '2024-03-31', '2024-04-30'])
+    
+    def test_weekly_and_yearly(self):
+        """測試每兩週與閏日開始的每年規則"""
+        self.assertEqual(occurrence_date('2024-01-01', 'weekly', 2, 3), '2024-02-12')
+        self.assertEqual(occurrence_date('2024-02-29', 'yearly', 1, 1), '2025-02-28')
+        self.assertEqual(occurrence_date('2024-02-29', 'yearly', 1, 4), '2028-02-29')
+
+
+class TestRecurringManager(unittest.TestCase):
+    """測試 RecurringManager 類別"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_manager = DatabaseManager(os.path.join(self.temp_dir, "recurring.db"))
+        self.transaction_manager = TransactionManager(self.db_manager)
+        self.account_manager = AccountManager(self.db_manager)
+        self.recurring_manager = RecurringManager(self.transaction_manager)
+        
+        category_manager = CategoryManager(self.db_manager)
+        self.expense_id = category_manager.get_categories_by_type('expense')[0]['id']
+        self.income_id = category_manager.get_categories_by_type('income')[0]['id']
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def test_catch_up_is_idempotent(self):
+        """測試補產生多期後再次執行不會重複記帳"""
+        account_id = self.account_manager.add_account("銀行")
+        rule_id = self.recurring_manager.add_rule(
+            "房租", 'expense', self.expense_id, 15000, 'monthly', '2024-01-05', account_id=account_id)
+        
+        self.assertEqual(self.recurring_manager.materialize_due('2024-06-30'), 6)
+        self.assertEqual(self.recurring_manager.materialize_due('2024-06-30'), 0)
+        self.assertEqual(self.recurring_manager.materialize_due('2024-07-05'), 1)
+        
+        transactions = self.transaction_manager.get_transactions()
+        self.assertEqual(len(transactions), 7)
+        self.assertEqual(transactions[0]['date'], '2024-07-05')
+        self.assertEqual(self.account_manager.get_balance(account_id), -15000 * 7)
+        self.assertEqual(self.account_manager.get_accounts()[0]['entry_count'], 7)
+        
+        rule = self.recurring_manager.get_rules()[0]
+        self.assertEqual(rule['id'], rule_id)
+        self.assertEqual(rule['occurrence_count'], 7)
+        self.assertEqual(rule['next_date'], '2024-08-05')
+    
+    def test_end_date(self):
+        """測試超過結束日期後規則停止"""
+        self.recurring_manager.add_rule("薪水", 'income', self.income_id, 50000, 'monthly', '2024-01-10',
+                                        end_date='2024-03-10')
+        self.assertEqual(self.recurring_manager.materialize_due('2024-12-31'), 3)
+        self.assertIsNone(self.recurring_manager.get_rules()[0]['next_date'])
+        self.assertEqual(self.transaction_manager.get_monthly_summary(2024, 3)['total_income'], 50000)
+    
+    def test_invalid_rule(self):
+        """測試無效的規則"""
+        with self.assertRaises(ValueError):
+            self.recurring_manager.add_rule("訂閱", 'expense', self.expense_id, 300, 'daily', '2024-01-01')
+        with self.assertRaises(ValueError):
+            self.recurring_manager.add_rule("訂閱", 'expense', self.income_id, 300, 'monthly', '2024-01-01')
+        with self.assertRaises(ValueError):
+            self.recurring_manager.add_rule("訂閱", 'expense', self.expense_id, 300, 'monthly', '2024-01-01',
+                                            end_date='2023-12-31')
+    
+    def test_deleted_rule_keeps_transactions(self):
+        """測試刪除規則後已產生的交易保留"""
+        rule_id = self.recurring_manager.add_rule("訂閱", 'expense', self.expense_id, 300, 'weekly', '2024-01-01')
+        self.recurring_manager.materialize_due('2024-01-31')
+        self.assertTrue(self.recurring_manager.delete_rule(rule_id))
+        self.assertFalse(self.recurring_manager.delete_rule(rule_id))
+        self.assertEqual(len(self.transaction_manager.get_transactions()), 5)
+    
+    def test_partitioned_bulk(self):
+        """測試年度分區跨年度批次產生並配置連號 ID"""
+        manager = PartitionedTransactionManager(self.db_manager)
+        recurring_manager = RecurringManager(manager)
+        recurring_manager.add_rule("保險", 'expense', self.expense_id, 1200, 'monthly', '2023-11-15')
+        
+        self.assertEqual(recurring_manager.materialize_due('2024-02-20'), 4)
+        transactions = manager.get_transactions_by_date_range('2023-01-01', '2024-12-31')
+        self.assertEqual([t['date'] for t in transactions],
+                         ['2024-02-15', '2024-01-15', '2023-12-15', '2023-11-15'])
+        self.assertEqual(sorted(t['id'] for t in transactions), list(range(1, 5)))
+        self.assertEqual(manager.get_transaction(transactions[0]['id'])['amount'], 1200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+"""
+對帳單解析測試
+測試 OFX / QIF 的串流解析與匯入
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database.models import DatabaseManager, CategoryManager, TransactionManager
+from database.accounts import AccountManager
+from database.partitions import PartitionedTransactionManager
+from utils.importers import OfxImporter, QifImporter
+from utils.statement_parsers import iter_ofx_transactions, iter_qif_transactions
+
+OFX_SGML = """OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+
+<OFX>
+<BANKMSGSRSV1><STMTTRNRS><STMTRS>
+<CURDEF>TWD
+<BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20240305120000.000[+8:CST]
+<TRNAMT>-1,250.00
+<FITID>A001
+<NAME>全聯 &amp; 超市
+<MEMO>信用卡
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20240310
+<TRNAMT>52000
+<FITID>A002
+<NAME>薪資
+</STMTTRN>
+</BANKTRANLIST>
+</STMTRS></STMTTRNRS></BANKMSGSRSV1>
+</OFX>
+"""
+
+OFX_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<?OFX OFXHEADER="200" VERSION="220"?>
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><CURDEF>USD</CURDEF><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT</TRNTYPE><DTPOSTED>20240102</DTPOSTED><TRNAMT>-9.99</TRNAMT>
+<FITID>X1</FITID><NAME>Coffee</NAME></STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>"""
+
+QIF = """!Account
+NChecking
+TBank
+^
+!Type:Bank
+D03/05/2024
+T-1,250.00
+P全聯
+M日用品
+LGroceries
+^
+D3/10'24
+T52,000.00
+P薪資
+^
+D13/45/2024
+T-10
+^
+!Type:Cat
+NFood
+E
+^
+"""
+
+
+class TestStatementParsers(unittest.TestCase):
+    """測試 OFX / QIF 解析函式"""
+    
+    def test_ofx_sgml_any_chunking(self):
+        """測試 SGML 格式在任意切塊下都得到相同的結果"""
+        expected = list(iter_ofx_transactions([OFX_SGML]))
+        self.assertEqual([(t['date'], t['amount'], t['fitid'], t['currency']) for t in expected],
+                         [('2024-03-05', '-1,250.00', 'A001', 'TWD'), ('2024-03-10', '52000', 'A002', 'TWD')])
+        self.assertEqual(expected[0]['name'], '全聯 & 超市')
+        for size in (1, 7, 64):
+            chunks = [OFX_SGML[start:start + size] for start in range(0, len(OFX_SGML), size)]
+            self.assertEqual(list(iter_ofx_transactions(chunks)), expected)
+    
+    def test_ofx_xml(self):
+        """測試 XML 格式 (有結束標籤)"""
+        transactions = list(iter_ofx_transactions([OFX_XML]))
+        self.assertEqual(len(transactions), 1)
+        self.assertEqual((transactions[0]['date'], transactions[0]['amount'], transactions[0]['currency']),
+                         ('2024-01-02', '-9.99', 'USD'))
+    
+    def test_qif(self):
+        """測試 QIF 的日期寫法並略過帳戶與分類清單"""
+        transactions = list(iter_qif_transactions(QIF.splitlines()))
+        self.assertEqual([(t['line'], t['date'], t['amount']) for t in transactions],
+                         [(6, '2024-03-05', '-1,250.00'), (12, '2024-03-10', '52,000.00'), (16, '13/45/2024', '-10')])
+        self.assertEqual(transactions[0]['category'], 'Groceries')
+        self.assertEqual(next(iter_qif_transactions(['D05/03/24', 'T1', '^'], day_first=True))['date'], '2024-03-05')
+
+
+class TestStatementImporters(unittest.TestCase):
+    """測試 OfxImporter 與 QifImporter"""
+    
+    def setUp(self):
+        """每個測試前執行"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_manager = DatabaseManager(os.path.join(self.temp_dir, "statement.db"))
+        self.transaction_manager = TransactionManager(self.db_manager)
+        CategoryManager(self.db_manager)
+    
+    def tearDown(self):
+        """每個測試後執行"""
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def _write(self, name, text):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+    
+    def test_ofx_import(self):
+        """測試 OFX 匯入的金額正負、備註與幣別"""
+        importer = OfxImporter(self.transaction_manager)
+        importer.BLOCK_SIZE = 16
+        result = importer.import_file(self._write('statement.ofx', OFX_SGML))
+        
+        self.assertEqual(result['imported'], 2)
+        transactions = {t['date']: t for t in self.transaction_manager.get_transactions()}
+        self.assertEqual(transactions['2024-03-05']['type'], 'expense')
+        self.assertEqual(transactions['2024-03-05']['amount'], 1250)
+        self.assertEqual(transactions['2024-03-05']['description'], '全聯 & 超市 - 信用卡')
+        self.assertEqual(transactions['2024-03-10']['type'], 'income')
+        
+        OfxImporter(self.transaction_manager).import_file(self._write('usd.ofx', OFX_XML))
+        self.assertEqual(self.transaction_manager.get_transactions()[-1]['currency'], 'USD')
+    
+    def test_ofx_reimport(self):
+        """測試記入帳戶時以 FITID 判斷重複：銀行修改備註後重新匯入仍會略過"""
+        account_id = AccountManager(self.db_manager).add_account("信用卡")
+        OfxImporter(self.transaction_manager, account_id=account_id).import_file(
+            self._write('statement.ofx', OFX_SGML))
+        result = OfxImporter(self.transaction_manager, account_id=account_id).import_file(
+            self._write('renamed.ofx', OFX_SGML.replace('<MEMO>信用卡', '<MEMO>信用卡 末四碼 1234')))
+        
+        self.assertEqual((result['imported'], result['duplicates']), (0, 2))
+        self.assertEqual(len(self.transaction_manager.get_transactions()), 2)
+    
+    def test_colliding_fitid_without_account(self):
+        """測試未指定帳戶時，不同銀行相同的 FITID 不會被誤判為重複"""
+        OfxImporter(self.transaction_manager).import_file(self._write('statement.ofx', OFX_SGML))
+        other_bank = OFX_SGML.replace('20240305120000.000[+8:CST]', '20240405').replace('-1,250.00', '-80')
+        result = OfxImporter(self.transaction_manager).import_file(self._write('other.ofx', other_bank))
+        
+        self.assertEqual((result['imported'], result['duplicates']), (1, 1))
+        self.assertEqual(len(self.transaction_manager.get_transactions()), 3)
+    
+    def test_update_account_refreshes_fingerprint(self):
+        """測試變更匯入交易的帳戶後，指紋改以新帳戶識別 (重新匯入到新帳戶時略過)"""
+        account_manager = AccountManager(self.db_manager)
+        old_account, new_account = account_manager.add_account("舊卡"), account_manager.add_account("新卡")
+        for manager in (self.transaction_manager, PartitionedTransactionManager(self.db_manager)):
+            with self.subTest(manager=type(manager).__name__):
+                self.db_manager.run_write(lambda conn: conn.execute('DELETE FROM transactions'))
+                OfxImporter(manager, account_id=old_account).import_file(self._write('statement.ofx', OFX_SGML))
+                for transaction in manager.get_transactions():
+                    manager.update_transaction(transaction['id'], transaction['date'], transaction['type'],
+                                               transaction['category_id'], transaction['amount'],
+                                               transaction['description'], account_id=new_account)
+                
+                result = OfxImporter(manager, account_id=new_account).import_file(
+                    self._write('statement.ofx', OFX_SGML))
+                self.assertEqual((result['imported'], result['duplicates']), (0, 2))
+                result = OfxImporter(manager, account_id=old_account).import_file(
+                    self._write('statement.ofx', OFX_SGML))
+                self.assertEqual((result['imported'], result['duplicates']), (2, 0))
+    
+    def test_qif_import(self):
+        """測試 QIF 匯入，無效日期記為該筆交易開始行號的錯誤"""
+        result = QifImporter(self.transaction_manager).import_file(self._write('statement.qif', QIF))
+        
+        self.assertEqual(result['imported'], 2)
+        self.assertEqual(result['errors'], [(16, "無法辨識的日期：13/45/2024")])
+        summary = self.transaction_manager.get_monthly_summary(2024, 3)
+        self.assertEqual((summary['total_income'], summary['total_expense']), (52000, 1250))
+
+
+if __name__ == '__main__':
+    unittest.main()
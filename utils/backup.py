@@ -4,12 +4,30 @@
 
 import os
 import shutil
+import stat
 from datetime import datetime
 from typing import List, Optional, Tuple
 
+from database.partitions import list_partitions, partition_path
+
+
+def _remove_tree(path: str):
+    """刪除目錄 (已結帳年度的分區檔案為唯讀，先取消唯讀再刪除)"""
+    def make_writable(function, target, _):
+        os.chmod(target, stat.S_IWRITE | stat.S_IREAD)
+        function(target)
+    
+    shutil.rmtree(path, onerror=make_writable)
+
 
 class BackupManager:
-    """資料庫備份管理器"""
+    """
+    資料庫備份管理器
+    
+    年度分區的帳本連同各年度的分區檔案一起備份到 {備份檔名}_partitions 目錄，還原時一併還原，
+    主資料庫的分區清單、交易 ID 配置與帳戶餘額才會與分區內容一致。已結帳的年度不再變動，
+    與先前備份中的檔案相同時以硬連結共用，不必再複製一次。
+    """
     
     def __init__(self, db_path: str = "accounting.db", backup_dir: str = "backup"):
         """
@@ -49,15 +67,59 @@ class BackupManager:
                 backup_filename = f"accounting_backup_{timestamp}.db"
             
             backup_path = os.path.join(self.backup_dir, backup_filename)
+            previous = self.list_backups()
             
             # 複製資料庫檔案
             shutil.copy2(self.db_path, backup_path)
             
+            # 依備份檔中的分區清單複製年度分區檔案
+            try:
+                self._backup_partitions(backup_path, previous)
+            except Exception:
+                self.delete_backup(backup_path)
+                raise
+            
             return True, backup_path
             
         except Exception as e:
             return False, f"備份失敗: {str(e)}"
     
+    @staticmethod
+    def get_partition_dir(backup_path: str) -> str:
+        """備份的年度分區檔案目錄"""
+        return f"{os.path.splitext(backup_path)[0]}_partitions"
+    
+    def _backup_partitions(self, backup_path: str, previous: List[dict]):
+        partitions = list_partitions(backup_path)
+        if not partitions:
+            return
+        
+        partition_dir = self.get_partition_dir(backup_path)
+        os.makedirs(partition_dir, exist_ok=True)
+        for partition in partitions:
+            source = partition_path(self.db_path, partition['year'])
+            if not os.path.exists(source):
+                continue
+            target = os.path.join(partition_dir, f"{partition['year']}.db")
+            if partition['closed'] and self._link_previous(source, target, partition['year'], previous):
+                continue
+            shutil.copy2(source, target)
+    
+    def _link_previous(self, source: str, target: str, year: int, previous: List[dict]) -> bool:
+        """已結帳年度與先前備份中的檔案相同 (大小與修改時間) 時建立硬連結"""
+        source_stat = os.stat(source)
+        for backup in previous:
+            candidate = os.path.join(self.get_partition_dir(backup['path']), f"{year}.db")
+            try:
+                candidate_stat = os.stat(candidate)
+                if (candidate_stat.st_size == source_stat.st_size
+                        and int(candidate_stat.st_mtime) == int(source_stat.st_mtime)):
+                    os.link(candidate, target)
+                    return True
+            except OSError:
+                continue
+        return False
+    
     def list_backups(self) -> List[dict]:
         """
         列出所有備份檔案
@@ -75,14 +137,19 @@ class BackupManager:
                 if filename.endswith('.db'):
                     filepath = os.path.join(self.backup_dir, filename)
                     
-                    # 取得檔案資訊
-                    stat = os.stat(filepath)
+                    # 取得檔案資訊 (大小包含年度分區檔案)
+                    file_stat = os.stat(filepath)
+                    size = file_stat.st_size
+                    partition_dir = self.get_partition_dir(filepath)
+                    if os.path.isdir(partition_dir):
+                        size += sum(os.path.getsize(os.path.join(partition_dir, name))
+                                    for name in os.listdir(partition_dir))
                     
                     backups.append({
                         'name': filename,
                         'path': filepath,
-                        'size': stat.st_size,
-                        'created_time': datetime.fromtimestamp(stat.st_mtime)
+                        'size': size,
+                        'created_time': datetime.fromtimestamp(file_stat.st_mtime)
                     })
             
             # 按建立時間排序（最新的在前）
@@ -108,14 +175,31 @@ class BackupManager:
             if not os.path.exists(backup_path):
                 return False, f"備份檔案不存在: {backup_path}"
             
-            # 備份當前資料庫（以防萬一）
+            # 檢查年度分區檔案是否齊全 (缺少時不動到目前的資料庫)
+            partition_dir = self.get_partition_dir(backup_path)
+            partitions = list_partitions(backup_path)
+            missing = [str(partition['year']) for partition in partitions
+                       if not os.path.exists(os.path.join(partition_dir, f"{partition['year']}.db"))]
+            if missing:
+                return False, f"備份缺少年度分區檔案: {', '.join(missing)}"
+            
+            # 備份當前資料庫（以防萬一）；目前的年度分區檔案改名保留，
+            # 備份中沒有的年度不會留下與還原後的資料庫不一致的檔案
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             if os.path.exists(self.db_path):
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
                 temp_backup = f"{self.db_path}.before_restore_{timestamp}"
                 shutil.copy2(self.db_path, temp_backup)
+                for partition in list_partitions(self.db_path):
+                    if os.path.exists(partition['path']):
+                        os.replace(partition['path'], f"{partition['path']}.before_restore_{timestamp}")
             
-            # 還原資料庫
+            # 還原資料庫與年度分區
             shutil.copy2(backup_path, self.db_path)
+            for partition in partitions:
+                # 先複製到暫存檔再取代 (已結帳年度的檔案為唯讀，無法直接覆寫)
+                target = partition_path(self.db_path, partition['year'])
+                shutil.copy2(os.path.join(partition_dir, f"{partition['year']}.db"), f"{target}.restore")
+                os.replace(f"{target}.restore", target)
             
             return True, f"資料庫已從備份還原: {backup_path}"
             
@@ -137,6 +221,9 @@ class BackupManager:
                 return False, "備份檔案不存在"
             
             os.remove(backup_path)
+            partition_dir = self.get_partition_dir(backup_path)
+            if os.path.isdir(partition_dir):
+                _remove_tree(partition_dir)
             return True, "備份檔案已刪除"
             
         except Exception as e:
@@ -0,0 +1,265 @@
+"""
+交易匯出工具模組
+依列表的篩選條件由資料庫分批串流讀取交易 (TransactionManager.iter_transactions)，邊寫入邊累計
+統計摘要，記憶體用量不隨筆數增加；可在背景執行緒執行並隨時取消。
+Excel 以 openpyxl 的 write-only 模式逐列寫入，摘要工作表由 SQL 彙總查詢產生
+"""
+
+import csv
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+from database.log import get_logger
+from database.models import TransactionManager
+from .importers import DEFAULT_MAPPING
+
+try:
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+    from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+    OPENPYXL_AVAILABLE = True
+except ImportError:
+    OPENPYXL_AVAILABLE = False
+
+logger = get_logger('exporters')
+
+# 匯出的欄位 (標題與匯入的預設欄位對應相同，匯出的檔案可直接匯回)
+EXPORT_FIELDS = ['date', 'type', 'category', 'amount', 'currency', 'description']
+
+TYPE_NAMES = {'income': '收入', 'expense': '支出'}
+
+
+class ExportCancelled(Exception):
+    """匯出已由使用者取消"""
+
+
+class TransactionExporter:
+    """
+    交易匯出基礎類別 (子類別以 _write 寫入檔案)
+    
+    交易每次讀取 BATCH_SIZE 筆，統計以「分」為單位的整數累計，筆數再多也不會有浮點誤差。
+    先寫入同目錄的暫存檔 (檔名加 .part)，完成後才取代目的檔案；取消或失敗時刪除暫存檔，
+    不會留下寫到一半的檔案。
+    """
+    
+    # 每批讀取的筆數
+    BATCH_SIZE = 5000
+    
+    def __init__(self, transaction_manager: TransactionManager, batch_size: Optional[int] = None):
+        self.transaction_manager = transaction_manager
+        self.batch_size = batch_size or self.BATCH_SIZE
+    
+    def export(self, file_path: str, filters: Optional[Dict] = None,
+               progress: Optional[Callable[[int, int], None]] = None,
+               cancel: Optional[threading.Event] = None) -> Dict:
+        """
+        匯出符合篩選條件的交易
+        
+        Args:
+            file_path: 檔案路徑
+            filters: 篩選條件 (與列表相同，None 為全部交易)
+            progress: 進度回呼 progress(已寫入筆數, 總筆數)，每批寫入後呼叫
+            cancel: 設定後在下一批之前停止匯出
+        
+        Returns:
+            包含 rows (筆數)、total_income、total_expense、balance (基準幣別) 與 cancelled 的字典；
+            取消時不建立檔案
+        
+        Raises:
+            sqlite3.Error: 查詢失敗
+            OSError: 寫入失敗
+        """
+        total = self.transaction_manager.count_transactions(filters)
+        summary = {'rows': 0, 'income_cents': 0, 'expense_cents': 0}
+        
+        def batches() -> Iterator[List[Dict]]:
+            for batch in self.transaction_manager.iter_transactions(filters, self.batch_size):
+                if cancel is not None and cancel.is_set():
+                    raise ExportCancelled()
+                for row in batch:
+                    key = 'income_cents' if row['type'] == 'income' else 'expense_cents'
+                    summary[key] += round(row['amount_base'] * 100)
+                yield batch
+                summary['rows'] += len(batch)
+                if progress:
+                    progress(summary['rows'], max(total, summary['rows']))
+        
+        partial_path = file_path + '.part'
+        try:
+            self._write(partial_path, batches(), lambda: self._summary(summary), filters)
+            os.replace(partial_path, file_path)
+        except ExportCancelled:
+            os.remove(partial_path)
+            logger.info("已取消匯出 (已寫入 %d 筆)", summary['rows'], extra={'event': 'export_cancelled'})
+            return dict(self._summary(summary), cancelled=True)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        
+        logger.info("已匯出 %d 筆交易到 %s", summary['rows'], file_path, extra={'event': 'export_completed'})
+        return dict(self._summary(summary), cancelled=False)
+    
+    @staticmethod
+    def _summary(summary: Dict) -> Dict:
+        return {'rows': summary['rows'], 'total_income': summary['income_cents'] / 100,
+                'total_expense': summary['expense_cents'] / 100,
+                'balance': (summary['income_cents'] - summary['expense_cents']) / 100}
+    
+    @staticmethod
+    def _row_values(row: Dict) -> List:
+        """一筆交易的匯出欄位值 (依 EXPORT_FIELDS)"""
+        return [row['date'], TYPE_NAMES.get(row['type'], row['type']), row['category_name'],
+                row['amount'], row['currency'], row.get('description') or '']
+    
+    def _write(self, file_path: str, batches: Iterator[List[Dict]], summary: Callable[[], Dict],
+               filters: Optional[Dict]):
+        """
+        寫入檔案 (子類別實作)
+        
+        Args:
+            file_path: 檔案路徑 (暫存檔)
+            batches: 交易批次，讀完後 summary() 才是完整的統計
+            summary: 取得目前統計的函式 (rows、total_income、total_expense、balance)
+            filters: 匯出的篩選條件
+        """
+        raise NotImplementedError
+
+
+class CsvExporter(TransactionExporter):
+    """匯出 CSV 檔案 (交易明細後接統計摘要與匯出資訊)"""
+    
+    def _write(self, file_path: str, batches: Iterator[List[Dict]], summary: Callable[[], Dict],
+               filters: Optional[Dict]):
+        with open(file_path, 'w', newline='', encoding='utf-8-sig') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow([DEFAULT_MAPPING[field] for field in EXPORT_FIELDS])
+            for batch in batches:
+                writer.writerows(self._row_values(row) for row in batch)
+            
+            totals = summary()
+            writer.writerow([])
+            writer.writerow(['統計摘要'])
+            writer.writerow(['總收入', f"${totals['total_income']:.2f}"])
+            writer.writerow(['總支出', f"${totals['total_expense']:.2f}"])
+            writer.writerow(['結餘', f"${totals['balance']:.2f}"])
+            
+            writer.writerow([])
+            writer.writerow(['匯出資訊'])
+            writer.writerow(['匯出時間', datetime.now().strftime('%Y-%m-%d %H:%M:%S')])
+            writer.writerow(['記錄筆數', totals['rows']])
+
+
+class XlsxExporter(TransactionExporter):
+    """
+    匯出 Excel 檔案 (需要 openpyxl)
+    
+    使用 write-only 活頁簿：每列寫入後即輸出到暫存檔，不在記憶體中保留儲存格；格式以活頁簿
+    共用的具名樣式 (NamedStyle) 指定，不必每個儲存格各建一份樣式。
+    另可加入月份摘要與分類樞紐工作表，兩者都由同一個彙總查詢 (每月、類型、分類一列) 產生，
+    不必重新讀取交易。
+    """
+    
+    # 交易記錄工作表的欄寬 (依 EXPORT_FIELDS)
+    COLUMN_WIDTHS = [12, 8, 15, 12, 6, 30]
+    
+    # 金額的數字格式
+    AMOUNT_FORMAT = '#,##0.00'
+    
+    def __init__(self, transaction_manager: TransactionManager, batch_size: Optional[int] = None,
+                 summary_sheets: bool = True):
+        """
+        Args:
+            transaction_manager: 交易管理器 (可為年度分區的管理器)
+            batch_size: 每批讀取的筆數
+            summary_sheets: 是否加入月份摘要與分類樞紐工作表
+        """
+        if not OPENPYXL_AVAILABLE:
+            raise ImportError("Excel 匯出需要安裝 openpyxl 套件")
+        super().__init__(transaction_manager, batch_size)
+        self.summary_sheets = summary_sheets
+    
+    @staticmethod
+    def _add_styles(workbook):
+        """加入共用的具名樣式 (標題、金額、合計)"""
+        workbook.add_named_style(NamedStyle(
+            name='export_header', font=Font(bold=True, color="FFFFFF"),
+            fill=PatternFill(start_color="366092", end_color="366092", fill_type="solid"),
+            alignment=Alignment(horizontal='center')))
+        workbook.add_named_style(NamedStyle(name='export_amount', number_format=XlsxExporter.AMOUNT_FORMAT))
+        workbook.add_named_style(NamedStyle(name='export_total', font=Font(bold=True),
+                                            number_format=XlsxExporter.AMOUNT_FORMAT))
+    
+    @staticmethod
+    def _cell(sheet, value, style: str):
+        cell = WriteOnlyCell(sheet, value=value)
+        cell.style = style
+        return cell
+    
+    def _create_sheet(self, workbook, title: str, headers: List[str], widths: List[int]):
+        """建立工作表並寫入標題列 (欄寬必須在寫入第一列前設定)"""
+        sheet = workbook.create_sheet(title)
+        for column, width in enumerate(widths, 1):
+            sheet.column_dimensions[openpyxl.utils.get_column_letter(column)].width = width
+        sheet.freeze_panes = 'A2'
+        sheet.append([self._cell(sheet, header, 'export_header') for header in headers])
+        return sheet
+    
+    def _write(self, file_path: str, batches: Iterator[List[Dict]], summary: Callable[[], Dict],
+               filters: Optional[Dict]):
+        workbook = openpyxl.Workbook(write_only=True)
+        self._add_styles(workbook)
+        sheet = self._create_sheet(workbook, "交易記錄", [DEFAULT_MAPPING[field] for field in EXPORT_FIELDS],
+                                   self.COLUMN_WIDTHS)
+        for batch in batches:
+            for row in batch:
+                values = self._row_values(row)
+                values[3] = self._cell(sheet, values[3], 'export_amount')
+                # 備註中的控制字元無法寫入 Excel
+                values[5] = ILLEGAL_CHARACTERS_RE.sub('', values[5])
+                sheet.append(values)
+        
+        if self.summary_sheets:
+            totals = self.transaction_manager._filtered_totals(filters)
+            self._write_monthly(workbook, totals)
+            self._write_pivot(workbook, totals)
+        workbook.save(file_path)
+    
+    def _write_monthly(self, workbook, totals: List[Dict]):
+        """月份摘要：每月的收入、支出、結餘與筆數 (金額以分累計)"""
+        months: Dict[str, List[int]] = {}
+        for item in totals:
+            month = months.setdefault(item['period'], [0, 0, 0])
+            month[0 if item['type'] == 'income' else 1] += round(item['total'] * 100)
+            month[2] += item['count']
+        
+        sheet = self._create_sheet(workbook, "月份摘要", ['月份', '收入', '支出', '結餘', '筆數'], [10, 15, 15, 15, 10])
+        income = expense = count = 0
+        for period in sorted(months):
+            month_income, month_expense, month_count = months[period]
+            sheet.append([period] + [self._cell(sheet, cents / 100, 'export_amount')
+                                     for cents in (month_income, month_expense, month_income - month_expense)]
+                         + [month_count])
+            income, expense, count = income + month_income, expense + month_expense, count + month_count
+        sheet.append(['合計'] + [self._cell(sheet, cents / 100, 'export_total')
+                                for cents in (income, expense, income - expense)] + [count])
+    
+    def _write_pivot(self, workbook, totals: List[Dict]):
+        """分類樞紐：每個分類一列、每月一欄 (收入分類在前，各自依合計由大到小)"""
+        periods = sorted({item['period'] for item in totals})
+        columns = {period: index for index, period in enumerate(periods)}
+        categories: Dict[tuple, List[int]] = {}
+        for item in totals:
+            cents = categories.setdefault((item['type'], item['category_name']), [0] * len(periods))
+            cents[columns[item['period']]] += round(item['total'] * 100)
+        
+        sheet = self._create_sheet(workbook, "分類樞紐", ['類型', '分類'] + periods + ['合計'],
+                                   [8, 15] + [12] * (len(periods) + 1))
+        for (transaction_type, name), cents in sorted(
+                categories.items(), key=lambda item: (item[0][0] != 'income', -sum(item[1]), item[0][1] or '')):
+            sheet.append([TYPE_NAMES.get(transaction_type, transaction_type), name]
+                         + [self._cell(sheet, value / 100, 'export_amount') if value else None for value in cents]
+                         + [self._cell(sheet, sum(cents) / 100, 'export_total')])
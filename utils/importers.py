@@ -0,0 +1,628 @@
+"""
+交易匯入工具模組
+串流讀取銀行對帳單等 CSV / Excel / OFX / QIF 檔案，依欄位對應正規化日期與金額；大型檔案以多個行程
+平行解析，再由單一寫入端分批寫入，記憶體用量不隨檔案大小增加
+"""
+
+import codecs
+import csv
+import os
+import re
+import sqlite3
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from database.category_rules import UNCATEGORIZED_CATEGORIES, CategoryRuleManager
+from database.log import get_logger
+from database.models import BASE_CURRENCY, TransactionManager
+from .statement_parsers import iter_ofx_transactions, iter_qif_transactions
+
+try:
+    import openpyxl
+    OPENPYXL_AVAILABLE = True
+except ImportError:
+    OPENPYXL_AVAILABLE = False
+
+logger = get_logger('importers')
+
+# 預設欄位對應 (與匯出 CSV 的標題相同，匯出的檔案可直接匯回)
+DEFAULT_MAPPING = {
+    'date': '日期',
+    'type': '類型',
+    'category': '分類',
+    'amount': '金額',
+    'currency': '幣別',
+    'description': '備註',
+}
+
+# 可對應的欄位：
+#   date 日期 (必要)
+#   amount 金額；有 type 欄位時取絕對值，否則負數為支出、正數為收入
+#   debit / credit 支出與存入分開兩欄的對帳單 (取代 amount)
+#   type 類型 (收入/支出)、category 分類名稱、currency 幣別、description 備註
+#   external_id 銀行的交易編號 (有編號時以編號判斷重複匯入)
+MAPPING_FIELDS = ('date', 'type', 'category', 'amount', 'debit', 'credit', 'currency', 'description',
+                  'external_id')
+
+# 類型欄位可接受的值
+TYPE_NAMES = {'income': 'income', '收入': 'income', 'expense': 'expense', '支出': 'expense'}
+
+# 沒有分類欄位 (或分類為空白) 且沒有分類規則符合時使用的分類名稱
+DEFAULT_CATEGORIES = UNCATEGORIZED_CATEGORIES
+
+# 未指定日期格式時依序嘗試的格式 (另外支援民國年，例如 113/03/05)
+DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%Y.%m.%d', '%Y%m%d')
+
+_ROC_DATE = re.compile(r'^(\d{2,3})[/.-](\d{1,2})[/.-](\d{1,2})$')
+_CURRENCY_PREFIX = re.compile(r'^(NT\$|US\$|\$|＄)')
+
+
+def parse_date(value: str, date_format: Optional[str] = None) -> str:
+    """
+    將日期字串正規化為 YYYY-MM-DD (無法辨識時拋出 ValueError)
+    
+    未指定格式時接受西元年 (2024-03-05、2024/3/5、20240305) 與民國年 (113/03/05)，
+    日期後面的時間會被忽略。指定格式時，已是 YYYY-MM-DD 的值 (Excel 的日期儲存格)
+    仍可接受。
+    """
+    text = (value or '').strip()
+    if date_format:
+        try:
+            return datetime.strptime(text, date_format).date().isoformat()
+        except ValueError:
+            formats = ('%Y-%m-%d',)
+    else:
+        formats = DATE_FORMATS
+    try:
+        text = text.split()[0] if text else text
+        match = None if date_format else _ROC_DATE.match(text)
+        if match:
+            year, month, day = (int(part) for part in match.groups())
+            return datetime(year + 1911, month, day).date().isoformat()
+        for candidate in formats:
+            try:
+                return datetime.strptime(text, candidate).date().isoformat()
+            except ValueError:
+                continue
+    except ValueError:
+        pass
+    raise ValueError(f"無法辨識的日期：{value}")
+
+
+def parse_amount(value: str) -> float:
+    """
+    將金額字串轉為數字 (無法辨識時拋出 ValueError)
+    
+    會去除千分位逗號與 $、NT$ 等幣別符號；括號或結尾的負號表示負數，例如 (1,200) 或 1200-。
+    """
+    text = (value or '').strip().replace(',', '').replace(' ', '')
+    negative = False
+    if text.startswith('(') and text.endswith(')'):
+        negative, text = True, text[1:-1]
+    elif text.endswith('-'):
+        negative, text = True, text[:-1]
+    if text.startswith('-'):
+        negative, text = not negative, text[1:]
+    text = _CURRENCY_PREFIX.sub('', text)
+    try:
+        amount = float(text)
+    except ValueError:
+        raise ValueError(f"無法辨識的金額：{value}") from None
+    return -amount if negative else amount
+
+
+def read_header(file_path: str, encoding: str = 'utf-8-sig', delimiter: str = ',') -> List[str]:
+    """讀取 CSV 的標題列 (供設定欄位對應)"""
+    with open(file_path, newline='', encoding=encoding) as f:
+        return [name.strip() for name in next(csv.reader(f, delimiter=delimiter), [])]
+
+
+def read_xlsx_header(file_path: str, sheet_name: Optional[str] = None) -> List[str]:
+    """讀取 Excel 工作表的標題列 (供設定欄位對應)"""
+    with XlsxImporter._open_sheet(file_path, sheet_name) as sheet:
+        header = next(sheet.iter_rows(max_row=1, values_only=True), ())
+        return [_cell_text(value) for value in header]
+
+
+def _cell_text(value) -> str:
+    """將 Excel 儲存格的值轉為與 CSV 相同的文字 (日期儲存格轉為 YYYY-MM-DD)"""
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d')
+    return str(value).strip()
+
+
+def _parse_row(row: Sequence[str], context: Dict) -> Dict:
+    """依解析設定將一列 CSV 轉成交易 (格式錯誤時拋出 ValueError)"""
+    def get(field):
+        index = context['columns'].get(field)
+        return row[index].strip() if index is not None and index < len(row) else ''
+    
+    date = parse_date(get('date'), context['date_format'])
+    if 'type' in context['columns']:
+        transaction_type = TYPE_NAMES.get(get('type').lower())
+        if transaction_type is None:
+            raise ValueError(f"無法辨識的類型：{get('type')}")
+        amount = abs(parse_amount(get('amount')))
+    elif 'amount' in context['columns']:
+        amount = parse_amount(get('amount'))
+        transaction_type = 'expense' if amount < 0 else 'income'
+        amount = abs(amount)
+    elif get('debit'):
+        transaction_type, amount = 'expense', abs(parse_amount(get('debit')))
+    elif get('credit'):
+        transaction_type, amount = 'income', abs(parse_amount(get('credit')))
+    else:
+        raise ValueError("沒有金額")
+    
+    category_name = get('category')
+    if category_name:
+        category_id = context['categories'].get((transaction_type, category_name))
+    else:
+        rules = context['rules']
+        category_id = rules.match(get('description'), transaction_type, amount) if rules is not None else None
+        if category_id is None:
+            category_id = context['default_categories'].get(transaction_type)
+    if category_id is None:
+        type_name = '收入' if transaction_type == 'income' else '支出'
+        raise ValueError(f"找不到{type_name}分類：{category_name or '(未指定)'}")
+    
+    transaction = TransactionManager._normalize_row({
+        'date': date, 'type': transaction_type, 'category_id': category_id, 'amount': amount,
+        'description': get('description'), 'currency': get('currency') or context['currency'],
+        'account_id': context['account_id'], 'external_id': get('external_id'),
+    })
+    account_currency = context['account_currency']
+    if account_currency and transaction['currency'] != account_currency:
+        raise ValueError(f"幣別 {transaction['currency']} 與帳戶幣別 {account_currency} 不同")
+    return transaction
+
+
+def _parse_chunk(chunk: Sequence[Tuple[int, List[str]]],
+                 context: Dict) -> Tuple[List[Tuple[int, Dict]], List[Tuple[int, str]]]:
+    """
+    解析一批 CSV 列 (在工作行程中執行，因此為模組層級函式)
+    
+    Returns:
+        ([(列號, 交易)], [(列號, 錯誤訊息)])
+    """
+    rows, errors = [], []
+    for line_number, row in chunk:
+        if not any(cell.strip() for cell in row):
+            continue
+        try:
+            rows.append((line_number, _parse_row(row, context)))
+        except (TypeError, ValueError) as e:
+            errors.append((line_number, str(e)))
+    return rows, errors
+
+
+# 對帳單 (OFX / QIF) 轉成的欄位與對應
+STATEMENT_HEADER = ['日期', '金額', '備註', '幣別', '交易編號']
+STATEMENT_MAPPING = {'date': '日期', 'amount': '金額', 'description': '備註', 'currency': '幣別',
+                     'external_id': '交易編號'}
+
+
+class _DecodedLines:
+    """
+    逐行 (或每 block_size 位元組) 解碼二進位檔案並記錄已讀取的位元組數 (供進度回報)
+    
+    OFX (SGML) 檔案可能整份只有一行，因此以固定大小讀取。
+    """
+    
+    def __init__(self, f: BinaryIO, encoding: str, block_size: Optional[int] = None):
+        self.f = f
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.block_size = block_size
+        self.position = 0
+    
+    def __iter__(self) -> Iterator[str]:
+        blocks = iter(lambda: self.f.read(self.block_size), b'') if self.block_size else self.f
+        for raw in blocks:
+            self.position += len(raw)
+            yield self.decoder.decode(raw)
+        tail = self.decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+
+
+class TransactionImporter:
+    """
+    交易匯入基礎類別 (子類別以 _open 提供逐列讀取的來源)
+    
+    讀取端每次只讀取 CHUNK_SIZE 列交給解析，檔案超過 PARALLEL_MIN_BYTES 時
+    以行程池平行解析，同時進行中的批次最多為工作行程數的兩倍。解析結果依原本
+    的順序交給單一寫入端，每 WRITE_BATCH_SIZE 筆在一個寫入交易中以
+    executemany 寫入，因此數百萬列的檔案也只佔用固定的記憶體。
+    
+    格式錯誤的列不會中斷匯入，而是記錄在錯誤報告中 (回傳前 MAX_REPORTED_ERRORS
+    筆，另可將全部錯誤寫入 CSV)。
+    
+    每批寫入前以指紋與既有交易做一次集合比對 (TransactionManager._match_existing)，
+    略過已匯入過的交易，並回報金額相同、日期相近的近似重複供使用者確認。
+    """
+    
+    # 每批解析的列數
+    CHUNK_SIZE = 5000
+    
+    # 每個寫入交易的筆數
+    WRITE_BATCH_SIZE = 5000
+    
+    # 檔案達此大小才使用行程池 (小檔案啟動行程的成本高於解析本身)
+    PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+    
+    # 回傳結果中保留的錯誤筆數上限
+    MAX_REPORTED_ERRORS = 1000
+    
+    def __init__(self, transaction_manager: TransactionManager, mapping: Optional[Dict[str, str]] = None,
+                 date_format: Optional[str] = None, currency: str = BASE_CURRENCY,
+                 account_id: Optional[int] = None, default_categories: Optional[Dict[str, str]] = None,
+                 max_workers: Optional[int] = None, skip_duplicates: bool = True, near_duplicate_days: int = 3,
+                 apply_rules: bool = True):
+        """
+        初始化匯入設定
+        
+        Args:
+            transaction_manager: 交易管理器 (可為年度分區的管理器)
+            mapping: 欄位對應 {欄位: 標題列的欄位名稱}，欄位見 MAPPING_FIELDS (預設為 DEFAULT_MAPPING)
+            date_format: 日期格式 (strptime 格式，None 時自動辨識)
+            currency: 沒有幣別欄位時使用的幣別
+            account_id: 匯入的交易記入的帳戶
+            default_categories: 沒有分類時使用的分類名稱 {'income': ..., 'expense': ...}
+            max_workers: 平行解析的行程數 (None 為 CPU 核心數，1 表示不使用行程池)
+            skip_duplicates: 略過指紋與既有交易相同的交易
+            near_duplicate_days: 近似重複的日期範圍 (±天數，0 表示不檢查)
+            apply_rules: 沒有分類的列依自動分類規則 (CategoryRuleManager) 決定分類
+        """
+        mapping = {field: column for field, column in (mapping or DEFAULT_MAPPING).items() if column}
+        unknown = set(mapping) - set(MAPPING_FIELDS)
+        if unknown:
+            raise ValueError(f"未知的欄位：{', '.join(sorted(unknown))}")
+        if 'date' not in mapping:
+            raise ValueError("必須指定日期欄位")
+        if not {'amount', 'debit', 'credit'} & set(mapping):
+            raise ValueError("必須指定金額欄位 (或支出/存入欄位)")
+        if 'type' in mapping and 'amount' not in mapping:
+            raise ValueError("指定類型欄位時必須同時指定金額欄位")
+        
+        self.transaction_manager = transaction_manager
+        self.db_manager = transaction_manager.db_manager
+        self.mapping = mapping
+        self.date_format = date_format
+        self.currency = TransactionManager._normalize_currency(currency)
+        self.account_id = account_id
+        self.default_categories = default_categories or DEFAULT_CATEGORIES
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.skip_duplicates = skip_duplicates
+        self.near_duplicate_days = near_duplicate_days
+        self.apply_rules = apply_rules
+    
+    def import_file(self, file_path: str, progress: Optional[Callable[[int, int], None]] = None,
+                    error_report_path: Optional[str] = None) -> Dict:
+        """
+        匯入檔案 (第一列為標題)
+        
+        Args:
+            file_path: 檔案路徑
+            progress: 進度回呼 progress(已處理量, 總量)，每批解析完成後呼叫
+                      (單位由子類別決定，CSV 為位元組，Excel 為列數；總量未知時為 0)
+            error_report_path: 將所有錯誤寫入此 CSV (欄位：列號, 錯誤)
+        
+        Returns:
+            包含 imported (匯入筆數)、error_count (錯誤筆數)、
+            errors ([(列號, 錯誤訊息)]，最多 MAX_REPORTED_ERRORS 筆)、duplicates (略過的重複筆數) 與
+            near_duplicates ([(列號, [近似的既有交易])]，最多 MAX_REPORTED_ERRORS 筆) 的字典；
+            列號 0 表示資料庫錯誤，之後的列沒有匯入
+        """
+        file_size = os.path.getsize(file_path)
+        done = total = 0
+        result = {'imported': 0, 'error_count': 0, 'errors': [], 'duplicates': 0, 'near_duplicates': []}
+        # 只與匯入開始前已存在的交易比對
+        before_id = self.transaction_manager._last_transaction_id()
+        report_file = open(error_report_path, 'w', newline='', encoding='utf-8-sig') if error_report_path else None
+        report = csv.writer(report_file) if report_file else None
+        if report:
+            report.writerow(['列號', '錯誤'])
+        
+        def add_errors(errors):
+            result['error_count'] += len(errors)
+            room = self.MAX_REPORTED_ERRORS - len(result['errors'])
+            if room > 0:
+                result['errors'].extend(errors[:room])
+            if report:
+                report.writerows(errors)
+        
+        try:
+            with self._open(file_path) as (header, rows, position, total):
+                if header is None:
+                    raise ValueError("檔案是空的")
+                context = self._build_context(header)
+                
+                chunks = self._read_chunks(rows, position)
+                if file_size >= self.PARALLEL_MIN_BYTES and self.max_workers > 1:
+                    parsed = self._parse_parallel(chunks, context)
+                else:
+                    parsed = ((_parse_chunk(chunk, context), position) for chunk, position in chunks)
+                
+                batch: List[Tuple[int, Dict]] = []
+                try:
+                    for (parsed_rows, errors), done in parsed:
+                        add_errors(errors)
+                        batch.extend(parsed_rows)
+                        while len(batch) >= self.WRITE_BATCH_SIZE:
+                            self._write(batch[:self.WRITE_BATCH_SIZE], result, add_errors, before_id)
+                            batch = batch[self.WRITE_BATCH_SIZE:]
+                        if progress:
+                            progress(done, total)
+                    if batch:
+                        self._write(batch, result, add_errors, before_id)
+                finally:
+                    # 寫入失敗時也要結束行程池
+                    parsed.close()
+        except sqlite3.Error as e:
+            logger.error("匯入交易錯誤：%s", e, extra={'event': 'import_failed', 'file_path': file_path})
+            add_errors([(0, str(e))])
+        except csv.Error as e:
+            raise ValueError(f"無法讀取 CSV 檔案：{e}") from None
+        finally:
+            if report_file:
+                report_file.close()
+        
+        if progress:
+            progress(total or done, total)
+        logger.info("已匯入 %d 筆交易 (%d 筆錯誤，略過 %d 筆重複)", result['imported'], result['error_count'],
+                    result['duplicates'], extra={'event': 'transactions_imported', 'file_path': file_path})
+        return result
+    
+    def parse_file(self, file_path: str) -> Tuple[List[Tuple[int, Dict]], List[Tuple[int, str]]]:
+        """
+        只解析檔案而不寫入 (例如對帳時與帳上交易比對)
+        
+        Returns:
+            ([(列號, 交易)], [(列號, 錯誤訊息)])
+        """
+        rows, errors = [], []
+        try:
+            with self._open(file_path) as (header, source, position, total):
+                if header is None:
+                    raise ValueError("檔案是空的")
+                context = self._build_context(header)
+                for chunk, _ in self._read_chunks(source, position):
+                    parsed_rows, chunk_errors = _parse_chunk(chunk, context)
+                    rows.extend(parsed_rows)
+                    errors.extend(chunk_errors)
+        except csv.Error as e:
+            raise ValueError(f"無法讀取 CSV 檔案：{e}") from None
+        return rows, errors
+    
+    @contextmanager
+    def _open(self, file_path: str):
+        """
+        開啟檔案，產生 (標題列, 逐列來源, 已處理量函式, 總量)
+        
+        逐列來源產生 (列號, [欄位文字])，讀完時才關閉檔案。
+        """
+        raise NotImplementedError
+    
+    def _build_context(self, header: Sequence[str]) -> Dict:
+        """依標題列與資料庫內容建立解析設定 (傳給工作行程，只包含可序列化的資料)"""
+        header = [name.strip() for name in header]
+        missing = [column for column in self.mapping.values() if column not in header]
+        if missing:
+            raise ValueError(f"檔案缺少欄位：{', '.join(missing)}")
+        
+        categories = {(row['type'], row['name']): row['id'] for row in self.db_manager.query(
+            'SELECT id, name, type FROM categories')}
+        account_currency = None
+        if self.account_id is not None:
+            account = self.db_manager.query_one('SELECT currency FROM accounts WHERE id = ?', (self.account_id,))
+            if account is None:
+                raise ValueError(f"帳戶 ID {self.account_id} 不存在")
+            account_currency = account['currency']
+        
+        return {
+            'columns': {field: header.index(column) for field, column in self.mapping.items()},
+            'date_format': self.date_format,
+            'categories': categories,
+            'default_categories': {transaction_type: categories.get((transaction_type, name))
+                                   for transaction_type, name in self.default_categories.items()},
+            'currency': self.currency,
+            'account_id': self.account_id,
+            'account_currency': account_currency,
+            # 規則只在匯入開始時編譯一次
+            'rules': CategoryRuleManager(self.transaction_manager).get_matcher() if self.apply_rules else None,
+        }
+    
+    def _read_chunks(self, rows: Iterator[Tuple[int, List[str]]],
+                     position: Callable[[], int]) -> Iterator[Tuple[List[Tuple[int, List[str]]], int]]:
+        """每 CHUNK_SIZE 列產生一批 ([(列號, 欄位)], 已處理量)"""
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.CHUNK_SIZE:
+                yield chunk, position()
+                chunk = []
+        if chunk:
+            yield chunk, position()
+    
+    def _parse_parallel(self, chunks, context: Dict):
+        """以行程池解析，依原本的順序回傳結果 (進行中的批次最多為工作行程數的兩倍)"""
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            for chunk, position in chunks:
+                pending.append((executor.submit(_parse_chunk, chunk, context), position))
+                if len(pending) >= self.max_workers * 2:
+                    future, done = pending.popleft()
+                    yield future.result(), done
+            while pending:
+                future, done = pending.popleft()
+                yield future.result(), done
+    
+    def _write(self, batch: Sequence[Tuple[int, Dict]], result: Dict, add_errors, before_id: int):
+        """
+        比對重複後寫入一批交易 (無法寫入的組，例如已結帳年度，記為該組每一列的錯誤)
+        
+        Args:
+            before_id: 只與 ID 不大於此值的既有交易比對
+        """
+        line_numbers = {id(row): line_number for line_number, row in batch}
+        check = self.skip_duplicates or self.near_duplicate_days > 0
+        for group in self.transaction_manager._bulk_groups([row for _, row in batch]):
+            def insert(conn):
+                self.transaction_manager._check_rows(conn, group)
+                duplicates, near = set(), {}
+                if check:
+                    duplicates, near = self.transaction_manager._match_existing(
+                        conn, group, before_id, self.near_duplicate_days)
+                if not self.skip_duplicates:
+                    duplicates = set()
+                rows = [row for position, row in enumerate(group) if position not in duplicates]
+                return (self.transaction_manager._insert_many(conn, rows) if rows else 0), len(duplicates), near
+            
+            try:
+                imported, duplicates, near = self.db_manager.run_write(insert)
+            except ValueError as e:
+                add_errors(sorted((line_numbers[id(row)], str(e)) for row in group))
+                continue
+            result['imported'] += imported
+            result['duplicates'] += duplicates
+            room = max(self.MAX_REPORTED_ERRORS - len(result['near_duplicates']), 0)
+            result['near_duplicates'].extend((line_numbers[id(group[position])], matches)
+                                             for position, matches in sorted(near.items())[:room])
+
+
+class CsvImporter(TransactionImporter):
+    """CSV 交易匯入 (以二進位逐行讀取並解碼，進度以位元組計算)"""
+    
+    def __init__(self, transaction_manager: TransactionManager, mapping: Optional[Dict[str, str]] = None,
+                 encoding: str = 'utf-8-sig', delimiter: str = ',', **kwargs):
+        """
+        Args:
+            encoding: 檔案編碼 (例如 'utf-8-sig' 或 'cp950')
+            delimiter: 欄位分隔字元
+            其他參數見 TransactionImporter
+        """
+        super().__init__(transaction_manager, mapping, **kwargs)
+        self.encoding = encoding
+        self.delimiter = delimiter
+    
+    @contextmanager
+    def _open(self, file_path: str):
+        with open(file_path, 'rb') as f:
+            lines = _DecodedLines(f, self.encoding)
+            reader = csv.reader(lines, delimiter=self.delimiter)
+            header = next(reader, None)
+            rows = ((reader.line_num, row) for row in reader)
+            yield header, rows, lambda: lines.position, os.path.getsize(file_path)
+
+
+class XlsxImporter(TransactionImporter):
+    """
+    Excel (.xlsx) 交易匯入
+    
+    以 openpyxl 的 read_only 模式開啟，逐列串流讀取工作表的 XML，不建立整本活頁簿的
+    物件模型，因此記憶體用量與列數無關。日期儲存格轉為 YYYY-MM-DD、數字轉為文字後，
+    與 CSV 使用相同的欄位對應與驗證。進度以列數計算。
+    """
+    
+    def __init__(self, transaction_manager: TransactionManager, mapping: Optional[Dict[str, str]] = None,
+                 sheet_name: Optional[str] = None, **kwargs):
+        """
+        Args:
+            sheet_name: 工作表名稱 (None 為活頁簿開啟時的工作表)
+            其他參數見 TransactionImporter
+        """
+        if not OPENPYXL_AVAILABLE:
+            raise ImportError("需要安裝 openpyxl")
+        super().__init__(transaction_manager, mapping, **kwargs)
+        self.sheet_name = sheet_name
+    
+    @staticmethod
+    @contextmanager
+    def _open_sheet(file_path: str, sheet_name: Optional[str] = None):
+        """以 read_only 模式開啟工作表 (離開時關閉檔案)"""
+        if not OPENPYXL_AVAILABLE:
+            raise ImportError("需要安裝 openpyxl")
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            if sheet_name is not None and sheet_name not in workbook.sheetnames:
+                raise ValueError(f"找不到工作表：{sheet_name}")
+            yield workbook[sheet_name] if sheet_name is not None else workbook.active
+        finally:
+            workbook.close()
+    
+    @contextmanager
+    def _open(self, file_path: str):
+        with self._open_sheet(file_path, self.sheet_name) as sheet:
+            values = sheet.iter_rows(values_only=True)
+            header = next(values, None)
+            current = {'row': 1}
+            
+            def rows():
+                for line_number, row in enumerate(values, start=2):
+                    current['row'] = line_number
+                    yield line_number, [_cell_text(value) for value in row]
+            
+            # max_row 取自工作表記錄的範圍，沒有記錄時無法估計進度
+            yield (None if header is None else [_cell_text(value) for value in header],
+                   rows(), lambda: current['row'], sheet.max_row or 0)
+
+
+class _StatementImporter(TransactionImporter):
+    """對帳單匯入 (解析出的交易轉成 STATEMENT_HEADER 的欄位，進度以位元組計算)"""
+    
+    # 每次讀取的位元組數 (None 為逐行讀取)
+    BLOCK_SIZE: Optional[int] = None
+    
+    def __init__(self, transaction_manager: TransactionManager, encoding: str = 'utf-8-sig', **kwargs):
+        """
+        Args:
+            encoding: 檔案編碼
+            其他參數見 TransactionImporter (欄位對應固定為 STATEMENT_MAPPING)
+        """
+        super().__init__(transaction_manager, STATEMENT_MAPPING, **kwargs)
+        self.encoding = encoding
+    
+    def _records(self, text: Iterator[str]) -> Iterator[Tuple[int, List[str]]]:
+        """由解碼後的文字產生 (編號, [日期, 金額, 備註, 幣別, 交易編號])"""
+        raise NotImplementedError
+    
+    @contextmanager
+    def _open(self, file_path: str):
+        with open(file_path, 'rb') as f:
+            text = _DecodedLines(f, self.encoding, self.BLOCK_SIZE)
+            yield STATEMENT_HEADER, self._records(iter(text)), lambda: text.position, os.path.getsize(file_path)
+
+
+class OfxImporter(_StatementImporter):
+    """OFX 對帳單匯入 (錯誤報告的列號為第幾筆交易)"""
+    
+    BLOCK_SIZE = 64 * 1024
+    
+    def _records(self, text):
+        for record in iter_ofx_transactions(text):
+            description = ' - '.join(part for part in (record['name'], record['memo']) if part)
+            yield record['index'], [record['date'], record['amount'], description, record['currency'],
+                                    record['fitid']]
+
+
+class QifImporter(_StatementImporter):
+    """QIF 對帳單匯入 (錯誤報告的列號為交易第一行的行號)"""
+    
+    def __init__(self, transaction_manager: TransactionManager, day_first: bool = False, **kwargs):
+        """
+        Args:
+            day_first: 日期是否為日/月/年 (QIF 預設為月/日/年)
+            其他參數見 _StatementImporter
+        """
+        super().__init__(transaction_manager, **kwargs)
+        self.day_first = day_first
+    
+    def _records(self, text):
+        for record in iter_qif_transactions(text, self.day_first):
+            description = ' - '.join(part for part in (record['payee'], record['memo']) if part)
+            yield record['line'], [record['date'], record['amount'], description, '', '']
@@ -0,0 +1,155 @@
+"""
+銀行對帳單解析模組
+以串流方式解析 OFX (SGML 1.x 與 XML 2.x) 與 QIF 檔案，逐筆產生交易，
+不建立整份文件的樹狀結構，記憶體用量與檔案大小無關
+"""
+
+import html
+import re
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional
+
+# OFX 標籤 (開始或結束) 與其後到下一個標籤前的文字；SGML 的資料元素沒有結束標籤
+_OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+# QIF 中記錄交易的區塊類型 (其他如 !Type:Cat、!Account 為分類或帳戶清單)
+QIF_TRANSACTION_TYPES = ('bank', 'cash', 'ccard', 'oth a', 'oth l', 'invst')
+
+
+def _ofx_date(value: str) -> str:
+    """OFX 日期 (YYYYMMDD[HHMMSS[.XXX]][[時區]]) 轉為 YYYY-MM-DD，無法辨識時原樣回傳"""
+    try:
+        return datetime.strptime(value[:8], '%Y%m%d').date().isoformat()
+    except ValueError:
+        return value
+
+
+def iter_ofx_transactions(chunks: Iterable[str]) -> Iterator[Dict]:
+    """
+    逐筆產生 OFX 檔案中的交易 (STMTTRN)
+    
+    只保留目前交易的欄位與所屬對帳單的幣別 (CURDEF)，文字可任意切塊傳入；
+    每塊只處理到最後一個 '<' 之前，其餘留到下一塊，標籤與文字不會被切斷。
+    
+    Args:
+        chunks: 解碼後的文字片段 (例如每次讀取 64KB)
+    
+    Yields:
+        包含 index (第幾筆，由 1 起算)、date、amount、type (TRNTYPE)、fitid、
+        name、memo、checknum 與 currency 的字典；日期已轉為 YYYY-MM-DD
+    """
+    currency = ''
+    current: Optional[Dict[str, str]] = None
+    index = 0
+    
+    def finish(values):
+        nonlocal index
+        index += 1
+        return {
+            'index': index,
+            'date': _ofx_date(values.get('DTPOSTED', '')),
+            'amount': values.get('TRNAMT', ''),
+            'type': values.get('TRNTYPE', ''),
+            'fitid': values.get('FITID', ''),
+            'name': values.get('NAME', '') or values.get('PAYEE', ''),
+            'memo': values.get('MEMO', ''),
+            'checknum': values.get('CHECKNUM', ''),
+            'currency': values.get('CURSYM', '') or currency,
+        }
+    
+    def scan(text):
+        nonlocal currency, current
+        for match in _OFX_TAG.finditer(text):
+            closing, tag, value = match.group(1), match.group(2).upper(), html.unescape(match.group(3).strip())
+            if tag == 'STMTTRN':
+                if current is not None:
+                    yield finish(current)
+                current = None if closing else {}
+            elif closing:
+                continue
+            elif current is not None:
+                current.setdefault(tag, value)
+            elif tag == 'CURDEF':
+                currency = value
+    
+    pending = ''
+    for chunk in chunks:
+        pending += chunk
+        cut = pending.rfind('<')
+        if cut <= 0:
+            continue
+        yield from scan(pending[:cut])
+        pending = pending[cut:]
+    yield from scan(pending)
+    if current is not None:
+        yield finish(current)
+
+
+def _qif_date(value: str, day_first: bool = False) -> str:
+    """
+    QIF 日期轉為 YYYY-MM-DD，無法辨識時原樣回傳
+    
+    QIF 日期常見 03/05/2024、3/5/24、3/ 5'24 (' 表示 2000 年後) 等寫法，
+    預設為月/日/年，day_first 為 True 時為日/月/年。
+    """
+    parts = re.split(r"[/.\-']", value.replace(' ', ''))
+    if len(parts) != 3 or not all(part.isdigit() for part in parts):
+        return value
+    first, second, year = (int(part) for part in parts)
+    if len(parts[2]) <= 2:
+        year += 2000 if year < 50 or "'" in value else 1900
+    month, day = (second, first) if day_first else (first, second)
+    try:
+        return datetime(year, month, day).date().isoformat()
+    except ValueError:
+        return value
+
+
+def iter_qif_transactions(lines: Iterable[str], day_first: bool = False) -> Iterator[Dict]:
+    """
+    逐筆產生 QIF 檔案中的交易
+    
+    每筆交易是以 '^' 結束的一組欄位 (D 日期、T/U 金額、P 對象、M 備註、L 分類、N 支票號碼)，
+    分割交易 (S/E/$) 只取總金額；非交易區塊 (分類清單、帳戶清單等) 會被略過。
+    
+    Args:
+        lines: 文字行
+        day_first: 日期是否為日/月/年
+    
+    Yields:
+        包含 line (交易第一行的行號)、date、amount、payee、memo、category 與 number 的字典
+    """
+    in_transactions = True
+    current: Dict[str, str] = {}
+    start_line = 0
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('!'):
+            header = line[1:].lower()
+            if header.startswith('type:'):
+                in_transactions = header[5:].strip() in QIF_TRANSACTION_TYPES
+            elif header == 'account':
+                in_transactions = False
+            current = {}
+            continue
+        if not in_transactions:
+            continue
+        if line.startswith('^'):
+            if current:
+                yield {
+                    'line': start_line,
+                    'date': _qif_date(current.get('D', ''), day_first),
+                    'amount': current.get('T', current.get('U', '')),
+                    'payee': current.get('P', ''),
+                    'memo': current.get('M', ''),
+                    'category': current.get('L', ''),
+                    'number': current.get('N', ''),
+                }
+            current = {}
+            continue
+        if not current:
+            start_line = line_number
+        # 分割交易的欄位重複出現，只保留第一個
+        current.setdefault(line[0], line[1:].strip())